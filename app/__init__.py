@@ -3,74 +3,124 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 from flask_mail import Mail
 from flask_cors import CORS
-from flask_migrate import Migrate
-from datetime import timedelta
-import os
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
+from app.config.config import Config
+from app.utils.db_routing import RoutingSession
 
 # Initialize extensions
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 jwt = JWTManager()
 mail = Mail()
-migrate = Migrate()
 
 def create_app():
     app = Flask(__name__, static_url_path='/uploads/', static_folder='uploads/')
     CORS(app)
 
-    # Configuration
-    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key')
-    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///app.db')
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'jwt-secret-key')
-    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
-
-    # Static file URL configuration - should match the Flutter app's base URL
-    app.config['STATIC_FILE_URL'] = os.getenv('STATIC_FILE_URL', 'http://192.168.231.17:8000')
-
-    # Mail configuration for Mailtrap
-    app.config['MAIL_SERVER'] = 'sandbox.smtp.mailtrap.io'
-    app.config['MAIL_PORT'] = 2525
-    app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
-    app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
-    app.config['MAIL_USE_TLS'] = True
-    app.config['MAIL_USE_SSL'] = False
-
-    # Configure upload folder and ensure directories exist
-    app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
-    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-    os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'audio'), exist_ok=True)
-    os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'thumbnails'), exist_ok=True)
-
-    # Ensure instance directory exists for SQLite database
-    instance_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance')
-    os.makedirs(instance_path, exist_ok=True)
+    # Configuration, read from the environment
+    app.config.from_object(Config())
 
     # Initialize extensions with app
     db.init_app(app)
     jwt.init_app(app)
     mail.init_app(app)
-    migrate.init_app(app, db)
+
+    # CLI commands: `flask init-db`, and `flask db` when Flask-Migrate is loaded
+    from app.commands import init_commands
+    init_commands(app)
+
+    # Log through a background queue, tagged with request ids
+    from app.utils.log import init_logging
+    init_logging(app)
+
+    # Apply the SQLite profile before the first connection is opened
+    from app.utils.sqlite import init_sqlite
+    init_sqlite(app, db)
+
+    # Raise on unplanned lazy loads in test mode
+    from app.models.loading import init_loading
+    init_loading(app, db)
+
+    # Route read-only views to replicas
+    from app.utils.db_routing import init_db_routing
+    init_db_routing(app, db)
+
+    # Profile individual requests on demand, including their before/after hooks and auth decorators
+    from app.utils.profiling import init_profiling
+    init_profiling(app)
+
+    # Record per-route latency, status codes and SQL usage
+    from app.utils.metrics import init_metrics
+    init_metrics(app, db)
+
+    # Cache blocks of the most requested audio files; reports its hit rate through /metrics
+    from app.utils.segment_cache import init_segment_cache
+    init_segment_cache(app)
+
+    # Pace bulk audio downloads and cap concurrent streams; registered after metrics so refusals are counted
+    from app.utils.stream_scheduler import init_stream_scheduler
+    init_stream_scheduler(app)
+
+    # Record playback positions from the ranges the stream route serves
+    from app.utils.listen_progress import init_listen_progress
+    init_listen_progress(app)
+
+    # Event log for the SSE endpoints of the async app
+    from app.utils.live_events import init_live_events
+    init_live_events(app)
+
+    # Flag repeated statements per request in development
+    from app.utils.query_trace import init_query_trace
+    init_query_trace(app, db)
+
+    # Compress responses; registered after metrics and profiling so their timings include it
+    from app.utils.compression import init_compression
+    init_compression(app)
+
+    # Surrogate keys for the CDN; registered before conditional so it sees the final Cache-Control
+    from app.utils.cdn import init_cdn
+    init_cdn(app)
+
+    # Per-view Cache-Control for conditional GETs
+    from app.utils.conditional import init_conditional
+    init_conditional(app)
 
     # Setup JWT error handlers
     from app.utils.jwt_handlers import register_jwt_handlers
     register_jwt_handlers(jwt)
 
+    # Setup rate limiting
+    from app.utils.rate_limit import init_rate_limiter
+    init_rate_limiter(app)
+
+    # Setup bulk deletion and the background file reaper
+    from app.utils.deletion import init_deletion
+    init_deletion(app)
+
+    # Setup the category snapshot cache
+    from app.utils.category_cache import init_category_cache
+    init_category_cache(app)
+
+    # Setup the shared response cache for hot GET endpoints
+    from app.utils.response_cache import init_response_cache
+    init_response_cache(app)
+
     # Import blueprints
     from .routes.auth import auth_bp
     from .routes.category import category_bp
     from .routes.podcast import podcast_bp
+    from .routes.health import health_bp
+    from .routes.metrics import metrics_bp
+    from .routes.profiling import profiling_bp
     
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(category_bp, url_prefix='/api')
     app.register_blueprint(podcast_bp, url_prefix='/api')
+    app.register_blueprint(health_bp, url_prefix='/api')
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(profiling_bp)
 
-    # Create database tables
-    with app.app_context():
-        db.create_all()
+    # Start delivering queued emails
+    from app.utils.email_outbox import init_email_outbox
+    init_email_outbox(app)
 
     return app 
\ No newline at end of file
@@ -0,0 +1,358 @@
+"""
+Async read API for high-concurrency read traffic.
+
+The read-heavy endpoints are served by FastAPI on SQLAlchemy's async engine,
+one event loop per worker instead of a thread per request:
+
+- GET /api/podcasts
+- GET /api/podcasts/discover
+- GET /api/podcasts/<id>
+- GET /api/podcasts/<id>/comments
+- GET /api/categories
+- GET /api/podcasts/<id>/events and GET /api/events?podcasts=<id>,<id>, the
+  Server-Sent Events streams of app.utils.live_events
+
+They use the same models, loading profiles and category snapshot as the Flask
+views and return the same JSON (see app.schemas). Every other route falls
+through to the Flask app, mounted behind them as WSGI.
+"""
+
+import asyncio
+import json
+import math
+from contextlib import asynccontextmanager
+import anyio
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from app import db
+from app.models.podcast import Podcast, podcast_categories, podcast_likes
+from app.models.category import Category
+from app.models.comment import Comment
+from app.models.loading import comment_options, podcast_options, podcast_visible
+from app.schemas import CategoryList, CategoryOut, CommentOut, CommentPage, PodcastOut, PodcastPage
+from app.utils.compression import ASGICompressionMiddleware, no_compression, precompressed
+from app.utils.conditional import PUBLIC_REVALIDATE, PUBLIC_SHORT, comments_validator, etag_for, podcast_fingerprint
+from app.utils.live_events import format_event
+from app.utils.response_cache import podcast_tags
+from app.utils.sqlite import apply_sqlite_pragmas, sqlite_pragmas
+from app.utils.stream_scheduler import PacedWSGIMiddleware
+
+# Async driver for each dialect the sync app supports
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+# Flask-SQLAlchemy's paginate() caps per_page at this by default
+MAX_PER_PAGE = 100
+
+def async_url(url):
+    """The database URL with the async driver for its dialect"""
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f'No async driver configured for {backend!r}')
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+def create_async_db(flask_app):
+    """Async engine for the app's primary database, with the same SQLite PRAGMAs as the sync one"""
+    with flask_app.app_context():
+        url = db.engine.url
+    engine = create_async_engine(async_url(url), pool_pre_ping=url.get_backend_name() != 'sqlite')
+    pragmas = sqlite_pragmas(flask_app.config, engine.sync_engine)
+    if pragmas is not None:
+        apply_sqlite_pragmas(engine.sync_engine, pragmas)
+    return engine
+
+def _int_arg(value, default):
+    # Same as request.args.get(name, default, type=int): unparsable values fall back to the default
+    try:
+        return int(value) if value is not None else default
+    except ValueError:
+        return default
+
+async def _paginate(session, statement, count_statement, page, per_page):
+    """(items, total, pages) with Flask-SQLAlchemy's paginate(error_out=True) rules"""
+    per_page = min(per_page, MAX_PER_PAGE)
+    if page < 1 or per_page < 1:
+        raise HTTPException(status_code=404)
+    result = await session.execute(statement.limit(per_page).offset((page - 1) * per_page))
+    items = result.unique().scalars().all()
+    if not items and page != 1:
+        raise HTTPException(status_code=404)
+    total = await session.scalar(select(func.count()).select_from(count_statement.subquery()))
+    return items, total, math.ceil(total / per_page) if total else 0
+
+def _validators(etag, policy):
+    return {'ETag': f'W/"{etag}"', 'Cache-Control': policy}
+
+def _not_modified(request, etag, policy):
+    """A 304 for a weakly matching If-None-Match, as app.utils.conditional.not_modified, else None"""
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match and (if_none_match.strip() == '*'
+                          or f'"{etag}"' in (tag.strip().removeprefix('W/') for tag in if_none_match.split(','))):
+        return Response(status_code=304, headers=_validators(etag, policy))
+    return None
+
+def _filter_podcasts(statement, category_id, search):
+    statement = statement.where(podcast_visible())
+    if category_id:
+        statement = statement.where(Podcast.id.in_(
+            select(podcast_categories.c.podcast_id).where(podcast_categories.c.category_id == category_id)))
+    if search:
+        statement = statement.where(Podcast.title.ilike(f'%{search}%'))
+    return statement
+
+class AsyncReadState:
+    """What the async handlers share: the Flask app, its async engine and the category snapshot"""
+
+    def __init__(self, flask_app, engine):
+        self.flask_app = flask_app
+        self.engine = engine
+        self.sessions = async_sessionmaker(engine, expire_on_commit=False)
+        self.static_url = flask_app.config.get('STATIC_FILE_URL', 'http://localhost:5000')
+        self.category_cache = flask_app.extensions['category_cache']
+        self.compressor = flask_app.extensions.get('compressor')
+        self.cdn = flask_app.extensions.get('cdn')
+        self.live_events = flask_app.extensions.get('live_events')
+
+    def edge_headers(self, *keys):
+        """Surrogate key headers as app.utils.cdn adds them to public Flask responses"""
+        return self.cdn.headers(keys) if self.cdn is not None and keys else {}
+
+    def podcast_keys(self, outs):
+        return podcast_tags(out.model_dump(include={'id', 'author', 'categories'}) for out in outs)
+
+    async def category_snapshot(self):
+        snapshot = self.category_cache.current()
+        if snapshot is not None:
+            return snapshot
+        # Rebuilding queries through the sync engine, so it runs in a worker thread
+        def rebuild():
+            with self.flask_app.app_context():
+                return self.category_cache.snapshot()
+        return await anyio.to_thread.run_sync(rebuild)
+
+    async def podcast_out(self, session, podcasts):
+        """PodcastOut for each podcast, categories from the snapshot as in Podcast.to_dict()"""
+        by_id = (await self.category_snapshot()).by_id
+        missing = {category.id for podcast in podcasts for category in podcast.categories} - by_id.keys()
+        if missing:
+            # Created after the snapshot was built; load them in one query
+            rows = await session.scalars(select(Category).where(Category.id.in_(missing)))
+            by_id = {**by_id, **{category.id: category.to_dict() for category in rows}}
+        return [
+            PodcastOut.from_model(podcast, self.static_url,
+                                  [CategoryOut(**by_id[category.id]) for category in podcast.categories if category.id in by_id])
+            for podcast in podcasts
+        ]
+
+async def _listing(request, response, session, podcasts, total, pages, page, category_id, *keys):
+    """A PodcastPage with the listing's Cache-Control and surrogate keys, as the Flask views send them"""
+    reads = request.app.state.reads
+    outs = await reads.podcast_out(session, podcasts)
+    if category_id:
+        keys += (f'category:{category_id}',)
+    response.headers['Cache-Control'] = PUBLIC_REVALIDATE
+    response.headers.update(reads.edge_headers(*keys, 'catalog', *reads.podcast_keys(outs)))
+    return PodcastPage(podcasts=outs, total=total, pages=pages, current_page=page)
+
+async def get_session(request: Request):
+    async with request.app.state.reads.sessions() as session:
+        yield session
+
+router = APIRouter(prefix='/api')
+
+@router.get('/podcasts', response_model=PodcastPage)
+async def get_podcasts(request: Request, response: Response, session: AsyncSession = Depends(get_session)):
+    args = request.query_params
+    page, per_page = _int_arg(args.get('page'), 1), _int_arg(args.get('per_page'), 10)
+    category_id, search = args.get('category_id'), args.get('search', '')
+    podcasts, total, pages = await _paginate(
+        session,
+        _filter_podcasts(select(Podcast), category_id, search)
+            .options(*podcast_options('card')).order_by(Podcast.created_at.desc()),
+        _filter_podcasts(select(Podcast.id), category_id, search),
+        page, per_page,
+    )
+    return await _listing(request, response, session, podcasts, total, pages, page, category_id)
+
+@router.get('/podcasts/discover', response_model=PodcastPage)
+@precompressed
+async def discover_podcasts(request: Request, response: Response, session: AsyncSession = Depends(get_session)):
+    args = request.query_params
+    page, per_page = _int_arg(args.get('page'), 1), _int_arg(args.get('per_page'), 10)
+    filtered = _filter_podcasts(select(Podcast.id), args.get('category_id'), args.get('search', ''))
+    # Same ranking as the Flask view: ids by likes + comments, then newest first
+    like_count_subq = select(podcast_likes.c.podcast_id, func.count().label('likes_count')) \
+        .group_by(podcast_likes.c.podcast_id).subquery()
+    comment_count_subq = select(Comment.podcast_id, func.count().label('comments_count')) \
+        .group_by(Comment.podcast_id).subquery()
+    ranked = filtered \
+        .outerjoin(like_count_subq, Podcast.id == like_count_subq.c.podcast_id) \
+        .outerjoin(comment_count_subq, Podcast.id == comment_count_subq.c.podcast_id) \
+        .order_by((func.coalesce(like_count_subq.c.likes_count, 0) + func.coalesce(comment_count_subq.c.comments_count, 0)).desc(),
+                  Podcast.created_at.desc())
+    page_ids, total, pages = await _paginate(session, ranked, filtered, page, per_page)
+
+    podcasts_by_id = {}
+    if page_ids:
+        rows = await session.scalars(select(Podcast).options(*podcast_options('card')).where(Podcast.id.in_(page_ids)))
+        podcasts_by_id = {podcast.id: podcast for podcast in rows}
+    podcasts = [podcasts_by_id[podcast_id] for podcast_id in page_ids if podcast_id in podcasts_by_id]
+    return await _listing(request, response, session, podcasts, total, pages, page, args.get('category_id'), 'ranking')
+
+@router.get('/podcasts/{podcast_id}', response_model=PodcastOut)
+@precompressed
+async def get_podcast(podcast_id: str, request: Request, response: Response, session: AsyncSession = Depends(get_session)):
+    podcast = (await session.execute(
+        select(Podcast).options(*podcast_options('detail')).where(Podcast.id == podcast_id, podcast_visible())
+    )).unique().scalar_one_or_none()
+    if podcast is None:
+        raise HTTPException(status_code=404)
+    reads = request.app.state.reads
+    etag = etag_for(podcast_fingerprint(podcast, (await reads.category_snapshot()).etag))
+    cached = _not_modified(request, etag, PUBLIC_REVALIDATE)
+    if cached is not None:
+        return cached
+    response.headers.update(_validators(etag, PUBLIC_REVALIDATE))
+    out = (await reads.podcast_out(session, [podcast]))[0]
+    response.headers.update(reads.edge_headers(*reads.podcast_keys([out])))
+    return out
+
+@router.get('/podcasts/{podcast_id}/comments', response_model=CommentPage)
+async def get_comments(podcast_id: str, request: Request, response: Response, session: AsyncSession = Depends(get_session)):
+    validator = (await session.execute(comments_validator(podcast_id))).first()
+    if validator is None:
+        raise HTTPException(status_code=404)
+    etag = etag_for('comments', podcast_id, validator.comments, validator.latest)
+    cached = _not_modified(request, etag, PUBLIC_REVALIDATE)
+    if cached is not None:
+        return cached
+    response.headers.update(_validators(etag, PUBLIC_REVALIDATE))
+    response.headers.update(request.app.state.reads.edge_headers(f'podcast:{podcast_id}'))
+    comments, total, pages = await _paginate(
+        session,
+        select(Comment).options(*comment_options()).where(Comment.podcast_id == podcast_id)
+            .order_by(Comment.created_at.desc()),
+        select(Comment.id).where(Comment.podcast_id == podcast_id),
+        1, 10,
+    )
+    return CommentPage(comments=[CommentOut.from_model(comment) for comment in comments],
+                       total=total, pages=pages, current_page=1)
+
+@router.get('/categories', response_model=CategoryList, responses={304: {'description': 'Not modified'}})
+async def get_categories(request: Request):
+    # The pre-serialised snapshot body and its ETag, as the Flask view sends them
+    snapshot = await request.app.state.reads.category_snapshot()
+    cached = _not_modified(request, snapshot.etag, PUBLIC_SHORT)
+    if cached is not None:
+        return cached
+    compressor = request.app.state.reads.compressor
+    encoding = compressor.choose(request.headers.get('accept-encoding'), snapshot.body) if compressor else None
+    headers = {**_validators(snapshot.etag, PUBLIC_SHORT), **request.app.state.reads.edge_headers('categories')}
+    if compressor is not None:
+        headers['Vary'] = 'Accept-Encoding'
+    if encoding is None:
+        return Response(snapshot.body, media_type='application/json', headers=headers)
+    # Compressed once per snapshot and kept with it
+    return Response(compressor.variant(snapshot.variants, snapshot.body, encoding), media_type='application/json',
+                    headers={**headers, 'Content-Encoding': encoding})
+
+async def _engagement_counts(session, podcast_ids):
+    """{podcast_id: counts event data} for the podcasts that exist, in one query"""
+    likes = select(func.count()).select_from(podcast_likes) \
+        .where(podcast_likes.c.podcast_id == Podcast.id).scalar_subquery()
+    comments = select(func.count()).select_from(Comment).where(Comment.podcast_id == Podcast.id).scalar_subquery()
+    rows = await session.execute(select(Podcast.id, likes, comments).where(Podcast.id.in_(podcast_ids), podcast_visible()))
+    return {podcast_id: {'podcast_id': podcast_id, 'likes_count': likes_count, 'comments_count': comments_count}
+            for podcast_id, likes_count, comments_count in rows}
+
+async def _event_stream(request, podcast_ids, single=False):
+    """An SSE response following `podcast_ids`: their current counts, any events missed since
+    Last-Event-ID (or `reset` when those are gone), then live events"""
+    reads = request.app.state.reads
+    live_events = reads.live_events
+    if live_events is None:
+        raise HTTPException(status_code=404)
+    if not podcast_ids or len(podcast_ids) > live_events.max_topics:
+        raise HTTPException(status_code=400, detail=f'Follow between 1 and {live_events.max_topics} podcasts')
+    broker = live_events.broker
+    # Subscribe before reading anything, so no event falls between the snapshot and the stream
+    subscription = broker.subscribe([f'podcast:{podcast_id}' for podcast_id in podcast_ids])
+    try:
+        async with reads.sessions() as session:
+            counts = await _engagement_counts(session, podcast_ids)
+        if single and not counts:
+            raise HTTPException(status_code=404)
+        initial = [format_event('counts', json.dumps(data)) for data in counts.values()]
+        after = _int_arg(request.headers.get('last-event-id'), None)
+        if after is not None:
+            replayed = await anyio.to_thread.run_sync(live_events.log.replay, after, subscription.topics)
+            if replayed is None:
+                initial.append(format_event('reset', '{}'))
+            else:
+                initial.extend(format_event(event, data, seq) for seq, _, event, data in replayed)
+                after = replayed[-1][0] if replayed else after
+    except BaseException:
+        broker.unsubscribe(subscription)
+        raise
+    return StreamingResponse(_events(broker, subscription, initial, after or 0, live_events.heartbeat),
+                             media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'})
+
+async def _events(broker, subscription, initial, after, heartbeat):
+    try:
+        for message in initial:
+            yield message
+        # Ends when the client disconnects, or when it fell so far behind that events were dropped
+        while not subscription.overflowed:
+            try:
+                seq, event, data = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield b': keep-alive\n\n'
+                continue
+            # Already sent in the replay
+            if seq > after:
+                yield format_event(event, data, seq)
+    finally:
+        broker.unsubscribe(subscription)
+
+@router.get('/podcasts/{podcast_id}/events')
+@no_compression
+async def podcast_events(podcast_id: str, request: Request):
+    return await _event_stream(request, [podcast_id], single=True)
+
+@router.get('/events')
+@no_compression
+async def multiplexed_events(request: Request):
+    # ?podcasts=a,b and ?podcasts=a&podcasts=b both work
+    podcast_ids = list(dict.fromkeys(
+        podcast_id for value in request.query_params.getlist('podcasts') for podcast_id in value.split(',') if podcast_id))
+    return await _event_stream(request, podcast_ids)
+
+def create_asgi_app(flask_app=None):
+    """FastAPI app serving the read endpoints, with every other route forwarded to Flask"""
+    if flask_app is None:
+        from app import create_app
+        flask_app = create_app()
+    reads = AsyncReadState(flask_app, create_async_db(flask_app))
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        await reads.engine.dispose()
+
+    app = FastAPI(title='Podcast API (async reads)', lifespan=lifespan,
+                  docs_url='/api/async/docs', openapi_url='/api/async/openapi.json', redoc_url=None)
+    app.state.reads = reads
+    app.include_router(router)
+    if reads.compressor is not None:
+        # Flask compresses its own responses; this covers the async routes
+        app.add_middleware(ASGICompressionMiddleware, compressor=reads.compressor)
+    # Writes, auth, streaming and everything else stay on Flask; a method the router
+    # does not serve (POST /api/podcasts) also falls through to it. Audio bodies are
+    # paced on the event loop rather than in Flask's threads
+    app.mount('/', PacedWSGIMiddleware(flask_app, flask_app.extensions.get('stream_scheduler')))
+    return app
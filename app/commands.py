@@ -0,0 +1,86 @@
+import os
+import click
+from flask import current_app, g
+from flask.cli import ScriptInfo, with_appcontext
+from sqlalchemy import inspect
+from app import db
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MIGRATIONS_DIR = os.path.join(PROJECT_ROOT, 'migrations')
+
+def _use_project_ini(config):
+    # alembic.ini sits in the project root (shared with the plain `alembic` CLI), not in migrations/
+    config.config_file_name = os.path.join(PROJECT_ROOT, 'alembic.ini')
+    return config
+
+def init_migrate(app):
+    """Register Flask-Migrate for the `flask db` commands"""
+    from flask_migrate import Migrate
+    if 'migrate' not in app.extensions:
+        Migrate(app, db, directory=MIGRATIONS_DIR).configure(_use_project_ini)
+
+def init_db():
+    """Bring the schema up to date. Needs an app context.
+
+    An empty database gets every table from the models and is stamped at the
+    latest migration; an existing one is upgraded with Alembic if it is
+    behind. Returns 'created', 'upgraded' or 'current'.
+    """
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    for folder in ('audio', 'thumbnails'):
+        os.makedirs(os.path.join(upload_folder, folder), exist_ok=True)
+
+    script = ScriptDirectory(MIGRATIONS_DIR)
+    with db.engine.begin() as connection:
+        context = MigrationContext.configure(connection)
+        if not inspect(connection).get_table_names():
+            db.metadata.create_all(connection)
+            context.stamp(script, 'head')
+            return 'created'
+        if context.get_current_revision() == script.get_current_head():
+            return 'current'
+
+    from flask_migrate import upgrade
+    init_migrate(current_app)
+    upgrade(directory=MIGRATIONS_DIR)
+    return 'upgraded'
+
+@click.command('init-db')
+def init_db_command():
+    """Create or migrate the database schema; run once per deploy, before starting workers."""
+    outcome = init_db()
+    click.echo({
+        'created': 'Created all tables and stamped the latest migration.',
+        'upgraded': 'Applied pending migrations.',
+        'current': 'Schema is up to date.',
+    }[outcome])
+
+class MigrateGroup(click.Group):
+    """Flask-Migrate's commands, imported on first use: they pull in Alembic, a tenth of a second of boot"""
+
+    def _commands(self, ctx):
+        from flask_migrate.cli import db as commands
+        init_migrate(ctx.ensure_object(ScriptInfo).load_app())
+        return commands
+
+    def list_commands(self, ctx):
+        return self._commands(ctx).list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self._commands(ctx).get_command(ctx, name)
+
+@click.group('db', cls=MigrateGroup)
+@click.option('-d', '--directory', default=None, help='Migration script directory (default is "migrations")')
+@click.option('-x', '--x-arg', multiple=True, help='Additional arguments consumed by custom env.py scripts')
+@with_appcontext
+def migrate_command(directory, x_arg):
+    """Perform database migrations."""
+    g.directory = directory
+    g.x_arg = x_arg
+
+def init_commands(app):
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(migrate_command)
@@ -1,12 +1,159 @@
 import os
+from datetime import timedelta
 from dotenv import load_dotenv
+from flask.helpers import get_debug_flag
 
 # Load environment variables from .env file
 load_dotenv()
 
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _flag(name, default):
+    """A boolean setting: "true" in any case turns it on"""
+    return os.getenv(name, str(default)).lower() == 'true'
+
 class Config:
-    # Static file URL configuration
-    STATIC_FILE_URL = os.getenv('STATIC_FILE_URL', 'http://localhost:5000/')
-    
-    # Other configurations
-    # ... existing code ... 
\ No newline at end of file
+    """Settings read from the environment (and .env) when the object is created"""
+
+    def __init__(self):
+        self.SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key')
+        self.SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///app.db')
+        self.SQLALCHEMY_TRACK_MODIFICATIONS = False
+        # Test mode: raise on any relationship or column load an endpoint did not plan for
+        self.SQLALCHEMY_RAISELOAD = _flag('SQLALCHEMY_RAISELOAD', False)
+
+        # Read replicas: comma separated URLs, used by views marked read_only
+        replica_urls = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+        self.SQLALCHEMY_BINDS = {f'replica_{i}': url for i, url in enumerate(replica_urls)}
+        self.SQLALCHEMY_REPLICA_BINDS = list(self.SQLALCHEMY_BINDS)
+        self.SQLALCHEMY_REPLICA_MAX_LAG = float(os.getenv('DATABASE_REPLICA_MAX_LAG', 5))
+        self.SQLALCHEMY_REPLICA_STICKY_SECONDS = float(os.getenv('DATABASE_REPLICA_STICKY_SECONDS', 5))
+        self.SQLALCHEMY_REPLICA_CHECK_INTERVAL = float(os.getenv('DATABASE_REPLICA_CHECK_INTERVAL', 5))
+        self.SQLALCHEMY_REPLICA_LAG_QUERY = os.getenv('DATABASE_REPLICA_LAG_QUERY')
+
+        # SQLite: "production" turns on WAL and tuned pragmas; the write queue group-commits small writes
+        self.SQLITE_PROFILE = os.getenv('SQLITE_PROFILE', 'production')
+        self.SQLITE_WRITE_QUEUE = _flag('SQLITE_WRITE_QUEUE', False)
+        self.SQLITE_WRITE_QUEUE_BATCH = int(os.getenv('SQLITE_WRITE_QUEUE_BATCH', 64))
+        self.SQLITE_WRITE_QUEUE_TIMEOUT = float(os.getenv('SQLITE_WRITE_QUEUE_TIMEOUT', 10))
+
+        self.JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'jwt-secret-key')
+        self.JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
+
+        # Static file URL configuration - should match the Flutter app's base URL
+        self.STATIC_FILE_URL = os.getenv('STATIC_FILE_URL', 'http://192.168.231.17:8000')
+
+        # Mail configuration for Mailtrap
+        self.MAIL_SERVER = 'sandbox.smtp.mailtrap.io'
+        self.MAIL_PORT = 2525
+        self.MAIL_USERNAME = os.getenv('MAIL_USERNAME')
+        self.MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
+        self.MAIL_USE_TLS = True
+        self.MAIL_USE_SSL = False
+
+        # Email outbox: messages are queued in the DB and delivered by a background sender, which the servers
+        # (serve.py, asgi.py, run.py) turn on; CLI commands, migrations and test apps leave it off
+        self.MAIL_OUTBOX_SENDER = _flag('MAIL_OUTBOX_SENDER', False)
+        self.MAIL_OUTBOX_BATCH_SIZE = int(os.getenv('MAIL_OUTBOX_BATCH_SIZE', 50))
+        self.MAIL_OUTBOX_POLL_INTERVAL = float(os.getenv('MAIL_OUTBOX_POLL_INTERVAL', 5))
+        self.MAIL_OUTBOX_IDLE_TIMEOUT = float(os.getenv('MAIL_OUTBOX_IDLE_TIMEOUT', 30))
+        self.MAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('MAIL_OUTBOX_MAX_ATTEMPTS', 8))
+        self.MAIL_OUTBOX_RETRY_BASE = float(os.getenv('MAIL_OUTBOX_RETRY_BASE', 30))
+        self.MAIL_OUTBOX_RETRY_MAX = float(os.getenv('MAIL_OUTBOX_RETRY_MAX', 3600))
+        self.MAIL_OUTBOX_LEASE = float(os.getenv('MAIL_OUTBOX_LEASE', 120))
+
+        # Deletes run in batches of this many rows, each in its own short transaction
+        self.DELETE_BATCH_SIZE = int(os.getenv('DELETE_BATCH_SIZE', 1000))
+
+        # Configure upload folder; `flask init-db` creates it and uploads create subfolders on demand
+        self.UPLOAD_FOLDER = os.path.join(APP_ROOT, 'uploads')
+
+        # Runtime files default to the instance directory; each is created by the feature that uses it
+        instance_path = os.path.join(os.path.dirname(APP_ROOT), 'instance')
+
+        # Rate limiting: "memory" keeps buckets per process, "file" shares them between workers
+        self.RATELIMIT_ENABLED = _flag('RATELIMIT_ENABLED', True)
+        self.RATELIMIT_BACKEND = os.getenv('RATELIMIT_BACKEND', 'memory')
+        self.RATELIMIT_STORAGE_PATH = os.getenv('RATELIMIT_STORAGE_PATH', os.path.join(instance_path, 'ratelimit.bin'))
+
+        # Category snapshot: shared version file for cross-worker invalidation, max age as a safety net
+        self.CATEGORY_CACHE_VERSION_PATH = os.getenv('CATEGORY_CACHE_VERSION_PATH', os.path.join(instance_path, 'category_version.bin'))
+        self.CATEGORY_CACHE_MAX_AGE = float(os.getenv('CATEGORY_CACHE_MAX_AGE', 300))
+
+        # Logging: level for the app.* loggers, "json" or "text" lines on stderr
+        self.LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+        self.LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+
+        # Development N+1 detector: warn when a request repeats one statement shape this often
+        self.QUERY_TRACE = _flag('QUERY_TRACE', get_debug_flag())
+        self.QUERY_TRACE_THRESHOLD = int(os.getenv('QUERY_TRACE_THRESHOLD', 5))
+
+        # Request metrics: METRICS_DIR aggregates all workers on the host, METRICS_TOKEN protects /metrics
+        self.METRICS_ENABLED = _flag('METRICS_ENABLED', True)
+        self.METRICS_DIR = os.getenv('METRICS_DIR') or None
+        self.METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+        self.METRICS_TOKEN = os.getenv('METRICS_TOKEN') or None
+
+        # On-demand profiling: requests with X-Profile set to PROFILE_TOKEN (or signed with it) run under cProfile
+        self.PROFILE_TOKEN = os.getenv('PROFILE_TOKEN') or None
+        self.PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(instance_path, 'profiles'))
+
+        # Response compression: gzip always, br and zstd when brotli or zstandard is installed; preference order
+        self.COMPRESS_ENABLED = _flag('COMPRESS_ENABLED', True)
+        self.COMPRESS_ENCODINGS = [name.strip() for name in os.getenv('COMPRESS_ENCODINGS', 'zstd,br,gzip').split(',') if name.strip()]
+        self.COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 500))
+        self.COMPRESS_GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', 6))
+        self.COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 5))
+        self.COMPRESS_ZSTD_LEVEL = int(os.getenv('COMPRESS_ZSTD_LEVEL', 3))
+        self.COMPRESS_CACHE_BYTES = int(os.getenv('COMPRESS_CACHE_BYTES', 16 * 1024 * 1024))
+
+        # Response cache: per-process memory LRU over a SQLite file shared by the host's workers; TTL and stale grace in seconds
+        self.RESPONSE_CACHE_ENABLED = _flag('RESPONSE_CACHE_ENABLED', True)
+        self.RESPONSE_CACHE_PATH = os.getenv('RESPONSE_CACHE_PATH', os.path.join(instance_path, 'response_cache.db'))
+        self.RESPONSE_CACHE_VERSION_PATH = os.getenv('RESPONSE_CACHE_VERSION_PATH', os.path.join(instance_path, 'response_cache_version.bin'))
+        self.RESPONSE_CACHE_MEMORY_BYTES = int(os.getenv('RESPONSE_CACHE_MEMORY_BYTES', 32 * 1024 * 1024))
+        self.RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', 30))
+        self.RESPONSE_CACHE_STALE = float(os.getenv('RESPONSE_CACHE_STALE', 30))
+        self.RESPONSE_CACHE_LEASE = float(os.getenv('RESPONSE_CACHE_LEASE', 5))
+
+        # CDN: surrogate keys on public responses, edge-only lifetime, batched purges to CDN_PURGE_URL ("fastly" or "cloudflare" API)
+        self.CDN_SURROGATE_KEYS = _flag('CDN_SURROGATE_KEYS', True)
+        self.CDN_EDGE_MAX_AGE = int(os.getenv('CDN_EDGE_MAX_AGE', 0))
+        self.CDN_PURGE_URL = os.getenv('CDN_PURGE_URL') or None
+        self.CDN_PURGE_TOKEN = os.getenv('CDN_PURGE_TOKEN') or None
+        self.CDN_PURGE_FORMAT = os.getenv('CDN_PURGE_FORMAT', 'fastly')
+        self.CDN_PURGE_BATCH_SIZE = int(os.getenv('CDN_PURGE_BATCH_SIZE', 30))
+        self.CDN_PURGE_DELAY = float(os.getenv('CDN_PURGE_DELAY', 1))
+        self.CDN_PURGE_TIMEOUT = float(os.getenv('CDN_PURGE_TIMEOUT', 5))
+        # Lifetime of uploaded audio and thumbnails, which never change under a given name
+        self.MEDIA_MAX_AGE = int(os.getenv('MEDIA_MAX_AGE', 31536000))
+        self.SEND_FILE_MAX_AGE_DEFAULT = self.MEDIA_MAX_AGE
+
+        # Segment cache: fixed-size blocks of popular audio files held per worker for range requests
+        self.SEGMENT_CACHE_ENABLED = _flag('SEGMENT_CACHE_ENABLED', True)
+        self.SEGMENT_CACHE_BYTES = int(os.getenv('SEGMENT_CACHE_BYTES', 64 * 1024 * 1024))
+        self.SEGMENT_CACHE_BLOCK_SIZE = int(os.getenv('SEGMENT_CACHE_BLOCK_SIZE', 256 * 1024))
+
+        # Stream scheduling: listens and bulk downloads paced to STREAM_RATE bytes/s after STREAM_BURST under the async app,
+        # bulk downloads (closed ranges over STREAM_SMALL_RANGE) capped per caller and, when STREAM_MAX_STREAMS is set, per worker
+        self.STREAM_SCHEDULER_ENABLED = _flag('STREAM_SCHEDULER_ENABLED', True)
+        self.STREAM_RATE = int(os.getenv('STREAM_RATE', 64000))
+        self.STREAM_BURST = int(os.getenv('STREAM_BURST', 1024 * 1024))
+        self.STREAM_CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE', 64 * 1024))
+        self.STREAM_SMALL_RANGE = int(os.getenv('STREAM_SMALL_RANGE', 256 * 1024))
+        self.STREAM_MAX_PER_USER = int(os.getenv('STREAM_MAX_PER_USER', 4))
+        self.STREAM_MAX_STREAMS = int(os.getenv('STREAM_MAX_STREAMS', 0)) or None
+
+        # Listening progress from served ranges: positions coalesced per (user, podcast) and written every LISTEN_PROGRESS_FLUSH_INTERVAL seconds
+        self.LISTEN_PROGRESS_FROM_RANGES = _flag('LISTEN_PROGRESS_FROM_RANGES', False)
+        self.LISTEN_PROGRESS_FLUSH_INTERVAL = float(os.getenv('LISTEN_PROGRESS_FLUSH_INTERVAL', 10))
+
+        # Live engagement events: a log shared by the workers on a host, read by each worker's SSE broker every LIVE_EVENTS_POLL_INTERVAL seconds
+        self.LIVE_EVENTS_ENABLED = _flag('LIVE_EVENTS_ENABLED', True)
+        self.LIVE_EVENTS_PATH = os.getenv('LIVE_EVENTS_PATH', os.path.join(instance_path, 'live_events.db'))
+        self.LIVE_EVENTS_RETENTION = float(os.getenv('LIVE_EVENTS_RETENTION', 300))
+        self.LIVE_EVENTS_POLL_INTERVAL = float(os.getenv('LIVE_EVENTS_POLL_INTERVAL', 1))
+        self.LIVE_EVENTS_HEARTBEAT = float(os.getenv('LIVE_EVENTS_HEARTBEAT', 15))
+        self.LIVE_EVENTS_QUEUE_SIZE = int(os.getenv('LIVE_EVENTS_QUEUE_SIZE', 100))
+        self.LIVE_EVENTS_MAX_PODCASTS = int(os.getenv('LIVE_EVENTS_MAX_PODCASTS', 50))
+
@@ -4,5 +4,6 @@ from .category import Category
 from .podcast import Podcast
 from .comment import Comment
 from .podcast_listen import PodcastListen
+from .email_outbox import EmailOutbox
 
-__all__ = ['User', 'Category', 'Podcast', 'Comment', 'PodcastListen'] 
\ No newline at end of file
+__all__ = ['User', 'Category', 'Podcast', 'Comment', 'PodcastListen', 'EmailOutbox'] 
\ No newline at end of file
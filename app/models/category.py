@@ -1,11 +1,11 @@
 from datetime import datetime
 from app import db
-import uuid
+from app.models.types import GUID, new_id
 
 class Category(db.Model):
     __tablename__ = 'categories'
 
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(GUID, primary_key=True, default=new_id)
     name = db.Column(db.String(100), nullable=False, unique=True)
     description = db.Column(db.Text, nullable=True)
     slug = db.Column(db.String(100), nullable=False, unique=True)
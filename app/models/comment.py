@@ -1,18 +1,24 @@
 from datetime import datetime
+from sqlalchemy.orm import query_expression
 from app import db
-import uuid
+from app.models.types import GUID, new_id
 
 class Comment(db.Model):
     __tablename__ = 'comments'
 
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(GUID, primary_key=True, default=new_id)
     content = db.Column(db.Text, nullable=False)
-    podcast_id = db.Column(db.String(36), db.ForeignKey('podcasts.id'), nullable=False)
-    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
-    parent_id = db.Column(db.String(36), db.ForeignKey('comments.id'), nullable=True)  # For nested comments
+    podcast_id = db.Column(GUID, db.ForeignKey('podcasts.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(GUID, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    parent_id = db.Column(GUID, db.ForeignKey('comments.id', ondelete='CASCADE'), nullable=True)  # For nested comments
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_comments_podcast_id_created_at', 'podcast_id', 'created_at'),
+        db.Index('ix_comments_parent_id', 'parent_id'),
+    )
+
     # Relationships
     podcast = db.relationship('Podcast', backref=db.backref('comments', lazy=True))
     user = db.relationship('User', backref=db.backref('comments', lazy=True))
@@ -20,6 +26,9 @@ class Comment(db.Model):
                             backref=db.backref('parent', remote_side=[id]),
                             lazy='dynamic', cascade='all, delete-orphan')
 
+    # Filled in by list queries (see app.models.loading); falls back to count_replies()
+    replies_count = query_expression()
+
     def __init__(self, content, podcast_id, user_id, parent_id=None):
         self.content = content
         self.podcast_id = podcast_id
@@ -29,6 +38,9 @@ class Comment(db.Model):
     def __repr__(self):
         return f'<Comment {self.id}>'
 
+    def count_replies(self):
+        return self.replies.count()
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -39,7 +51,7 @@ class Comment(db.Model):
                 'email': self.user.email
             } if self.user else None,
             'parent_id': self.parent_id,
-            'replies_count': self.replies.count(),
+            'replies_count': self.replies_count if self.replies_count is not None else self.count_replies(),
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         } 
\ No newline at end of file
@@ -0,0 +1,113 @@
+"""
+Named loading profiles for endpoints.
+
+Relationships default to lazy loading (Podcast.likes raises), so every
+endpoint states what it needs:
+
+- minimal: id only, for existence checks
+- stream:  the columns the audio hot path reads
+- owner:   id and author, for authorization checks
+- card:    everything Podcast.to_dict() needs, batched for lists; categories
+           load ids only and are serialised from the category snapshot
+- detail:  the same data for a single podcast, in as few round trips as possible
+
+podcast_query() and podcast_or_404() leave out podcasts pending deletion.
+
+With SQLALCHEMY_RAISELOAD enabled every ORM query also gets raiseload('*')
+and profile columns are loaded with raiseload=True, so an unplanned lazy load
+fails loudly instead of issuing a hidden query.
+"""
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import aliased, joinedload, load_only, raiseload, selectinload, with_expression
+from app.models.podcast import Podcast, podcast_likes
+from app.models.category import Category
+from app.models.comment import Comment
+from app.models.podcast_listen import PodcastListen
+from app.models.user import User
+
+def _raiseload():
+    return has_app_context() and current_app.config.get('SQLALCHEMY_RAISELOAD', False)
+
+def likes_count_expression():
+    """Correlated count of a podcast's likes, answered from the podcast_likes primary key"""
+    return select(func.count()) \
+        .where(podcast_likes.c.podcast_id == Podcast.id) \
+        .correlate(Podcast) \
+        .scalar_subquery()
+
+def replies_count_expression():
+    """Correlated count of a comment's replies, answered from the parent_id index"""
+    reply = aliased(Comment)
+    return select(func.count()) \
+        .select_from(reply) \
+        .where(reply.parent_id == Comment.id) \
+        .correlate(Comment) \
+        .scalar_subquery()
+
+def _author():
+    return load_only(User.id, User.email, raiseload=_raiseload())
+
+def _card():
+    return [
+        joinedload(Podcast.author).options(_author()),
+        selectinload(Podcast.categories).options(load_only(Category.id, raiseload=_raiseload())),
+        with_expression(Podcast.likes_count, likes_count_expression()),
+    ]
+
+def _detail():
+    return [
+        joinedload(Podcast.author).options(_author()),
+        joinedload(Podcast.categories).options(load_only(Category.id, raiseload=_raiseload())),
+        with_expression(Podcast.likes_count, likes_count_expression()),
+    ]
+
+def _columns(*columns):
+    return [load_only(*columns, raiseload=_raiseload())]
+
+PROFILES = {
+    'minimal': lambda: _columns(Podcast.id),
+    'stream': lambda: _columns(Podcast.id, Podcast.audio_url, Podcast.author_id, Podcast.duration),
+    'owner': lambda: _columns(Podcast.id, Podcast.author_id),
+    'card': _card,
+    'detail': _detail,
+}
+
+def podcast_options(profile):
+    """Loader options for the named Podcast profile"""
+    return PROFILES[profile]()
+
+def podcast_visible():
+    """Criterion for podcasts not pending deletion; deleting an account stamps its podcasts too"""
+    return Podcast.deletion_requested_at.is_(None)
+
+def podcast_query(profile):
+    """Podcast.query with a loading profile applied, without podcasts pending deletion"""
+    return Podcast.query.options(*podcast_options(profile)).filter(podcast_visible())
+
+def podcast_or_404(profile, podcast_id):
+    """One podcast by id with a loading profile applied; 404 when missing or pending deletion"""
+    return podcast_query(profile).filter(Podcast.id == podcast_id).one_or_404()
+
+def comment_options():
+    return [
+        joinedload(Comment.user).options(_author()),
+        with_expression(Comment.replies_count, replies_count_expression()),
+    ]
+
+def listen_options():
+    """Listen history rows with their podcast as a card"""
+    return [selectinload(PodcastListen.podcast).options(*_card())]
+
+def _raise_on_lazy_load(execute_state):
+    if not _raiseload():
+        return
+    if execute_state.is_select and not execute_state.is_column_load and not execute_state.is_relationship_load:
+        execute_state.statement = execute_state.statement.options(raiseload('*'))
+
+def init_loading(app, db):
+    """Install the raiseload test mode when SQLALCHEMY_RAISELOAD is set"""
+    session_class = db.session.session_factory.class_
+    if app.config['SQLALCHEMY_RAISELOAD'] and not event.contains(session_class, 'do_orm_execute', _raise_on_lazy_load):
+        event.listen(session_class, 'do_orm_execute', _raise_on_lazy_load)
@@ -1,49 +1,62 @@
 from datetime import datetime
 from app import db
 from flask import current_app
-import uuid
+from sqlalchemy.orm import query_expression
+from app.models.types import GUID, new_id
 
 # Association table for many-to-many relationship between Podcast and Category
 podcast_categories = db.Table('podcast_categories',
-    db.Column('podcast_id', db.String(36), db.ForeignKey('podcasts.id'), primary_key=True),
-    db.Column('category_id', db.String(36), db.ForeignKey('categories.id'), primary_key=True)
+    db.Column('podcast_id', GUID, db.ForeignKey('podcasts.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('category_id', GUID, db.ForeignKey('categories.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_podcast_categories_category_id', 'category_id', 'podcast_id')
 )
 
 # Association table for likes
 podcast_likes = db.Table('podcast_likes',
-    db.Column('podcast_id', db.String(36), db.ForeignKey('podcasts.id'), primary_key=True),
-    db.Column('user_id', db.String(36), db.ForeignKey('users.id'), primary_key=True),
-    db.Column('created_at', db.DateTime, default=datetime.utcnow)
+    db.Column('podcast_id', GUID, db.ForeignKey('podcasts.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('user_id', GUID, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('created_at', db.DateTime, default=datetime.utcnow),
+    db.Index('ix_podcast_likes_user_id', 'user_id', 'podcast_id')
 )
 
 class Podcast(db.Model):
     __tablename__ = 'podcasts'
 
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(GUID, primary_key=True, default=new_id)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=True)
     thumbnail_url = db.Column(db.String(500), nullable=False)
     audio_url = db.Column(db.String(500), nullable=False)
     duration = db.Column(db.Integer, nullable=True)  # Duration in seconds
-    author_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
+    author_id = db.Column(GUID, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
     slug = db.Column(db.String(200), nullable=False, unique=True)
     published = db.Column(db.Boolean, default=False)
     published_at = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Set when the podcast's deletion is queued; the row goes once its listens and comments are gone
+    deletion_requested_at = db.Column(db.DateTime, nullable=True, index=True)
 
-    # Relationships
+    # Relationships load lazily; endpoints pick what to load through app.models.loading profiles
     author = db.relationship('User', backref=db.backref('podcasts', lazy=True))
     categories = db.relationship('Category', 
                                secondary=podcast_categories,
-                               lazy='subquery',
+                               lazy='select',
                                backref=db.backref('podcasts', lazy=True))
+    # Never load every liking user; like state is read from podcast_likes directly
     likes = db.relationship('User',
                           secondary=podcast_likes,
-                          lazy='subquery',
+                          lazy='raise',
                           backref=db.backref('liked_podcasts', lazy=True))
     listen_records = db.relationship('PodcastListen', backref='podcast', lazy=True)
 
+    # Filled by the card and detail loading profiles
+    likes_count = query_expression()
+
+    # (created_at, id) lets listing and ranking queries read ordered ids without touching rows;
+    # deletion_requested_at covers their filter on podcasts pending deletion
+    __table_args__ = (db.Index('ix_podcasts_created_at', 'created_at', 'id', 'deletion_requested_at'),)
+
     def __init__(self, title, thumbnail_url, audio_url, author_id, description=None, duration=None):
         self.title = title
         self.thumbnail_url = thumbnail_url
@@ -56,6 +69,15 @@ class Podcast(db.Model):
     def __repr__(self):
         return f'<Podcast {self.title}>'
 
+    def count_likes(self):
+        return db.session.query(db.func.count()).select_from(podcast_likes) \
+            .filter(podcast_likes.c.podcast_id == self.id).scalar()
+
+    def _category_dicts(self):
+        # Reuse the serialised categories from the shared snapshot; only ids need to be loaded
+        by_id = current_app.extensions['category_cache'].snapshot().by_id
+        return [by_id.get(category.id) or category.to_dict() for category in self.categories]
+
     def to_dict(self):
         # Get the static file URL from config
         static_url = current_app.config.get('STATIC_FILE_URL', 'http://localhost:5000')
@@ -75,8 +97,8 @@ class Podcast(db.Model):
                 'id': self.author.id,
                 'email': self.author.email
             } if self.author else None,
-            'categories': [category.to_dict() for category in self.categories],
-            'likes_count': len(self.likes),
+            'categories': self._category_dicts(),
+            'likes_count': self.likes_count if self.likes_count is not None else self.count_likes(),
             'slug': self.slug,
             'published': self.published,
             'published_at': self.published_at.isoformat() if self.published_at else None,
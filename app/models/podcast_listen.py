@@ -1,16 +1,20 @@
 from app import db
 from datetime import datetime
-import uuid
+from app.models.types import GUID, new_id
 
 class PodcastListen(db.Model):
     __tablename__ = 'podcast_listens'
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
-    podcast_id = db.Column(db.String(36), db.ForeignKey('podcasts.id'), nullable=False)
+    id = db.Column(GUID, primary_key=True, default=new_id)
+    user_id = db.Column(GUID, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    podcast_id = db.Column(GUID, db.ForeignKey('podcasts.id', ondelete='CASCADE'), nullable=False)
     time_listened = db.Column(db.Integer, nullable=False)
     tracked_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    __table_args__ = (db.UniqueConstraint('user_id', 'podcast_id', name='_user_podcast_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'podcast_id', name='_user_podcast_uc'),
+        db.Index('ix_podcast_listens_user_id_tracked_at', 'user_id', 'tracked_at'),
+        db.Index('ix_podcast_listens_podcast_id', 'podcast_id'),
+    )
 
     def to_dict(self):
         return {
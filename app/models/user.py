@@ -1,7 +1,7 @@
 from app import db
 from datetime import datetime, UTC
 from sqlalchemy import TypeDecorator, DateTime
-import uuid
+from app.models.types import GUID, new_id
 
 # Custom DateTime type that ensures timezone awareness
 class UTCDateTime(TypeDecorator):
@@ -24,7 +24,7 @@ class UTCDateTime(TypeDecorator):
 class User(db.Model):
     __tablename__ = 'users'
 
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(GUID, primary_key=True, default=new_id)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password = db.Column(db.String(200), nullable=False)
     is_verified = db.Column(db.Boolean, default=False)
@@ -34,6 +34,8 @@ class User(db.Model):
     reset_token_expiry = db.Column(UTCDateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Set when the account's deletion is queued; the account cannot log in from then on
+    deletion_requested_at = db.Column(db.DateTime, nullable=True, index=True)
 
     # Relationships
     listen_history = db.relationship('PodcastListen', backref='user', lazy=True, order_by='PodcastListen.tracked_at.desc()')
@@ -1,43 +1,56 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, create_access_token, get_jwt_identity
 from app import db
 from app.models.user import User
 from app.models.podcast_listen import PodcastListen
 from app.utils.email import send_verification_email, send_reset_password_email, send_welcome_email
 from app.utils.password import hash_password, verify_password, is_password_strong
+from app.utils.rate_limit import rate_limit
+from app.utils.db_routing import read_only
+from app.utils.conditional import PRIVATE_REVALIDATE, cache_control, etag_for, not_modified, podcast_fingerprint, validated
+from app.utils.response_cache import cached, podcast_tags
 from datetime import datetime, UTC, timedelta
 import jwt
 import os
 from functools import wraps
 from sqlalchemy import func
-from app.models.podcast import Podcast
+from app.models.podcast import Podcast, podcast_likes
+from app.models.loading import podcast_query, podcast_visible, listen_options
 
 auth_bp = Blueprint('auth', __name__)
 
-def token_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        token = None
-        if 'Authorization' in request.headers:
-            auth_header = request.headers['Authorization']
-            try:
-                token = auth_header.split(" ")[1]
-            except IndexError:
-                return jsonify({'message': 'Invalid token format'}), 401
+def authenticate_token():
+    """The user of the request's bearer token, or (None, error response)"""
+    token = None
+    if 'Authorization' in request.headers:
+        auth_header = request.headers['Authorization']
+        try:
+            token = auth_header.split(" ")[1]
+        except IndexError:
+            return None, (jsonify({'message': 'Invalid token format'}), 401)
 
-        if not token:
-            return jsonify({'message': 'Token is missing'}), 401
+    if not token:
+        return None, (jsonify({'message': 'Token is missing'}), 401)
 
-        try:
-            data = jwt.decode(token, os.getenv('JWT_SECRET_KEY', 'jwt-secret-key'), algorithms=["HS256"])
-            current_user = User.query.get(data['sub'])  # data['sub'] is now a UUID string
-            if not current_user:
-                return jsonify({'message': 'User not found'}), 401
-        except jwt.ExpiredSignatureError:
-            return jsonify({'message': 'Token has expired'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'message': 'Invalid token'}), 401
+    try:
+        data = jwt.decode(token, os.getenv('JWT_SECRET_KEY', 'jwt-secret-key'), algorithms=["HS256"])
+        current_user = User.query.get(data['sub'])  # data['sub'] is now a UUID string
+        # An account queued for deletion is gone as far as its tokens are concerned
+        if not current_user or current_user.deletion_requested_at is not None:
+            return None, (jsonify({'message': 'User not found'}), 401)
+    except jwt.ExpiredSignatureError:
+        return None, (jsonify({'message': 'Token has expired'}), 401)
+    except jwt.InvalidTokenError:
+        return None, (jsonify({'message': 'Invalid token'}), 401)
+    return current_user, None
 
+def token_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        # Kept separate from the view call so profiles show the cost of authentication on its own
+        current_user, error = authenticate_token()
+        if error is not None:
+            return error
         return f(current_user, *args, **kwargs)
     return decorated
 
@@ -64,9 +77,9 @@ def signup():
         password=hash_password(data['password'])
     )
     db.session.add(user)
+    send_verification_email(user)
     db.session.commit()
     
-    send_verification_email(user)
     return jsonify({'message': 'Registration successful. Please check your email to verify your account.'}), 201
 
 @auth_bp.route('/verify-email', methods=['POST'])
@@ -99,12 +112,13 @@ def verify_email():
     user.is_verified = True
     user.otp = None
     user.otp_expiry = None
+    send_welcome_email(user)
     db.session.commit()
     
-    send_welcome_email(user)
     return jsonify({'message': 'Email verified successfully'}), 200
 
 @auth_bp.route('/login', methods=['POST'])
+@rate_limit('login')
 def login():
     data = request.get_json()
     
@@ -115,6 +129,9 @@ def login():
     
     if not user or not verify_password(data['password'], user.password):
         return jsonify({'message': 'Invalid credentials'}), 401
+
+    if user.deletion_requested_at is not None:
+        return jsonify({'message': 'This account is being deleted'}), 403
         
     # Create token payload
     payload = {
@@ -140,14 +157,16 @@ def login():
     }), 200
 
 @auth_bp.route('/forgot-password', methods=['POST'])
+@rate_limit('forgot_password')
 def forgot_password():
     data = request.get_json()
     user = User.query.filter_by(email=data['email']).first()
     
-    if not user:
+    if not user or user.deletion_requested_at is not None:
         return jsonify({'error': 'Email not found'}), 404
     
     send_reset_password_email(user)
+    db.session.commit()
     return jsonify({'message': 'Password reset instructions sent to your email'}), 200
 
 @auth_bp.route('/reset-password', methods=['POST'])
@@ -161,7 +180,8 @@ def reset_password():
     user = User.query.filter_by(reset_token=data['token']).first()
     
     current_time = datetime.now(UTC)
-    if not user or not user.reset_token_expiry or user.reset_token_expiry < current_time:
+    if not user or not user.reset_token_expiry or user.reset_token_expiry < current_time \
+            or user.deletion_requested_at is not None:
         return jsonify({'error': 'Invalid or expired reset token'}), 400
     
     # Validate password strength
@@ -177,7 +197,15 @@ def reset_password():
     
     return jsonify({'message': 'Password reset successfully'}), 200
 
+def _podcast_list_validators(name, podcasts):
+    """(304 response or None, etag) for a list of card-loaded podcasts"""
+    categories_etag = current_app.extensions['category_cache'].snapshot().etag
+    etag = etag_for(name, [podcast_fingerprint(podcast, categories_etag) for podcast in podcasts])
+    return not_modified(etag), etag
+
 @auth_bp.route('/profile', methods=['GET'])
+@read_only
+@cache_control(PRIVATE_REVALIDATE)
 @jwt_required()
 def get_profile():
     try:
@@ -185,17 +213,39 @@ def get_profile():
         # current_user_id is now a UUID string
         user = User.query.get(current_user_id)
         
-        if not user:
+        if not user or user.deletion_requested_at is not None:
             return jsonify({'message': 'User not found'}), 404
-        
-        return jsonify({
+
+        etag = etag_for('profile', user.id, user.email, user.is_verified, user.updated_at)
+        response = not_modified(etag, user.updated_at)
+        if response is not None:
+            return response
+        return validated(jsonify({
             'email': user.email,
             'is_verified': user.is_verified
-        }), 200
+        }), etag, user.updated_at), 200
     except Exception as e:
         return jsonify({'message': f'Error accessing profile: {str(e)}'}), 401 
 
+@auth_bp.route('/profile', methods=['DELETE'])
+@jwt_required()
+def delete_profile():
+    data = request.get_json(silent=True) or {}
+    user = User.query.get(get_jwt_identity())
+    if not user:
+        return jsonify({'message': 'User not found'}), 404
+
+    if not data.get('password') or not verify_password(data['password'], user.password):
+        return jsonify({'message': 'Password is required to delete the account'}), 401
+
+    # Podcasts, listens, likes and comments can run into millions of rows: delete them in the background.
+    # The account is stamped first, so it cannot log in meanwhile and a restart resumes the deletion.
+    current_app.extensions['deletion'].delete_account(user.id)
+    return jsonify({'message': 'Account deletion started'}), 202
+
 @auth_bp.route('/profile/podcasts', methods=['GET'])
+@read_only
+@cache_control(PRIVATE_REVALIDATE)
 @jwt_required()
 def get_user_podcasts():
     try:
@@ -204,14 +254,19 @@ def get_user_podcasts():
         if not user:
             return jsonify({'message': 'User not found'}), 404
         # Get podcasts authored by this user
-        podcasts = user.podcasts  # Backref from Podcast model
-        return jsonify({
+        podcasts = podcast_query('card').filter(Podcast.author_id == user.id).all()
+        response, etag = _podcast_list_validators('profile-podcasts', podcasts)
+        if response is not None:
+            return response
+        return validated(jsonify({
             'podcasts': [podcast.to_dict() for podcast in podcasts]
-        }), 200
+        }), etag), 200
     except Exception as e:
         return jsonify({'message': f'Error retrieving user podcasts: {str(e)}'}), 401
 
 @auth_bp.route('/profile/liked-podcasts', methods=['GET'])
+@read_only
+@cache_control(PRIVATE_REVALIDATE)
 @jwt_required()
 def get_liked_podcasts():
     try:
@@ -220,14 +275,20 @@ def get_liked_podcasts():
         if not user:
             return jsonify({'message': 'User not found'}), 404
         # Get podcasts liked by this user
-        liked_podcasts = user.liked_podcasts  # Backref from Podcast model
-        return jsonify({
+        liked_ids = db.session.query(podcast_likes.c.podcast_id).filter(podcast_likes.c.user_id == user.id)
+        liked_podcasts = podcast_query('card').filter(Podcast.id.in_(liked_ids)).all()
+        response, etag = _podcast_list_validators('liked-podcasts', liked_podcasts)
+        if response is not None:
+            return response
+        return validated(jsonify({
             'podcasts': [podcast.to_dict() for podcast in liked_podcasts]
-        }), 200
+        }), etag), 200
     except Exception as e:
         return jsonify({'message': f'Error retrieving liked podcasts: {str(e)}'}), 401
 
 @auth_bp.route('/profile/details', methods=['GET'])
+@read_only
+@cache_control(PRIVATE_REVALIDATE)
 @jwt_required()
 def get_profile_details():
     try:
@@ -236,17 +297,18 @@ def get_profile_details():
         if not user:
             return jsonify({'message': 'User not found'}), 404
         # Efficiently gather profile stats
-        podcasts_count = len(user.podcasts)
-        liked_podcasts_count = len(user.liked_podcasts)
+        podcasts_count = db.session.query(func.count(Podcast.id)).filter(Podcast.author_id == user.id, podcast_visible()).scalar()
+        liked_podcasts_count = db.session.query(func.count()).select_from(podcast_likes) \
+            .filter(podcast_likes.c.user_id == user.id).scalar()
         followers_count = 0  # Placeholder, implement if follower model exists
         following_count = 0  # Placeholder, implement if following model exists
         
         # Calculate total listens across all podcasts authored by the user
         total_listens_count = db.session.query(func.sum(PodcastListen.time_listened)) \
             .join(Podcast, PodcastListen.podcast_id == Podcast.id) \
-            .filter(Podcast.author_id == user.id).scalar() or 0
+            .filter(Podcast.author_id == user.id, podcast_visible()).scalar() or 0
         
-        return jsonify({
+        details = {
             'email': user.email,
             'is_verified': user.is_verified,
             'podcasts_count': podcasts_count,
@@ -254,12 +316,22 @@ def get_profile_details():
             'followers_count': followers_count,
             'following_count': following_count,
             'total_listens_count': total_listens_count,
-        }), 200
+        }
+        etag = etag_for('profile-details', user.id, sorted(details.items()))
+        response = not_modified(etag)
+        if response is not None:
+            return response
+        return validated(jsonify(details), etag), 200
     except Exception as e:
         return jsonify({'message': f'Error retrieving profile details: {str(e)}'}), 401
 
 @auth_bp.route('/profile/listen-history', methods=['GET'])
+@read_only
+@cache_control(PRIVATE_REVALIDATE)
 @jwt_required()
+@cached(lambda body, view_args, query: [f'listens:{get_jwt_identity()}', *podcast_tags(
+            listen['podcast'] for listen in body['listen_history'] if listen['podcast'])],
+        args=('page', 'per_page'), defaults={'page': 1, 'per_page': 10}, per_user=True)
 def get_listen_history():
     try:
         current_user_id = get_jwt_identity()
@@ -272,7 +344,8 @@ def get_listen_history():
         per_page = request.args.get('per_page', 10, type=int)
         
         # Query PodcastListen directly with pagination
-        listen_history = PodcastListen.query.filter_by(user_id=user.id)\
+        listen_history = PodcastListen.query.options(*listen_options()).filter_by(user_id=user.id)\
+            .filter(PodcastListen.podcast.has(podcast_visible()))\
             .order_by(PodcastListen.tracked_at.desc())\
             .paginate(
                 page=page, 
@@ -280,12 +353,21 @@ def get_listen_history():
                 error_out=False
             )
         
-        return jsonify({
+        categories_etag = current_app.extensions['category_cache'].snapshot().etag
+        etag = etag_for('listen-history', listen_history.total, listen_history.page, per_page, [
+            (listen.id, listen.time_listened, listen.tracked_at,
+             podcast_fingerprint(listen.podcast, categories_etag) if listen.podcast else None)
+            for listen in listen_history.items
+        ])
+        response = not_modified(etag)
+        if response is not None:
+            return response
+        return validated(jsonify({
             'listen_history': [listen.to_dict() for listen in listen_history.items],
             'total': listen_history.total,
             'pages': listen_history.pages,
             'current_page': listen_history.page,
             'per_page': per_page
-        }), 200
+        }), etag), 200
     except Exception as e:
         return jsonify({'message': f'Error retrieving listen history: {str(e)}'}), 401 
\ No newline at end of file
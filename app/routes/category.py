@@ -1,18 +1,33 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from app import db
 from app.models.category import Category
+from app.utils.db_routing import read_only
+from app.utils.compression import negotiated_response
+from app.utils.conditional import PUBLIC_SHORT, cache_control, not_modified, validated
+from app.utils.response_cache import invalidate
+from app.utils.cdn import purge, surrogate_keys
 
 category_bp = Blueprint('category', __name__)
 
 @category_bp.route('/categories', methods=['GET'])
+@read_only
+@cache_control(PUBLIC_SHORT)
 def get_categories():
-    categories = Category.query.all()
-    return jsonify({
-        'categories': [category.to_dict() for category in categories]
-    }), 200
+    # Served from the in-process snapshot: no query and no serialisation per request
+    snapshot = current_app.extensions['category_cache'].snapshot()
+    surrogate_keys('categories')
+    response = not_modified(snapshot.etag)
+    if response is not None:
+        return response
+    # Compressed once per snapshot and kept with it
+    return validated(negotiated_response(snapshot.body, snapshot.variants), snapshot.etag)
 
 @category_bp.route('/categories/<category_id>', methods=['GET'])
+@read_only
 def get_category(category_id):
+    cached = current_app.extensions['category_cache'].snapshot().by_id.get(category_id)
+    if cached is not None:
+        return jsonify(cached), 200
     category = Category.query.get(category_id)
     if not category:
         return jsonify({'message': 'Category not found'}), 404
@@ -30,6 +45,8 @@ def create_category():
     category = Category(name=name, description=description)
     db.session.add(category)
     db.session.commit()
+    current_app.extensions['category_cache'].invalidate()
+    purge('categories')
     return jsonify({'message': 'Category created', 'category': category.to_dict()}), 201
 
 @category_bp.route('/categories/<category_id>', methods=['DELETE'])
@@ -39,4 +56,7 @@ def delete_category(category_id):
         return jsonify({'message': 'Category not found'}), 404
     db.session.delete(category)
     db.session.commit()
+    current_app.extensions['category_cache'].invalidate()
+    # Cached podcasts and listings that showed this category
+    invalidate('categories', f'category:{category_id}')
     return jsonify({'message': 'Category deleted'}), 200 
\ No newline at end of file
@@ -0,0 +1,27 @@
+from flask import Blueprint, jsonify, current_app
+from sqlalchemy import text
+from app import db
+
+health_bp = Blueprint('health', __name__)
+
+@health_bp.route('/health/db', methods=['GET'])
+def database_health():
+    """Report whether the primary database and every read replica are reachable, with replica lag."""
+    try:
+        db.session.execute(text('SELECT 1'))
+        primary = {'healthy': True, 'error': None}
+    except Exception as e:
+        primary = {'healthy': False, 'error': str(e)}
+    finally:
+        db.session.rollback()
+
+    router = current_app.extensions['db_router']
+    replicas = router.health()
+    usable = [r for r in replicas if r['healthy'] and r['lag_seconds'] <= router.max_lag]
+
+    status = 200 if primary['healthy'] else 503
+    return jsonify({
+        'primary': primary,
+        'replicas': replicas,
+        'replicas_in_rotation': len(usable)
+    }), status
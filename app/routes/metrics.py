@@ -0,0 +1,22 @@
+import hmac
+from flask import Blueprint, Response, current_app, request
+from app.utils.metrics import render
+
+metrics_bp = Blueprint('metrics', __name__)
+
+def _authorized(value, expected):
+    # Compared as bytes: compare_digest rejects str with non-ASCII characters
+    try:
+        return hmac.compare_digest(value.encode(), expected.encode())
+    except (TypeError, ValueError):
+        return False
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def export_metrics():
+    """Request metrics in Prometheus text format"""
+    token = current_app.config['METRICS_TOKEN']
+    if token and not _authorized(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    metrics = current_app.extensions['metrics']
+    routes, counters = metrics.collect()
+    return Response(render(routes, counters, metrics.help), mimetype='text/plain; version=0.0.4')
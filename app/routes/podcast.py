@@ -1,95 +1,122 @@
+import logging
+import mimetypes
 import os
-from flask import Blueprint, request, jsonify, current_app, send_from_directory, send_file
+from flask import Blueprint, request, jsonify, current_app, send_from_directory, send_file, abort
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
 from app import db
-from app.models.podcast import Podcast
+from app.models.podcast import Podcast, podcast_categories, podcast_likes
 from app.models.category import Category
 from app.models.comment import Comment
-from mutagen import File as MutagenFile
+from app.models.loading import comment_options, podcast_or_404, podcast_query, podcast_visible
+from app.models.types import parse_id
 from app.utils.file_handlers import (
     save_file, 
     ALLOWED_AUDIO_EXTENSIONS, 
     ALLOWED_IMAGE_EXTENSIONS
 )
 from app.routes.auth import token_required
+from app.utils.rate_limit import rate_limit
+from app.utils.db_routing import read_only
+from app.utils.compression import no_compression, precompressed
+from app.utils.response_cache import cached, invalidate, podcast_tags
+from app.utils.cdn import surrogate_keys
+from app.utils.live_events import publish
+from app.utils.segment_cache import cached_range
+from app.utils.stream_scheduler import paced
+from app.utils.listen_progress import record_range
+from app.utils.conditional import PUBLIC_REVALIDATE, cache_control, comments_validator, etag_for, not_modified, podcast_fingerprint, validated
+from app.utils.log import lazy
 from sqlalchemy import func
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
 from app.models.podcast_listen import PodcastListen
 from sqlalchemy.exc import IntegrityError
 from datetime import datetime
 
 podcast_bp = Blueprint('podcast', __name__)
+logger = logging.getLogger(__name__)
 
 @podcast_bp.route('/podcasts/<podcast_id>/comments', methods=['POST'])
+@rate_limit('comment')
 @token_required
 def add_comment(current_user, podcast_id):
-    podcast = Podcast.query.get_or_404(podcast_id)
+    # The stored form of the id, so cache tags and event topics match the other write views
+    podcast_id = podcast_or_404('minimal', podcast_id).id
     data = request.get_json()
     
     if not data or not data.get('content'):
         return jsonify({'message': 'Comment content is required'}), 400
     
-    # Debug: Print request data
-    print(f"Adding comment to podcast {podcast_id}")
-    print(f"Request data: {data}")
-    print(f"Current user: {current_user.id}")
-    
+    logger.debug('Adding comment to podcast %s by user %s: %s', podcast_id, current_user.id, data)
+
+    # Optional parent comment ID for replies; it must be a comment on the same podcast
+    parent_id = data.get('parent_id')
+    if parent_id is not None:
+        parent_id = parse_id(parent_id)
+        if parent_id is None:
+            return jsonify({'message': 'Invalid parent comment id'}), 400
+        if db.session.execute(db.select(Comment.id).where(
+                Comment.id == parent_id, Comment.podcast_id == podcast_id)).first() is None:
+            return jsonify({'message': 'Parent comment not found'}), 404
+
     comment = Comment(
         content=data['content'],
         podcast_id=podcast_id,
         user_id=current_user.id,
-        parent_id=data.get('parent_id')  # Optional parent comment ID for replies
+        parent_id=parent_id
     )
     
     db.session.add(comment)
     db.session.commit()
+    invalidate(f'podcast:{podcast_id}', 'ranking')
+    comment_dict = comment.to_dict()
+    publish(podcast_id, lambda: {
+        'new-comment': {'comment': comment_dict},
+        'comment-count': {'comments_count': _comments_count(podcast_id)},
+    })
     
-    # Debug: Print created comment
-    print(f"Created comment: {comment.to_dict()}")
-    
+    logger.debug('Created comment: %s', comment_dict)
+
     return jsonify({
         'message': 'Comment added successfully',
-        'comment': comment.to_dict()
+        'comment': comment_dict
     }), 201
 
 @podcast_bp.route('/podcasts/<podcast_id>/comments', methods=['GET'])
+@read_only
+@cache_control(PUBLIC_REVALIDATE)
+@cached(lambda body, view_args, query: [f"podcast:{parse_id(view_args['podcast_id']) or view_args['podcast_id']}"])
 def get_comments(podcast_id):
-    # First, verify the podcast exists
-    podcast = Podcast.query.get_or_404(podcast_id)
-    print(f"\n=== Debug: Getting comments for podcast {podcast_id} ===")
-    
-    # Get all comments for this podcast without any filters first
-    all_comments = Comment.query.filter_by(podcast_id=podcast_id).all()
-    print(f"Raw comments found: {len(all_comments)}")
-    for comment in all_comments:
-        print(f"Comment ID: {comment.id}, Content: {comment.content}, User ID: {comment.user_id}")
-    
-    # Now try the paginated query
+    # Verify the podcast exists and version its comments in one query, so a repeat poll stops here
+    validator = db.session.execute(comments_validator(podcast_id)).first()
+    if validator is None:
+        abort(404)
+    etag = etag_for('comments', podcast_id, validator.comments, validator.latest)
+    response = not_modified(etag)
+    if response is not None:
+        return response
+
     try:
-        comments = Comment.query.filter_by(podcast_id=podcast_id)\
+        comments = Comment.query.options(*comment_options()).filter_by(podcast_id=podcast_id)\
             .order_by(Comment.created_at.desc())\
             .paginate(page=1, per_page=10)
-        
-        print(f"\nPaginated query results:")
-        print(f"Total items: {comments.total}")
-        print(f"Items on current page: {len(comments.items)}")
-        print(f"Current page: {comments.page}")
-        print(f"Total pages: {comments.pages}")
-        
-        # Convert comments to dict and print for debugging
+
         comments_list = [comment.to_dict() for comment in comments.items]
-        print(f"\nComments being returned: {comments_list}")
-        
-        return jsonify({
+        logger.debug('Comments for podcast %s: page %s of %s, %s of %s total: %s', podcast_id,
+                     comments.page, comments.pages, len(comments.items), comments.total, comments_list)
+
+        return validated(jsonify({
             'comments': comments_list,
             'total': comments.total,
             'pages': comments.pages,
             'current_page': comments.page
-        }), 200
+        }), etag), 200
         
     except Exception as e:
-        print(f"\nError in pagination: {str(e)}")
+        logger.warning('Paginating comments for podcast %s failed: %s', podcast_id, e)
+        db.session.rollback()
         # Fallback to non-paginated response if pagination fails
+        all_comments = Comment.query.filter_by(podcast_id=podcast_id).all()
         return jsonify({
             'comments': [comment.to_dict() for comment in all_comments],
             'total': len(all_comments),
@@ -110,8 +137,15 @@ def delete_comment(current_user, podcast_id, comment_id):
     if comment.user_id != current_user.id:
         return jsonify({'message': 'You can only delete your own comments'}), 403
         
+    # The stored ids, as in add_comment
+    comment_id, podcast_id = comment.id, comment.podcast_id
     db.session.delete(comment)
     db.session.commit()
+    invalidate(f'podcast:{podcast_id}', 'ranking')
+    publish(podcast_id, lambda: {
+        'comment-deleted': {'comment_id': comment_id},
+        'comment-count': {'comments_count': _comments_count(podcast_id)},
+    })
     
     return jsonify({'message': 'Comment deleted successfully'}), 200
 
@@ -122,35 +156,95 @@ def test():
 @podcast_bp.route('/podcasts/<podcast_id>/like', methods=['POST'])
 @token_required
 def like_podcast(current_user, podcast_id):
-    podcast = Podcast.query.get_or_404(podcast_id)
+    podcast = podcast_or_404('minimal', podcast_id)
     
-    if current_user in podcast.likes:
+    if _is_liked(podcast.id, current_user.id):
         return jsonify({'message': 'You have already liked this podcast'}), 400
-        
-    podcast.likes.append(current_user)
-    db.session.commit()
+
+    write_queue = current_app.extensions.get('sqlite_write_queue')
+    try:
+        if write_queue is not None:
+            # Group-committed by the writer thread, which reads the new count in the same transaction
+            likes_count = write_queue.submit(_like, podcast.id, current_user.id)
+        else:
+            db.session.execute(podcast_likes.insert().values(podcast_id=podcast.id, user_id=current_user.id))
+            db.session.commit()
+            likes_count = podcast.count_likes()
+    except IntegrityError:
+        # A concurrent request liked it first
+        db.session.rollback()
+        return jsonify({'message': 'You have already liked this podcast'}), 400
+    except TimeoutError:
+        return _write_queue_busy()
+    invalidate(f'podcast:{podcast.id}', 'ranking')
+    publish(podcast.id, {'like-count': {'likes_count': likes_count}})
     
     return jsonify({
         'message': 'Podcast liked successfully',
-        'likes_count': len(podcast.likes)
+        'likes_count': likes_count
     }), 200
 
 @podcast_bp.route('/podcasts/<podcast_id>/unlike', methods=['POST'])
 @token_required
 def unlike_podcast(current_user, podcast_id):
-    podcast = Podcast.query.get_or_404(podcast_id)
+    podcast = podcast_or_404('minimal', podcast_id)
     
-    if current_user not in podcast.likes:
-        return jsonify({'message': 'You have not liked this podcast'}), 400
-        
-    podcast.likes.remove(current_user)
-    db.session.commit()
+    write_queue = current_app.extensions.get('sqlite_write_queue')
+    if write_queue is not None:
+        try:
+            likes_count = write_queue.submit(_unlike, podcast.id, current_user.id)
+        except TimeoutError:
+            return _write_queue_busy()
+        if likes_count is None:
+            return jsonify({'message': 'You have not liked this podcast'}), 400
+    else:
+        result = db.session.execute(podcast_likes.delete().where(
+            podcast_likes.c.podcast_id == podcast.id,
+            podcast_likes.c.user_id == current_user.id
+        ))
+        if result.rowcount == 0:
+            db.session.rollback()
+            return jsonify({'message': 'You have not liked this podcast'}), 400
+        db.session.commit()
+        likes_count = podcast.count_likes()
+    invalidate(f'podcast:{podcast.id}', 'ranking')
+    publish(podcast.id, {'like-count': {'likes_count': likes_count}})
     
     return jsonify({
         'message': 'Podcast unliked successfully',
-        'likes_count': len(podcast.likes)
+        'likes_count': likes_count
     }), 200
 
+def _like(connection, podcast_id, user_id):
+    """Insert a like on a Core connection; returns the podcast's new like count"""
+    connection.execute(podcast_likes.insert().values(podcast_id=podcast_id, user_id=user_id))
+    return _count_likes(connection, podcast_id)
+
+def _unlike(connection, podcast_id, user_id):
+    """Remove a like on a Core connection; returns the new like count, or None when there was no like"""
+    result = connection.execute(podcast_likes.delete().where(
+        podcast_likes.c.podcast_id == podcast_id, podcast_likes.c.user_id == user_id))
+    return _count_likes(connection, podcast_id) if result.rowcount else None
+
+def _count_likes(connection, podcast_id):
+    return connection.execute(
+        db.select(db.func.count()).select_from(podcast_likes).where(podcast_likes.c.podcast_id == podcast_id)
+    ).scalar()
+
+def _write_queue_busy():
+    response = jsonify({'message': 'Too many writes in progress, please retry shortly'})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
+
+def _comments_count(podcast_id):
+    return db.session.execute(comments_validator(podcast_id)).first().comments
+
+def _is_liked(podcast_id, user_id):
+    return db.session.query(podcast_likes.c.podcast_id) \
+        .filter(podcast_likes.c.podcast_id == podcast_id, podcast_likes.c.user_id == user_id) \
+        .first() is not None
+
 
 
 #create a new podcast
@@ -158,81 +252,60 @@ def unlike_podcast(current_user, podcast_id):
 @token_required
 def create_podcast(current_user):
     try:
-        print("\n=== DEBUG: PODCAST CREATION START ===")
-        print(f"Current user: {current_user.id}")
-        
-        # Print all incoming form data
-        print("\n--- INCOMING FORM DATA ---")
-        for key, value in request.form.items():
-            print(f"Form field '{key}': {value}")
-        
-        # Print all incoming files
-        print("\n--- INCOMING FILES ---")
-        for key, file in request.files.items():
-            print(f"File '{key}': {file.filename} ({file.content_type})")
-        
+        logger.debug('Creating podcast for user %s: form=%s files=%s', current_user.id,
+                     lazy(request.form.to_dict, flat=False),
+                     lazy(lambda: {key: (file.filename, file.content_type) for key, file in request.files.items()}))
+
         # Get form data
         title = request.form.get('title')
         description = request.form.get('description')
-        
-        print(f"\n--- EXTRACTED BASIC DATA ---")
-        print(f"Title: {title}")
-        print(f"Description: {description}")
-        
+
         # Handle categories - support both categories[] and categories format
         category_ids = []
-        print("\n--- CATEGORY PROCESSING ---")
-        print("All form keys:", list(request.form.keys()))
-        
         for key in request.form:
             if key == 'categories[]' or key == 'categories':
-                values = request.form.getlist(key)
-                print(f"Found category key '{key}' with values: {values}")
-                category_ids.extend(values)
-        
-        print(f"Raw category_ids before processing: {category_ids}")
-        
-        # Convert category IDs to strings and remove duplicates
-        # Since we're using UUIDs now, we don't need to convert to int
-        category_ids = list(set(category_ids))
-        print(f"Processed category_ids (unique): {category_ids}")
-        
+                category_ids.extend(request.form.getlist(key))
+
+        # Canonical UUID strings without duplicates; anything else is rejected before files are saved
+        category_ids = list(dict.fromkeys(parse_id(category_id) for category_id in category_ids))
+        logger.debug('Category ids: %s', category_ids)
+        if None in category_ids:
+            logger.debug('Rejected podcast: malformed category id')
+            return jsonify({'message': 'Invalid category id'}), 400
+
         # Validate required fields
         if not title:
-            print("ERROR: Title is missing")
+            logger.debug('Rejected podcast: title is missing')
             return jsonify({'message': 'Title is required'}), 400
             
         # Handle file uploads
         audio_file = request.files.get('audio')
         thumbnail_file = request.files.get('thumbnail')
-        
-        print(f"\n--- FILE VALIDATION ---")
-        print(f"Audio file present: {audio_file is not None}")
-        print(f"Thumbnail file present: {thumbnail_file is not None}")
-        
+
         if not audio_file:
-            print("ERROR: Audio file is missing")
+            logger.debug('Rejected podcast: audio file is missing')
             return jsonify({'message': 'Audio file is required'}), 400
         if not thumbnail_file:
-            print("ERROR: Thumbnail file is missing")
+            logger.debug('Rejected podcast: thumbnail file is missing')
             return jsonify({'message': 'Thumbnail file is required'}), 400
             
         # Save files
-        print("\n--- FILE SAVING ---")
         audio_path = save_file(
             audio_file, 
             os.path.join(current_app.config['UPLOAD_FOLDER'], 'audio'),
             ALLOWED_AUDIO_EXTENSIONS
         )
-        print(f"Audio saved to: {audio_path}")
+        logger.debug('Audio saved to %s', audio_path)
 
         try:
+            # Only uploads need mutagen; importing it here keeps it out of worker boot
+            from mutagen import File as MutagenFile
             audio_file_mutagen = MutagenFile(audio_path)
             audio_duration = audio_file_mutagen.info.length
             seconds = round(audio_duration)
-            print(f"Audio duration: {audio_duration} seconds")
+            logger.debug('Audio duration: %s seconds', audio_duration)
         except Exception as e:
-            print(f"Error getting audio duration: {str(e)}")
+            logger.warning('Could not read the duration of %s: %s', audio_path, e)
             return jsonify({'message': 'Error getting audio duration'}), 500
 
         
@@ -241,13 +314,12 @@ def create_podcast(current_user):
             os.path.join(current_app.config['UPLOAD_FOLDER'], 'thumbnails'),
             ALLOWED_IMAGE_EXTENSIONS
         )
-        print(f"Thumbnail saved to: {thumbnail_path}")
+        logger.debug('Thumbnail saved to %s', thumbnail_path)
         
         if not audio_path or not thumbnail_path:
-            print("ERROR: Invalid file type")
+            logger.debug('Rejected podcast: invalid file type')
             return jsonify({'message': 'Invalid file type'}), 400
         
-        print("\n--- PODCAST CREATION ---")
         # Create podcast with relative paths
         podcast = Podcast(
             title=title,
@@ -257,33 +329,20 @@ def create_podcast(current_user):
             author_id=current_user.id,
             duration=seconds
         )
-        print(f"Podcast object created with ID: {podcast.id}")
         
         # Add categories
-        print(f"\n--- CATEGORY ASSOCIATION ---")
-        print(f"Attempting to associate {len(category_ids)} categories")
         if category_ids:
-            print(f"Looking for categories with IDs: {category_ids}")
             categories = Category.query.filter(Category.id.in_(category_ids)).all()
-            print(f"Found {len(categories)} categories in database")
-            for cat in categories:
-                print(f"  - Category: {cat.name} (ID: {cat.id})")
-            
+            logger.debug('Found %s of %s categories: %s', len(categories), len(category_ids),
+                         lazy(lambda: [(category.id, category.name) for category in categories]))
             podcast.categories.extend(categories)
-            print(f"Categories associated with podcast")
-        else:
-            print("No categories to associate")
         
-        print("\n--- DATABASE COMMIT ---")
         db.session.add(podcast)
         db.session.commit()
-        print(f"Podcast saved to database with ID: {podcast.id}")
+        invalidate('catalog', f'podcast:{podcast.id}', *(f'category:{category_id}' for category_id in category_ids))
         
-        print("\n--- RESPONSE ---")
         podcast_dict = podcast.to_dict()
-        print(f"Returning podcast data: {podcast_dict}")
-        
-        print("=== DEBUG: PODCAST CREATION END ===\n")
+        logger.debug('Created podcast %s: %s', podcast.id, podcast_dict)
         
         return jsonify({
             'message': 'Podcast created successfully',
@@ -291,33 +350,38 @@ def create_podcast(current_user):
         }), 201
         
     except Exception as e:
-        print(f"\n=== ERROR IN PODCAST CREATION ===")
-        print(f"Error: {str(e)}")
-        print(f"Error type: {type(e)}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
-        print("=== ERROR END ===\n")
+        logger.exception('Error creating podcast: %s', e)
         db.session.rollback()
         return jsonify({'message': str(e)}), 500
 
 
 # get the podcast by id
 @podcast_bp.route('/podcasts/<podcast_id>', methods=['GET'])
+@read_only
+@precompressed
+@cache_control(PUBLIC_REVALIDATE)
+@cached(lambda body, view_args, query: podcast_tags([body]))
 def get_podcast(podcast_id):
-    podcast = Podcast.query.get_or_404(podcast_id)
-    return jsonify(podcast.to_dict()), 200
+    podcast = podcast_or_404('detail', podcast_id)
+    # The ETag comes from the loaded row; a match skips serialisation entirely
+    etag = etag_for(podcast_fingerprint(podcast, current_app.extensions['category_cache'].snapshot().etag))
+    response = not_modified(etag)
+    if response is not None:
+        return response
+    return validated(jsonify(podcast.to_dict()), etag), 200
 
 
 # Check if podcast is liked by user
 @podcast_bp.route('/podcasts/<podcast_id>/check-like', methods=['GET'])
+@read_only
 @token_required
 def check_podcast_like(current_user, podcast_id):
-    podcast = Podcast.query.get_or_404(podcast_id)
-    is_liked = current_user in podcast.likes
+    podcast = podcast_or_404('minimal', podcast_id)
+    is_liked = _is_liked(podcast.id, current_user.id)
     
     return jsonify({
         'is_liked': is_liked,
-        'likes_count': len(podcast.likes)
+        'likes_count': podcast.count_likes()
     }), 200
 
 
@@ -325,41 +389,42 @@ def check_podcast_like(current_user, podcast_id):
 @podcast_bp.route('/podcasts/<podcast_id>', methods=['DELETE'])
 @token_required
 def delete_podcast(current_user, podcast_id):
-    podcast = Podcast.query.get_or_404(podcast_id)
+    podcast = podcast_or_404('owner', podcast_id)
 
     # Authorization: Only the author can delete
     if podcast.author_id != current_user.id:
         return jsonify({'message': 'You are not authorized to delete this podcast'}), 403
 
     try:
-        # Remove likes manually from association table
-        podcast.likes.clear()
-
-        # Remove category associations
-        podcast.categories.clear()
-
-        # Manually delete comments (if cascade isn't set)
-        Comment.query.filter_by(podcast_id=podcast_id).delete()
-
-        # Optionally delete associated files from disk
-        upload_folder = current_app.config['UPLOAD_FOLDER']
-        thumbnail_path = os.path.join(upload_folder, podcast.thumbnail_url)
-        audio_path = os.path.join(upload_folder, podcast.audio_url)
-        for file_path in [thumbnail_path, audio_path]:
-            if os.path.exists(file_path):
-                os.remove(file_path)
+        # Listens and comments can run into millions of rows: the podcast is stamped and deleted in the background
+        current_app.extensions['deletion'].delete_podcast(podcast.id)
 
-        db.session.delete(podcast)
-        db.session.commit()
-
-        return jsonify({'message': 'Podcast deleted successfully'}), 200
+        return jsonify({'message': 'Podcast deletion started'}), 202
 
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': f'Error deleting podcast: {str(e)}'}), 500
 
 
+def _podcast_ids_in_category(category_id):
+    """Podcast ids for a category, resolved through ix_podcast_categories_category_id"""
+    return db.session.query(podcast_categories.c.podcast_id) \
+        .filter(podcast_categories.c.category_id == category_id)
+
+def _listing_tags(body, view_args, query):
+    """Listings change with any new or deleted podcast, and with each listed podcast"""
+    tags = ['catalog', *podcast_tags(body['podcasts'])]
+    if query.get('category_id'):
+        tags.append(f"category:{query['category_id']}")
+    return tags
+
+LISTING_ARGS = ('page', 'per_page', 'category_id', 'search')
+LISTING_DEFAULTS = {'page': 1, 'per_page': 10}
+
 @podcast_bp.route('/podcasts', methods=['GET'])
+@read_only
+@cache_control(PUBLIC_REVALIDATE)
+@cached(_listing_tags, args=LISTING_ARGS, defaults=LISTING_DEFAULTS)
 def get_podcasts():
     # Get query parameters
     page = request.args.get('page', 1, type=int)
@@ -368,11 +433,11 @@ def get_podcasts():
     search = request.args.get('search', '')
     
     # Build query
-    query = Podcast.query
+    query = podcast_query('card')
     
     # Apply filters
     if category_id:
-        query = query.filter(Podcast.categories.any(id=category_id))
+        query = query.filter(Podcast.id.in_(_podcast_ids_in_category(category_id)))
     if search:
         query = query.filter(Podcast.title.ilike(f'%{search}%'))
     
@@ -388,6 +453,12 @@ def get_podcasts():
 
 
 @podcast_bp.route('/podcasts/discover', methods=['GET'])
+@read_only
+@precompressed
+@cache_control(PUBLIC_REVALIDATE)
+# Likes and comments anywhere can reorder the ranking
+@cached(lambda body, view_args, query: ['ranking', *_listing_tags(body, view_args, query)],
+        args=LISTING_ARGS, defaults=LISTING_DEFAULTS)
 def discover_podcasts():
     """
     Discover podcasts, always sorted by total engagement (likes + comments), descending.
@@ -397,68 +468,84 @@ def discover_podcasts():
       - category_id: str (optional, UUID)
       - search: str (optional)
     """
-    from sqlalchemy import func
-    from app.models.comment import Comment
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
     category_id = request.args.get('category_id')  # Now a string UUID
     search = request.args.get('search', '')
 
-    query = Podcast.query
+    # Rank ids only, so the ranking reads the ix_podcasts_created_at index instead of whole podcast rows
+    query = db.session.query(Podcast.id).filter(podcast_visible())
 
     if category_id:
-        query = query.filter(Podcast.categories.any(id=category_id))
+        query = query.filter(Podcast.id.in_(_podcast_ids_in_category(category_id)))
     if search:
         query = query.filter(Podcast.title.ilike(f'%{search}%'))
 
-    # Subquery for comment count
+    # Subqueries for like and comment counts, each aggregated straight from its index
+    like_count_subq = db.session.query(
+        podcast_likes.c.podcast_id,
+        func.count().label('likes_count')
+    ).group_by(podcast_likes.c.podcast_id).subquery()
     comment_count_subq = db.session.query(
         Comment.podcast_id,
-        func.count(Comment.id).label('comments_count')
+        func.count().label('comments_count')
     ).group_by(Comment.podcast_id).subquery()
     # Join likes and comments count, order by (likes + comments)
     query = query \
-        .outerjoin(Podcast.likes) \
+        .outerjoin(like_count_subq, Podcast.id == like_count_subq.c.podcast_id) \
         .outerjoin(comment_count_subq, Podcast.id == comment_count_subq.c.podcast_id) \
-        .group_by(Podcast.id) \
-        .order_by((func.count().label('likes_count') + func.coalesce(comment_count_subq.c.comments_count, 0)).desc(), Podcast.created_at.desc())
+        .order_by((func.coalesce(like_count_subq.c.likes_count, 0) + func.coalesce(comment_count_subq.c.comments_count, 0)).desc(), Podcast.created_at.desc())
+
+    ranked = query.paginate(page=page, per_page=per_page)
 
-    podcasts = query.paginate(page=page, per_page=per_page)
+    # Load full rows for this page only, keeping the ranking order
+    page_ids = [row.id for row in ranked.items]
+    podcasts_by_id = {podcast.id: podcast for podcast in podcast_query('card').filter(Podcast.id.in_(page_ids))} if page_ids else {}
+    podcasts = [podcasts_by_id[podcast_id] for podcast_id in page_ids if podcast_id in podcasts_by_id]
 
     return jsonify({
-        'podcasts': [podcast.to_dict() for podcast in podcasts.items],
-        'total': podcasts.total,
-        'pages': podcasts.pages,
-        'current_page': podcasts.page
+        'podcasts': [podcast.to_dict() for podcast in podcasts],
+        'total': ranked.total,
+        'pages': ranked.pages,
+        'current_page': ranked.page
     }), 200
 
 @podcast_bp.route('/uploads/thumbnails/<path:filename>')
 def serve_thumbnail(filename):
+    surrogate_keys(f'file:thumbnails/{filename}')
     return send_from_directory('uploads/thumbnails', filename)
 
 @podcast_bp.route('/uploads/audio/<path:filename>')
+@no_compression
+@paced
 def serve_audio(filename):
+    surrogate_keys(f'file:audio/{filename}')
+    path = safe_join(os.path.join(current_app.root_path, 'uploads/audio'), filename)
+    response = cached_range(path, mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream') if path else None
+    if response is not None:
+        return response
     return send_from_directory('uploads/audio', filename)
 
 @podcast_bp.route('/podcasts/<podcast_id>/stream', methods=['GET'])
+@read_only
+@no_compression
+@paced
 def stream_podcast_audio(podcast_id):
     """
     Stream audio file for a specific podcast by ID.
     Supports HTTP Range headers for proper audio streaming.
     Returns last listened position if user has listened before.
     """
+    # Outside the try, so a missing podcast is a 404 rather than a streaming error
+    podcast = podcast_or_404('stream', podcast_id)
     try:
-        # Get the podcast
-        podcast = Podcast.query.get_or_404(podcast_id)
-        
-        # Debug: Print podcast info
-        print(f"Podcast ID: {podcast_id}")
-        print(f"Audio URL from DB: {podcast.audio_url}")
+        logger.debug('Streaming podcast %s from %s', podcast_id, podcast.audio_url)
         
         # Check for user's listen record if authenticated
         last_position = None
+        user_id = None
         try:
-            from flask_jwt_extended import get_jwt_identity
+            verify_jwt_in_request(optional=True)
             user_id = get_jwt_identity()
             if user_id:
                 listen_record = PodcastListen.query.filter_by(
@@ -467,25 +554,21 @@ def stream_podcast_audio(podcast_id):
                 ).first()
                 if listen_record:
                     last_position = listen_record.time_listened
-                    print(f"Found listen record for user {user_id}: {last_position} seconds")
+                    logger.debug('User %s last listened to %s at %s seconds', user_id, podcast_id, last_position)
         except Exception as e:
-            print(f"Error checking listen record: {e}")
+            logger.debug('No listen record for this request: %s', e)
         
         # Construct the full path to the audio file
         upload_folder = current_app.config['UPLOAD_FOLDER']
-        print(f"Upload folder: {upload_folder}")
         
         # The audio_url is stored as a relative path like 'audio/filename.mp3'
         audio_path = os.path.join(upload_folder, podcast.audio_url)
-        print(f"Constructed audio path: {audio_path}")
         
         # Check if the audio file exists
         if not os.path.exists(audio_path):
-            print(f"Audio file not found at: {audio_path}")
+            logger.warning('Audio file for podcast %s not found at %s', podcast_id, audio_path)
             return jsonify({'message': 'Audio file not found'}), 404
         
-        print(f"Audio file found, size: {os.path.getsize(audio_path)} bytes")
-        
         # Get file info for proper headers
         file_size = os.path.getsize(audio_path)
         file_name = os.path.basename(audio_path)
@@ -495,12 +578,15 @@ def stream_podcast_audio(podcast_id):
             'Accept-Ranges': 'bytes',
             'Content-Length': str(file_size),
             'Content-Type': 'audio/mpeg',  # Adjust based on your audio format
-            'Cache-Control': 'public, max-age=31536000',  # Cache for 1 year
+            'Cache-Control': f"public, max-age={current_app.config['MEDIA_MAX_AGE']}",
         }
+        surrogate_keys(f'podcast:{podcast.id}', f'author:{podcast.author_id}', f'file:{podcast.audio_url}')
         
         # Add last position header if available
         if last_position is not None:
             headers['X-Last-Position'] = str(last_position)
+            # The header is the caller's own, so no shared cache may keep this response
+            headers['Cache-Control'] = f"private, max-age={current_app.config['MEDIA_MAX_AGE']}"
         
         # Handle Range requests for streaming
         range_header = request.headers.get('Range', None)
@@ -519,6 +605,10 @@ def stream_podcast_audio(podcast_id):
                 
                 # Calculate content length for this range
                 content_length = end - start + 1
+
+                # The range start is where the player is reading, so it stands in for a /track call
+                if user_id and record_range(user_id, podcast, audio_path, os.stat(audio_path), start):
+                    headers['X-Listen-Progress'] = 'server'
                 
                 # Update headers for partial content
                 headers.update({
@@ -526,6 +616,12 @@ def stream_podcast_audio(podcast_id):
                     'Content-Range': f'bytes {start}-{end}/{file_size}',
                 })
                 
+                # Assembled from cached blocks when the segment cache is on
+                response = cached_range(audio_path, start, end)
+                if response is not None:
+                    response.headers.update(headers)
+                    return response
+
                 # Return partial content
                 response = send_file(
                     audio_path,
@@ -564,12 +660,11 @@ def stream_podcast_audio(podcast_id):
         return response
         
     except Exception as e:
-        print(f"Error streaming podcast {podcast_id}: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Error streaming podcast %s: %s', podcast_id, e)
         return jsonify({'message': 'Error streaming audio file'}), 500
 
 @podcast_bp.route('/podcasts/<podcast_id>/track', methods=['POST'])
+@rate_limit('track')
 @jwt_required()
 def track_podcast_listen(podcast_id):
     from flask import request
@@ -579,6 +674,19 @@ def track_podcast_listen(podcast_id):
 
     if not isinstance(time_listened, (int, float)) or time_listened < 0:
         return jsonify({'message': 'Invalid time_listened value.'}), 400
+    # Podcasts pending deletion take no new listens; the stored id keys the upsert
+    podcast_id = podcast_or_404('minimal', podcast_id).id
+
+    # With the SQLite write queue enabled the upsert is group-committed by the writer thread
+    write_queue = current_app.extensions.get('sqlite_write_queue')
+    if write_queue is not None:
+        try:
+            outcome = write_queue.submit(_record_listen, user_id, podcast_id, time_listened)
+        except TimeoutError:
+            return _write_queue_busy()
+        if outcome != 'unchanged':
+            invalidate(f'listens:{user_id}')
+        return jsonify({'message': _TRACK_MESSAGES[outcome]}), 201 if outcome == 'created' else 200
 
     try:
         # Attempt to create a new listen record
@@ -590,6 +698,7 @@ def track_podcast_listen(podcast_id):
         )
         db.session.add(listen)
         db.session.commit()
+        invalidate(f'listens:{user_id}')
         return jsonify({'message': 'Listen tracked successfully (new record).'}), 201
 
     except IntegrityError:
@@ -607,24 +716,55 @@ def track_podcast_listen(podcast_id):
             listen.time_listened = int(time_listened)
             listen.tracked_at = datetime.utcnow()  # Update the timestamp
             db.session.commit()
+            invalidate(f'listens:{user_id}')
             return jsonify({'message': 'Listen tracked successfully (updated).'}), 200
         else:
             # The existing record has a longer or equal listen time, so do nothing.
             return jsonify({'message': 'Existing listen time is longer or equal, no update needed.'}), 200
 
+_TRACK_MESSAGES = {
+    'created': 'Listen tracked successfully (new record).',
+    'updated': 'Listen tracked successfully (updated).',
+    'unchanged': 'Existing listen time is longer or equal, no update needed.'
+}
+
+def _record_listen(connection, user_id, podcast_id, time_listened):
+    """Insert or raise a listen record on a Core connection; returns created, updated or unchanged"""
+    listens = PodcastListen.__table__
+    existing = connection.execute(
+        db.select(listens.c.time_listened)
+        .where(listens.c.user_id == user_id, listens.c.podcast_id == podcast_id)
+    ).first()
+    if existing is None:
+        connection.execute(listens.insert().values(
+            user_id=user_id,
+            podcast_id=podcast_id,
+            time_listened=int(time_listened),
+            tracked_at=datetime.utcnow()
+        ))
+        return 'created'
+    if time_listened > existing.time_listened:
+        connection.execute(
+            listens.update()
+            .where(listens.c.user_id == user_id, listens.c.podcast_id == podcast_id)
+            .values(time_listened=int(time_listened), tracked_at=datetime.utcnow())
+        )
+        return 'updated'
+    return 'unchanged'
+
 @podcast_bp.route('/podcasts/<podcast_id>/last-position', methods=['GET'])
+@read_only
 @jwt_required()
 def get_last_listened_position(podcast_id):
     """
     Get the last listened position for a specific podcast.
     Returns the time in seconds where the user last stopped listening.
     """
+    # Check if podcast exists
+    podcast = podcast_or_404('minimal', podcast_id)
     try:
         user_id = get_jwt_identity()
         
-        # Check if podcast exists
-        podcast = Podcast.query.get_or_404(podcast_id)
-        
         # Get the user's listen record for this podcast
         listen_record = PodcastListen.query.filter_by(
             user_id=user_id,
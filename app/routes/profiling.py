@@ -0,0 +1,23 @@
+import hmac
+import os
+import re
+from flask import Blueprint, current_app, jsonify, request, send_from_directory
+
+profiling_bp = Blueprint('profiling', __name__)
+
+_PROFILE_ID = re.compile(r'^[0-9a-f]{32}$')
+
+@profiling_bp.route('/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """A stored profile: the JSON summary, or the raw cProfile stats as <id>.prof"""
+    token = current_app.config['PROFILE_TOKEN']
+    if not token:
+        return jsonify({'message': 'Profiling is disabled'}), 404
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return jsonify({'message': 'Unauthorized'}), 401
+    name, extension = os.path.splitext(profile_id)
+    if not _PROFILE_ID.match(name) or extension not in ('', '.prof'):
+        return jsonify({'message': 'Profile not found'}), 404
+    if extension == '.prof':
+        return send_from_directory(current_app.config['PROFILE_DIR'], profile_id, mimetype='application/octet-stream')
+    return send_from_directory(current_app.config['PROFILE_DIR'], f'{name}.json', mimetype='application/json')
@@ -0,0 +1,100 @@
+"""
+Response schemas for the async read API (app.asgi).
+
+Each model mirrors the dict the Flask endpoints return from the model's
+to_dict(), field for field, so clients get identical JSON from either stack.
+Timestamps stay ISO strings as produced by isoformat().
+"""
+
+from typing import Optional
+from pydantic import BaseModel
+
+class AuthorOut(BaseModel):
+    id: str
+    email: str
+
+class CategoryOut(BaseModel):
+    id: str
+    name: str
+    description: Optional[str] = None
+    slug: str
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
+
+class CategoryList(BaseModel):
+    categories: list[CategoryOut]
+
+class PodcastOut(BaseModel):
+    id: str
+    title: str
+    description: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    audio_url: Optional[str] = None
+    duration: Optional[int] = None
+    author: Optional[AuthorOut] = None
+    categories: list[CategoryOut]
+    likes_count: int
+    slug: str
+    published: Optional[bool] = None
+    published_at: Optional[str] = None
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
+
+    @classmethod
+    def from_model(cls, podcast, static_url, categories):
+        """Same shape as Podcast.to_dict(); `categories` are the podcast's serialised categories"""
+        return cls(
+            id=podcast.id,
+            title=podcast.title,
+            description=podcast.description,
+            thumbnail_url=f'{static_url}/uploads/{podcast.thumbnail_url}' if podcast.thumbnail_url else None,
+            audio_url=f'{static_url}/uploads/{podcast.audio_url}' if podcast.audio_url else None,
+            duration=podcast.duration,
+            author=AuthorOut(id=podcast.author.id, email=podcast.author.email) if podcast.author else None,
+            categories=categories,
+            likes_count=podcast.likes_count,
+            slug=podcast.slug,
+            published=podcast.published,
+            published_at=_isoformat(podcast.published_at),
+            created_at=_isoformat(podcast.created_at),
+            updated_at=_isoformat(podcast.updated_at),
+        )
+
+class PodcastPage(BaseModel):
+    podcasts: list[PodcastOut]
+    total: int
+    pages: int
+    current_page: int
+
+class CommentOut(BaseModel):
+    id: str
+    content: str
+    podcast_id: str
+    user: Optional[AuthorOut] = None
+    parent_id: Optional[str] = None
+    replies_count: int
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
+
+    @classmethod
+    def from_model(cls, comment):
+        """Same shape as Comment.to_dict()"""
+        return cls(
+            id=comment.id,
+            content=comment.content,
+            podcast_id=comment.podcast_id,
+            user=AuthorOut(id=comment.user.id, email=comment.user.email) if comment.user else None,
+            parent_id=comment.parent_id,
+            replies_count=comment.replies_count,
+            created_at=_isoformat(comment.created_at),
+            updated_at=_isoformat(comment.updated_at),
+        )
+
+class CommentPage(BaseModel):
+    comments: list[CommentOut]
+    total: int
+    pages: int
+    current_page: int
+
+def _isoformat(value):
+    return value.isoformat() if value else None
@@ -0,0 +1,114 @@
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import namedtuple
+from sqlalchemy.orm import Session
+from app import db
+from app.models.category import Category
+
+# `variants` holds the body's compressed encodings, filled on first use
+CategorySnapshot = namedtuple('CategorySnapshot', ['version', 'categories', 'by_id', 'body', 'etag', 'built_at', 'variants'])
+
+class VersionFile:
+    """A 64-bit counter in a small memory-mapped file, shared by every worker on the host.
+
+    Reading it is a plain memory access; bumping it takes an fcntl lock.
+    """
+
+    _COUNTER = struct.Struct('<Q')
+
+    def __init__(self, path):
+        import fcntl
+        self._fcntl = fcntl
+        self.path = path
+        self._fd = None
+        self._map = None
+        self._lock = threading.Lock()
+
+    def _open(self):
+        # On first use, so building an app never touches the file
+        with self._lock:
+            if self._map is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+                if os.fstat(fd).st_size < self._COUNTER.size:
+                    os.ftruncate(fd, self._COUNTER.size)
+                self._fd = fd
+                self._map = mmap.mmap(fd, self._COUNTER.size)
+
+    def read(self):
+        if self._map is None:
+            self._open()
+        return self._COUNTER.unpack_from(self._map)[0]
+
+    def bump(self):
+        if self._map is None:
+            self._open()
+        self._fcntl.lockf(self._fd, self._fcntl.LOCK_EX)
+        try:
+            version = self.read() + 1
+            self._COUNTER.pack_into(self._map, 0, version)
+        finally:
+            self._fcntl.lockf(self._fd, self._fcntl.LOCK_UN)
+        return version
+
+class CategoryCache:
+    """Immutable, versioned snapshot of the category table with its JSON body pre-serialised.
+
+    A process rebuilds its snapshot only when the shared version differs from
+    the one it was built at, so a write in any worker is picked up by all of
+    them on their next read. Snapshots older than `max_age` seconds are
+    rebuilt too, which bounds staleness for edits made outside this host.
+    Snapshot dicts are shared; treat them as read-only.
+    """
+
+    def __init__(self, app, version_file, max_age=300):
+        self.app = app
+        self.version_file = version_file
+        self.max_age = max_age
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def current(self):
+        """The snapshot if it is still current, else None; never queries, so it is safe on an event loop"""
+        snapshot = self._snapshot
+        return snapshot if self._is_current(snapshot, self.version_file.read()) else None
+
+    def snapshot(self):
+        snapshot = self._snapshot
+        version = self.version_file.read()
+        if self._is_current(snapshot, version):
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if not self._is_current(snapshot, version):
+                snapshot = self._build(version)
+                self._snapshot = snapshot
+        return snapshot
+
+    def _is_current(self, snapshot, version):
+        return snapshot is not None and snapshot.version == version \
+            and time.monotonic() - snapshot.built_at < self.max_age
+
+    def invalidate(self):
+        """Call after committing a category change"""
+        self.version_file.bump()
+
+    def _build(self, version):
+        # Always read the primary, so a snapshot is never built from a lagging replica
+        with Session(db.engine) as session:
+            rows = session.scalars(db.select(Category).order_by(Category.created_at, Category.id)).all()
+            items = tuple(category.to_dict() for category in rows)
+        body = (self.app.json.dumps({'categories': list(items)}) + '\n').encode()
+        etag = hashlib.sha1(body).hexdigest()
+        by_id = {item['id']: item for item in items}
+        return CategorySnapshot(version, items, by_id, body, etag, time.monotonic(), {})
+
+def init_category_cache(app):
+    version_file = VersionFile(app.config['CATEGORY_CACHE_VERSION_PATH'])
+    cache = CategoryCache(app, version_file, max_age=app.config['CATEGORY_CACHE_MAX_AGE'])
+    app.extensions['category_cache'] = cache
+    return cache
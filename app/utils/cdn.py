@@ -0,0 +1,174 @@
+"""
+CDN integration: surrogate keys on cacheable responses and batched purges.
+
+Views name what a response was built from with surrogate_keys():
+`podcast:<id>`, `category:<id>`, `author:<id>`, `file:<path>` for uploaded
+media, and the collection keys `catalog`, `ranking` and `categories`. Public
+responses carry them in Surrogate-Key (space separated, Fastly and most
+CDNs) and Cache-Tag (comma separated, Cloudflare). With CDN_EDGE_MAX_AGE set
+they also get Surrogate-Control and CDN-Cache-Control lifetimes, which only
+the edge honours; browsers keep revalidating.
+
+Write paths call purge() with the keys they changed after committing. The
+PurgeDispatcher gathers keys for CDN_PURGE_DELAY seconds, so a burst of
+writes becomes one call, and posts them CDN_PURGE_BATCH_SIZE at a time to
+CDN_PURGE_URL from a background thread, retrying with backoff while the
+endpoint fails.
+"""
+
+import atexit
+import itertools
+import json
+import os
+import threading
+import time
+import urllib.request
+from flask import current_app, g, request
+from app.utils.email_outbox import retry_delay
+
+# Request body key and auth header for each purge API
+PURGE_FORMATS = {
+    'fastly': ('surrogate_keys', lambda token: {'Fastly-Key': token}),
+    'cloudflare': ('tags', lambda token: {'Authorization': f'Bearer {token}'}),
+}
+
+class PurgeDispatcher:
+    """Sends purge requests for surrogate keys in deduplicated batches, off the request thread"""
+
+    retry_base = 1
+    retry_max = 60
+
+    def __init__(self, app):
+        self.app = app
+        self.url = app.config['CDN_PURGE_URL']
+        self.token = app.config['CDN_PURGE_TOKEN']
+        self.body_key, self.auth_headers = PURGE_FORMATS[app.config['CDN_PURGE_FORMAT']]
+        self.batch_size = app.config['CDN_PURGE_BATCH_SIZE']
+        self.delay = app.config['CDN_PURGE_DELAY']
+        self.timeout = app.config['CDN_PURGE_TIMEOUT']
+        # Insertion-ordered set of keys waiting to be sent
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def submit(self, keys):
+        with self._lock:
+            self._pending.update(dict.fromkeys(keys))
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                # First use, or a worker forked from a process that had started the thread
+                self._thread = threading.Thread(target=self._run, name='cdn-purge', daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+        self._wakeup.set()
+
+    def _run(self):
+        failures = 0
+        while True:
+            self._wakeup.wait()
+            # Let the rest of a burst of writes join this batch
+            time.sleep(self.delay)
+            self._wakeup.clear()
+            try:
+                self.drain()
+                failures = 0
+            except Exception as e:
+                failures += 1
+                delay = retry_delay(failures, self.retry_base, self.retry_max)
+                self.app.logger.warning('CDN purge failed (attempt %s), retrying in %ss: %s', failures, delay, e)
+                time.sleep(delay)
+                self._wakeup.set()
+
+    def drain(self):
+        """Send every pending key now, one batch at a time; unsent keys stay pending on failure"""
+        while True:
+            with self._lock:
+                batch = list(itertools.islice(self._pending, self.batch_size))
+                for key in batch:
+                    del self._pending[key]
+            if not batch:
+                return
+            try:
+                self.send(batch)
+            except Exception:
+                with self._lock:
+                    self._pending.update(dict.fromkeys(batch))
+                raise
+
+    def send(self, keys):
+        headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+        if self.token:
+            headers.update(self.auth_headers(self.token))
+        body = json.dumps({self.body_key: keys}).encode()
+        purge_request = urllib.request.Request(self.url, data=body, headers=headers, method='POST')
+        # Any status of 400 or above raises HTTPError
+        with urllib.request.urlopen(purge_request, timeout=self.timeout) as response:
+            response.read()
+
+    def flush(self):
+        """Send what is still pending; registered to run at interpreter exit"""
+        try:
+            self.drain()
+        except Exception as e:
+            self.app.logger.warning('CDN purge at exit failed, %s keys not purged: %s', len(self._pending), e)
+
+class CDN:
+    def __init__(self, app, dispatcher=None):
+        self.edge_max_age = app.config['CDN_EDGE_MAX_AGE']
+        self.dispatcher = dispatcher
+
+    def headers(self, keys):
+        """Response headers naming `keys`, plus the edge lifetime when one is configured"""
+        keys = list(dict.fromkeys(keys))
+        headers = {'Surrogate-Key': ' '.join(keys), 'Cache-Tag': ','.join(keys)}
+        if self.edge_max_age:
+            headers['Surrogate-Control'] = f'max-age={self.edge_max_age}'
+            headers['CDN-Cache-Control'] = f'public, max-age={self.edge_max_age}'
+        return headers
+
+def wants_surrogate_keys():
+    return 'cdn' in current_app.extensions
+
+def surrogate_keys(*keys):
+    """Name what this request's response was built from; sent only if the response is public"""
+    if 'cdn' not in current_app.extensions:
+        return
+    pending = g.get('_surrogate_keys')
+    if pending is None:
+        pending = g._surrogate_keys = {}
+    pending.update(dict.fromkeys(keys))
+
+def purge(*keys):
+    """Purge edge copies built from any of `keys`; call after committing the write"""
+    cdn = current_app.extensions.get('cdn')
+    if cdn is not None and cdn.dispatcher is not None and keys:
+        cdn.dispatcher.submit(keys)
+
+def _apply_surrogate_keys(response):
+    if request.endpoint == 'static':
+        # Uploaded media under /uploads/, named by its stored path
+        surrogate_keys(f"file:{request.view_args['filename']}")
+    keys = g.pop('_surrogate_keys', None)
+    if not keys:
+        return response
+    if not (200 <= response.status_code < 300 or response.status_code == 304):
+        return response
+    # Private and uncacheable responses never reach the edge cache
+    if not response.cache_control.public:
+        return response
+    response.headers.update(current_app.extensions['cdn'].headers(keys))
+    return response
+
+def init_cdn(app):
+    """Surrogate keys on public responses, and purges when CDN_PURGE_URL is set. Register before init_conditional."""
+    if not app.config['CDN_SURROGATE_KEYS']:
+        return None
+    dispatcher = None
+    if app.config['CDN_PURGE_URL']:
+        dispatcher = PurgeDispatcher(app)
+        atexit.register(dispatcher.flush)
+    cdn = CDN(app, dispatcher)
+    app.extensions['cdn'] = cdn
+    app.after_request(_apply_surrogate_keys)
+    return cdn
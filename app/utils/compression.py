@@ -0,0 +1,253 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from flask import current_app, request
+
+# Content types worth compressing; audio and images are already compressed
+COMPRESSIBLE_TYPES = {
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+}
+
+def _gzip(level):
+    return lambda data: gzip.compress(data, compresslevel=level, mtime=0)
+
+def available_codecs(gzip_level=6, brotli_quality=5, zstd_level=3):
+    """encoding -> compress(bytes) for gzip and whichever of brotli and zstandard are installed"""
+    codecs = {'gzip': _gzip(gzip_level)}
+    try:
+        import brotli
+        codecs['br'] = lambda data: brotli.compress(data, quality=brotli_quality)
+    except ImportError:
+        pass
+    try:
+        import zstandard
+        # A ZstdCompressor must not be shared between threads; a fresh one per body is cheap
+        codecs['zstd'] = lambda data: zstandard.ZstdCompressor(level=zstd_level).compress(data)
+    except ImportError:
+        pass
+    return codecs
+
+def negotiate(accept_encoding, preference):
+    """The first encoding in `preference` with the client's highest q-value, or None for identity"""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name] = quality
+    best, best_quality = None, 0.0
+    for encoding in preference:
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+def is_compressible(mimetype):
+    return bool(mimetype) and (mimetype.startswith('text/') or mimetype in COMPRESSIBLE_TYPES)
+
+def no_compression(f):
+    """Never compress this view's responses (audio, ranges). Place it directly under the route decorator."""
+    f._no_compression = True
+    return f
+
+def precompressed(f):
+    """Keep this view's compressed bodies, so a payload served again is not compressed again"""
+    f._precompressed = True
+    return f
+
+class Compressor:
+    """Compresses response bodies and remembers the results for repeated payloads.
+
+    Bodies marked precompressed are kept in an LRU keyed by encoding and body
+    digest, bounded by `cache_bytes` of compressed data. `variant` stores the
+    compressed bytes on a caller's own cache entry instead.
+    """
+
+    def __init__(self, codecs, preference, min_size=500, cache_bytes=16 * 1024 * 1024):
+        self.codecs = codecs
+        self.preference = [encoding for encoding in preference if encoding in codecs]
+        self.min_size = min_size
+        self.cache_bytes = cache_bytes
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+
+    def negotiate(self, accept_encoding):
+        return negotiate(accept_encoding, self.preference)
+
+    def compress(self, body, encoding):
+        return self.codecs[encoding](body)
+
+    def cached(self, body, encoding):
+        """compress() through the digest-keyed LRU"""
+        key = (encoding, hashlib.sha1(body).digest())
+        with self._lock:
+            compressed = self._cache.get(key)
+            if compressed is not None:
+                self._cache.move_to_end(key)
+                return compressed
+        compressed = self.compress(body, encoding)
+        if len(compressed) > self.cache_bytes:
+            return compressed
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = compressed
+                self._cached_bytes += len(compressed)
+                while self._cached_bytes > self.cache_bytes:
+                    _, evicted = self._cache.popitem(last=False)
+                    self._cached_bytes -= len(evicted)
+        return compressed
+
+    def variant(self, variants, body, encoding):
+        """Compressed `body` memoised in `variants`, a dict stored alongside the caller's cache entry"""
+        compressed = variants.get(encoding)
+        if compressed is None:
+            compressed = variants[encoding] = self.compress(body, encoding)
+        return compressed
+
+    def choose(self, accept_encoding, body):
+        """The encoding to use for `body`, or None when it is too small or the client accepts none"""
+        if len(body) < self.min_size:
+            return None
+        return self.negotiate(accept_encoding)
+
+def negotiated_response(body, variants, mimetype='application/json'):
+    """A response for a cached body in the request's encoding, compressed variants memoised in `variants`"""
+    compressor = current_app.extensions.get('compressor')
+    encoding = compressor.choose(request.headers.get('Accept-Encoding'), body) if compressor else None
+    if encoding is None:
+        response = current_app.response_class(body, mimetype=mimetype)
+    else:
+        response = current_app.response_class(compressor.variant(variants, body, encoding), mimetype=mimetype)
+        response.headers['Content-Encoding'] = encoding
+    if compressor is not None:
+        response.vary.add('Accept-Encoding')
+    return response
+
+def _eligible(response):
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    if response.direct_passthrough or response.is_streamed:
+        return False
+    if 'Content-Encoding' in response.headers or 'Content-Range' in response.headers:
+        return False
+    if 'no-transform' in response.headers.get('Cache-Control', ''):
+        return False
+    return is_compressible(response.mimetype)
+
+def _compress_response(response):
+    view = current_app.view_functions.get(request.endpoint)
+    if view is not None and getattr(view, '_no_compression', False):
+        return response
+    if not _eligible(response):
+        return response
+    response.vary.add('Accept-Encoding')
+    compressor = current_app.extensions['compressor']
+    body = response.get_data()
+    encoding = compressor.choose(request.headers.get('Accept-Encoding'), body)
+    if encoding is None:
+        return response
+    if view is not None and getattr(view, '_precompressed', False):
+        compressed = compressor.cached(body, encoding)
+    else:
+        compressed = compressor.compress(body, encoding)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    # The compressed bytes differ from the identity ones, so a strong validator no longer holds
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+class ASGICompressionMiddleware:
+    """The same rules for an ASGI app.
+
+    Single-message bodies are compressed; streamed bodies and responses that
+    already carry a Content-Encoding (such as Flask's, mounted behind FastAPI)
+    pass through untouched.
+    """
+
+    def __init__(self, app, compressor):
+        self.app = app
+        self.compressor = compressor
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = None
+        for name, value in scope['headers']:
+            if name == b'accept-encoding':
+                accept_encoding = value.decode('latin-1')
+        start = None
+
+        async def wrapped_send(message):
+            nonlocal start
+            if message['type'] == 'http.response.start':
+                headers = {name.lower(): value for name, value in message.get('headers', [])}
+                mimetype = headers.get(b'content-type', b'').split(b';')[0].strip().decode('latin-1')
+                endpoint = scope.get('endpoint')
+                if 200 <= message['status'] and message['status'] not in (204, 206, 304) \
+                        and b'content-encoding' not in headers and b'content-range' not in headers \
+                        and is_compressible(mimetype) and not getattr(endpoint, '_no_compression', False):
+                    start = message
+                    return
+                await send(message)
+                return
+            if start is None:
+                await send(message)
+                return
+            pending, start = start, None
+            if message.get('more_body', False):
+                # Streamed: not worth buffering
+                await send(pending)
+                await send(message)
+                return
+            body = message.get('body', b'')
+            encoding = self.compressor.choose(accept_encoding, body)
+            headers = [(name, value) for name, value in pending.get('headers', [])
+                       if name.lower() not in (b'content-length', b'vary', b'etag')]
+            vary = [value for name, value in pending.get('headers', []) if name.lower() == b'vary']
+            headers.append((b'vary', b', '.join(vary + [b'Accept-Encoding'])))
+            etag = next((value for name, value in pending.get('headers', []) if name.lower() == b'etag'), None)
+            if encoding is not None:
+                if getattr(scope.get('endpoint'), '_precompressed', False):
+                    body = self.compressor.cached(body, encoding)
+                else:
+                    body = self.compressor.compress(body, encoding)
+                headers.append((b'content-encoding', encoding.encode()))
+                if etag is not None and not etag.startswith(b'W/'):
+                    etag = b'W/' + etag
+            if etag is not None:
+                headers.append((b'etag', etag))
+            headers.append((b'content-length', str(len(body)).encode()))
+            await send({**pending, 'headers': headers})
+            await send({'type': 'http.response.body', 'body': body})
+
+        await self.app(scope, receive, wrapped_send)
+
+def create_compressor(app):
+    codecs = available_codecs(app.config['COMPRESS_GZIP_LEVEL'], app.config['COMPRESS_BROTLI_QUALITY'],
+                              app.config['COMPRESS_ZSTD_LEVEL'])
+    return Compressor(codecs, app.config['COMPRESS_ENCODINGS'], min_size=app.config['COMPRESS_MIN_SIZE'],
+                      cache_bytes=app.config['COMPRESS_CACHE_BYTES'])
+
+def init_compression(app):
+    """Compress eligible responses by Accept-Encoding; nothing is hooked when COMPRESS_ENABLED is off"""
+    if not app.config['COMPRESS_ENABLED']:
+        return
+    app.extensions['compressor'] = create_compressor(app)
+    app.after_request(_compress_response)
@@ -0,0 +1,105 @@
+"""
+Conditional GETs: weak ETags and Last-Modified without building the body.
+
+A view computes its validators from what it has already loaded (or from one
+small validator query), asks not_modified() for a 304 before calling
+to_dict()/jsonify, and otherwise attaches the same validators to the full
+response with validated(). ETags are weak: they identify the data a
+representation was built from, not its bytes, so they hold across gzip and
+identity encodings.
+
+Cache-Control is declared per view with @cache_control and set on its 2xx and
+304 responses.
+"""
+
+import hashlib
+from datetime import UTC
+from flask import current_app, request
+from sqlalchemy import func, select
+from app.models.comment import Comment
+from app.models.loading import podcast_visible
+from app.models.podcast import Podcast
+
+# Shared policies: clients and proxies may keep a copy but revalidate before every reuse
+PUBLIC_REVALIDATE = 'public, no-cache'
+PRIVATE_REVALIDATE = 'private, no-cache'
+# Rarely changing data: reused for a minute without asking
+PUBLIC_SHORT = 'public, max-age=60'
+
+def etag_for(*parts):
+    """Opaque ETag value for a representation built from `parts` (values with a stable repr)"""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+def podcast_fingerprint(podcast, categories_etag):
+    """What Podcast.to_dict() depends on, read from a card or detail load without serialising it"""
+    return (
+        podcast.id,
+        podcast.updated_at,
+        podcast.likes_count,
+        podcast.author.email if podcast.author else None,
+        tuple(category.id for category in podcast.categories),
+        # Category names and descriptions come from the snapshot
+        categories_etag,
+    )
+
+def comments_validator(podcast_id):
+    """One row (id, comments, latest) for an existing podcast, none for a missing one or one pending deletion.
+
+    Every new comment or reply moves `latest` and every deletion (with its
+    cascaded replies) moves `comments`, so the pair versions the listing and
+    each comment's replies_count; both are answered from
+    ix_comments_podcast_id_created_at.
+    """
+    return select(
+        Podcast.id,
+        select(func.count()).where(Comment.podcast_id == Podcast.id).correlate(Podcast).scalar_subquery().label('comments'),
+        select(func.max(Comment.created_at)).where(Comment.podcast_id == Podcast.id).correlate(Podcast).scalar_subquery().label('latest'),
+    ).where(Podcast.id == podcast_id, podcast_visible())
+
+def _utc(value):
+    return value.replace(tzinfo=UTC, microsecond=0) if value.tzinfo is None else value.replace(microsecond=0)
+
+def not_modified(etag=None, last_modified=None):
+    """A 304 response when the request's validators match, else None. Call it before serialising.
+
+    If-None-Match takes precedence over If-Modified-Since, as in RFC 9110.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    if request.if_none_match:
+        matched = etag is not None and request.if_none_match.contains_weak(etag)
+    else:
+        matched = last_modified is not None and request.if_modified_since is not None \
+            and _utc(last_modified) <= request.if_modified_since
+    if not matched:
+        return None
+    return validated(current_app.response_class(status=304), etag, last_modified)
+
+def validated(response, etag=None, last_modified=None):
+    """Attach the validators to a response"""
+    if etag is not None:
+        response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = _utc(last_modified)
+    return response
+
+def cache_control(policy):
+    """Cache-Control for this view's successful and 304 responses. Place it directly under the route decorator."""
+    def decorator(f):
+        f._cache_control = policy
+        return f
+    return decorator
+
+def _apply_cache_control(response):
+    if request.method not in ('GET', 'HEAD') or 'Cache-Control' in response.headers:
+        return response
+    if not (200 <= response.status_code < 300 or response.status_code == 304):
+        return response
+    view = current_app.view_functions.get(request.endpoint)
+    policy = getattr(view, '_cache_control', None)
+    if policy:
+        response.headers['Cache-Control'] = policy
+    return response
+
+def init_conditional(app):
+    app.after_request(_apply_cache_control)
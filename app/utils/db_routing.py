@@ -0,0 +1,167 @@
+import itertools
+import math
+import threading
+import time
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from itsdangerous import BadData, URLSafeTimedSerializer
+from sqlalchemy import text
+
+# Used when SQLALCHEMY_REPLICA_LAG_QUERY is not set; returns replay lag in seconds
+_POSTGRES_LAG_QUERY = (
+    'SELECT CASE WHEN pg_is_in_recovery() '
+    'THEN COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) '
+    'ELSE 0 END'
+)
+
+# Set on clients that just wrote; while it is valid their reads go to the primary
+STICKY_COOKIE = 'db_primary'
+
+def read_only(f):
+    """Mark a view as safe to serve from a read replica. Place it directly under the route decorator."""
+    f._db_read_only = True
+    return f
+
+class RoutingSession(Session):
+    """Session that sends reads of read_only views to a healthy replica bind.
+
+    A request reads from one replica throughout, so its statements see a
+    single point in time. Everything else goes to the primary: flushes, bulk
+    INSERT/UPDATE/DELETE, SELECT ... FOR UPDATE, any read after the request
+    has written, and every request from a client that wrote within the sticky
+    window.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            if self._flushing or _is_write(clause):
+                g.db_wrote = True
+            elif g.get('db_read_only') and not g.get('db_wrote'):
+                if 'db_replica' not in g:
+                    g.db_replica = current_app.extensions['db_router'].pick()
+                if g.db_replica is not None:
+                    return g.db_replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def _is_write(clause):
+    if clause is None:
+        return False
+    return getattr(clause, 'is_dml', False) or getattr(clause, '_for_update_arg', None) is not None
+
+class ReplicaState:
+    def __init__(self, key):
+        self.key = key
+        self.healthy = True
+        self.lag = 0.0
+        self.error = None
+        self.checked_at = 0.0
+
+    def to_dict(self):
+        return {
+            'bind': self.key,
+            'healthy': self.healthy,
+            'lag_seconds': self.lag,
+            'error': self.error
+        }
+
+class ReplicaRouter:
+    """Chooses replica engines round-robin, skipping replicas that are down or lagging.
+
+    Replica health is re-checked lazily, at most every `check_interval`
+    seconds, by whichever request finds it stale. Stickiness travels with the
+    client in a signed, timestamped cookie, so every worker honours it.
+    """
+
+    def __init__(self, app, db, keys):
+        self.db = db
+        self.app = app
+        self.keys = keys
+        self.max_lag = app.config['SQLALCHEMY_REPLICA_MAX_LAG']
+        self.sticky_seconds = app.config['SQLALCHEMY_REPLICA_STICKY_SECONDS']
+        self.check_interval = app.config['SQLALCHEMY_REPLICA_CHECK_INTERVAL']
+        self.lag_query = app.config.get('SQLALCHEMY_REPLICA_LAG_QUERY')
+        self.states = {key: ReplicaState(key) for key in keys}
+        self._cycle = itertools.cycle(keys) if keys else None
+        self._check_lock = threading.Lock()
+        self._signer = URLSafeTimedSerializer(app.secret_key, salt='db-routing-sticky')
+
+    def pick(self):
+        if not self.keys:
+            return None
+        self._refresh_stale()
+        for _ in range(len(self.keys)):
+            key = next(self._cycle)
+            state = self.states[key]
+            if state.healthy and state.lag <= self.max_lag:
+                return self.db.engines[key]
+        return None
+
+    def _refresh_stale(self):
+        now = time.monotonic()
+        stale = [state for state in self.states.values() if now - state.checked_at >= self.check_interval]
+        if stale and self._check_lock.acquire(blocking=False):
+            try:
+                for state in stale:
+                    self.check(state)
+            finally:
+                self._check_lock.release()
+
+    def check(self, state):
+        engine = self.db.engines[state.key]
+        try:
+            with engine.connect() as connection:
+                if self.lag_query:
+                    lag = connection.execute(text(self.lag_query)).scalar()
+                elif engine.dialect.name == 'postgresql':
+                    lag = connection.execute(text(_POSTGRES_LAG_QUERY)).scalar()
+                else:
+                    connection.execute(text('SELECT 1'))
+                    lag = 0
+            state.healthy = True
+            state.lag = float(lag or 0)
+            state.error = None
+        except Exception as e:
+            state.healthy = False
+            state.error = str(e)
+        state.checked_at = time.monotonic()
+        return state
+
+    def health(self):
+        """Check every replica now and report their state"""
+        with self._check_lock:
+            return [self.check(state).to_dict() for state in self.states.values()]
+
+    def stick(self, response):
+        """Send this client's reads to the primary for the next `sticky_seconds`"""
+        response.set_cookie(STICKY_COOKIE, self._signer.dumps(1), max_age=math.ceil(self.sticky_seconds),
+                            httponly=True, samesite='Lax')
+
+    def is_sticky(self, token):
+        """Whether a sticky cookie value is genuine and still within the window"""
+        if not token:
+            return False
+        try:
+            self._signer.loads(token, max_age=self.sticky_seconds)
+        except BadData:
+            return False
+        return True
+
+def _start_routing():
+    router = current_app.extensions['db_router']
+    view = current_app.view_functions.get(request.endpoint)
+    if view is not None and getattr(view, '_db_read_only', False) and router.keys:
+        g.db_read_only = not router.is_sticky(request.cookies.get(STICKY_COOKIE))
+
+def _finish_routing(response):
+    if g.get('db_wrote'):
+        current_app.extensions['db_router'].stick(response)
+    return response
+
+def init_db_routing(app, db):
+    keys = app.config['SQLALCHEMY_REPLICA_BINDS']
+    router = ReplicaRouter(app, db, keys)
+    app.extensions['db_router'] = router
+    if keys:
+        app.before_request(_start_routing)
+        app.after_request(_finish_routing)
+    return router
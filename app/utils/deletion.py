@@ -0,0 +1,288 @@
+import os
+import queue
+import threading
+from datetime import datetime
+from flask import current_app
+from app import db
+from app.models.comment import Comment
+from app.models.podcast import Podcast, podcast_categories, podcast_likes
+from app.models.podcast_listen import PodcastListen
+from app.models.user import User
+from app.utils.file_handlers import delete_file
+from app.utils.cdn import purge
+from app.utils.response_cache import invalidate
+
+def _delete_batched(table, condition, batch_size):
+    """Delete matching rows `batch_size` at a time, committing after each batch so no lock is held for long"""
+    total = 0
+    while True:
+        ids = db.session.execute(db.select(table.c.id).where(condition).limit(batch_size)).scalars().all()
+        if not ids:
+            return total
+        db.session.execute(table.delete().where(table.c.id.in_(ids)))
+        db.session.commit()
+        total += len(ids)
+
+def delete_podcasts(podcast_ids, batch_size=1000):
+    """Delete podcasts and everything that references them with set-based DELETEs.
+
+    Listens and comments go in committed batches; likes, category links and
+    the podcast rows go in one final short transaction. Returns the stored
+    file paths (relative to UPLOAD_FOLDER) for the file reaper.
+    """
+    if not podcast_ids:
+        return []
+    podcasts = Podcast.__table__
+    files = []
+    for thumbnail_url, audio_url in db.session.execute(
+            db.select(podcasts.c.thumbnail_url, podcasts.c.audio_url).where(podcasts.c.id.in_(podcast_ids))):
+        files.extend(path for path in (thumbnail_url, audio_url) if path)
+
+    listens = PodcastListen.__table__
+    comments = Comment.__table__
+    _delete_batched(listens, listens.c.podcast_id.in_(podcast_ids), batch_size)
+    # Replies share their parent's podcast_id, so this removes whole threads
+    _delete_batched(comments, comments.c.podcast_id.in_(podcast_ids), batch_size)
+
+    db.session.execute(podcast_likes.delete().where(podcast_likes.c.podcast_id.in_(podcast_ids)))
+    db.session.execute(podcast_categories.delete().where(podcast_categories.c.podcast_id.in_(podcast_ids)))
+    db.session.execute(podcasts.delete().where(podcasts.c.id.in_(podcast_ids)))
+    db.session.commit()
+    invalidate('catalog', 'ranking', *(f'podcast:{podcast_id}' for podcast_id in podcast_ids))
+    purge(*(f'file:{path}' for path in files))
+    return files
+
+def delete_author(user_id, batch_size=1000, podcasts_per_batch=50, reaper=None):
+    """Delete a user account, every podcast it authored and all of its activity.
+
+    Podcasts go `podcasts_per_batch` at a time and their files are handed to
+    the reaper as soon as each batch commits. Safe to re-run if interrupted.
+    """
+    podcasts = Podcast.__table__
+    while True:
+        podcast_ids = db.session.execute(
+            db.select(podcasts.c.id).where(podcasts.c.author_id == user_id).limit(podcasts_per_batch)
+        ).scalars().all()
+        if not podcast_ids:
+            break
+        files = delete_podcasts(podcast_ids, batch_size)
+        if reaper is not None:
+            reaper.submit(files)
+
+    listens = PodcastListen.__table__
+    comments = Comment.__table__
+    # Podcasts whose likes or comments this user's activity shows up in
+    touched = set(db.session.execute(
+        db.select(podcast_likes.c.podcast_id).where(podcast_likes.c.user_id == user_id)
+        .union(db.select(comments.c.podcast_id).where(comments.c.user_id == user_id))
+    ).scalars())
+    _delete_batched(listens, listens.c.user_id == user_id, batch_size)
+    # Replies by other users to these comments are removed by the ON DELETE CASCADE on parent_id
+    _delete_batched(comments, comments.c.user_id == user_id, batch_size)
+    db.session.execute(podcast_likes.delete().where(podcast_likes.c.user_id == user_id))
+    db.session.execute(User.__table__.delete().where(User.__table__.c.id == user_id))
+    db.session.commit()
+    invalidate('ranking', f'author:{user_id}', f'listens:{user_id}', *(f'podcast:{podcast_id}' for podcast_id in touched))
+
+class _Worker:
+    """A daemon thread consuming a queue, started on first use and again after a fork"""
+
+    name = 'worker'
+
+    def __init__(self, app):
+        self.app = app
+        self._items = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._resumed = threading.Event()
+
+    def start(self):
+        """Run the thread in this process; a new thread first picks up what resume() finds"""
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                self._items = queue.Queue()
+                self._resumed = threading.Event()
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+
+    def submit(self, item):
+        self.start()
+        self._items.put(item)
+
+    def join(self):
+        """Block until everything submitted so far has been handled"""
+        if self._thread is not None and self._pid == os.getpid():
+            self._resumed.wait()
+            self._items.join()
+
+    def resume(self):
+        """Items left over from before this thread started; none by default"""
+        return []
+
+    def _run(self):
+        items = self._items
+        try:
+            for item in self.resume():
+                items.put(item)
+        except Exception as e:
+            self.app.logger.exception('%s could not resume: %s', self.name, e)
+        self._resumed.set()
+        while True:
+            item = items.get()
+            try:
+                self.handle(item)
+            except Exception as e:
+                self.app.logger.exception('%s failed on %r: %s', self.name, item, e)
+            finally:
+                items.task_done()
+
+    def handle(self, item):
+        raise NotImplementedError
+
+class FileReaper(_Worker):
+    """Removes uploaded files of deleted podcasts outside the request"""
+
+    name = 'file-reaper'
+
+    def submit(self, paths):
+        if paths:
+            super().submit(list(paths))
+
+    def handle(self, paths):
+        upload_folder = os.path.realpath(self.app.config['UPLOAD_FOLDER'])
+        for path in paths:
+            full_path = os.path.realpath(os.path.join(upload_folder, path))
+            # Stored paths are relative to the upload folder; never follow one outside it
+            if os.path.commonpath([upload_folder, full_path]) != upload_folder:
+                continue
+            try:
+                delete_file(full_path)
+            except OSError as e:
+                self.app.logger.warning('Could not remove %s: %s', full_path, e)
+
+class _PendingDeleter(_Worker):
+    """Deletes rows whose deletion_requested_at is set; resumes the ones a previous process left"""
+
+    model = None
+
+    def __init__(self, app, reaper):
+        super().__init__(app)
+        self.reaper = reaper
+
+    def request(self, id):
+        """Stamp the row for deletion in the caller's session and return the cache tags it hides.
+
+        Commit, invalidate the tags, then submit(id).
+        """
+        table = self.model.__table__
+        db.session.execute(
+            table.update()
+            .where(table.c.id == id, table.c.deletion_requested_at.is_(None))
+            .values(deletion_requested_at=datetime.utcnow())
+        )
+        return []
+
+    def resume(self):
+        table = self.model.__table__
+        with self.app.app_context():
+            try:
+                return db.session.execute(
+                    db.select(table.c.id).where(table.c.deletion_requested_at.isnot(None))
+                    .order_by(table.c.deletion_requested_at)
+                ).scalars().all()
+            finally:
+                db.session.remove()
+
+    def handle(self, id):
+        with self.app.app_context():
+            try:
+                self.delete(id)
+            finally:
+                db.session.remove()
+
+    def delete(self, id):
+        raise NotImplementedError
+
+class AccountDeleter(_PendingDeleter):
+    """Runs author account deletions in the background"""
+
+    name = 'account-deleter'
+    model = User
+
+    def request(self, user_id):
+        # Stamping the account's podcasts hides them everywhere podcasts pending deletion are hidden
+        podcasts = Podcast.__table__
+        pending = podcasts.c.author_id == user_id, podcasts.c.deletion_requested_at.is_(None)
+        podcast_ids = db.session.execute(db.select(podcasts.c.id).where(*pending)).scalars().all()
+        db.session.execute(podcasts.update().where(*pending).values(deletion_requested_at=datetime.utcnow()))
+        return super().request(user_id) + ['catalog', 'ranking', f'author:{user_id}',
+                                           *(f'podcast:{podcast_id}' for podcast_id in podcast_ids)]
+
+    def delete(self, user_id):
+        delete_author(user_id, batch_size=self.app.config['DELETE_BATCH_SIZE'], reaper=self.reaper)
+
+class PodcastDeleter(_PendingDeleter):
+    """Runs podcast deletions in the background"""
+
+    name = 'podcast-deleter'
+    model = Podcast
+
+    def request(self, podcast_id):
+        return super().request(podcast_id) + ['catalog', 'ranking', f'podcast:{podcast_id}']
+
+    def delete(self, podcast_id):
+        self.reaper.submit(delete_podcasts([podcast_id], self.app.config['DELETE_BATCH_SIZE']))
+
+class Deletion:
+    """Deletions that run in the background and survive a restart.
+
+    The request stamps deletion_requested_at and commits before the id is
+    queued, so a process that dies mid-way leaves the row stamped; each
+    process's deleters queue every stamped row again when they start. The
+    deletes are idempotent, so a deletion resumed by two workers at once only
+    repeats some of them.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.reaper = FileReaper(app)
+        self.accounts = AccountDeleter(app, self.reaper)
+        self.podcasts = PodcastDeleter(app, self.reaper)
+
+    def delete_podcast(self, podcast_id):
+        """Queue a podcast for deletion and return immediately; its files follow once its rows are gone"""
+        tags = self.podcasts.request(podcast_id)
+        db.session.commit()
+        # Gone from listings, detail pages and streams from now on, here and at the edge
+        invalidate(*tags)
+        self.podcasts.submit(podcast_id)
+
+    def delete_account(self, user_id):
+        """Queue an account for deletion and return immediately"""
+        tags = self.accounts.request(user_id)
+        db.session.commit()
+        invalidate(*tags)
+        self.accounts.submit(user_id)
+
+    def resume(self):
+        """Start the deleters in this process, which queue the deletions still pending"""
+        self.accounts.start()
+        self.podcasts.start()
+
+    def join(self):
+        self.podcasts.join()
+        self.accounts.join()
+
+def _resume_deletions():
+    current_app.extensions['deletion'].resume()
+
+def init_deletion(app):
+    """Create the deleters; each process resumes pending deletions on its first request"""
+    deletion = Deletion(app)
+    app.extensions['deletion'] = deletion
+    app.before_request(_resume_deletions)
+    return deletion
@@ -1,11 +1,13 @@
-from app import mail, db
-from flask_mail import Message
+from app import db
+from app.models.email_outbox import EmailOutbox
 from datetime import datetime, timedelta, UTC
+from functools import lru_cache
+from string import Template
 import secrets
 
-def _get_email_template(template_name, **kwargs):
-    """Get HTML email template with common styling"""
-    base_style = """
+EMAIL_SENDER = 'noreply@podcastapp.com'
+
+_BASE_STYLE = """
     <style>
         body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; margin: 0; padding: 0; }
         .container { max-width: 600px; margin: 0 auto; padding: 20px; }
@@ -17,16 +19,33 @@ def _get_email_template(template_name, **kwargs):
         .warning { background: #fff3cd; border: 1px solid #ffeaa7; padding: 15px; border-radius: 5px; margin: 20px 0; }
     </style>
     """
-    
+
+# Values used when a placeholder is not passed to _get_email_template
+_TEMPLATE_DEFAULTS = {'otp': '', 'reset_url': '', 'email': 'there', 'app_url': ''}
+
+def _get_email_template(template_name, **kwargs):
+    """Get HTML email template with common styling"""
+    return _compile_template(template_name).safe_substitute(_TEMPLATE_DEFAULTS, **kwargs)
+
+@lru_cache(maxsize=None)
+def _compile_template(template_name):
+    """Build the template for an email once per process, with the shared styling already inlined"""
+    source = _get_template_source(template_name)
+    if source is None:
+        raise ValueError(f'Unknown email template: {template_name}')
+    return Template(Template(source).safe_substitute(base_style=_BASE_STYLE))
+
+def _get_template_source(template_name):
+    """Raw HTML of an email template, with $placeholders for the per-message values"""
     if template_name == "verification":
-        return f"""
+        return """
         <!DOCTYPE html>
         <html>
         <head>
             <meta charset="UTF-8">
             <meta name="viewport" content="width=device-width, initial-scale=1.0">
             <title>Verify Your Email</title>
-            {base_style}
+            $base_style
         </head>
         <body>
             <div class="container">
@@ -39,7 +58,7 @@ def _get_email_template(template_name, **kwargs):
                     <p>Thank you for signing up. To complete your registration, please verify your email address by entering the verification code below:</p>
                     
                     <div class="otp-code">
-                        {kwargs.get('otp', '')}
+                        $otp
                     </div>
                     
                     <p><strong>This verification code will expire in 10 minutes.</strong></p>
@@ -61,14 +80,14 @@ def _get_email_template(template_name, **kwargs):
         """
     
     elif template_name == "password_reset":
-        return f"""
+        return """
         <!DOCTYPE html>
         <html>
         <head>
             <meta charset="UTF-8">
             <meta name="viewport" content="width=device-width, initial-scale=1.0">
             <title>Reset Your Password</title>
-            {base_style}
+            $base_style
         </head>
         <body>
             <div class="container">
@@ -81,7 +100,7 @@ def _get_email_template(template_name, **kwargs):
                     <p>We received a request to reset your password. Click the button below to create a new password:</p>
                     
                     <div style="text-align: center;">
-                        <a href="{kwargs.get('reset_url', '')}" class="button">Reset Password</a>
+                        <a href="$reset_url" class="button">Reset Password</a>
                     </div>
                     
                     <p><strong>This link will expire in 1 hour.</strong></p>
@@ -93,7 +112,7 @@ def _get_email_template(template_name, **kwargs):
                     </div>
                     
                     <p>If the button doesn't work, copy and paste this link into your browser:</p>
-                    <p style="word-break: break-all; color: #4CAF50;">{kwargs.get('reset_url', '')}</p>
+                    <p style="word-break: break-all; color: #4CAF50;">$reset_url</p>
                 </div>
                 <div class="footer">
                     <p>© 2025 Podcast App. All rights reserved.</p>
@@ -105,14 +124,14 @@ def _get_email_template(template_name, **kwargs):
         """
     
     elif template_name == "welcome":
-        return f"""
+        return """
         <!DOCTYPE html>
         <html>
         <head>
             <meta charset="UTF-8">
             <meta name="viewport" content="width=device-width, initial-scale=1.0">
             <title>Welcome to Podcast App</title>
-            {base_style}
+            $base_style
         </head>
         <body>
             <div class="container">
@@ -122,7 +141,7 @@ def _get_email_template(template_name, **kwargs):
                 </div>
                 <div class="content">
                     <h2>Welcome to Podcast App!</h2>
-                    <p>Hi {kwargs.get('email', 'there')},</p>
+                    <p>Hi $email,</p>
                     
                     <p>Your email has been successfully verified! You're now ready to explore the world of podcasts.</p>
                     
@@ -136,7 +155,7 @@ def _get_email_template(template_name, **kwargs):
                     </ul>
                     
                     <div style="text-align: center; margin: 30px 0;">
-                        <a href="{kwargs.get('app_url', '')}" class="button">Start Exploring</a>
+                        <a href="$app_url" class="button">Start Exploring</a>
                     </div>
                     
                     <p>Happy listening!</p>
@@ -151,21 +170,33 @@ def _get_email_template(template_name, **kwargs):
         </html>
         """
 
+def queue_email(subject, recipient, html, body):
+    """Add a message to the email outbox in the current transaction.
+
+    Nothing is sent here: the outbox sender delivers the row once the
+    surrounding commit succeeds, so a slow mail relay never blocks a request.
+    """
+    message = EmailOutbox(
+        sender=EMAIL_SENDER,
+        recipient=recipient,
+        subject=subject,
+        html=html,
+        body=body
+    )
+    db.session.add(message)
+    db.session.info['email_outbox_dirty'] = True
+    return message
+
 def send_verification_email(user):
-    """Send email verification with OTP"""
+    """Queue email verification with OTP. The caller commits it together with the user change."""
     # Generate a 6-digit OTP
     otp = ''.join([str(secrets.randbelow(10)) for _ in range(6)])
     user.otp = otp
     user.otp_expiry = datetime.now(UTC) + timedelta(minutes=10)  # OTP valid for 10 minutes
-    db.session.commit()
     
     html_content = _get_email_template("verification", otp=otp)
     
-    msg = Message('Verify Your Email - Podcast App',
-                  sender='noreply@podcastapp.com',
-                  recipients=[user.email])
-    msg.html = html_content
-    msg.body = f"""Verify Your Email - Podcast App
+    body = f"""Verify Your Email - Podcast App
 
 Welcome to Podcast App!
 
@@ -177,25 +208,20 @@ If you didn't create an account with us, please ignore this email.
 
 © 2025 Podcast App. All rights reserved."""
     
-    mail.send(msg)
+    queue_email('Verify Your Email - Podcast App', user.email, html_content, body)
 
 def send_reset_password_email(user):
-    """Send password reset email"""
+    """Queue password reset email. The caller commits it together with the reset token."""
     token = secrets.token_urlsafe(32)
     user.reset_token = token
     user.reset_token_expiry = datetime.now(UTC) + timedelta(hours=1)
-    db.session.commit()
     
     # Create reset URL - you should update this to match your frontend URL
     reset_url = f"http://192.168.231.17:8000/reset-password?token={token}"
     
     html_content = _get_email_template("password_reset", reset_url=reset_url)
     
-    msg = Message('Reset Your Password - Podcast App',
-                  sender='noreply@podcastapp.com',
-                  recipients=[user.email])
-    msg.html = html_content
-    msg.body = f"""Reset Your Password - Podcast App
+    body = f"""Reset Your Password - Podcast App
 
 We received a request to reset your password.
 
@@ -207,19 +233,15 @@ If you didn't request a password reset, please ignore this email.
 
 © 2025 Podcast App. All rights reserved."""
     
-    mail.send(msg)
+    queue_email('Reset Your Password - Podcast App', user.email, html_content, body)
 
 def send_welcome_email(user):
-    """Send welcome email after successful verification"""
+    """Queue welcome email after successful verification"""
     app_url = "http://192.168.231.17:8000"  # Update this to match your frontend URL
     
     html_content = _get_email_template("welcome", email=user.email, app_url=app_url)
     
-    msg = Message('Welcome to Podcast App!',
-                  sender='noreply@podcastapp.com',
-                  recipients=[user.email])
-    msg.html = html_content
-    msg.body = f"""Welcome to Podcast App!
+    body = f"""Welcome to Podcast App!
 
 Hi {user.email},
 
@@ -240,4 +262,4 @@ The Podcast App Team
 
 © 2025 Podcast App. All rights reserved."""
     
-    mail.send(msg) 
\ No newline at end of file
+    queue_email('Welcome to Podcast App!', user.email, html_content, body)
@@ -0,0 +1,200 @@
+import os
+import smtplib
+import threading
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from flask_mail import Message
+from sqlalchemy import event, or_, update
+from sqlalchemy.orm import Session
+from app import db, mail
+from app.models.email_outbox import EmailOutbox
+
+# Errors that only concern one message; anything else means the SMTP connection must be reopened
+_MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+_wakeup = threading.Event()
+
+@event.listens_for(Session, 'after_commit')
+def _notify_sender(session):
+    """Wake the sender as soon as a transaction that queued emails commits"""
+    if session.info.pop('email_outbox_dirty', False):
+        _wakeup.set()
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_notification(session):
+    session.info.pop('email_outbox_dirty', None)
+
+def retry_delay(attempts, base, maximum):
+    """Exponential backoff in seconds after the given number of failed attempts"""
+    return min(base * (2 ** max(attempts - 1, 0)), maximum)
+
+class OutboxSender:
+    """Drains the email_outbox table in batches over one persistent SMTP connection.
+
+    Rows are claimed with a short lease before sending, so several workers can
+    run a sender against the same database without delivering a message twice.
+    The SMTP connection stays open while there is work and is closed after
+    MAIL_OUTBOX_IDLE_TIMEOUT seconds without messages.
+
+    The thread is started by start(), on first use in each process and again
+    after a fork, so a preloading server master never runs one.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.batch_size = app.config['MAIL_OUTBOX_BATCH_SIZE']
+        self.poll_interval = app.config['MAIL_OUTBOX_POLL_INTERVAL']
+        self.idle_timeout = app.config['MAIL_OUTBOX_IDLE_TIMEOUT']
+        self.max_attempts = app.config['MAIL_OUTBOX_MAX_ATTEMPTS']
+        self.retry_base = app.config['MAIL_OUTBOX_RETRY_BASE']
+        self.retry_max = app.config['MAIL_OUTBOX_RETRY_MAX']
+        self.lease = timedelta(seconds=app.config['MAIL_OUTBOX_LEASE'])
+        self._connection = None
+        self._last_sent = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Run the sender thread in this process; cheap when it is already running"""
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                # A connection opened before a fork belongs to the parent
+                self._connection = None
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='email-outbox-sender', daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        _wakeup.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+        self._close_connection()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                sent = self.drain()
+                if not sent:
+                    self._close_if_idle()
+            except Exception as e:
+                self.app.logger.exception('Email outbox sender failed: %s', e)
+                self._close_connection()
+                sent = 0
+            if sent:
+                continue
+            _wakeup.wait(self.poll_interval)
+            _wakeup.clear()
+
+    def drain(self):
+        """Send every message that is due, one batch at a time. Returns the number sent."""
+        total = 0
+        with self.app.app_context():
+            try:
+                while not self._stop.is_set():
+                    batch = self._claim_batch()
+                    if not batch:
+                        break
+                    sent, connection_ok = self._send_batch(batch)
+                    total += sent
+                    if not connection_ok:
+                        # Leave the rest for the next poll instead of hammering a relay that is down
+                        break
+            finally:
+                db.session.remove()
+        return total
+
+    def _claim_batch(self):
+        now = datetime.utcnow()
+        token = str(uuid.uuid4())
+        due = db.session.query(EmailOutbox.id) \
+            .filter(EmailOutbox.status == 'pending',
+                    EmailOutbox.next_attempt_at <= now,
+                    or_(EmailOutbox.locked_until.is_(None), EmailOutbox.locked_until < now)) \
+            .order_by(EmailOutbox.next_attempt_at) \
+            .limit(self.batch_size) \
+            .scalar_subquery()
+        db.session.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.id.in_(due),
+                   or_(EmailOutbox.locked_until.is_(None), EmailOutbox.locked_until < now))
+            .values(claim_token=token, locked_until=now + self.lease)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return EmailOutbox.query.filter_by(claim_token=token).all()
+
+    def _send_batch(self, batch):
+        sent = 0
+        connection_ok = True
+        for row in batch:
+            if connection_ok:
+                try:
+                    self._deliver(row)
+                except _MESSAGE_ERRORS as e:
+                    self._mark_failed(row, e)
+                except Exception as e:
+                    self._close_connection()
+                    self._mark_failed(row, e)
+                    connection_ok = False
+                else:
+                    row.status = 'sent'
+                    row.attempts += 1
+                    row.sent_at = datetime.utcnow()
+                    row.last_error = None
+                    sent += 1
+            row.claim_token = None
+            row.locked_until = None
+        db.session.commit()
+        return sent, connection_ok
+
+    def _deliver(self, row):
+        if self._connection is None:
+            self._connection = mail.connect().__enter__()
+            # Idle from the moment it opens, even if its first message is refused
+            self._last_sent = datetime.utcnow()
+        msg = Message(row.subject, sender=row.sender, recipients=[row.recipient])
+        msg.html = row.html
+        msg.body = row.body
+        self._connection.send(msg)
+        self._last_sent = datetime.utcnow()
+
+    def _mark_failed(self, row, error):
+        row.attempts += 1
+        row.last_error = str(error)
+        if row.attempts >= self.max_attempts:
+            row.status = 'failed'
+            self.app.logger.error('Giving up on email %s to %s: %s', row.id, row.recipient, error)
+        else:
+            delay = retry_delay(row.attempts, self.retry_base, self.retry_max)
+            row.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+
+    def _close_if_idle(self):
+        if self._connection and datetime.utcnow() - self._last_sent > timedelta(seconds=self.idle_timeout):
+            self._close_connection()
+
+    def _close_connection(self):
+        if self._connection is None:
+            return
+        try:
+            self._connection.__exit__(None, None, None)
+        except Exception:
+            pass
+        self._connection = None
+
+def _start_sender():
+    if current_app.config['MAIL_OUTBOX_SENDER']:
+        current_app.extensions['email_outbox'].start()
+
+def init_email_outbox(app):
+    """Create the outbox sender; with MAIL_OUTBOX_SENDER on, each process starts it on its first request"""
+    sender = OutboxSender(app)
+    app.extensions['email_outbox'] = sender
+    app.before_request(_start_sender)
+    return sender
@@ -0,0 +1,221 @@
+"""
+Listening progress derived from the audio ranges the server sends.
+
+When LISTEN_PROGRESS_FROM_RANGES is on, every range an authenticated user
+fetches from the stream route is mapped back to a playback position and
+recorded as that user's time_listened, so players can slow down or stop
+their /track heartbeats.
+
+A byte offset becomes seconds through the file's timeline: the audio data
+starts after any ID3v2 tag (or at the WAV data chunk), and an MP3 with a
+Xing/Info header is mapped through its 100-entry seek table, which keeps VBR
+files accurate; anything else is treated as constant bitrate over its
+duration. Timelines are read once per file and worker.
+
+Positions are only kept in memory until the ProgressWriter's next flush
+(every LISTEN_PROGRESS_FLUSH_INTERVAL seconds), which writes the highest
+position per (user, podcast) with one max-upsert: however many ranges a
+player fetches, each listen costs at most one row write per interval.
+"""
+
+import atexit
+import bisect
+import functools
+import os
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+from app.models.podcast_listen import PodcastListen
+from app.utils.response_cache import invalidate
+
+# Rows per upsert statement
+WRITE_BATCH = 500
+
+class Timeline:
+    """Maps byte offsets in an audio file to playback seconds"""
+
+    __slots__ = ('start', 'audio_bytes', 'duration', 'toc')
+
+    def __init__(self, start, audio_bytes, duration, toc=None):
+        self.start = start
+        self.audio_bytes = audio_bytes
+        self.duration = duration
+        self.toc = toc
+
+    def seconds(self, offset):
+        if offset <= self.start or self.audio_bytes <= 0:
+            return 0.0
+        fraction = min((offset - self.start) / self.audio_bytes, 1.0)
+        if self.toc is None:
+            return fraction * self.duration
+        # toc[i] is where i% of the duration starts, in 256ths of the audio bytes
+        position = fraction * 256
+        i = min(max(bisect.bisect_right(self.toc, position) - 1, 0), 99)
+        low, high = self.toc[i], self.toc[i + 1] if i < 99 else 256
+        percent = i + ((position - low) / (high - low) if high > low else 0)
+        return min(percent, 100) / 100 * self.duration
+
+def _audio_start(f):
+    """Offset of the first audio byte: after an ID3v2 tag, or the start of a WAV data chunk"""
+    head = f.read(12)
+    if head[:3] == b'ID3' and len(head) >= 10:
+        size = 0
+        for byte in head[6:10]:
+            size = (size << 7) | (byte & 0x7F)
+        # A footer (flag 0x10) adds another 10 bytes
+        return 10 + size + (10 if head[5] & 0x10 else 0)
+    if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+        f.seek(12)
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                return 0
+            if chunk[:4] == b'data':
+                return f.tell()
+            f.seek(int.from_bytes(chunk[4:], 'little') + (int.from_bytes(chunk[4:], 'little') & 1), os.SEEK_CUR)
+    return 0
+
+def _xing(frame):
+    """(audio bytes or None, toc or None) from a Xing/Info header in the first MPEG frame"""
+    index = frame.find(b'Xing')
+    if index < 0:
+        index = frame.find(b'Info')
+    if index < 0 or len(frame) < index + 8:
+        return None, None
+    flags = int.from_bytes(frame[index + 4:index + 8], 'big')
+    offset = index + 8
+    if flags & 0x1:
+        offset += 4
+    audio_bytes = None
+    if flags & 0x2:
+        audio_bytes = int.from_bytes(frame[offset:offset + 4], 'big') or None
+        offset += 4
+    toc = None
+    if flags & 0x4 and len(frame) >= offset + 100:
+        toc = list(frame[offset:offset + 100])
+    return audio_bytes, toc
+
+@functools.lru_cache(maxsize=1024)
+def timeline(path, mtime_ns, size, fallback_duration=None):
+    """The file's Timeline, or None when its duration is unknown. Keyed by mtime and size, so edits are picked up."""
+    duration = None
+    try:
+        # Only progress tracking needs mutagen; importing it here keeps it out of worker boot
+        from mutagen import File as MutagenFile
+        audio = MutagenFile(path)
+        if audio is not None and audio.info.length:
+            duration = audio.info.length
+    except Exception:
+        pass
+    duration = duration or fallback_duration
+    if not duration:
+        return None
+    with open(path, 'rb') as f:
+        start = min(_audio_start(f), size)
+        f.seek(start)
+        audio_bytes, toc = _xing(f.read(512))
+    return Timeline(start, min(audio_bytes or size - start, size - start), duration, toc)
+
+class ProgressWriter:
+    """Keeps the furthest position per (user, podcast) and writes them in one batch per interval"""
+
+    def __init__(self, app, interval=10.0):
+        self.app = app
+        self.interval = interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def record(self, user_id, podcast_id, seconds):
+        key = (user_id, podcast_id)
+        with self._lock:
+            if seconds > self._pending.get(key, -1):
+                self._pending[key] = seconds
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                if self._pid != os.getpid():
+                    # A forked worker: the other positions are the parent's to write
+                    self._pending = {key: self._pending[key]}
+                # First use, after a fork, or after the thread died; what it had not flushed is kept
+                self._thread = threading.Thread(target=self._run, name='listen-progress', daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                self.app.logger.exception('Writing listen progress failed: %s', e)
+
+    def flush(self):
+        """Write everything recorded so far; positions that fail to write are kept for the next flush"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        rows = [
+            {'user_id': user_id, 'podcast_id': podcast_id, 'time_listened': int(seconds), 'tracked_at': datetime.utcnow()}
+            for (user_id, podcast_id), seconds in pending.items()
+        ]
+        try:
+            with self.app.app_context():
+                write_queue = self.app.extensions.get('sqlite_write_queue')
+                for i in range(0, len(rows), WRITE_BATCH):
+                    batch = rows[i:i + WRITE_BATCH]
+                    if write_queue is not None:
+                        write_queue.submit(_upsert, batch)
+                    else:
+                        with db.engine.begin() as connection:
+                            _upsert(connection, batch)
+                invalidate(*{f'listens:{user_id}' for user_id, _ in pending})
+        except Exception:
+            with self._lock:
+                for key, seconds in pending.items():
+                    if seconds > self._pending.get(key, -1):
+                        self._pending[key] = seconds
+            raise
+        return len(rows)
+
+def _upsert(connection, rows):
+    """Insert listens, or raise time_listened where the new position is further along"""
+    listens = PodcastListen.__table__
+    dialect = postgresql if connection.dialect.name == 'postgresql' else sqlite
+    statement = dialect.insert(listens)
+    statement = statement.on_conflict_do_update(
+        index_elements=[listens.c.user_id, listens.c.podcast_id],
+        set_={'time_listened': statement.excluded.time_listened, 'tracked_at': statement.excluded.tracked_at},
+        where=statement.excluded.time_listened > listens.c.time_listened,
+    )
+    connection.execute(statement, rows)
+
+def record_range(user_id, podcast, path, stat, start):
+    """Record that `user_id` fetched `path` from byte `start`; True when a position was recorded"""
+    writer = current_writer()
+    if writer is None:
+        return False
+    file_timeline = timeline(path, stat.st_mtime_ns, stat.st_size, podcast.duration)
+    if file_timeline is None:
+        return False
+    seconds = file_timeline.seconds(start)
+    # Probes and the first second are not a listen yet
+    if seconds < 1:
+        return False
+    writer.record(user_id, podcast.id, seconds)
+    return True
+
+def current_writer():
+    return current_app.extensions.get('listen_progress')
+
+def init_listen_progress(app):
+    """Create the progress writer; nothing is recorded when LISTEN_PROGRESS_FROM_RANGES is off"""
+    if not app.config['LISTEN_PROGRESS_FROM_RANGES']:
+        return None
+    writer = ProgressWriter(app, interval=app.config['LISTEN_PROGRESS_FLUSH_INTERVAL'])
+    app.extensions['listen_progress'] = writer
+    atexit.register(writer.flush)
+    return writer
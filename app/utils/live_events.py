@@ -0,0 +1,250 @@
+"""
+Live engagement events for the episode screen, pushed over Server-Sent Events.
+
+Write views publish what changed after committing:
+
+- `like-count`: {podcast_id, likes_count}, from like and unlike
+- `comment-count`: {podcast_id, comments_count}, from adding and deleting comments
+- `new-comment`: {podcast_id, comment}, the comment as the comments endpoint returns it
+- `comment-deleted`: {podcast_id, comment_id}
+
+Events go to an EventLog, a SQLite file (LIVE_EVENTS_PATH) that every worker
+on the host appends to and reads; it stands in for a pub/sub server such as
+Redis, and anything with the same append/since/last_seq methods can replace
+it. Each event gets an increasing sequence number, sent as the SSE `id`, so a
+reconnecting client resumes from Last-Event-ID while the event is still within
+LIVE_EVENTS_RETENTION seconds.
+
+The SSE endpoints live on the async app (app.asgi). Each worker has one
+Broker: a single task reads new events from the log every
+LIVE_EVENTS_POLL_INTERVAL seconds, or at once when a view in the same process
+published, and fans them out to the subscribers of each podcast. A connected
+client is an asyncio.Queue and a set entry per podcast, so idle connections
+cost no threads and no queries; they only get a comment line every
+LIVE_EVENTS_HEARTBEAT seconds to keep proxies from closing them.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import anyio
+from flask import current_app
+
+# Rows read from the log per poll
+READ_BATCH = 500
+
+logger = logging.getLogger(__name__)
+
+class EventLog:
+    """Events in a SQLite file shared by the workers on a host"""
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS events (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT, topic TEXT NOT NULL, event TEXT NOT NULL,
+            data TEXT NOT NULL, created REAL NOT NULL);
+        CREATE INDEX IF NOT EXISTS ix_events_created ON events (created);
+    '''
+
+    # Prune expired events on every this many appends
+    prune_every = 100
+
+    def __init__(self, path, retention=300):
+        self.path = path
+        self.retention = retention
+        self._local = threading.local()
+        self._created = False
+        self._appends = 0
+
+    def _create(self):
+        # On the first connection, so building an app never touches the file
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        try:
+            connection.executescript(self.SCHEMA)
+        finally:
+            connection.close()
+        self._created = True
+
+    def _connection(self):
+        # One connection per thread, reopened after a fork
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            if not self._created:
+                self._create()
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            # A lost event only means a client shows a stale counter until the next one
+            connection.execute('PRAGMA synchronous=OFF')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def append(self, topic, events):
+        """Store `events`, (name, data) pairs, under `topic` in one transaction"""
+        now = time.time()
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany('INSERT INTO events (topic, event, data, created) VALUES (?, ?, ?, ?)',
+                                   [(topic, name, json.dumps(data), now) for name, data in events])
+            self._appends += 1
+            if self._appends % self.prune_every == 0:
+                connection.execute('DELETE FROM events WHERE created < ?', (now - self.retention,))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def since(self, seq, topics=None, limit=READ_BATCH):
+        """(seq, topic, event, data) after `seq`, oldest first, optionally only for `topics`"""
+        sql = 'SELECT seq, topic, event, data FROM events WHERE seq > ?'
+        params = [seq]
+        if topics is not None:
+            sql += f" AND topic IN ({','.join('?' * len(topics))})"
+            params.extend(topics)
+        return self._connection().execute(sql + ' ORDER BY seq LIMIT ?', (*params, limit)).fetchall()
+
+    def last_seq(self):
+        return self._connection().execute('SELECT coalesce(max(seq), 0) FROM events').fetchone()[0]
+
+    def replay(self, seq, topics):
+        """Every event for `topics` after `seq`, or None when some of them may already have been pruned"""
+        first = self._connection().execute('SELECT min(seq) FROM events').fetchone()[0]
+        if first is None or first > seq + 1:
+            return None
+        rows = []
+        while True:
+            batch = self.since(seq, topics)
+            rows.extend(batch)
+            if len(batch) < READ_BATCH:
+                return rows
+            seq = batch[-1][0]
+
+class Subscription:
+    """One connected client: the topics it follows and the events waiting to be sent"""
+
+    __slots__ = ('topics', 'queue', 'overflowed')
+
+    def __init__(self, topics, queue_size):
+        self.topics = topics
+        self.queue = asyncio.Queue(queue_size)
+        self.overflowed = False
+
+class Broker:
+    """Fans events from the log out to this worker's subscribers; polls only while anyone is subscribed"""
+
+    def __init__(self, log, poll_interval=1.0, queue_size=100):
+        self.log = log
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self._topics = {}
+        self._task = None
+        self._loop = None
+        self._wakeup = None
+        self.cursor = 0
+
+    def subscribe(self, topics):
+        subscription = Subscription(topics, self.queue_size)
+        for topic in topics:
+            self._topics.setdefault(topic, set()).add(subscription)
+        if self._task is None or self._task.done():
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self.cursor = self.log.last_seq()
+            self._task = self._loop.create_task(self._run())
+        return subscription
+
+    def unsubscribe(self, subscription):
+        for topic in subscription.topics:
+            subscribers = self._topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._topics[topic]
+
+    def notify(self):
+        """Deliver without waiting for the next poll; safe to call from any thread"""
+        loop, wakeup = self._loop, self._wakeup
+        if loop is not None and wakeup is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(wakeup.set)
+
+    async def _run(self):
+        while self._topics:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                while True:
+                    rows = await anyio.to_thread.run_sync(self.log.since, self.cursor)
+                    self._dispatch(rows)
+                    if len(rows) < READ_BATCH:
+                        break
+            except Exception as e:
+                logger.warning('Reading live events failed: %s', e)
+
+    def _dispatch(self, rows):
+        for seq, topic, event, data in rows:
+            self.cursor = seq
+            for subscription in self._topics.get(topic, ()):
+                try:
+                    subscription.queue.put_nowait((seq, event, data))
+                except asyncio.QueueFull:
+                    # Too slow to keep up: its stream ends and the client resumes from Last-Event-ID
+                    subscription.overflowed = True
+
+class LiveEvents:
+    """The log views publish to, and the broker once the async app has created one"""
+
+    def __init__(self, log, poll_interval, heartbeat, queue_size, max_topics):
+        self.log = log
+        self.heartbeat = heartbeat
+        self.max_topics = max_topics
+        self.broker = Broker(log, poll_interval, queue_size)
+
+    def publish(self, topic, events):
+        self.log.append(topic, events)
+        self.broker.notify()
+
+def format_event(name, data, seq=None):
+    """One SSE message; `data` is already JSON"""
+    lines = f'id: {seq}\nevent: {name}\n' if seq is not None else f'event: {name}\n'
+    return f'{lines}data: {data}\n\n'.encode()
+
+def publish(podcast_id, events):
+    """Push `events`, {name: data}, to the podcast's subscribers; call after committing.
+
+    `events` may also be a function returning them, so data that costs a query
+    is only built when live events are on. Never raises: the write it reports
+    has already been committed.
+    """
+    live_events = current_app.extensions.get('live_events')
+    if live_events is None:
+        return
+    try:
+        if callable(events):
+            events = events()
+        live_events.publish(f'podcast:{podcast_id}',
+                            [(name, {'podcast_id': podcast_id, **data}) for name, data in events.items()])
+    except Exception as e:
+        # Clients catch up on their next event or when they reconnect
+        current_app.logger.exception('Publishing live events for podcast %s failed: %s', podcast_id, e)
+
+def init_live_events(app):
+    """Create the event log; nothing is published when LIVE_EVENTS_ENABLED is off"""
+    if not app.config['LIVE_EVENTS_ENABLED']:
+        return None
+    live_events = LiveEvents(
+        EventLog(app.config['LIVE_EVENTS_PATH'], app.config['LIVE_EVENTS_RETENTION']),
+        poll_interval=app.config['LIVE_EVENTS_POLL_INTERVAL'],
+        heartbeat=app.config['LIVE_EVENTS_HEARTBEAT'],
+        queue_size=app.config['LIVE_EVENTS_QUEUE_SIZE'],
+        max_topics=app.config['LIVE_EVENTS_MAX_PODCASTS'],
+    )
+    app.extensions['live_events'] = live_events
+    return live_events
@@ -0,0 +1,161 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from flask import g, has_request_context, request
+from flask.logging import default_handler
+
+# Incoming X-Request-ID values are reused only if they look like an id
+_REQUEST_ID = re.compile(r'^[A-Za-z0-9._:-]{1,128}$')
+
+# Attributes every LogRecord has; anything else came from `extra=`
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'request_id'}
+
+class lazy:
+    """Defers an expensive log argument until the record is actually formatted.
+
+        logger.debug('Created comment: %s', lazy(comment.to_dict))
+    """
+
+    __slots__ = ('fn', 'args', 'kwargs')
+
+    def __init__(self, fn, *args, **kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+
+    def __str__(self):
+        return str(self.fn(*self.args, **self.kwargs))
+
+    def __repr__(self):
+        return repr(self.fn(*self.args, **self.kwargs))
+
+class RequestIdFilter(logging.Filter):
+    """Stamps each record with the id of the request that logged it ('-' outside requests)"""
+
+    def filter(self, record):
+        record.request_id = g.get('request_id', '-') if has_request_context() else '-'
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', '-'),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+        if record.stack_info:
+            entry['stack_info'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+class _LogQueueHandler(QueueHandler):
+    def __init__(self, queue, start_listener):
+        super().__init__(queue)
+        self.start_listener = start_listener
+
+    def enqueue(self, record):
+        self.start_listener()
+        super().enqueue(record)
+
+    def prepare(self, record):
+        # Render the message (and traceback) in the calling thread, since arguments may be
+        # ORM objects or request-bound; the formatter runs later in the listener thread
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _plain.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+_plain = logging.Formatter()
+
+class AsyncLogging:
+    """Request threads only put records on a queue; a listener thread does the I/O.
+
+    The queue is unbounded, so logging never blocks a request. The listener is
+    started by the first record a process logs, so forked workers run their
+    own, and drained at exit.
+    """
+
+    def __init__(self, formatter, stream=None):
+        self.target = logging.StreamHandler(stream or sys.stderr)
+        self.target.setFormatter(formatter)
+        self.handler = _LogQueueHandler(queue.SimpleQueue(), self.start)
+        self.handler.addFilter(RequestIdFilter())
+        self.listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+        os.register_at_fork(after_in_child=self._reset)
+        atexit.register(self.stop)
+
+    def _reset(self):
+        # The parent's lock may have been held by another thread at the fork
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self.handler.queue = queue.SimpleQueue()
+                self.listener = QueueListener(self.handler.queue, self.target, respect_handler_level=True)
+                self.listener.start()
+                self._pid = os.getpid()
+
+    def stop(self):
+        if self._pid == os.getpid() and self.listener._thread is not None:
+            self.listener.stop()
+
+_async_logging = None
+
+def _start_request():
+    incoming = request.headers.get('X-Request-ID', '')
+    g.request_id = incoming if _REQUEST_ID.match(incoming) else uuid.uuid4().hex
+
+def _finish_request(response):
+    request_id = g.get('request_id')
+    if request_id:
+        response.headers['X-Request-ID'] = request_id
+    return response
+
+def init_logging(app):
+    """Send the 'app' logger tree (app.logger and every module logger under app.*) through the queue"""
+    global _async_logging
+    if _async_logging is None:
+        if app.config['LOG_FORMAT'] == 'json':
+            formatter = JsonFormatter()
+        else:
+            formatter = logging.Formatter('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s')
+        _async_logging = AsyncLogging(formatter)
+
+    logger = logging.getLogger('app')
+    logger.setLevel(app.config['LOG_LEVEL'])
+    logger.removeHandler(default_handler)
+    if _async_logging.handler not in logger.handlers:
+        logger.addHandler(_async_logging.handler)
+    logger.propagate = False
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    return _async_logging
@@ -0,0 +1,238 @@
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+from flask import current_app, g, request
+from sqlalchemy import event
+
+# Histogram upper bounds; the last bucket is +Inf
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_local = threading.local()
+
+class RouteStats:
+    __slots__ = ('latency', 'latency_sum', 'count', 'statuses', 'queries', 'query_count', 'query_seconds', 'audio_bytes')
+
+    def __init__(self):
+        self.latency = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.count = 0
+        self.statuses = {}
+        self.queries = [0] * (len(QUERY_BUCKETS) + 1)
+        self.query_count = 0
+        self.query_seconds = 0.0
+        self.audio_bytes = 0
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def merge(self, data):
+        for i, value in enumerate(data['latency']):
+            self.latency[i] += value
+        for i, value in enumerate(data['queries']):
+            self.queries[i] += value
+        for status, value in data['statuses'].items():
+            self.statuses[status] = self.statuses.get(status, 0) + value
+        self.latency_sum += data['latency_sum']
+        self.count += data['count']
+        self.query_count += data['query_count']
+        self.query_seconds += data['query_seconds']
+        self.audio_bytes += data['audio_bytes']
+
+class Metrics:
+    """Per-route request metrics kept in process memory.
+
+    With METRICS_DIR set, each process also writes its totals to a file there
+    (at most every METRICS_FLUSH_INTERVAL seconds) and /metrics adds up the
+    files of every worker, so a scrape sees the whole host.
+    """
+
+    def __init__(self, directory=None, flush_interval=5.0):
+        self.routes = {}
+        # Callables returning {metric name: value} from other components, and each metric's help text
+        self.sources = []
+        self.help = {}
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flushed_at = 0.0
+        self._file = None
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # A forked worker starts from empty totals and writes its own file
+        self.routes = {}
+        self._lock = threading.Lock()
+        self._flushed_at = 0.0
+        self._file = None
+
+    def observe(self, key, seconds, status, queries, query_seconds):
+        with self._lock:
+            stats = self.routes.get(key)
+            if stats is None:
+                stats = self.routes[key] = RouteStats()
+            stats.latency[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            stats.latency_sum += seconds
+            stats.count += 1
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            stats.queries[bisect.bisect_left(QUERY_BUCKETS, queries)] += 1
+            stats.query_count += queries
+            stats.query_seconds += query_seconds
+        if self.directory and time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def add_source(self, collect, help):
+        """Report the totals `collect()` returns with the request metrics, summed across workers"""
+        self.sources.append(collect)
+        self.help.update(help)
+
+    def _counters(self):
+        counters = {}
+        for collect in self.sources:
+            counters.update(collect())
+        return counters
+
+    def add_audio_bytes(self, key, count):
+        with self._lock:
+            stats = self.routes.get(key)
+            if stats is not None:
+                stats.audio_bytes += count
+
+    def _snapshot(self):
+        with self._lock:
+            routes = {f'{method} {route}': stats.to_dict() for (method, route), stats in self.routes.items()}
+        return {'routes': routes, 'counters': self._counters()}
+
+    def flush(self):
+        if self._file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._file = os.path.join(self.directory, f'metrics-{os.getpid()}-{time.time_ns()}.json')
+        self._flushed_at = time.monotonic()
+        temp = self._file + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump(self._snapshot(), f)
+        os.replace(temp, self._file)
+
+    def collect(self):
+        """(totals per (method, route), source counters) for this process, or for every worker when METRICS_DIR is set"""
+        if not self.directory:
+            with self._lock:
+                routes = {key: _copy(stats) for key, stats in self.routes.items()}
+            return routes, self._counters()
+        self.flush()
+        totals = {}
+        counters = {}
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, values in data['routes'].items():
+                method, route = name.split(' ', 1)
+                totals.setdefault((method, route), RouteStats()).merge(values)
+            for name, value in data['counters'].items():
+                counters[name] = counters.get(name, 0) + value
+        return totals, counters
+
+def _copy(stats):
+    copy = RouteStats()
+    copy.merge(stats.to_dict())
+    return copy
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _histogram(lines, name, labels, bounds, counts, total):
+    cumulative = 0
+    for bound, count in zip(bounds, counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    cumulative += counts[-1]
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+    lines.append(f'{name}_sum{{{labels}}} {total}')
+    lines.append(f'{name}_count{{{labels}}} {cumulative}')
+
+def render(routes, counters=None, help=None):
+    """Prometheus text exposition format"""
+    lines = [
+        '# HELP http_request_duration_seconds Time spent handling a request, by route.',
+        '# TYPE http_request_duration_seconds histogram',
+    ]
+    items = sorted(routes.items())
+    for (method, route), stats in items:
+        labels = f'method="{method}",route="{_label(route)}"'
+        _histogram(lines, 'http_request_duration_seconds', labels, LATENCY_BUCKETS, stats.latency, stats.latency_sum)
+
+    lines += ['# HELP http_requests_total Requests handled, by route and status code.', '# TYPE http_requests_total counter']
+    for (method, route), stats in items:
+        for status, count in sorted(stats.statuses.items()):
+            lines.append(f'http_requests_total{{method="{method}",route="{_label(route)}",status="{status}"}} {count}')
+
+    lines += ['# HELP db_queries_per_request SQL statements issued per request, by route.', '# TYPE db_queries_per_request histogram']
+    for (method, route), stats in items:
+        labels = f'method="{method}",route="{_label(route)}"'
+        _histogram(lines, 'db_queries_per_request', labels, QUERY_BUCKETS, stats.queries, stats.query_count)
+
+    lines += ['# HELP db_query_seconds_total Time spent in SQL statements, by route.', '# TYPE db_query_seconds_total counter']
+    for (method, route), stats in items:
+        lines.append(f'db_query_seconds_total{{method="{method}",route="{_label(route)}"}} {stats.query_seconds}')
+
+    lines += ['# HELP audio_bytes_sent_total Bytes of audio served, by route.', '# TYPE audio_bytes_sent_total counter']
+    for (method, route), stats in items:
+        if stats.audio_bytes:
+            lines.append(f'audio_bytes_sent_total{{method="{method}",route="{_label(route)}"}} {stats.audio_bytes}')
+
+    for name, value in sorted((counters or {}).items()):
+        if help and name in help:
+            lines.append(f'# HELP {name} {help[name]}')
+        lines.append(f"# TYPE {name} {'counter' if name.endswith('_total') else 'gauge'}")
+        lines.append(f'{name} {value}')
+    return '\n'.join(lines) + '\n'
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    sql = getattr(_local, 'sql', None)
+    if sql is not None:
+        sql[0] += 1
+        sql[1] += time.perf_counter() - context._metrics_started
+
+def _start_request():
+    g.metrics_started = time.perf_counter()
+    _local.sql = [0, 0.0]
+
+def _finish_request(response):
+    started = g.pop('metrics_started', None)
+    sql = getattr(_local, 'sql', None)
+    _local.sql = None
+    if started is None:
+        return response
+    rule = request.url_rule
+    key = (request.method, rule.rule if rule is not None else '<unmatched>')
+    queries, query_seconds = sql if sql is not None else (0, 0.0)
+    metrics = current_app.extensions['metrics']
+    metrics.observe(key, time.perf_counter() - started, response.status_code, queries, query_seconds)
+    if response.mimetype and response.mimetype.startswith('audio/') and response.content_length:
+        # Taken from Content-Length: file responses are passed straight to the server, so
+        # the body is never seen here; an aborted download still counts in full
+        metrics.add_audio_bytes(key, response.content_length)
+    return response
+
+def init_metrics(app, db):
+    metrics = Metrics(app.config['METRICS_DIR'], app.config['METRICS_FLUSH_INTERVAL'])
+    app.extensions['metrics'] = metrics
+    if not app.config['METRICS_ENABLED']:
+        return metrics
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    return metrics
@@ -0,0 +1,140 @@
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+import uuid
+from contextlib import ExitStack
+from flask import current_app, g, request
+from app.utils.query_trace import trace_queries
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'X-Profile'
+
+# (file suffix, function) pairs whose cumulative time is reported as one phase
+AUTH_FUNCTIONS = {
+    ('flask_jwt_extended/view_decorators.py', 'verify_jwt_in_request'),
+    ('app/routes/auth.py', 'authenticate_token'),
+}
+JSON_FUNCTIONS = {
+    ('flask/json/__init__.py', 'jsonify'),
+}
+
+def sign(secret, method, path, ttl=300):
+    """X-Profile value that profiles one `method path` request until `ttl` seconds from now"""
+    expires = int(time.time()) + ttl
+    signature = hmac.new(secret.encode(), f'{expires}:{method.upper()}:{path}'.encode(), hashlib.sha256).hexdigest()
+    return f'{expires}.{signature}'
+
+def _authorized(value, secret):
+    """The header is either the secret itself or a signature from sign(); anything malformed is refused"""
+    try:
+        # Compared as bytes: compare_digest rejects str with non-ASCII characters
+        if hmac.compare_digest(value.encode(), secret.encode()):
+            return True
+        expires, _, signature = value.partition('.')
+        if not expires.isdigit() or int(expires) < time.time():
+            return False
+        expected = hmac.new(secret.encode(), f'{expires}:{request.method}:{request.path}'.encode(), hashlib.sha256).hexdigest()
+        return hmac.compare_digest(signature.encode(), expected.encode())
+    except (TypeError, ValueError):
+        return False
+
+def _matches(func, names):
+    filename, _, name = func
+    return any(name == function and filename.replace(os.sep, '/').endswith(suffix) for suffix, function in names)
+
+def _short(func):
+    filename, line, name = func
+    return f"{'/'.join(filename.replace(os.sep, '/').split('/')[-3:])}:{line}({name})"
+
+def summarize(stats, trace, elapsed, limit=25):
+    """Where the request spent its time: SQL, auth, serialisation and the top functions"""
+    entries = stats.stats
+    auth = sum(ct for func, (_, _, _, ct, _) in entries.items() if _matches(func, AUTH_FUNCTIONS))
+    # to_dict time counted only where entered from outside another to_dict, so nesting is not double counted
+    serialize = sum(
+        caller_ct
+        for func, (_, _, _, _, callers) in entries.items() if func[2] == 'to_dict'
+        for caller, (_, _, _, caller_ct) in callers.items() if caller[2] != 'to_dict'
+    )
+    serialize += sum(ct for func, (_, _, _, ct, _) in entries.items() if _matches(func, JSON_FUNCTIONS))
+    top = sorted(entries.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return {
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'total_ms': round(elapsed * 1000, 2),
+        'sql_ms': round(trace.seconds * 1000, 2),
+        'sql_queries': len(trace),
+        'sql_statements': [{'count': count, 'sql': sql[:500]} for sql, count in trace.grouped()[:10]],
+        'auth_ms': round(auth * 1000, 2),
+        'serialize_ms': round(serialize * 1000, 2),
+        'functions': [{
+            'function': _short(func),
+            'calls': nc,
+            'own_ms': round(tt * 1000, 3),
+            'cumulative_ms': round(ct * 1000, 3),
+        } for func, (_, nc, tt, ct, _) in top],
+    }
+
+def _start_request():
+    value = request.headers.get(HEADER)
+    if not value or not _authorized(value, current_app.config['PROFILE_TOKEN']):
+        return
+    import cProfile
+    stack = ExitStack()
+    trace = stack.enter_context(trace_queries())
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is already active on this thread
+        stack.close()
+        return
+    g.profile = (profiler, stack, trace, time.perf_counter())
+
+def _stop():
+    profiler, stack, trace, started = g.pop('profile')
+    profiler.disable()
+    stack.close()
+    return profiler, trace, time.perf_counter() - started
+
+def _finish_request(response):
+    if 'profile' not in g:
+        return response
+    import pstats
+    profiler, trace, elapsed = _stop()
+    summary = summarize(pstats.Stats(profiler), trace, elapsed)
+    profile_id = uuid.uuid4().hex
+    directory = current_app.config['PROFILE_DIR']
+    try:
+        os.makedirs(directory, exist_ok=True)
+        profiler.dump_stats(os.path.join(directory, f'{profile_id}.prof'))
+        with open(os.path.join(directory, f'{profile_id}.json'), 'w') as f:
+            json.dump(summary, f, indent=2)
+    except OSError:
+        logger.exception('Could not store profile %s', profile_id)
+    response.headers['X-Profile-Id'] = profile_id
+    response.headers['Server-Timing'] = ', '.join([
+        f"total;dur={summary['total_ms']}",
+        f"sql;dur={summary['sql_ms']};desc=\"{summary['sql_queries']} queries\"",
+        f"auth;dur={summary['auth_ms']}",
+        f"serialize;dur={summary['serialize_ms']}",
+    ])
+    logger.info('Profiled %s %s: %s ms, stored as %s', request.method, request.path, summary['total_ms'], profile_id)
+    return response
+
+def _teardown_request(exc):
+    # after_request is skipped when the response could not be built
+    if 'profile' in g:
+        _stop()
+
+def init_profiling(app):
+    """Profile requests that carry an authorised X-Profile header; nothing is hooked without PROFILE_TOKEN"""
+    if not app.config['PROFILE_TOKEN']:
+        return
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_teardown_request)
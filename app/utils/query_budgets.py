@@ -0,0 +1,140 @@
+"""
+Query budget check for every endpoint.
+
+check_query_budgets() calls each endpoint once through the test client, in an
+order where every call has the data it needs (sign up, verify, log in, upload,
+comment, like, ...), while tracing the SQL it runs. An endpoint fails when it
+issues more statements than its pinned budget, or repeats one statement shape
+QUERY_TRACE_THRESHOLD times or more, the usual sign of an N+1 query.
+
+Budgets are pinned for SQLite; when a change legitimately adds or removes a
+query, update the number here in the same commit. `python -m
+benchmarks.query_budgets` runs the check from the command line.
+"""
+
+import io
+from flask_jwt_extended import create_access_token
+from sqlalchemy import func
+from app import db
+from app.models.comment import Comment
+from app.models.user import User
+from app.utils.query_trace import trace_queries
+
+PASSWORD = 'Budget-Passw0rd!'
+
+def _scenarios(app, ids, audio, thumbnail):
+    """(name, budget, call, after) in execution order.
+
+    `call(state)` returns the (method, url, keyword arguments) of the test client request, so
+    lookups it needs run before tracing starts; `after(response, state)` keeps ids for later calls.
+    """
+    def user_field(email, field):
+        with app.app_context():
+            return getattr(db.session.execute(db.select(User).filter_by(email=email)).scalar_one(), field)
+
+    with app.app_context():
+        reader = create_access_token(identity=ids['users'][0])
+        # The most discussed podcast, so per-comment queries would show up as repeats
+        podcast_id = db.session.execute(
+            db.select(Comment.podcast_id).group_by(Comment.podcast_id).order_by(func.count().desc()).limit(1)
+        ).scalar_one()
+    category_id = ids['categories'][0]
+
+    def auth(state):
+        return {'Authorization': f"Bearer {state['token']}"}
+
+    def upload(state):
+        return 'post', '/api/podcasts', dict(headers=auth(state), content_type='multipart/form-data', data={
+            'title': 'Budget episode',
+            'description': 'Uploaded by the query budget check',
+            'categories[]': [category_id],
+            'audio': (io.BytesIO(audio), 'episode.wav'),
+            'thumbnail': (io.BytesIO(thumbnail), 'cover.gif'),
+        })
+
+    def remember(key, field):
+        def call(response, state):
+            state[key] = response.get_json()[field]['id']
+        return call
+
+    def etag(key):
+        def call(response, state):
+            state[key] = response.headers['ETag']
+        return call
+
+    reader_auth = {'Authorization': f'Bearer {reader}'}
+    return [
+        ('POST /auth/signup', 3, lambda s: ('post', '/auth/signup', dict(json={'email': s['email'], 'password': PASSWORD})), None),
+        ('POST /auth/verify-email', 3, lambda s: ('post', '/auth/verify-email', dict(json={'email': s['email'], 'otp': user_field(s['email'], 'otp')})), None),
+        ('POST /auth/login', 1, lambda s: ('post', '/auth/login', dict(json={'email': s['email'], 'password': PASSWORD})), lambda r, s: s.update(token=r.get_json()['token'])),
+        ('POST /auth/forgot-password', 3, lambda s: ('post', '/auth/forgot-password', dict(json={'email': s['email']})), None),
+        ('POST /auth/reset-password', 2, lambda s: ('post', '/auth/reset-password', dict(json={'token': user_field(s['email'], 'reset_token'), 'new_password': PASSWORD})), None),
+        ('GET /auth/profile', 1, lambda s: ('get', '/auth/profile', dict(headers=auth(s))), etag('profile_etag')),
+        ('GET /auth/profile (304)', 1, lambda s: ('get', '/auth/profile', dict(headers={**auth(s), 'If-None-Match': s['profile_etag']})), None),
+        ('GET /api/categories', 0, lambda s: ('get', '/api/categories', dict()), None),
+        ('GET /api/categories/<id>', 0, lambda s: ('get', f'/api/categories/{category_id}', dict()), None),
+        ('POST /api/categories', 3, lambda s: ('post', '/api/categories', dict(json={'name': 'Budget category'})), remember('category_id', 'category')),
+        ('POST /api/podcasts', 8, upload, remember('podcast_id', 'podcast')),
+        ('GET /api/podcasts', 3, lambda s: ('get', '/api/podcasts', dict()), None),
+        ('GET /api/podcasts?category_id', 3, lambda s: ('get', f'/api/podcasts?category_id={category_id}', dict()), None),
+        ('GET /api/podcasts/discover', 4, lambda s: ('get', '/api/podcasts/discover', dict()), None),
+        ('GET /api/podcasts/<id>', 1, lambda s: ('get', f'/api/podcasts/{podcast_id}', dict()), etag('podcast_etag')),
+        ('GET /api/podcasts/<id> (304)', 1, lambda s: ('get', f'/api/podcasts/{podcast_id}', dict(headers={'If-None-Match': s['podcast_etag']})), None),
+        ('POST /api/podcasts/<id>/comments', 7, lambda s: ('post', f'/api/podcasts/{podcast_id}/comments', dict(headers=auth(s), json={'content': 'Nice'})), remember('comment_id', 'comment')),
+        ('GET /api/podcasts/<id>/comments', 3, lambda s: ('get', f'/api/podcasts/{podcast_id}/comments', dict()), etag('comments_etag')),
+        ('GET /api/podcasts/<id>/comments (304)', 1, lambda s: ('get', f'/api/podcasts/{podcast_id}/comments', dict(headers={'If-None-Match': s['comments_etag']})), None),
+        ('DELETE /api/podcasts/<id>/comments/<id>', 6, lambda s: ('delete', f"/api/podcasts/{podcast_id}/comments/{s['comment_id']}", dict(headers=auth(s))), None),
+        ('POST /api/podcasts/<id>/like', 6, lambda s: ('post', f'/api/podcasts/{podcast_id}/like', dict(headers=auth(s))), None),
+        ('GET /api/podcasts/<id>/check-like', 4, lambda s: ('get', f'/api/podcasts/{podcast_id}/check-like', dict(headers=auth(s))), None),
+        ('POST /api/podcasts/<id>/unlike', 5, lambda s: ('post', f'/api/podcasts/{podcast_id}/unlike', dict(headers=auth(s))), None),
+        ('POST /api/podcasts/<id>/track', 2, lambda s: ('post', f'/api/podcasts/{podcast_id}/track', dict(headers=reader_auth, json={'time_listened': 42})), None),
+        ('GET /api/podcasts/<id>/last-position', 2, lambda s: ('get', f'/api/podcasts/{podcast_id}/last-position', dict(headers=reader_auth)), None),
+        ('GET /api/podcasts/<id>/stream', 1, lambda s: ('get', f"/api/podcasts/{s['podcast_id']}/stream", dict(headers={'Range': 'bytes=0-99'})), None),
+        ('GET /auth/profile/podcasts', 3, lambda s: ('get', '/auth/profile/podcasts', dict(headers=auth(s))), None),
+        ('GET /auth/profile/liked-podcasts', 3, lambda s: ('get', '/auth/profile/liked-podcasts', dict(headers=reader_auth)), None),
+        ('GET /auth/profile/details', 4, lambda s: ('get', '/auth/profile/details', dict(headers=reader_auth)), None),
+        ('GET /auth/profile/listen-history', 5, lambda s: ('get', '/auth/profile/listen-history', dict(headers=reader_auth)), None),
+        ('DELETE /api/podcasts/<id>', 3, lambda s: ('delete', f"/api/podcasts/{s['podcast_id']}", dict(headers=auth(s))), None),
+        ('DELETE /api/categories/<id>', 3, lambda s: ('delete', f"/api/categories/{s['category_id']}", dict()), None),
+        ('DELETE /auth/profile', 4, lambda s: ('delete', '/auth/profile', dict(headers=auth(s), json={'password': PASSWORD})), None),
+        ('GET /api/health/db', 1, lambda s: ('get', '/api/health/db', dict()), None),
+        ('GET /api/test', 0, lambda s: ('get', '/api/test', dict()), None),
+    ]
+
+def check_query_budgets(app, ids, audio, thumbnail):
+    """Run every scenario and return a list of (endpoint, queries, budget, failures, report).
+
+    `audio` and `thumbnail` are the file contents uploaded by POST /api/podcasts.
+    """
+    client = app.test_client()
+    threshold = app.config['QUERY_TRACE_THRESHOLD']
+    # The category snapshot is built once per version, not per request
+    with app.test_request_context():
+        app.extensions['category_cache'].snapshot()
+
+    state = {'email': 'budget@example.com'}
+    results = []
+    for name, budget, call, after in _scenarios(app, ids, audio, thumbnail):
+        method, url, kwargs = call(state)
+        with trace_queries(app) as trace:
+            response = getattr(client, method)(url, **kwargs)
+        failures = []
+        if response.status_code >= 400:
+            failures.append(f'{name} returned {response.status_code}: {response.get_data(as_text=True)[:200]}')
+            results.append((name, len(trace), budget, failures, trace.report()))
+            continue
+        if name.endswith('(304)') and response.status_code != 304:
+            failures.append(f'{name} returned {response.status_code} instead of 304')
+        if after is not None:
+            after(response, state)
+        # Category writes bump the snapshot version; rebuild outside the measured calls
+        with app.test_request_context():
+            app.extensions['category_cache'].snapshot()
+
+        if len(trace) > budget:
+            failures.append(f'{name}: {len(trace)} queries, budget {budget}')
+        for sql, count in trace.repeated(threshold):
+            failures.append(f'{name}: {count} x {sql[:200]}')
+        results.append((name, len(trace), budget, failures, trace.report()))
+    app.extensions['deletion'].join()
+    return results
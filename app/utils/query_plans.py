@@ -0,0 +1,121 @@
+"""
+Query plan regression check for the hot read endpoints.
+
+check_query_plans() drives get_podcasts, discover_podcasts, get_comments and
+get_listen_history through the test client on a seeded database, captures
+every SQL statement they issue and explains it. A statement is reported when
+it reads a table without an index:
+
+- SQLite: an `EXPLAIN QUERY PLAN` step of the form `SCAN <table>` with no
+  `USING INDEX` / `USING COVERING INDEX`.
+- PostgreSQL: a `Seq Scan` node in `EXPLAIN (FORMAT JSON)`. Sequential scans are
+  disabled for the session first, so small seeded tables still show whether
+  an index path exists.
+
+Free-text `search` filters use a leading-wildcard ILIKE that no B-tree index
+can serve, so they are not part of the scenarios. `python -m
+benchmarks.query_plans` runs the check from the command line.
+"""
+
+import json
+import re
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+from app import db
+
+_SQLITE_SCAN = re.compile(r'^SCAN (\S+)(?: AS (\S+))?$')
+
+def _scenarios(ids, token):
+    auth = {'Authorization': f'Bearer {token}'}
+    category_id = ids['categories'][0]
+    podcast_id = ids['podcasts'][0]
+    return [
+        ('get_podcasts', '/api/podcasts', {}),
+        ('get_podcasts', '/api/podcasts?page=3&per_page=20', {}),
+        ('get_podcasts', f'/api/podcasts?category_id={category_id}', {}),
+        ('discover_podcasts', '/api/podcasts/discover', {}),
+        ('discover_podcasts', f'/api/podcasts/discover?category_id={category_id}', {}),
+        ('get_comments', f'/api/podcasts/{podcast_id}/comments', {}),
+        ('get_listen_history', '/auth/profile/listen-history', auth),
+        ('get_listen_history', '/auth/profile/listen-history?page=2&per_page=5', auth),
+    ]
+
+def _table_name(name, tables):
+    """Map a plan alias like podcast_likes_1 back to its table, or None for subqueries"""
+    if name in tables:
+        return name
+    base = re.sub(r'_\d+$', '', name)
+    return base if base in tables else None
+
+def _sqlite_violations(connection, statement, parameters, tables):
+    plan = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+    violations = []
+    for row in plan:
+        detail = row[-1]
+        match = _SQLITE_SCAN.match(detail)
+        if match and _table_name(match.group(1), tables):
+            violations.append(detail)
+    return [row[-1] for row in plan], violations
+
+def _postgres_violations(connection, statement, parameters, tables):
+    connection.exec_driver_sql('SET enable_seqscan = off')
+    result = connection.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + statement, parameters).scalar()
+    plan = result if isinstance(result, list) else json.loads(result)
+    lines, violations = [], []
+
+    def walk(node):
+        line = node['Node Type'] + (f" on {node['Relation Name']}" if 'Relation Name' in node else '')
+        if 'Index Name' in node:
+            line += f" using {node['Index Name']}"
+        lines.append(line)
+        if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') in tables:
+            violations.append(line)
+        for child in node.get('Plans', []):
+            walk(child)
+
+    walk(plan[0]['Plan'])
+    return lines, violations
+
+def check_query_plans(app, ids):
+    """Run every scenario and return a list of (endpoint, url, statement, plan, violations)"""
+    with app.app_context():
+        engine = db.engine
+        tables = set(db.metadata.tables)
+        token = create_access_token(identity=ids['users'][0])
+
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    explain = _postgres_violations if engine.dialect.name == 'postgresql' else _sqlite_violations
+    client = app.test_client()
+    # Build the category snapshot up front: it reads the whole (tiny) table once per version, not per request
+    with app.test_request_context():
+        app.extensions['category_cache'].snapshot()
+    results = []
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        for endpoint, url, headers in _scenarios(ids, token):
+            captured.clear()
+            response = client.get(url, headers=headers)
+            if response.status_code != 200:
+                raise RuntimeError(f'{url} returned {response.status_code}')
+            # Explain each distinct statement once, with the parameters of its first execution
+            statements = {}
+            for statement, parameters in captured:
+                statements.setdefault(statement, parameters)
+            event.remove(engine, 'before_cursor_execute', capture)
+            try:
+                with engine.connect() as connection:
+                    for statement, parameters in statements.items():
+                        if not statement.lstrip().upper().startswith('SELECT'):
+                            continue
+                        plan, violations = explain(connection, statement, parameters, tables)
+                        results.append((endpoint, url, statement, plan, violations))
+                    connection.rollback()
+            finally:
+                event.listen(engine, 'before_cursor_execute', capture)
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+    return results
@@ -0,0 +1,131 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from flask import current_app, request
+from sqlalchemy import event
+from app import db
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+_WHITESPACE = re.compile(r'\s+')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+# Expanded IN lists and multi-row VALUES differ only in their length
+_PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_NAMED = re.compile(r'%\(\w+\)s|(?<!:):\w+|\$\d+|%s')
+
+def normalize(statement):
+    """Reduce a statement to its shape: literals and placeholders become `?`, IN lists collapse"""
+    sql = _WHITESPACE.sub(' ', statement).strip()
+    sql = _STRING.sub('?', sql)
+    sql = _NAMED.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    return _PLACEHOLDER_LIST.sub('(?...)', sql)
+
+class QueryTrace:
+    """The statements executed on one thread while the trace was active"""
+
+    def __init__(self):
+        self.statements = []
+        self.seconds = 0.0
+
+    def __len__(self):
+        return len(self.statements)
+
+    def add(self, statement, seconds):
+        self.statements.append(statement)
+        self.seconds += seconds
+
+    def grouped(self):
+        """(normalised SQL, executions), most repeated first"""
+        return Counter(normalize(statement) for statement in self.statements).most_common()
+
+    def repeated(self, threshold):
+        """Statement shapes executed at least `threshold` times: the usual sign of an N+1"""
+        return [(sql, count) for sql, count in self.grouped() if count >= threshold]
+
+    def report(self, limit=200):
+        lines = [f'{len(self.statements)} statements in {self.seconds * 1000:.1f} ms']
+        for sql, count in self.grouped():
+            lines.append(f'  {count:>4} x {sql[:limit]}')
+        return '\n'.join(lines)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._trace_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    traces = getattr(_local, 'traces', None)
+    if traces:
+        elapsed = time.perf_counter() - context._trace_started
+        for trace in traces:
+            trace.add(statement, elapsed)
+
+def _listen(engines):
+    for engine in engines:
+        if not event.contains(engine, 'after_cursor_execute', _after_cursor_execute):
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+def _engines(app):
+    with app.app_context():
+        return list(db.engines.values())
+
+def _push():
+    trace = QueryTrace()
+    if getattr(_local, 'traces', None) is None:
+        _local.traces = []
+    _local.traces.append(trace)
+    return trace
+
+def _pop(trace):
+    _local.traces.remove(trace)
+
+@contextmanager
+def trace_queries(app=None):
+    """Collect every statement this thread runs inside the block, including test client requests"""
+    app = app or current_app._get_current_object()
+    _listen(_engines(app))
+    trace = _push()
+    try:
+        yield trace
+    finally:
+        _pop(trace)
+
+@contextmanager
+def assert_max_queries(n, app=None):
+    """Fail with the grouped statement list if the block runs more than `n` statements.
+
+        with assert_max_queries(3, app):
+            client.get('/api/podcasts')
+    """
+    with trace_queries(app) as trace:
+        yield trace
+    if len(trace) > n:
+        raise AssertionError(f'Expected at most {n} queries, got {len(trace)}\n{trace.report()}')
+
+def _start_request():
+    request.environ['app.query_trace'] = _push()
+
+def _finish_request(response):
+    trace = request.environ.pop('app.query_trace', None)
+    if trace is None:
+        return response
+    _pop(trace)
+    repeated = trace.repeated(current_app.config['QUERY_TRACE_THRESHOLD'])
+    if repeated:
+        logger.warning('Possible N+1 in %s %s: %s', request.method, request.path,
+                       '; '.join(f'{count} x {sql[:200]}' for sql, count in repeated))
+    return response
+
+def init_query_trace(app, db):
+    """Log requests that repeat one statement shape QUERY_TRACE_THRESHOLD times or more"""
+    if not app.config['QUERY_TRACE']:
+        return
+    _listen(_engines(app))
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
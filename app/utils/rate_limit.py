@@ -0,0 +1,216 @@
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+import jwt
+from flask import current_app, g, jsonify, request
+
+RateLimitPolicy = namedtuple('RateLimitPolicy', ['name', 'limit', 'period', 'key'])
+RateLimitResult = namedtuple('RateLimitResult', ['policy', 'allowed', 'remaining', 'reset', 'retry_after'])
+
+# Default policies: `limit` requests per `period` seconds, bucketed by `key` (ip, user or token)
+DEFAULT_POLICIES = {
+    'login': RateLimitPolicy('login', 10, 60, 'ip'),
+    'forgot_password': RateLimitPolicy('forgot_password', 5, 900, 'ip'),
+    'comment': RateLimitPolicy('comment', 20, 60, 'user'),
+    'track': RateLimitPolicy('track', 120, 60, 'user'),
+}
+
+def _take(tokens, updated, now, policy):
+    """Refill a token bucket up to `now` and try to take one token from it.
+
+    Returns the new token count and whether the request is allowed.
+    """
+    rate = policy.limit / policy.period
+    tokens = min(policy.limit, tokens + max(now - updated, 0) * rate)
+    if tokens >= 1:
+        return tokens - 1, True
+    return tokens, False
+
+def _result(policy, tokens, allowed):
+    rate = policy.limit / policy.period
+    reset = math.ceil((policy.limit - tokens) / rate)
+    retry_after = 0 if allowed else math.ceil((1 - tokens) / rate)
+    return RateLimitResult(policy, allowed, int(tokens), reset, retry_after)
+
+class MemoryBackend:
+    """Token buckets held in this process, bounded by an LRU of `max_keys` buckets"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, policy):
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens, updated = policy.limit, now
+            else:
+                tokens, updated = bucket
+                self._buckets.move_to_end(key)
+            tokens, allowed = _take(tokens, updated, now, policy)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return _result(policy, tokens, allowed)
+
+class FileBackend:
+    """Token buckets shared by every worker on the host through a memory-mapped file.
+
+    The file is a fixed table of slots (key hash, tokens, last update, time
+    the bucket is full again). A key hashes to a short window of slots and
+    only that byte range is locked with fcntl while its bucket is updated, so
+    a check is O(1) and never touches the database. A slot is reused for
+    another key once its own bucket has refilled completely, whatever the
+    period of the policy asking, so idle keys cost nothing. When every slot
+    in the window holds a live bucket, the one closest to refilling is
+    evicted: its key starts over with a full bucket, and no other key's bucket
+    is shared or reset.
+    """
+
+    _SLOT = struct.Struct('<Qddd')
+    _PROBE = 4
+
+    def __init__(self, path, slots=65536):
+        import fcntl
+        self._fcntl = fcntl
+        self.path = path
+        self.slots = slots
+        self._fd = None
+        self._map = None
+        self._lock = threading.Lock()
+
+    def _open(self):
+        # Called with the lock held, on the first hit
+        size = self.slots * self._SLOT.size
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(fd).st_size != size:
+            # New file, or one with another slot count or layout: start from empty buckets
+            os.ftruncate(fd, 0)
+            os.ftruncate(fd, size)
+        self._fd = fd
+        self._map = mmap.mmap(fd, size)
+
+    def hit(self, key, policy):
+        digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+        first = digest % (self.slots - self._PROBE)
+        start = first * self._SLOT.size
+        length = self._PROBE * self._SLOT.size
+        now = time.time()
+        with self._lock:
+            if self._map is None:
+                self._open()
+            self._fcntl.lockf(self._fd, self._fcntl.LOCK_EX, length, start, os.SEEK_SET)
+            try:
+                offset, tokens, updated = self._find_slot(digest, start, now, policy)
+                tokens, allowed = _take(tokens, updated, now, policy)
+                full_at = now + (policy.limit - tokens) * policy.period / policy.limit
+                self._SLOT.pack_into(self._map, offset, digest, tokens, now, full_at)
+            finally:
+                self._fcntl.lockf(self._fd, self._fcntl.LOCK_UN, length, start, os.SEEK_SET)
+        return _result(policy, tokens, allowed)
+
+    def _find_slot(self, digest, start, now, policy):
+        reusable = None
+        evictable, evictable_full_at = None, None
+        for i in range(self._PROBE):
+            offset = start + i * self._SLOT.size
+            owner, tokens, updated, full_at = self._SLOT.unpack_from(self._map, offset)
+            if owner == digest:
+                return offset, tokens, updated
+            # Stale by the owner's own policy, not the caller's
+            if reusable is None and (owner == 0 or now >= full_at):
+                reusable = offset
+            if evictable is None or full_at < evictable_full_at:
+                evictable, evictable_full_at = offset, full_at
+        # Every slot in the window is busy: evict the bucket nearest to full, the one that loses least
+        return reusable if reusable is not None else evictable, policy.limit, now
+
+class RateLimiter:
+    def __init__(self, backend, policies, enabled=True):
+        self.backend = backend
+        self.policies = policies
+        self.enabled = enabled
+
+    def hit(self, policy_name):
+        policy = self.policies[policy_name]
+        key = f'{policy.name}:{policy.key}:{_client_key(policy.key)}'
+        return self.backend.hit(key, policy)
+
+def _bearer_token():
+    auth_header = request.headers.get('Authorization', '')
+    parts = auth_header.split(' ')
+    return parts[1] if len(parts) == 2 else None
+
+def _client_key(kind):
+    """Identify the caller for a policy without touching the database"""
+    if kind in ('user', 'token'):
+        token = _bearer_token()
+        if token and kind == 'token':
+            return hashlib.sha256(token.encode()).hexdigest()[:32]
+        if token:
+            try:
+                data = jwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
+                return f"u:{data['sub']}"
+            except (jwt.InvalidTokenError, KeyError):
+                pass
+    return request.remote_addr or 'unknown'
+
+def rate_limit(policy_name):
+    """Apply the named rate limit policy to a route. Place it above the auth decorators."""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            limiter = current_app.extensions.get('rate_limiter')
+            if limiter is None or not limiter.enabled:
+                return f(*args, **kwargs)
+            result = limiter.hit(policy_name)
+            g.rate_limit = result
+            if not result.allowed:
+                return jsonify({'message': 'Too many requests, please try again later'}), 429
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
+
+def _add_rate_limit_headers(response):
+    result = g.get('rate_limit')
+    if result is None:
+        return response
+    policy = result.policy
+    response.headers['RateLimit-Limit'] = str(policy.limit)
+    response.headers['RateLimit-Remaining'] = str(result.remaining)
+    response.headers['RateLimit-Reset'] = str(result.reset)
+    response.headers['RateLimit-Policy'] = f'{policy.limit};w={policy.period}'
+    if not result.allowed:
+        response.headers['Retry-After'] = str(result.retry_after)
+    return response
+
+def _load_policies(app):
+    """Default policies, overridden per policy by RATELIMIT_<NAME>=limit/period[/key]"""
+    policies = dict(DEFAULT_POLICIES)
+    policies.update(app.config.get('RATELIMIT_POLICIES', {}))
+    for name, policy in list(policies.items()):
+        override = os.getenv(f'RATELIMIT_{name.upper()}')
+        if override:
+            parts = override.split('/')
+            key = parts[2] if len(parts) > 2 else policy.key
+            policies[name] = RateLimitPolicy(name, int(parts[0]), float(parts[1]), key)
+    return policies
+
+def init_rate_limiter(app):
+    if app.config['RATELIMIT_BACKEND'] == 'file':
+        backend = FileBackend(app.config['RATELIMIT_STORAGE_PATH'])
+    else:
+        backend = MemoryBackend()
+    limiter = RateLimiter(backend, _load_policies(app), enabled=app.config['RATELIMIT_ENABLED'])
+    app.extensions['rate_limiter'] = limiter
+    app.after_request(_add_rate_limit_headers)
+    return limiter
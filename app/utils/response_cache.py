@@ -0,0 +1,353 @@
+"""
+Response cache for hot GET endpoints, shared by every worker on the host.
+
+Entries are keyed by endpoint, view arguments, the view's normalised query
+arguments and, for per-user views, the caller's identity. Two tiers:
+
+- memory: a byte-bounded LRU in each process
+- shared: one SQLite file (RESPONSE_CACHE_PATH) that every worker reads and
+  fills, so one worker's miss warms all of them
+
+Invalidation is by tag. An entry records the version of every tag it was
+built from (`podcast:<id>`, `category:<id>`, `catalog`, ...); write handlers
+call invalidate() with the tags they touched after committing, which bumps
+the versions in the shared file and a memory-mapped counter, so every worker
+sees the change on its next lookup. Entries also expire after a TTL.
+
+Only one worker recomputes a missing or expired key: it takes a lease in the
+shared file while the others serve the expired copy (when its tags are still
+current) or wait briefly for the new one.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+from functools import wraps
+from urllib.parse import urlencode
+from flask import current_app, request
+from app.utils.category_cache import VersionFile
+from app.utils.cdn import purge, surrogate_keys, wants_surrogate_keys
+from app.utils.compression import negotiated_response
+from app.utils.conditional import etag_for, not_modified, validated
+
+# `tags` is a tuple of (tag, version) pairs; `variants` holds compressed bodies, per process
+CacheEntry = namedtuple('CacheEntry', ['body', 'mimetype', 'etag', 'tags', 'expires', 'variants'])
+
+# Tags of per-user responses, which no CDN holds
+PRIVATE_TAGS = ('listens:',)
+
+class SharedTier:
+    """Entries, tag versions and recompute leases in a SQLite file shared by the workers on a host"""
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY, body BLOB NOT NULL, mimetype TEXT NOT NULL, etag TEXT NOT NULL,
+            tags TEXT NOT NULL, expires REAL NOT NULL, keep_until REAL NOT NULL);
+        CREATE INDEX IF NOT EXISTS ix_entries_keep_until ON entries (keep_until);
+        CREATE TABLE IF NOT EXISTS tags (tag TEXT PRIMARY KEY, version INTEGER NOT NULL, seq INTEGER NOT NULL);
+        CREATE INDEX IF NOT EXISTS ix_tags_seq ON tags (seq);
+        CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, token TEXT NOT NULL, expires REAL NOT NULL);
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._created = False
+
+    def _create(self):
+        # On the first connection, so building an app never touches the file
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        try:
+            connection.executescript(self.SCHEMA)
+        finally:
+            connection.close()
+        self._created = True
+
+    def _connection(self):
+        # One connection per thread, reopened after a fork
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            if not self._created:
+                self._create()
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            # Cached data can always be recomputed, so it is never worth an fsync
+            connection.execute('PRAGMA synchronous=OFF')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT body, mimetype, etag, tags, expires FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        body, mimetype, etag, tags, expires = row
+        return CacheEntry(bytes(body), mimetype, etag, tuple(tuple(pair) for pair in json.loads(tags)), expires, {})
+
+    def put(self, key, entry, keep_until):
+        self._connection().execute(
+            'INSERT OR REPLACE INTO entries (key, body, mimetype, etag, tags, expires, keep_until) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (key, entry.body, entry.mimetype, entry.etag, json.dumps(entry.tags), entry.expires, keep_until))
+
+    def prune(self, now):
+        connection = self._connection()
+        connection.execute('DELETE FROM entries WHERE keep_until < ?', (now,))
+        connection.execute('DELETE FROM leases WHERE expires < ?', (now,))
+
+    def bump(self, tags):
+        """Increment the tags' versions; returns {tag: (version, seq)}"""
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            seq = connection.execute('SELECT coalesce(max(seq), 0) + 1 FROM tags').fetchone()[0]
+            for tag in tags:
+                connection.execute(
+                    'INSERT INTO tags (tag, version, seq) VALUES (?, 1, ?) '
+                    'ON CONFLICT (tag) DO UPDATE SET version = version + 1, seq = excluded.seq', (tag, seq))
+            rows = connection.execute(
+                f"SELECT tag, version, seq FROM tags WHERE tag IN ({','.join('?' * len(tags))})", tuple(tags)).fetchall()
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return {tag: (version, seq) for tag, version, seq in rows}
+
+    def changed_since(self, seq):
+        return self._connection().execute('SELECT tag, version, seq FROM tags WHERE seq > ?', (seq,)).fetchall()
+
+    def acquire(self, key, token, seconds):
+        """Take the recompute lease for `key` unless another holder's lease is still live"""
+        now = time.time()
+        cursor = self._connection().execute(
+            'INSERT INTO leases (key, token, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET token = excluded.token, expires = excluded.expires WHERE leases.expires < ?',
+            (key, token, now + seconds, now))
+        return cursor.rowcount == 1
+
+    def release(self, key, token):
+        self._connection().execute('DELETE FROM leases WHERE key = ? AND token = ?', (key, token))
+
+class ResponseCache:
+    """The memory LRU in front of the shared tier, plus tag versions and leases"""
+
+    def __init__(self, shared, version_file, memory_bytes=32 * 1024 * 1024, ttl=30, stale=30, lease=5):
+        self.shared = shared
+        self.version_file = version_file
+        self.memory_bytes = memory_bytes
+        self.ttl = ttl
+        self.stale = stale
+        self.lease = lease
+        self._memory = OrderedDict()
+        self._memory_used = 0
+        self._lock = threading.Lock()
+        # tag -> (version, seq); unknown tags are at version 0
+        self._tags = {}
+        self._seq = 0
+        self._seen = None
+        self._tags_lock = threading.Lock()
+        self._puts = 0
+
+    def _refresh_tags(self):
+        counter = self.version_file.read()
+        if counter == self._seen:
+            return
+        with self._tags_lock:
+            if counter == self._seen:
+                return
+            for tag, version, seq in self.shared.changed_since(self._seq):
+                self._tags[tag] = (version, seq)
+                self._seq = max(self._seq, seq)
+            self._seen = counter
+
+    def seq(self):
+        """Current tag sequence; pass it to store() to drop entries whose tags changed while they were built"""
+        self._refresh_tags()
+        return self._seq
+
+    def _current(self, entry):
+        return all(self._tags.get(tag, (0, 0))[0] == version for tag, version in entry.tags)
+
+    def lookup(self, key):
+        """(entry, fresh) for a usable entry, or (None, False)"""
+        self._refresh_tags()
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+        if entry is None or not self._current(entry) or entry.expires <= now:
+            shared = self.shared.get(key)
+            if shared is not None and self._current(shared) and (entry is None or shared.expires > entry.expires):
+                entry = shared
+                self._remember(key, entry)
+        if entry is None or not self._current(entry):
+            return None, False
+        if entry.expires > now:
+            return entry, True
+        # Expired but built from current data: good enough while one worker recomputes it
+        return (entry, False) if entry.expires + self.stale > now else (None, False)
+
+    def _remember(self, key, entry):
+        size = len(entry.body) + len(key)
+        if size > self.memory_bytes:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_used -= len(previous.body) + len(key)
+            self._memory[key] = entry
+            self._memory_used += size
+            while self._memory_used > self.memory_bytes:
+                evicted_key, evicted = self._memory.popitem(last=False)
+                self._memory_used -= len(evicted.body) + len(evicted_key)
+
+    def store(self, key, body, mimetype, etag, tags, ttl, since):
+        """Cache a response built from data read after tag sequence `since`; returns the entry or None"""
+        self._refresh_tags()
+        versions = []
+        for tag in sorted(set(tags)):
+            version, seq = self._tags.get(tag, (0, 0))
+            if seq > since:
+                # Invalidated while the response was being built: it may already be stale
+                return None
+            versions.append((tag, version))
+        entry = CacheEntry(body, mimetype, etag, tuple(versions), time.time() + (ttl or self.ttl), {})
+        self._remember(key, entry)
+        self.shared.put(key, entry, entry.expires + self.stale)
+        self._puts += 1
+        if self._puts % 100 == 0:
+            self.shared.prune(time.time())
+        return entry
+
+    def invalidate(self, *tags):
+        if not tags:
+            return
+        changed = self.shared.bump(sorted(set(tags)))
+        with self._tags_lock:
+            self._tags.update(changed)
+        self.version_file.bump()
+
+    def wait(self, key):
+        """Poll for the entry another worker is building, up to the lease time"""
+        deadline = time.monotonic() + self.lease
+        delay = 0.005
+        while time.monotonic() < deadline:
+            time.sleep(delay)
+            delay = min(delay * 2, 0.1)
+            entry, fresh = self.lookup(key)
+            if fresh:
+                return entry
+        return None
+
+def invalidate(*tags):
+    """Drop cached and edge copies of responses built from any of `tags`; call after committing the write"""
+    cache = current_app.extensions.get('response_cache')
+    if cache is not None:
+        cache.invalidate(*tags)
+    purge(*(tag for tag in tags if not tag.startswith(PRIVATE_TAGS)))
+
+def podcast_tags(podcasts):
+    """podcast:<id>, author:<id> and category:<id> tags for serialised podcasts"""
+    tags = []
+    for podcast in podcasts:
+        tags.append(f"podcast:{podcast['id']}")
+        if podcast.get('author'):
+            tags.append(f"author:{podcast['author']['id']}")
+        tags.extend(f"category:{category['id']}" for category in podcast.get('categories') or ())
+    return tags
+
+def _key(args, defaults, per_user):
+    query = []
+    for name in args:
+        value = request.args.get(name, '').strip()
+        if value and value != defaults.get(name):
+            query.append((name, value))
+    user = '-'
+    if per_user:
+        from flask_jwt_extended import get_jwt_identity
+        user = get_jwt_identity() or '-'
+    view_args = sorted((request.view_args or {}).items())
+    return f'{request.endpoint}|{user}|{urlencode(view_args)}|{urlencode(query)}'
+
+def _respond(entry):
+    surrogate_keys(*(tag for tag, _ in entry.tags))
+    response = not_modified(entry.etag)
+    if response is not None:
+        return response
+    return validated(negotiated_response(entry.body, entry.variants, entry.mimetype), entry.etag)
+
+def cached(tags, args=(), defaults=None, ttl=None, per_user=False):
+    """Serve this GET view from the response cache.
+
+    `tags(body, view_args, query_args)` names the tags a response was built
+    from, given its parsed JSON. Only the query arguments in `args` are part of
+    the key (values equal to `defaults` are dropped, so ?page=1 and no page
+    share an entry). `per_user` keys entries by the JWT identity; put the
+    decorator under jwt_required. Place it directly above the view function.
+    """
+    defaults = {name: str(value) for name, value in (defaults or {}).items()}
+
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*view_args, **view_kwargs):
+            cache = current_app.extensions.get('response_cache')
+            if cache is None or request.method != 'GET':
+                response = current_app.make_response(f(*view_args, **view_kwargs))
+                if wants_surrogate_keys() and response.status_code == 200 and response.is_json:
+                    surrogate_keys(*tags(response.get_json(), request.view_args or {}, request.args))
+                return response
+            key = _key(args, defaults, per_user)
+            entry, fresh = cache.lookup(key)
+            if fresh:
+                return _respond(entry)
+
+            token = uuid.uuid4().hex
+            leased = cache.shared.acquire(key, token, cache.lease)
+            if not leased:
+                # Another worker is recomputing this key
+                if entry is not None:
+                    return _respond(entry)
+                entry = cache.wait(key)
+                if entry is not None:
+                    return _respond(entry)
+            try:
+                since = cache.seq()
+                response = current_app.make_response(f(*view_args, **view_kwargs))
+                if response.status_code != 200 or response.mimetype != 'application/json' or 'Set-Cookie' in response.headers:
+                    return response
+                body = response.get_data()
+                etag, _ = response.get_etag()
+                if etag is None:
+                    etag = etag_for(body)
+                entry_tags = tags(json.loads(body), request.view_args or {}, request.args)
+                entry = cache.store(key, body, response.mimetype, etag, entry_tags, ttl, since)
+                if entry is None:
+                    surrogate_keys(*entry_tags)
+                    return response
+                return _respond(entry)
+            finally:
+                if leased:
+                    cache.shared.release(key, token)
+        return wrapper
+    return decorator
+
+def init_response_cache(app):
+    """Set up the cache; nothing is cached when RESPONSE_CACHE_ENABLED is off"""
+    if not app.config['RESPONSE_CACHE_ENABLED']:
+        return None
+    cache = ResponseCache(
+        SharedTier(app.config['RESPONSE_CACHE_PATH']),
+        VersionFile(app.config['RESPONSE_CACHE_VERSION_PATH']),
+        memory_bytes=app.config['RESPONSE_CACHE_MEMORY_BYTES'],
+        ttl=app.config['RESPONSE_CACHE_TTL'],
+        stale=app.config['RESPONSE_CACHE_STALE'],
+        lease=app.config['RESPONSE_CACHE_LEASE'],
+    )
+    app.extensions['response_cache'] = cache
+    return cache
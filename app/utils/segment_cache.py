@@ -0,0 +1,209 @@
+"""
+In-memory cache of audio file blocks for range requests on the hottest episodes.
+
+Files are split into fixed blocks of SEGMENT_CACHE_BLOCK_SIZE bytes (256 KiB)
+and a range response is assembled from the blocks it covers, so a popular
+episode is served without an open/seek/read per request. Each worker holds
+up to SEGMENT_CACHE_BYTES of blocks.
+
+Admission is TinyLFU: every block access is counted in a small count-min
+sketch whose counters are halved periodically, and when the cache is full a
+new block only displaces the least recently used one if it has been asked
+for more often. A one-off scan of a long-tail episode therefore cannot push
+out the blocks of this week's hit.
+
+Blocks are keyed by path, mtime and size, so a replaced file is never served
+from old blocks.
+"""
+
+import os
+import stat as stat_module
+import threading
+from collections import OrderedDict
+from zlib import adler32
+from flask import current_app, request
+
+# Halves every counter in one bytes.translate() pass
+_HALVE = bytes(value >> 1 for value in range(256))
+
+def file_etag(path, stat):
+    """The ETag send_file() gives the same file, so cached and uncached responses validate alike"""
+    check = adler32(path.encode('utf-8')) & 0xFFFFFFFF
+    return f'{stat.st_mtime}-{stat.st_size}-{check}'
+
+class FrequencySketch:
+    """Approximate access counts: a count-min sketch of 4-bit counters with periodic halving.
+
+    After `sample` increments every counter is halved, so the estimates follow
+    recent popularity rather than all-time totals.
+    """
+
+    DEPTH = 4
+    MAX_COUNT = 15
+
+    def __init__(self, width):
+        self.width = 1 << max(width - 1, 1).bit_length()
+        self.mask = self.width - 1
+        self.table = bytearray(self.width * self.DEPTH)
+        self.sample = 10 * self.width
+        self.additions = 0
+
+    def _indexes(self, key):
+        h = hash(key)
+        for row in range(self.DEPTH):
+            yield row * self.width + (hash((row, h)) & self.mask)
+
+    def increment(self, key):
+        table = self.table
+        for index in self._indexes(key):
+            if table[index] < self.MAX_COUNT:
+                table[index] += 1
+        self.additions += 1
+        if self.additions >= self.sample:
+            self.table = bytearray(table.translate(_HALVE))
+            self.additions //= 2
+
+    def estimate(self, key):
+        table = self.table
+        return min(table[index] for index in self._indexes(key))
+
+class SegmentCache:
+    """A byte-bounded LRU of file blocks behind a TinyLFU admission filter"""
+
+    def __init__(self, capacity, block_size=256 * 1024):
+        self.block_size = block_size
+        self.max_blocks = max(capacity // block_size, 1)
+        self.sketch = FrequencySketch(max(self.max_blocks * 4, 1024))
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = dict.fromkeys(('hits', 'misses', 'hit_bytes', 'miss_bytes', 'admissions', 'rejections', 'evictions'), 0)
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # A forked worker starts empty, with its own lock and counters
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = dict.fromkeys(self.stats, 0)
+
+    def _lookup(self, key):
+        with self._lock:
+            self.sketch.increment(key)
+            block = self._blocks.get(key)
+            if block is None:
+                self.stats['misses'] += 1
+                return None
+            self._blocks.move_to_end(key)
+            self.stats['hits'] += 1
+            self.stats['hit_bytes'] += len(block)
+            return block
+
+    def _admit(self, key, block):
+        with self._lock:
+            self.stats['miss_bytes'] += len(block)
+            if key in self._blocks:
+                return
+            if len(self._blocks) >= self.max_blocks:
+                victim = next(iter(self._blocks))
+                if self.sketch.estimate(key) <= self.sketch.estimate(victim):
+                    self.stats['rejections'] += 1
+                    return
+                del self._blocks[victim]
+                self.stats['evictions'] += 1
+            self._blocks[key] = block
+            self.stats['admissions'] += 1
+
+    def read_range(self, path, stat, start, end):
+        """Yield bytes `start` to `end` (inclusive) of the file, block by block through the cache"""
+        size = self.block_size
+        first, last = start // size, end // size
+        fd = None
+        try:
+            for index in range(first, last + 1):
+                key = (path, stat.st_mtime_ns, stat.st_size, index)
+                block = self._lookup(key)
+                if block is None:
+                    if fd is None:
+                        fd = os.open(path, os.O_RDONLY)
+                    block = os.pread(fd, size, index * size)
+                    self._admit(key, block)
+                low = start - index * size if index == first else 0
+                high = end - index * size + 1 if index == last else len(block)
+                yield block if low == 0 and high == len(block) else block[low:high]
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+    def counters(self):
+        """Totals for /metrics"""
+        with self._lock:
+            stats = dict(self.stats)
+            resident = sum(len(block) for block in self._blocks.values())
+        return {
+            'segment_cache_hits_total': stats['hits'],
+            'segment_cache_misses_total': stats['misses'],
+            'segment_cache_hit_bytes_total': stats['hit_bytes'],
+            'segment_cache_miss_bytes_total': stats['miss_bytes'],
+            'segment_cache_admissions_total': stats['admissions'],
+            'segment_cache_rejections_total': stats['rejections'],
+            'segment_cache_evictions_total': stats['evictions'],
+            'segment_cache_bytes': resident,
+        }
+
+def cached_range(path, start=None, end=None, mimetype='audio/mpeg'):
+    """A 206 response for bytes `start` to `end` of `path` assembled from the segment cache.
+
+    Without `start` the request's Range header is used. Returns None, so the
+    caller falls back to send_file(), when the cache is off, the file is
+    missing, there is no single satisfiable range or an If-Range does not match.
+    """
+    cache = current_app.extensions.get('segment_cache')
+    if cache is None or request.method != 'GET':
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if not stat_module.S_ISREG(stat.st_mode):
+        return None
+    etag = file_etag(path, stat)
+    if_range = request.if_range
+    if if_range.etag is not None and if_range.etag != etag or if_range.date is not None:
+        return None
+    if start is None:
+        byte_range = request.range
+        bounds = byte_range.range_for_length(stat.st_size) if byte_range is not None else None
+        if bounds is None:
+            return None
+        start, end = bounds[0], bounds[1] - 1
+    response = current_app.response_class(cache.read_range(path, stat, start, end), status=206,
+                                          mimetype=mimetype, direct_passthrough=True)
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    response.content_length = end - start + 1
+    response.set_etag(etag)
+    response.last_modified = stat.st_mtime
+    max_age = current_app.get_send_file_max_age(path)
+    if max_age:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+    return response
+
+COUNTER_HELP = {
+    'segment_cache_hits_total': 'Audio blocks served from the segment cache.',
+    'segment_cache_misses_total': 'Audio blocks read from disk.',
+    'segment_cache_hit_bytes_total': 'Bytes of audio served from the segment cache.',
+    'segment_cache_miss_bytes_total': 'Bytes of audio read from disk for range requests.',
+    'segment_cache_admissions_total': 'Blocks added to the segment cache.',
+    'segment_cache_rejections_total': 'Blocks TinyLFU kept out of a full segment cache.',
+    'segment_cache_evictions_total': 'Blocks evicted to admit more popular ones.',
+    'segment_cache_bytes': 'Bytes of audio held in the segment cache.',
+}
+
+def init_segment_cache(app):
+    """Set up the block cache and report it through /metrics; nothing is cached when SEGMENT_CACHE_ENABLED is off"""
+    if not app.config['SEGMENT_CACHE_ENABLED']:
+        return None
+    cache = SegmentCache(app.config['SEGMENT_CACHE_BYTES'], app.config['SEGMENT_CACHE_BLOCK_SIZE'])
+    app.extensions['segment_cache'] = cache
+    app.extensions['metrics'].add_source(cache.counters, COUNTER_HELP)
+    return cache
@@ -0,0 +1,169 @@
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from sqlalchemy import create_engine, event
+
+# Pragmas applied to every new connection when SQLITE_PROFILE=production
+PRODUCTION_PRAGMAS = {
+    'journal_mode': 'WAL',          # readers no longer block on writers
+    'synchronous': 'NORMAL',        # fsync at checkpoints only; safe with WAL
+    'busy_timeout': 5000,           # wait for a lock instead of failing with "database is locked"
+    'mmap_size': 268435456,         # 256 MiB of the file read through mmap
+    'cache_size': -65536,           # 64 MiB page cache per connection
+    'temp_store': 'MEMORY',
+    'foreign_keys': 'ON',           # enforce foreign keys and their ON DELETE CASCADE
+}
+
+# Applied whatever the profile: deletes rely on ON DELETE CASCADE, which SQLite ignores without it
+BASE_PRAGMAS = {'foreign_keys': 'ON'}
+
+def _is_file_database(engine):
+    database = engine.url.database
+    return engine.dialect.name == 'sqlite' and database not in (None, '', ':memory:') \
+        and not database.startswith('file::memory:')
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """Run the given PRAGMAs on every connection the engine opens"""
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+def group_commit_engine(engine, pragmas=PRODUCTION_PRAGMAS):
+    """A separate engine on the same file whose transactions start with BEGIN IMMEDIATE.
+
+    pysqlite never emits BEGIN before a SAVEPOINT, so on an ordinary engine the
+    first SAVEPOINT opens the transaction and its RELEASE commits it, one
+    commit per job. Turning off the driver's own transaction handling and
+    emitting BEGIN ourselves (SQLAlchemy's documented pysqlite workaround)
+    makes the savepoints nest in a real transaction; IMMEDIATE takes the write
+    lock up front. Only the writer thread uses it, so reads elsewhere keep
+    their deferred transactions.
+    """
+    writer = create_engine(engine.url, pool_size=1, max_overflow=0)
+    apply_sqlite_pragmas(writer, pragmas)
+
+    @event.listens_for(writer, 'connect')
+    def disable_driver_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(writer, 'begin')
+    def begin_immediate(connection):
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+    return writer
+
+class WriteQueue:
+    """Single writer thread that serialises and group-commits small write transactions.
+
+    Request threads submit a function taking a Core connection; the writer
+    runs whatever has queued up while the previous batch was committing (up to
+    `max_batch` jobs) in one transaction, each inside its own SAVEPOINT so one
+    failing job does not undo the others, and commits once. Give it an engine
+    from group_commit_engine, or every SAVEPOINT commits on its own.
+    `submit` blocks until the batch is committed and returns the function's
+    result or raises its exception.
+    """
+
+    def __init__(self, engine, max_batch=64, timeout=None):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self._jobs = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        """Run fn(connection, *args, **kwargs) in the next batch and return its result.
+
+        Raises TimeoutError when the batch has not committed within `timeout`
+        seconds. A job that had not started by then is dropped; one that had
+        may still commit.
+        """
+        self._ensure_started()
+        future = Future()
+        self._jobs.put((future, fn, args, kwargs))
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    def _ensure_started(self):
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                if self._pid != os.getpid():
+                    # Threads do not survive fork: jobs queued in the parent belong to its callers
+                    self._jobs = queue.Queue()
+                # A writer that died in this process leaves its queue to the next one
+                self._thread = threading.Thread(target=self._run, args=(self._jobs,), name='sqlite-writer', daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+
+    def _run(self, jobs):
+        while True:
+            batch = [jobs.get()]
+            try:
+                while len(batch) < self.max_batch:
+                    batch.append(jobs.get_nowait())
+            except queue.Empty:
+                pass
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        # Callers that timed out have cancelled their jobs
+        batch = [job for job in batch if job[0].set_running_or_notify_cancel()]
+        results = []
+        try:
+            with self.engine.begin() as connection:
+                for future, fn, args, kwargs in batch:
+                    savepoint = connection.begin_nested()
+                    try:
+                        results.append((future, fn(connection, *args, **kwargs), None))
+                        savepoint.commit()
+                    except Exception as e:
+                        savepoint.rollback()
+                        results.append((future, None, e))
+        except Exception as e:
+            for future, fn, args, kwargs in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+def sqlite_pragmas(config, engine):
+    """The PRAGMAs for an engine under the configured profile, None for other databases"""
+    if engine.dialect.name != 'sqlite':
+        return None
+    if config['SQLITE_PROFILE'] == 'production' and _is_file_database(engine):
+        return PRODUCTION_PRAGMAS
+    return BASE_PRAGMAS
+
+def init_sqlite(app, db):
+    """Apply the SQLite profile (foreign keys on in every one) and create the optional write queue"""
+    with app.app_context():
+        engines = db.engines
+    for engine in engines.values():
+        pragmas = sqlite_pragmas(app.config, engine)
+        if pragmas is not None:
+            apply_sqlite_pragmas(engine, pragmas)
+    if app.config['SQLITE_PROFILE'] != 'production':
+        return None
+
+    primary = engines[None]
+    if app.config['SQLITE_WRITE_QUEUE'] and _is_file_database(primary):
+        write_queue = WriteQueue(group_commit_engine(primary), max_batch=app.config['SQLITE_WRITE_QUEUE_BATCH'],
+                                 timeout=app.config['SQLITE_WRITE_QUEUE_TIMEOUT'])
+        app.extensions['sqlite_write_queue'] = write_queue
+        return write_queue
+    return None
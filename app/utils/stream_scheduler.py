@@ -0,0 +1,228 @@
+"""
+Bandwidth shaping and fair sharing for audio responses.
+
+Views marked @paced have their audio bodies scheduled here. Requests fall in
+three classes:
+
+- seeks: bodies of at most STREAM_SMALL_RANGE bytes, what players fetch
+  after a seek. Sent at once, never limited.
+- listens: no Range, or an open-ended one (`bytes=N-`), which is how players
+  read an episode. Never refused.
+- bulk: closed ranges larger than STREAM_SMALL_RANGE, how download managers
+  fetch whole files in parallel. A caller may hold STREAM_MAX_PER_USER of
+  them (429 beyond that), and a worker STREAM_MAX_STREAMS if set (503).
+
+Listens and bulk streams are paced: their first STREAM_BURST bytes go out at
+line rate, then STREAM_RATE bytes per second. Pacing needs a server that can
+wait without holding a thread, so it happens in PacedWSGIMiddleware, which
+the async app (app.asgi) serves Flask through: an open stream costs a
+coroutine and one chunk of memory. Under a threaded WSGI server (serve.py,
+run.py) bodies are sent unpaced and the client's TCP window sets the pace;
+the limits still apply.
+
+A bulk stream holds its slots until the server closes its body, so an aborted
+download frees them as soon as the connection goes.
+"""
+
+import threading
+import time
+import anyio
+from flask import current_app, jsonify, request
+from app.utils.rate_limit import _client_key
+
+# Set in the WSGI environ by servers that can pace; the scheduler turns it on for paced bodies
+PACING_KEY = 'podcast.paced'
+
+def paced(f):
+    """Schedule this view's audio responses. Place it directly under the route decorator."""
+    f._paced = True
+    return f
+
+class SlotBody:
+    """A bulk stream's response body; releases its slots on close()"""
+
+    __slots__ = ('body', 'scheduler', 'user', 'released')
+
+    def __init__(self, body, scheduler, user):
+        self.body = body
+        self.scheduler = scheduler
+        self.user = user
+        self.released = False
+
+    def __iter__(self):
+        return iter(self.body)
+
+    def close(self):
+        if not self.released:
+            self.released = True
+            self.scheduler.release(self.user)
+        close = getattr(self.body, 'close', None)
+        if close is not None:
+            close()
+
+class StreamScheduler:
+    """Concurrent bulk-stream slots per caller and per worker, and the pacing parameters"""
+
+    def __init__(self, rate, burst, chunk_size=64 * 1024, small_range=256 * 1024, max_per_user=4, max_streams=None):
+        self.rate = rate
+        self.burst = burst
+        self.chunk_size = chunk_size
+        self.small_range = small_range
+        self.max_per_user = max_per_user
+        self.max_streams = max_streams
+        self.active = 0
+        # Only callers with an open bulk stream have an entry
+        self._per_user = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, user):
+        """None when a slot was taken, else the status to refuse with: 429 for the caller's limit, 503 for the worker's"""
+        with self._lock:
+            count = self._per_user.get(user, 0)
+            if count >= self.max_per_user:
+                return 429
+            if self.max_streams is not None and self.active >= self.max_streams:
+                return 503
+            self._per_user[user] = count + 1
+            self.active += 1
+        return None
+
+    def release(self, user):
+        with self._lock:
+            count = self._per_user.pop(user, 0) - 1
+            if count > 0:
+                self._per_user[user] = count
+            self.active -= 1
+
+    def classify(self, response, byte_range):
+        """'seek', 'listen' or 'bulk' for a response to a request with werkzeug Range `byte_range` (or None)"""
+        length = response.content_length
+        if length is not None and length <= self.small_range:
+            return 'seek'
+        if byte_range is None or any(end is None for _, end in byte_range.ranges):
+            return 'listen'
+        return 'bulk'
+
+    def schedule(self, response, user, byte_range=None, environ=None):
+        """The response with its slots taken and pacing requested, or a 429/503 response when no slot is free"""
+        kind = self.classify(response, byte_range)
+        if kind == 'seek':
+            return response
+        if kind == 'bulk':
+            refused = self.acquire(user)
+            if refused is not None:
+                response.close()
+                message = 'Too many concurrent streams' if refused == 429 else 'Streaming capacity reached, please retry shortly'
+                refusal = jsonify({'message': message})
+                refusal.status_code = refused
+                refusal.headers['Retry-After'] = '1'
+                return refusal
+            response.response = SlotBody(response.response, self, user)
+        if environ is not None and PACING_KEY in environ:
+            environ[PACING_KEY] = True
+        return response
+
+def _schedule_stream(response):
+    if request.method != 'GET' or response.status_code not in (200, 206):
+        return response
+    view = current_app.view_functions.get(request.endpoint)
+    if not getattr(view, '_paced', False) or not (response.mimetype or '').startswith('audio/'):
+        return response
+    return current_app.extensions['stream_scheduler'].schedule(response, _client_key('user'), request.range, request.environ)
+
+def _read(chunks, size):
+    """At least `size` bytes from the body iterator, fewer only at its end"""
+    data = bytearray()
+    for chunk in chunks:
+        data += chunk
+        if len(data) >= size:
+            break
+    return bytes(data)
+
+class PacedWSGIMiddleware:
+    """Serves a WSGI app to an ASGI server, reading its response body a chunk at a time.
+
+    Each chunk is read in a worker thread and sent from the event loop, so no
+    thread is held between chunks. Bodies the scheduler asked to pace sleep on
+    the event loop once their burst is out. The body is closed when the
+    response ends or the client disconnects.
+    """
+
+    def __init__(self, app, scheduler=None, chunk_size=64 * 1024):
+        self.app = app
+        self.scheduler = scheduler
+        self.chunk_size = scheduler.chunk_size if scheduler is not None else chunk_size
+
+    async def __call__(self, scope, receive, send):
+        # Starlette's environ builder, as its WSGIMiddleware uses
+        from starlette.middleware.wsgi import build_environ
+        body = bytearray()
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+        environ = build_environ(scope, bytes(body))
+        if self.scheduler is not None:
+            environ[PACING_KEY] = False
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [status, headers]
+
+        iterable = await anyio.to_thread.run_sync(self.app, environ, start_response)
+        try:
+            async with anyio.create_task_group() as tasks:
+                async def watch_disconnect():
+                    while (await receive())['type'] != 'http.disconnect':
+                        pass
+                    tasks.cancel_scope.cancel()
+
+                tasks.start_soon(watch_disconnect)
+                await self._respond(iter(iterable), started, environ.get(PACING_KEY), send)
+                tasks.cancel_scope.cancel()
+        finally:
+            close = getattr(iterable, 'close', None)
+            if close is not None:
+                close()
+
+    async def _respond(self, chunks, started, pace, send):
+        data = await anyio.to_thread.run_sync(_read, chunks, self.chunk_size)
+        # WSGI apps may call start_response as late as their first chunk
+        status, headers = started
+        await send({
+            'type': 'http.response.start',
+            'status': int(status.split(' ', 1)[0]),
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+        })
+        rate, burst = (self.scheduler.rate, self.scheduler.burst) if pace else (None, None)
+        began = time.monotonic()
+        sent = 0
+        while data:
+            await send({'type': 'http.response.body', 'body': data, 'more_body': True})
+            sent += len(data)
+            if rate and sent > burst:
+                ahead = began + (sent - burst) / rate - time.monotonic()
+                if ahead > 0:
+                    await anyio.sleep(ahead)
+            data = await anyio.to_thread.run_sync(_read, chunks, self.chunk_size)
+        await send({'type': 'http.response.body', 'body': b''})
+
+def create_stream_scheduler(config):
+    return StreamScheduler(
+        config['STREAM_RATE'],
+        config['STREAM_BURST'],
+        chunk_size=config['STREAM_CHUNK_SIZE'],
+        small_range=config['STREAM_SMALL_RANGE'],
+        max_per_user=config['STREAM_MAX_PER_USER'],
+        max_streams=config['STREAM_MAX_STREAMS'],
+    )
+
+def init_stream_scheduler(app):
+    """Pace and limit audio streams; nothing is hooked when STREAM_SCHEDULER_ENABLED is off"""
+    if not app.config['STREAM_SCHEDULER_ENABLED']:
+        return None
+    scheduler = create_stream_scheduler(app.config)
+    app.extensions['stream_scheduler'] = scheduler
+    app.after_request(_schedule_stream)
+    return scheduler
@@ -0,0 +1,8 @@
+import os
+from app.asgi import create_asgi_app
+
+# Servers deliver queued email unless told otherwise
+os.environ.setdefault('MAIL_OUTBOX_SENDER', 'true')
+
+# Async reads plus the Flask app behind them: `uvicorn asgi:app --workers 4`
+app = create_asgi_app()
@@ -0,0 +1 @@
+# Benchmark and performance regression tools
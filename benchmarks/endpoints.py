@@ -0,0 +1,458 @@
+"""
+Latency and throughput of every endpoint in the auth, category and podcast blueprints.
+
+Seeds a synthetic world (see benchmarks.seed), then sends `--requests`
+requests to each endpoint twice: sequentially through the Flask test client,
+and over HTTP to a real threaded local server with `--concurrency` keep-alive
+connections. Requests that change data get their own prepared rows (fresh
+users, comments, likes, podcasts to delete, ...), created before timing
+starts, so every timed request does the same work.
+
+For each endpoint and mode it records p50/p95/p99 latency and throughput.
+`--save` writes them to a JSON baseline; `--baseline` compares against one
+and exits with code 1 when p50, p95 or throughput is worse than the baseline
+by more than `--tolerance` (p99 is reported but too noisy to gate on).
+Differences smaller than `--min-delta-ms` are ignored.
+
+Usage:
+    python -m benchmarks.endpoints --save benchmarks/baseline.json
+    python -m benchmarks.endpoints --baseline benchmarks/baseline.json --tolerance 0.25
+    python -m benchmarks.endpoints --only podcast.get_podcasts,auth.login -v
+"""
+
+import argparse
+import http.client
+import io
+import itertools
+import json
+import os
+import platform
+import queue
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, UTC
+from werkzeug.test import EnvironBuilder
+
+PASSWORD = 'Bench-Passw0rd!'
+BLUEPRINTS = ('auth', 'category', 'podcast')
+
+class World:
+    """Seeded ids plus helpers that create the rows write endpoints consume"""
+
+    def __init__(self, app, ids):
+        from app.utils.password import hash_password
+        self.app = app
+        self.ids = ids
+        self.password_hash = hash_password(PASSWORD)
+        self.counter = 0
+        self.reader = ids['users'][0]
+        self.podcast = ids['podcasts'][0]
+        self.category = ids['categories'][0]
+
+    def unique(self, prefix):
+        self.counter += 1
+        return f'{prefix}-{os.getpid()}-{self.counter}'
+
+    def token(self, user_id):
+        from flask_jwt_extended import create_access_token
+        with self.app.app_context():
+            return create_access_token(identity=user_id)
+
+    def auth(self, user_id):
+        return {'Authorization': f'Bearer {self.token(user_id)}'}
+
+    def users(self, count, **fields):
+        """Insert `count` users with a known password; callable field values are called per row"""
+        from app import db
+        from app.models.types import new_id
+        from app.models.user import User
+        now = datetime.utcnow()
+        rows = [{
+            'id': new_id(),
+            'email': f"{self.unique('bench')}@example.com",
+            'password': self.password_hash,
+            'is_verified': True,
+            'created_at': now,
+            'updated_at': now,
+            **{key: value() if callable(value) else value for key, value in fields.items()},
+        } for _ in range(count)]
+        with self.app.app_context():
+            db.session.execute(User.__table__.insert(), rows)
+            db.session.commit()
+        return rows
+
+    def insert(self, table, rows):
+        from app import db
+        with self.app.app_context():
+            db.session.execute(table.insert(), rows)
+            db.session.commit()
+        return rows
+
+def _request(method, path, **kwargs):
+    return (method, path, kwargs)
+
+def _scenarios(world, n, slow_n):
+    """endpoint -> function returning prepared (method, path, kwargs) requests.
+
+    Endpoints that hash a password with bcrypt take hundreds of milliseconds by
+    design and get `slow_n` requests instead of `n`.
+    """
+    from app.models.category import Category
+    from app.models.comment import Comment
+    from app.models.podcast import Podcast, podcast_likes
+    from app.models.types import new_id
+    from benchmarks.seed import THUMBNAIL, wav_bytes
+
+    ids = world.ids
+    podcasts = ids['podcasts']
+    reader_auth = world.auth(world.reader)
+    audio = wav_bytes()
+    now = datetime.utcnow()
+    later = datetime.now(UTC) + timedelta(hours=1)
+
+    def same(method, path, **kwargs):
+        return lambda: [_request(method, path, **kwargs)] * n
+
+    def signup():
+        return [_request('POST', '/auth/signup', json={'email': f"{world.unique('signup')}@example.com", 'password': PASSWORD})
+                for _ in range(slow_n)]
+
+    def verify_email():
+        # OTPs are unique per user
+        otps = (f'{i:06d}' for i in itertools.count(world.counter))
+        users = world.users(n, is_verified=False, otp=lambda: next(otps), otp_expiry=later)
+        return [_request('POST', '/auth/verify-email', json={'email': u['email'], 'otp': u['otp']}) for u in users]
+
+    def forgot_password():
+        user = world.users(1)[0]
+        return [_request('POST', '/auth/forgot-password', json={'email': user['email']})] * n
+
+    def reset_password():
+        users = world.users(slow_n, reset_token=new_id, reset_token_expiry=later)
+        return [_request('POST', '/auth/reset-password', json={'token': u['reset_token'], 'new_password': PASSWORD})
+                for u in users]
+
+    def login():
+        user = world.users(1)[0]
+        return [_request('POST', '/auth/login', json={'email': user['email'], 'password': PASSWORD})] * slow_n
+
+    def delete_profile():
+        return [_request('DELETE', '/auth/profile', headers=world.auth(u['id']), json={'password': PASSWORD})
+                for u in world.users(slow_n)]
+
+    def create_category():
+        return [_request('POST', '/api/categories', json={'name': world.unique('Bench category')}) for _ in range(n)]
+
+    def delete_category():
+        rows = world.insert(Category.__table__, [{
+            'id': new_id(), 'name': world.unique('Doomed category'), 'slug': world.unique('doomed'),
+            'created_at': now, 'updated_at': now,
+        } for _ in range(n)])
+        return [_request('DELETE', f"/api/categories/{row['id']}") for row in rows]
+
+    def author():
+        user = world.users(1)[0]
+        return user['id'], world.auth(user['id'])
+
+    def add_comment():
+        _, headers = author()
+        return [_request('POST', f'/api/podcasts/{world.podcast}/comments', headers=headers, json={'content': 'Benchmark'})] * n
+
+    def delete_comment():
+        user_id, headers = author()
+        rows = world.insert(Comment.__table__, [{
+            'id': new_id(), 'content': 'Doomed', 'podcast_id': world.podcast, 'user_id': user_id,
+            'created_at': now, 'updated_at': now,
+        } for _ in range(n)])
+        return [_request('DELETE', f"/api/podcasts/{world.podcast}/comments/{row['id']}", headers=headers) for row in rows]
+
+    def like():
+        _, headers = author()
+        return [_request('POST', f'/api/podcasts/{podcasts[i % len(podcasts)]}/like', headers=headers) for i in range(n)]
+
+    def unlike():
+        user_id, headers = author()
+        targets = [podcasts[i % len(podcasts)] for i in range(n)]
+        world.insert(podcast_likes, [{'podcast_id': p, 'user_id': user_id, 'created_at': now} for p in set(targets)])
+        return [_request('POST', f'/api/podcasts/{p}/unlike', headers=headers) for p in targets]
+
+    def create_podcast():
+        _, headers = author()
+        # The slug is derived from the title, so titles must be unique
+        return [_request('POST', '/api/podcasts', headers=headers, data={
+            'title': world.unique('Benchmark episode'),
+            'categories[]': [world.category],
+            'audio': (io.BytesIO(audio), 'episode.wav'),
+            'thumbnail': (io.BytesIO(THUMBNAIL), 'cover.gif'),
+        }) for _ in range(n)]
+
+    def delete_podcast():
+        user_id, headers = author()
+        rows = world.insert(Podcast.__table__, [{
+            'id': new_id(), 'title': 'Doomed episode', 'slug': world.unique('doomed-episode'), 'author_id': user_id,
+            'audio_url': 'audio/missing.wav', 'thumbnail_url': 'thumbnails/missing.gif',
+            'created_at': now, 'updated_at': now,
+        } for _ in range(n)])
+        return [_request('DELETE', f"/api/podcasts/{row['id']}", headers=headers) for row in rows]
+
+    def track():
+        return [_request('POST', f'/api/podcasts/{podcasts[i % len(podcasts)]}/track', headers=reader_auth,
+                         json={'time_listened': i}) for i in range(n)]
+
+    return {
+        'auth.signup': signup,
+        'auth.verify_email': verify_email,
+        'auth.login': login,
+        'auth.forgot_password': forgot_password,
+        'auth.reset_password': reset_password,
+        'auth.get_profile': same('GET', '/auth/profile', headers=reader_auth),
+        'auth.delete_profile': delete_profile,
+        'auth.get_user_podcasts': same('GET', '/auth/profile/podcasts', headers=reader_auth),
+        'auth.get_liked_podcasts': same('GET', '/auth/profile/liked-podcasts', headers=reader_auth),
+        'auth.get_profile_details': same('GET', '/auth/profile/details', headers=reader_auth),
+        'auth.get_listen_history': same('GET', '/auth/profile/listen-history', headers=reader_auth),
+        'category.get_categories': same('GET', '/api/categories'),
+        'category.get_category': same('GET', f'/api/categories/{world.category}'),
+        'category.create_category': create_category,
+        'category.delete_category': delete_category,
+        'podcast.add_comment': add_comment,
+        'podcast.get_comments': same('GET', f'/api/podcasts/{world.podcast}/comments'),
+        'podcast.delete_comment': delete_comment,
+        'podcast.test': same('GET', '/api/test'),
+        'podcast.like_podcast': like,
+        'podcast.unlike_podcast': unlike,
+        'podcast.create_podcast': create_podcast,
+        'podcast.get_podcast': same('GET', f'/api/podcasts/{world.podcast}'),
+        'podcast.check_podcast_like': same('GET', f'/api/podcasts/{world.podcast}/check-like', headers=reader_auth),
+        'podcast.delete_podcast': delete_podcast,
+        'podcast.get_podcasts': same('GET', '/api/podcasts?per_page=20'),
+        'podcast.discover_podcasts': same('GET', '/api/podcasts/discover'),
+        'podcast.serve_thumbnail': same('GET', '/api/uploads/thumbnails/episode_0.gif'),
+        'podcast.serve_audio': same('GET', '/api/uploads/audio/episode_0.wav'),
+        'podcast.stream_podcast_audio': same('GET', f'/api/podcasts/{world.podcast}/stream',
+                                             headers={'Range': 'bytes=0-65535'}),
+        'podcast.track_podcast_listen': track,
+        'podcast.get_last_listened_position': same('GET', f'/api/podcasts/{world.podcast}/last-position', headers=reader_auth),
+    }
+
+def _encode(method, path, kwargs):
+    """Method, path, headers and body of a test-client style request, for http.client"""
+    kwargs = dict(kwargs)
+    if 'data' in kwargs:
+        kwargs['data'] = {key: (io.BytesIO(value[0].getvalue()), value[1]) if isinstance(value, tuple) else value
+                          for key, value in kwargs['data'].items()}
+    builder = EnvironBuilder(path=path, method=method, **kwargs)
+    try:
+        environ = builder.get_environ()
+        body = environ['wsgi.input'].read()
+        headers = dict(builder.headers)
+        if environ.get('CONTENT_TYPE'):
+            headers['Content-Type'] = environ['CONTENT_TYPE']
+        headers['Content-Length'] = str(len(body))
+        full_path = environ['PATH_INFO'] + ('?' + environ['QUERY_STRING'] if environ.get('QUERY_STRING') else '')
+        return method, full_path, headers, body
+    finally:
+        builder.close()
+
+def _summarize(latencies, elapsed, errors):
+    ordered = sorted(latencies)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+
+    return {
+        'requests': len(ordered),
+        'errors': errors,
+        'p50_ms': round(percentile(50), 3),
+        'p95_ms': round(percentile(95), 3),
+        'p99_ms': round(percentile(99), 3),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3),
+        'throughput_rps': round(len(ordered) / elapsed, 1),
+    }
+
+def run_client(app, requests):
+    client = app.test_client()
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    for method, path, kwargs in requests:
+        kwargs = dict(kwargs)
+        if 'data' in kwargs:
+            kwargs['data'] = {key: (io.BytesIO(value[0].getvalue()), value[1]) if isinstance(value, tuple) else value
+                              for key, value in kwargs['data'].items()}
+        begin = time.perf_counter()
+        response = client.open(path, method=method, **kwargs)
+        response.get_data()
+        response.close()
+        latencies.append(time.perf_counter() - begin)
+        errors += response.status_code >= 400
+    return _summarize(latencies, time.perf_counter() - started, errors)
+
+def run_server(port, requests, concurrency):
+    work = queue.Queue()
+    for request in requests:
+        work.put(_encode(*request))
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker():
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        try:
+            while True:
+                try:
+                    method, path, headers, body = work.get_nowait()
+                except queue.Empty:
+                    return
+                begin = time.perf_counter()
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                elapsed = time.perf_counter() - begin
+                with lock:
+                    latencies.append(elapsed)
+                    errors[0] += response.status >= 400
+                if response.will_close:
+                    connection.close()
+                    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return _summarize(latencies, time.perf_counter() - started, errors[0])
+
+def _start_server(app):
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """Regression messages for every result that is worse than the baseline"""
+    regressions = []
+    for mode, endpoints in results.items():
+        for endpoint, current in endpoints.items():
+            previous = baseline.get('results', {}).get(mode, {}).get(endpoint)
+            if not previous:
+                continue
+            for key in ('p50_ms', 'p95_ms'):
+                limit = previous[key] * (1 + tolerance)
+                if current[key] > limit and current[key] - previous[key] > min_delta_ms:
+                    regressions.append(f'{mode} {endpoint}: {key} {current[key]} > {previous[key]} (+{tolerance:.0%})')
+            floor = previous['throughput_rps'] * (1 - tolerance)
+            if current['throughput_rps'] < floor:
+                regressions.append(f"{mode} {endpoint}: throughput {current['throughput_rps']} < {previous['throughput_rps']} (-{tolerance:.0%})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark every endpoint through the test client and a local server')
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint and mode')
+    parser.add_argument('--slow-requests', type=int, default=20, help='requests for endpoints that run bcrypt')
+    parser.add_argument('--concurrency', type=int, default=8, help='connections to the local server')
+    parser.add_argument('--modes', default='client,server')
+    parser.add_argument('--only', help='comma separated endpoints, e.g. podcast.get_podcasts')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--podcasts', type=int, default=5000)
+    parser.add_argument('--likes', type=int, default=50000)
+    parser.add_argument('--comments', type=int, default=50000)
+    parser.add_argument('--listens', type=int, default=200000)
+    parser.add_argument('--save', help='write results to this JSON baseline')
+    parser.add_argument('--baseline', help='compare with this JSON baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--min-delta-ms', type=float, default=1.0)
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args()
+
+    os.environ.setdefault('MAIL_OUTBOX_SENDER', 'false')
+    os.environ['RATELIMIT_ENABLED'] = 'false'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    tmpdir = tempfile.TemporaryDirectory()
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmpdir.name, 'endpoints.db')
+
+    from app import create_app
+    from benchmarks.seed import seed
+    app = create_app()
+    app.config['UPLOAD_FOLDER'] = os.path.join(tmpdir.name, 'uploads')
+    print(f'Seeding {args.users} users, {args.podcasts} podcasts, {args.listens} listens...', flush=True)
+    with app.app_context():
+        ids = seed(args.users, args.podcasts, args.likes, args.comments, args.listens,
+                   upload_folder=app.config['UPLOAD_FOLDER'])
+    # The file routes serve uploads/ relative to the app package; point them at the seeded files
+    app.root_path = tmpdir.name
+
+    world = World(app, ids)
+    scenarios = _scenarios(world, args.requests, args.slow_requests)
+    covered = set(scenarios)
+    expected = {rule.endpoint for rule in app.url_map.iter_rules() if rule.endpoint.split('.')[0] in BLUEPRINTS}
+    if expected - covered:
+        print(f"Not benchmarked: {', '.join(sorted(expected - covered))}")
+    if args.only:
+        selected = args.only.split(',')
+        scenarios = {name: scenarios[name] for name in selected}
+
+    server = _start_server(app) if 'server' in args.modes else None
+    results = {mode: {} for mode in args.modes.split(',')}
+    print(f"{'endpoint':<36} {'mode':<6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'errors':>6}")
+    for name, prepare in scenarios.items():
+        for mode in results:
+            requests = prepare()
+            run = (lambda r: run_client(app, r)) if mode == 'client' else \
+                (lambda r: run_server(server.server_port, r, args.concurrency))
+            # Warm caches and connections with a few untimed requests where repeating them is harmless
+            if all(method == 'GET' for method, _, _ in requests):
+                run(requests[:10])
+            result = run(requests)
+            results[mode][name] = result
+            print(f"{name:<36} {mode:<6} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+                  f"{result['throughput_rps']:>8.1f} {result['errors']:>6}", flush=True)
+    if server is not None:
+        server.shutdown()
+    app.extensions['deletion'].join()
+    tmpdir.cleanup()
+
+    failed = [f'{mode} {name}: {result["errors"]} errors' for mode, endpoints in results.items()
+              for name, result in endpoints.items() if result['errors']]
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'meta': {
+                    'created_at': datetime.now(UTC).isoformat(timespec='seconds'),
+                    'python': platform.python_version(),
+                    'machine': platform.machine(),
+                    'requests': args.requests,
+                    'slow_requests': args.slow_requests,
+                    'concurrency': args.concurrency,
+                    'world': {k: getattr(args, k) for k in ('users', 'podcasts', 'likes', 'comments', 'listens')},
+                },
+                'results': results,
+            }, f, indent=2)
+        print(f'Saved baseline to {args.save}')
+    if args.baseline:
+        with open(args.baseline) as f:
+            failed += compare(results, json.load(f), args.tolerance, args.min_delta_ms)
+    if failed:
+        print(f'\n{len(failed)} problem(s):')
+        for line in failed:
+            print(f'  {line}')
+        sys.exit(1)
+    if args.baseline:
+        print(f'No regressions beyond {args.tolerance:.0%}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Per-request cost of the metrics middleware.
+
+Builds two apps on the same seeded database, one with METRICS_ENABLED=false
+and one with it on, and times the same requests through each test client.
+Rounds alternate between the two apps and the median round is reported, so
+drift (CPU frequency, page cache) affects both sides equally.
+
+Usage:
+    python -m benchmarks.metrics_overhead --requests 500 --rounds 7
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+def _time_requests(client, url, count):
+    started = time.perf_counter()
+    for _ in range(count):
+        response = client.get(url)
+        response.close()
+    return (time.perf_counter() - started) / count
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the per-request cost of request metrics')
+    parser.add_argument('--requests', type=int, default=500, help='requests per round')
+    parser.add_argument('--rounds', type=int, default=7)
+    args = parser.parse_args()
+
+    os.environ.setdefault('MAIL_OUTBOX_SENDER', 'false')
+    os.environ.setdefault('RATELIMIT_ENABLED', 'false')
+    tmpdir = tempfile.TemporaryDirectory()
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmpdir.name, 'metrics.db')
+
+    from app import create_app
+    from benchmarks.seed import seed
+
+    os.environ['METRICS_ENABLED'] = 'false'
+    plain = create_app()
+    os.environ['METRICS_ENABLED'] = 'true'
+    measured = create_app()
+    with plain.app_context():
+        ids = seed(users=50, podcasts=200, likes=500, comments=500, listens=1000)
+
+    urls = [
+        '/api/test',
+        '/api/categories',
+        '/api/podcasts?per_page=20',
+        f"/api/podcasts/{ids['podcasts'][0]}",
+    ]
+    clients = {'off': plain.test_client(), 'on': measured.test_client()}
+    print(f"{'endpoint':<40} {'off (us)':>10} {'on (us)':>10} {'cost (us)':>10} {'cost':>7}")
+    for url in urls:
+        for client in clients.values():
+            _time_requests(client, url, 20)
+        timings = {name: [] for name in clients}
+        for _ in range(args.rounds):
+            for name, client in clients.items():
+                timings[name].append(_time_requests(client, url, args.requests))
+        off = statistics.median(timings['off']) * 1e6
+        on = statistics.median(timings['on']) * 1e6
+        print(f'{url[:40]:<40} {off:>10.1f} {on:>10.1f} {on - off:>10.1f} {(on - off) / off:>7.1%}')
+
+    metrics = measured.extensions['metrics']
+    count = 100000
+    started = time.perf_counter()
+    for _ in range(count):
+        metrics.observe(('GET', '/bench'), 0.004, 200, 3, 0.001)
+    print(f'\nobserve(): {(time.perf_counter() - started) / count * 1e6:.2f} us per call')
+    tmpdir.cleanup()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Query budget check for every endpoint.
+
+Seeds a synthetic catalog and runs app.utils.query_budgets against it. Exits
+with code 1 when an endpoint issues more statements than its pinned budget,
+or repeats one statement shape QUERY_TRACE_THRESHOLD times or more; -v prints
+the statements of every call.
+
+Usage:
+    python -m benchmarks.query_budgets
+"""
+
+import os
+import sys
+import tempfile
+
+def main():
+    os.environ.setdefault('MAIL_OUTBOX_SENDER', 'false')
+    os.environ['RATELIMIT_ENABLED'] = 'false'
+    # Measure the queries themselves, not cache hits
+    os.environ.setdefault('RESPONSE_CACHE_ENABLED', 'false')
+    tmpdir = tempfile.TemporaryDirectory()
+    if 'DATABASE_URL' not in os.environ:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmpdir.name, 'budgets.db')
+    os.environ.setdefault('LIVE_EVENTS_PATH', os.path.join(tmpdir.name, 'live_events.db'))
+
+    from app import create_app
+    from app.utils.query_budgets import check_query_budgets
+    from benchmarks.seed import THUMBNAIL, seed, wav_bytes
+    app = create_app()
+    app.config['UPLOAD_FOLDER'] = tmpdir.name
+    with app.app_context():
+        ids = seed(users=50, podcasts=200, likes=500, comments=500, listens=1000)
+
+    verbose = '-v' in sys.argv
+    failures = []
+    print(f"{'endpoint':<42} {'queries':>7} {'budget':>6}")
+    for name, queries, budget, errors, report in check_query_budgets(app, ids, wav_bytes(), THUMBNAIL):
+        failures.extend(errors)
+        print(f"{name:<42} {queries:>7} {budget:>6}  {'FAIL' if errors else 'ok'}")
+        if verbose or errors:
+            print('    ' + report.replace('\n', '\n    '))
+    tmpdir.cleanup()
+
+    if failures:
+        print(f'\n{len(failures)} budget failure(s):')
+        for failure in failures:
+            print(f'  {failure}')
+        sys.exit(1)
+    print('All endpoints within their query budgets')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Query plan regression check for the hot read endpoints.
+
+Seeds a synthetic catalog and runs app.utils.query_plans against it. Exits
+with code 1 when a statement reads a table without an index (a SQLite
+`SCAN <table>` step, or a PostgreSQL `Seq Scan` node); -v prints the plan of
+every statement.
+
+Usage:
+    python -m benchmarks.query_plans                # temporary SQLite database
+    DATABASE_URL=postgresql://... python -m benchmarks.query_plans
+"""
+
+import os
+import sys
+import tempfile
+
+def main():
+    os.environ.setdefault('MAIL_OUTBOX_SENDER', 'false')
+    os.environ.setdefault('RATELIMIT_ENABLED', 'false')
+    # Measure the queries themselves, not cache hits
+    os.environ.setdefault('RESPONSE_CACHE_ENABLED', 'false')
+    tmpdir = None
+    if 'DATABASE_URL' not in os.environ:
+        tmpdir = tempfile.TemporaryDirectory()
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmpdir.name, 'plans.db')
+
+    from app import create_app
+    from app.utils.query_plans import check_query_plans
+    from benchmarks.seed import seed
+    app = create_app()
+    with app.app_context():
+        ids = seed()
+
+    verbose = '-v' in sys.argv
+    failures = 0
+    for endpoint, url, statement, plan, violations in check_query_plans(app, ids):
+        if violations:
+            failures += 1
+        if violations or verbose:
+            print(f"{'FAIL' if violations else 'ok  '} {endpoint} {url}")
+            print('     ' + ' '.join(statement.split())[:200])
+            for line in plan:
+                print(f'       {line}')
+    if tmpdir:
+        tmpdir.cleanup()
+
+    if failures:
+        print(f'\n{failures} statement(s) read a table without an index')
+        sys.exit(1)
+    print('All hot queries use indexes')
+
+if __name__ == '__main__':
+    main()
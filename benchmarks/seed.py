@@ -0,0 +1,246 @@
+"""
+Seed a database with a synthetic podcast catalog.
+
+Rows are written with Core bulk inserts, so even large worlds load quickly.
+Podcast popularity follows a Zipf distribution: a few podcasts collect most
+of the likes, comments and listens, as in production. Listens are generated
+and inserted in committed chunks, so millions of rows never sit in memory at
+once.
+
+With --upload-folder every podcast also gets a small silent WAV file and a
+thumbnail on disk (hard links to one template), so the streaming and file
+routes have something to serve.
+
+Usage:
+    python -m benchmarks.seed --users 200 --podcasts 1000
+    python -m benchmarks.seed --users 20000 --podcasts 50000 --listens 5000000 --upload-folder app/uploads
+"""
+
+import argparse
+import bisect
+import io
+import itertools
+import os
+import random
+import struct
+import wave
+from datetime import datetime, timedelta
+from app import db
+from app.commands import init_db
+from app.models.category import Category
+from app.models.comment import Comment
+from app.models.podcast import Podcast, podcast_categories, podcast_likes
+from app.models.podcast_listen import PodcastListen
+from app.models.types import new_id
+from app.models.user import User
+
+CATEGORY_NAMES = [
+    'Technology', 'Science', 'Comedy', 'News', 'History', 'Business', 'Health',
+    'Sports', 'Music', 'Education', 'Arts', 'Fiction', 'True Crime', 'Politics',
+    'Society', 'Religion', 'Kids', 'Games', 'Travel', 'Food'
+]
+
+# Smallest valid GIF: 1x1 transparent pixel
+THUMBNAIL = bytes.fromhex('47494638396101000100800000000000ffffff21f90401000000002c00000000010001000002024401003b')
+
+def wav_bytes(seconds=1, rate=8000):
+    """A silent mono 16-bit WAV file"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as audio:
+        audio.setnchannels(1)
+        audio.setsampwidth(2)
+        audio.setframerate(rate)
+        audio.writeframes(struct.pack('<h', 0) * int(rate * seconds))
+    return buffer.getvalue()
+
+class ZipfSampler:
+    """Draws indexes 0..n-1 with P(rank k) proportional to 1 / (k + 1) ** s.
+
+    Ranks are shuffled onto indexes, so the most popular items are spread
+    across the catalog instead of being the first rows.
+    """
+
+    def __init__(self, n, s, rng):
+        self.rng = rng
+        self.order = list(range(n))
+        rng.shuffle(self.order)
+        self.cumulative = list(itertools.accumulate(1.0 / (k + 1) ** s for k in range(n)))
+        self.total = self.cumulative[-1]
+
+    def __call__(self):
+        rank = bisect.bisect_left(self.cumulative, self.rng.random() * self.total)
+        return self.order[min(rank, len(self.order) - 1)]
+
+def _insert(table, rows, batch_size=5000):
+    for i in range(0, len(rows), batch_size):
+        db.session.execute(table.insert(), rows[i:i + batch_size])
+
+def _distinct_pairs(rng, users, items, total, sample):
+    """Yield up to `total` unique (user, item) index pairs, spread evenly over users.
+
+    Each user's items are drawn from `sample` without repeats, so only one
+    user's picks are held in memory at a time.
+    """
+    total = min(total, users * items)
+    for user in range(users):
+        count = total // users + (1 if user < total % users else 0)
+        if count * 2 > items:
+            picks = rng.sample(range(items), count)
+        else:
+            picked = set()
+            for _ in range(count * 50):
+                if len(picked) == count:
+                    break
+                picked.add(sample())
+            # A steep skew rarely reaches the tail; top up uniformly
+            while len(picked) < count:
+                picked.add(rng.randrange(items))
+            picks = picked
+        for item in picks:
+            yield user, item
+
+def _write_media(upload_folder, podcast_rows, audio_seconds):
+    audio_dir = os.path.join(upload_folder, 'audio')
+    thumbnail_dir = os.path.join(upload_folder, 'thumbnails')
+    os.makedirs(audio_dir, exist_ok=True)
+    os.makedirs(thumbnail_dir, exist_ok=True)
+    templates = {}
+    for name, content in (('audio', wav_bytes(audio_seconds)), ('thumbnail', THUMBNAIL)):
+        path = os.path.join(upload_folder, f'.seed-template-{name}')
+        with open(path, 'wb') as f:
+            f.write(content)
+        templates[name] = path
+    for row in podcast_rows:
+        for name, column in (('audio', 'audio_url'), ('thumbnail', 'thumbnail_url')):
+            target = os.path.join(upload_folder, row[column])
+            if os.path.exists(target):
+                continue
+            try:
+                os.link(templates[name], target)
+            except OSError:
+                with open(templates[name], 'rb') as src, open(target, 'wb') as dst:
+                    dst.write(src.read())
+
+def seed(users=200, podcasts=1000, likes=5000, comments=5000, listens=20000, seed_value=42,
+         zipf=1.1, upload_folder=None, audio_seconds=5, chunk_size=100000):
+    """Fill the current app's database with a synthetic world. Returns the generated ids."""
+    init_db()
+    rng = random.Random(seed_value)
+    now = datetime.utcnow()
+
+    user_rows = [{
+        'id': new_id(),
+        'email': f'user{i}@example.com',
+        'password': 'not-a-real-hash',
+        'is_verified': True,
+        'created_at': now,
+        'updated_at': now
+    } for i in range(users)]
+    _insert(User.__table__, user_rows)
+    user_ids = [row['id'] for row in user_rows]
+
+    category_rows = [{
+        'id': new_id(),
+        'name': name,
+        'description': f'{name} podcasts',
+        'slug': name.lower().replace(' ', '-'),
+        'created_at': now,
+        'updated_at': now
+    } for name in CATEGORY_NAMES]
+    _insert(Category.__table__, category_rows)
+    category_ids = [row['id'] for row in category_rows]
+
+    podcast_rows = []
+    for i in range(podcasts):
+        created = now - timedelta(minutes=i * 7)
+        podcast_rows.append({
+            'id': new_id(),
+            'title': f'Episode {i}',
+            'description': f'Synthetic episode number {i}',
+            'thumbnail_url': f'thumbnails/episode_{i}.gif',
+            'audio_url': f'audio/episode_{i}.wav',
+            'duration': rng.randint(300, 5400),
+            'author_id': rng.choice(user_ids),
+            'slug': f'episode-{i}',
+            'published': True,
+            'published_at': created,
+            'created_at': created,
+            'updated_at': created
+        })
+    _insert(Podcast.__table__, podcast_rows)
+    podcast_ids = [row['id'] for row in podcast_rows]
+    if upload_folder:
+        _write_media(upload_folder, podcast_rows, audio_seconds)
+
+    _insert(podcast_categories, [
+        {'podcast_id': podcast_id, 'category_id': category_id}
+        for podcast_id in podcast_ids
+        for category_id in rng.sample(category_ids, rng.randint(1, 3))
+    ])
+
+    popularity = ZipfSampler(podcasts, zipf, rng)
+
+    _insert(podcast_likes, [
+        {'podcast_id': podcast_ids[podcast], 'user_id': user_ids[user], 'created_at': now}
+        for user, podcast in _distinct_pairs(rng, users, podcasts, likes, popularity)
+    ])
+
+    comment_rows = [{
+        'id': new_id(),
+        'content': f'Comment {i}',
+        'podcast_id': podcast_ids[popularity()],
+        'user_id': rng.choice(user_ids),
+        'parent_id': None,
+        'created_at': now - timedelta(seconds=i),
+        'updated_at': now - timedelta(seconds=i)
+    } for i in range(comments)]
+    _insert(Comment.__table__, comment_rows)
+    db.session.commit()
+
+    listen_rows = ({
+        'id': new_id(),
+        'user_id': user_ids[user],
+        'podcast_id': podcast_ids[podcast],
+        'time_listened': rng.randint(0, 3600),
+        'tracked_at': now - timedelta(seconds=rng.randint(0, 86400 * 30))
+    } for user, podcast in _distinct_pairs(rng, users, podcasts, listens, popularity))
+    while True:
+        chunk = list(itertools.islice(listen_rows, chunk_size))
+        if not chunk:
+            break
+        _insert(PodcastListen.__table__, chunk)
+        db.session.commit()
+
+    if db.engine.dialect.name in ('sqlite', 'postgresql'):
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql('ANALYZE')
+
+    return {
+        'users': user_ids,
+        'categories': category_ids,
+        'podcasts': podcast_ids,
+        'comments': [row['id'] for row in comment_rows]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Seed the database with synthetic data')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--podcasts', type=int, default=1000)
+    parser.add_argument('--likes', type=int, default=5000)
+    parser.add_argument('--comments', type=int, default=5000)
+    parser.add_argument('--listens', type=int, default=20000)
+    parser.add_argument('--zipf', type=float, default=1.1, help='popularity skew (0 = uniform)')
+    parser.add_argument('--upload-folder', help='write a dummy audio file and thumbnail per podcast here')
+    parser.add_argument('--audio-seconds', type=float, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        ids = seed(args.users, args.podcasts, args.likes, args.comments, args.listens, args.seed,
+                   zipf=args.zipf, upload_folder=args.upload_folder, audio_seconds=args.audio_seconds)
+    print(f"Seeded {len(ids['users'])} users, {len(ids['podcasts'])} podcasts")
+
+if __name__ == '__main__':
+    main()
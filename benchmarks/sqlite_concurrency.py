@@ -0,0 +1,141 @@
+"""
+Concurrent read/write throughput of a file-backed SQLite database.
+
+Runs the same workload against three configurations, each on a fresh seeded
+database file:
+
+- default:    rollback journal and SQLite's stock pragmas
+- production: SQLITE_PROFILE=production (WAL, synchronous=NORMAL, busy_timeout, ...)
+- queue:      production plus the single-writer group-commit queue
+
+Reader threads page through the newest podcasts and count a podcast's
+listens; writer threads upsert listen progress the way POST /track does, one
+transaction per write (or one queued job per write). Reported numbers are
+operations per second and the number of "database is locked" errors.
+
+Usage:
+    python -m benchmarks.sqlite_concurrency --readers 8 --writers 8 --seconds 5
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+MODES = {
+    'default': {'SQLITE_PROFILE': 'default', 'SQLITE_WRITE_QUEUE': 'false'},
+    'production': {'SQLITE_PROFILE': 'production', 'SQLITE_WRITE_QUEUE': 'false'},
+    'queue': {'SQLITE_PROFILE': 'production', 'SQLITE_WRITE_QUEUE': 'true'},
+}
+
+def _run_mode(mode, directory, args):
+    os.environ.update(MODES[mode])
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(directory, f'{mode}.db')
+
+    from app import create_app, db
+    from app.models.podcast import Podcast
+    from app.models.podcast_listen import PodcastListen
+    from app.routes.podcast import _record_listen
+    from benchmarks.seed import seed
+    from sqlalchemy.exc import IntegrityError
+
+    app = create_app()
+    with app.app_context():
+        ids = seed(users=args.users, podcasts=args.podcasts, listens=args.users * 10)
+        engine = db.engine
+    write_queue = app.extensions.get('sqlite_write_queue')
+
+    podcasts = Podcast.__table__
+    listens = PodcastListen.__table__
+    page_query = db.select(podcasts.c.id, podcasts.c.title).order_by(podcasts.c.created_at.desc()).limit(20)
+    stop = threading.Event()
+    counts = {'reads': 0, 'writes': 0, 'locked': 0}
+    counts_lock = threading.Lock()
+
+    def record(key, amount=1):
+        with counts_lock:
+            counts[key] += amount
+
+    def reader(n):
+        rng = random.Random(n)
+        done = 0
+        while not stop.is_set():
+            try:
+                with engine.connect() as connection:
+                    connection.execute(page_query).all()
+                    connection.execute(
+                        db.select(db.func.count()).select_from(listens)
+                        .where(listens.c.podcast_id == rng.choice(ids['podcasts']))
+                    ).scalar()
+                done += 1
+            except Exception as e:
+                if 'locked' not in str(e):
+                    raise
+                record('locked')
+        record('reads', done)
+
+    def writer(n):
+        rng = random.Random(1000 + n)
+        done = 0
+        while not stop.is_set():
+            user_id = rng.choice(ids['users'])
+            podcast_id = rng.choice(ids['podcasts'])
+            seconds = rng.randint(0, 3600)
+            try:
+                if write_queue is not None:
+                    write_queue.submit(_record_listen, user_id, podcast_id, seconds)
+                else:
+                    with engine.begin() as connection:
+                        _record_listen(connection, user_id, podcast_id, seconds)
+                done += 1
+            except IntegrityError:
+                # Another writer inserted the same pair first; POST /track retries as an update
+                continue
+            except Exception as e:
+                if 'locked' not in str(e):
+                    raise
+                record('locked')
+        record('writes', done)
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    engine.dispose()
+
+    return {
+        'reads_per_s': counts['reads'] / elapsed,
+        'writes_per_s': counts['writes'] / elapsed,
+        'locked': counts['locked'],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare SQLite read/write throughput per profile')
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--podcasts', type=int, default=1000)
+    parser.add_argument('--modes', default=','.join(MODES))
+    args = parser.parse_args()
+
+    os.environ.setdefault('MAIL_OUTBOX_SENDER', 'false')
+    os.environ.setdefault('RATELIMIT_ENABLED', 'false')
+
+    print(f'{args.readers} readers, {args.writers} writers, {args.seconds:g}s per mode')
+    print(f"{'mode':<12}{'reads/s':>12}{'writes/s':>12}{'locked':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in args.modes.split(','):
+            result = _run_mode(mode, directory, args)
+            print(f"{mode:<12}{result['reads_per_s']:>12.0f}{result['writes_per_s']:>12.0f}{result['locked']:>10}")
+
+if __name__ == '__main__':
+    main()
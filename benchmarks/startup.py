@@ -0,0 +1,194 @@
+"""
+Startup time of the app and of the production launcher.
+
+Everything runs in fresh subprocesses so nothing is already imported:
+
+  * create_app: interpreter start, `import app` and `create_app()`, split
+    into their parts, plus the slowest imports from `python -X importtime`
+  * serve.py: time from launching the master until the first request
+    succeeds and until every worker reports ready, with and without
+    --preload (forked workers versus workers that each build the app)
+
+Usage:
+    python -m benchmarks.startup --runs 10 --workers 4
+    python -m benchmarks.startup --save startup.json
+    python -m benchmarks.startup --baseline startup.json --tolerance 0.25
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime, UTC
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child; prints the phase timings as JSON
+_CREATE_APP = '''
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+create_app()
+created = time.perf_counter()
+print(json.dumps({'import_ms': (imported - started) * 1000, 'create_app_ms': (created - imported) * 1000}))
+'''
+
+_INIT_DB = '''
+from app import create_app
+from app.commands import init_db
+app = create_app()
+with app.app_context():
+    init_db()
+'''
+
+def _env(root):
+    env = dict(os.environ)
+    env.update({
+        'DATABASE_URL': 'sqlite:///' + os.path.join(root, 'startup.db'),
+        'MAIL_OUTBOX_SENDER': 'false',
+        'LOG_LEVEL': 'WARNING',
+        'PYTHONPATH': ROOT,
+    })
+    return env
+
+def measure_create_app(env, runs):
+    rows = []
+    for _ in range(runs):
+        began = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', _CREATE_APP], env=env, cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout
+        total = (time.perf_counter() - began) * 1000
+        rows.append({**json.loads(output.strip().splitlines()[-1]), 'process_ms': total})
+    return {key: round(statistics.median(row[key] for row in rows), 1) for key in rows[0]}
+
+def slowest_imports(env, limit):
+    """(cumulative ms, top-level package) of the slowest imports under `import app; create_app()`"""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', _CREATE_APP], env=env, cwd=ROOT,
+                            capture_output=True, text=True, check=True).stderr
+    packages = {}
+    for line in stderr.splitlines():
+        match = re.match(r'import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)', line)
+        # Only modules imported directly by the app or by the interpreter itself
+        if match and len(match.group(2)) <= 3:
+            name = match.group(3).split('.')[0] if not match.group(3).startswith('app.') else match.group(3)
+            packages[name] = max(packages.get(name, 0), int(match.group(1)) / 1000)
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)
+    return [(round(ms, 1), name) for name, ms in ranked if name != 'app'][:limit]
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def measure_launcher(env, workers, threads, preload, runs):
+    rows = []
+    for _ in range(runs):
+        port = _free_port()
+        command = [sys.executable, os.path.join(ROOT, 'serve.py'), '--bind', f'127.0.0.1:{port}',
+                   '--workers', str(workers), '--threads', str(threads), '--preload' if preload else '--no-preload']
+        began = time.perf_counter()
+        server = subprocess.Popen(command, env=env, cwd=ROOT, stderr=subprocess.PIPE, text=True)
+        try:
+            first = None
+            while first is None:
+                try:
+                    with urllib.request.urlopen(f'http://127.0.0.1:{port}/api/test', timeout=1) as response:
+                        response.read()
+                    first = time.perf_counter() - began
+                except OSError:
+                    if server.poll() is not None:
+                        raise RuntimeError(f'serve.py exited: {server.stderr.read()}')
+                    time.sleep(0.005)
+            # The master logs "Serving on" once every worker has reported ready
+            for line in server.stderr:
+                if 'Serving on' in line:
+                    break
+            ready = time.perf_counter() - began
+        finally:
+            server.terminate()
+            server.wait()
+        rows.append({'first_response_ms': first * 1000, 'all_workers_ready_ms': ready * 1000})
+    return {key: round(statistics.median(row[key] for row in rows), 1) for key in rows[0]}
+
+def compare(result, baseline, tolerance, min_delta_ms):
+    """Regression messages for every timing slower than the baseline"""
+    regressions = []
+    for section, timings in result.items():
+        if not isinstance(timings, dict):
+            continue
+        for key, current in timings.items():
+            previous = baseline.get('results', {}).get(section, {}).get(key)
+            if previous is None:
+                continue
+            if current > previous * (1 + tolerance) and current - previous > min_delta_ms:
+                regressions.append(f'{section} {key}: {current} > {previous} (+{tolerance:.0%})')
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure app and launcher startup time')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--imports', type=int, default=12, help='slowest imports to list')
+    parser.add_argument('--save', help='write results to this JSON baseline')
+    parser.add_argument('--baseline', help='compare with this JSON baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--min-delta-ms', type=float, default=20)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.TemporaryDirectory()
+    env = _env(tmpdir.name)
+    subprocess.run([sys.executable, '-c', _INIT_DB], env=env, cwd=ROOT, check=True)
+
+    results = {'create_app': measure_create_app(env, args.runs)}
+    print('create_app (median of %d fresh processes)' % args.runs)
+    for key, value in results['create_app'].items():
+        print(f'  {key:<24} {value:>8.1f}')
+    imports = slowest_imports(env, args.imports)
+    print('slowest imports (cumulative ms)')
+    for ms, name in imports:
+        print(f'  {name:<32} {ms:>8.1f}')
+
+    for preload in (True, False):
+        name = f"serve_{'preload' if preload else 'no_preload'}"
+        results[name] = measure_launcher(env, args.workers, args.threads, preload, args.runs)
+        print(f'serve.py --workers {args.workers} {"--preload" if preload else "--no-preload"}')
+        for key, value in results[name].items():
+            print(f'  {key:<24} {value:>8.1f}')
+    tmpdir.cleanup()
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'meta': {
+                    'created_at': datetime.now(UTC).isoformat(timespec='seconds'),
+                    'python': platform.python_version(),
+                    'machine': platform.machine(),
+                    'runs': args.runs,
+                    'workers': args.workers,
+                    'threads': args.threads,
+                },
+                'results': {**results, 'slowest_imports': imports},
+            }, f, indent=2)
+        print(f'Saved baseline to {args.save}')
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f'\n{len(regressions)} regression(s):')
+            for line in regressions:
+                print(f'  {line}')
+            sys.exit(1)
+        print(f'No regressions beyond {args.tolerance:.0%}')
+
+if __name__ == '__main__':
+    main()
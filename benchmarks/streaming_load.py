@@ -0,0 +1,465 @@
+"""
+Concurrent listeners on the audio delivery path.
+
+Seeds a small catalog with real audio files of podcast-like sizes (silent
+8 kHz 16-bit WAV, 16 KB/s: the byte rate of a 128 kbps MP3), starts the app
+in a separate server process and simulates `--players` listeners with
+asyncio. Each player behaves like a web or mobile audio client:
+
+  * probe: `Range: bytes=0-1` to learn the file size
+  * chunks: sequential `--chunk-kb` range requests, fetched ahead of the
+    playhead until `--buffer` seconds are buffered, then paced at the
+    playback rate (times `--speed`)
+  * seeks: with probability `--seek-prob` per chunk, jump to a random offset
+  * heartbeats: `POST /track` every `--heartbeat` seconds of playback
+
+Half the players use `/api/podcasts/<id>/stream`, the other half the static
+`/api/uploads/audio/<file>` route. Episodes are picked with the same Zipf
+popularity as the seeder.
+
+Reported: sustained bytes per second (mean and 10th percentile of 1-second
+buckets after ramp-up), time to first byte (until the response headers
+arrive) per request kind, error rate, rebuffer stalls, and the CPU and peak
+RSS of the server process (from /proc, so Linux only) next to the client's
+own CPU, which shows when the load generator itself is the bottleneck.
+`--save` and `--baseline` work like benchmarks.endpoints.
+
+Usage:
+    python -m benchmarks.streaming_load --players 1000 --duration 60
+    python -m benchmarks.streaming_load --players 200 --speed 20 --save streaming.json
+    python -m benchmarks.streaming_load --baseline streaming.json --tolerance 0.25
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, UTC
+
+BYTE_RATE = 16000
+MEDIA_KINDS = ('probe', 'chunk', 'seek')
+
+class Connection:
+    """A minimal keep-alive HTTP/1.1 client on asyncio streams"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, headers=None, body=b''):
+        """Returns (status, headers, body bytes read, seconds to first byte)"""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}', f'Content-Length: {len(body)}']
+        lines += [f'{key}: {value}' for key, value in (headers or {}).items()]
+        began = time.perf_counter()
+        try:
+            self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode() + body)
+            head = await self.reader.readuntil(b'\r\n\r\n')
+            first_byte = time.perf_counter() - began
+            status_line, *header_lines = head.decode('latin-1').split('\r\n')
+            status = int(status_line.split()[1])
+            response_headers = {}
+            for line in header_lines:
+                if line:
+                    key, _, value = line.partition(':')
+                    response_headers[key.strip().lower()] = value.strip()
+            remaining = int(response_headers.get('content-length', 0))
+            received = 0
+            while remaining:
+                data = await self.reader.read(min(remaining, 262144))
+                if not data:
+                    raise ConnectionError('connection closed mid-body')
+                received += len(data)
+                remaining -= len(data)
+        except BaseException:
+            self.close()
+            raise
+        if response_headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, response_headers, received, first_byte
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+class Stats:
+    def __init__(self, started):
+        self.started = started
+        self.first_byte = defaultdict(list)
+        self.requests = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.timeline = defaultdict(int)
+        self.bytes = 0
+        self.stalls = 0
+        self.playing_seconds = 0.0
+
+    def record(self, kind, ok, received=0, first_byte=None):
+        self.requests[kind] += 1
+        if not ok:
+            self.errors[kind] += 1
+        if first_byte is not None:
+            self.first_byte[kind].append(first_byte)
+        if received:
+            self.bytes += received
+            self.timeline[int(time.perf_counter() - self.started)] += received
+
+def _percentile(values, p):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+class Player:
+    def __init__(self, number, catalog, pick, token, options, stats):
+        self.rng = random.Random(number)
+        self.catalog = catalog
+        self.pick = pick
+        self.token = token
+        self.options = options
+        self.stats = stats
+        self.media = Connection(options.host, options.port)
+        self.api = Connection(options.host, options.port)
+        self.stream_route = number % 2 == 0
+
+    async def fetch(self, kind, path, start, end=''):
+        try:
+            # Signed in, so the stream scheduler counts each player as its own caller
+            status, headers, received, first_byte = await self.media.request(
+                'GET', path, {'Range': f'bytes={start}-{end}', 'Authorization': f'Bearer {self.token}'})
+        except (OSError, ConnectionError, asyncio.IncompleteReadError):
+            self.stats.record(kind, False)
+            return None
+        self.stats.record(kind, status == 206, received, first_byte)
+        return headers if status == 206 else None
+
+    async def heartbeat(self, podcast_id, seconds):
+        try:
+            status, _, _, first_byte = await self.api.request(
+                'POST', f'/api/podcasts/{podcast_id}/track',
+                {'Authorization': f'Bearer {self.token}', 'Content-Type': 'application/json'},
+                json.dumps({'time_listened': int(seconds)}).encode())
+        except (OSError, ConnectionError, asyncio.IncompleteReadError):
+            self.stats.record('track', False)
+            return
+        self.stats.record('track', status in (200, 201), first_byte=first_byte)
+
+    async def run(self, deadline):
+        options = self.options
+        rate = BYTE_RATE * options.speed
+        chunk = options.chunk_kb * 1024
+        buffer_bytes = options.buffer * BYTE_RATE
+        try:
+            while time.perf_counter() < deadline:
+                podcast_id, filename = self.catalog[self.pick()]
+                path = f'/api/podcasts/{podcast_id}/stream' if self.stream_route else f'/api/uploads/audio/{filename}'
+                headers = await self.fetch('probe', path, 0, 1)
+                if headers is None:
+                    await asyncio.sleep(1)
+                    continue
+                size = int(headers['content-range'].rsplit('/', 1)[1])
+                position = playhead = 0
+                last_heartbeat = 0.0
+                clock = None
+                kind = 'chunk'
+                while position < size and time.perf_counter() < deadline:
+                    now = time.perf_counter()
+                    if clock is not None:
+                        playhead = min(position, playhead + (now - clock) * rate)
+                        self.stats.playing_seconds += (now - clock) * options.speed
+                    clock = now
+                    if position - playhead >= buffer_bytes:
+                        await asyncio.sleep(min((position - playhead - buffer_bytes) / rate + 0.01, deadline - now))
+                        continue
+                    if kind == 'chunk' and position and playhead >= position:
+                        self.stats.stalls += 1
+                    end = min(position + chunk, size) - 1
+                    if await self.fetch(kind, path, position, end) is None:
+                        break
+                    position = end + 1
+                    kind = 'chunk'
+                    if self.rng.random() < options.seek_prob:
+                        position = playhead = self.rng.randrange(size) // 2 * 2
+                        kind = 'seek'
+                    played = playhead / BYTE_RATE
+                    if self.token and played - last_heartbeat >= options.heartbeat:
+                        last_heartbeat = played
+                        await self.heartbeat(podcast_id, played)
+        finally:
+            self.media.close()
+            self.api.close()
+
+def _process_tree(pid):
+    """pid and every descendant, from /proc"""
+    children = defaultdict(list)
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    parent = int(f.read().rsplit(')', 1)[1].split()[1])
+            except OSError:
+                continue
+            children[parent].append(int(entry))
+    tree, todo = [], [pid]
+    while todo:
+        current = todo.pop()
+        tree.append(current)
+        todo.extend(children[current])
+    return tree
+
+def _process_usage(pid):
+    """(CPU seconds, RSS bytes) summed over the process tree, or None without /proc"""
+    if not os.path.isdir('/proc'):
+        return None
+    ticks = os.sysconf('SC_CLK_TCK')
+    cpu = rss = 0
+    for member in _process_tree(pid):
+        try:
+            with open(f'/proc/{member}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            cpu += (int(fields[11]) + int(fields[12])) / ticks
+            rss += int(fields[21]) * resource.getpagesize()
+        except (OSError, IndexError):
+            continue
+    return cpu, rss
+
+async def _sample_server(pid, samples, stop):
+    while not stop.is_set():
+        usage = _process_usage(pid)
+        if usage is not None:
+            samples.append((time.perf_counter(), *usage))
+        try:
+            await asyncio.wait_for(stop.wait(), 0.5)
+        except asyncio.TimeoutError:
+            pass
+
+async def _run(options, catalog, tokens, weights_seed, server_pid):
+    from benchmarks.seed import ZipfSampler
+    pick = ZipfSampler(len(catalog), options.zipf, random.Random(weights_seed))
+    started = time.perf_counter()
+    stats = Stats(started)
+    deadline = started + options.ramp + options.duration
+    samples, stop = [], asyncio.Event()
+    sampler = asyncio.create_task(_sample_server(server_pid, samples, stop))
+    client_before = resource.getrusage(resource.RUSAGE_SELF)
+
+    async def start(player, delay):
+        await asyncio.sleep(delay)
+        await player.run(deadline)
+
+    players = [Player(i, catalog, pick, tokens[i % len(tokens)] if tokens else None, options, stats)
+               for i in range(options.players)]
+    await asyncio.gather(*(start(player, options.ramp * i / options.players) for i, player in enumerate(players)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await sampler
+    client_after = resource.getrusage(resource.RUSAGE_SELF)
+    client_cpu = (client_after.ru_utime + client_after.ru_stime) - (client_before.ru_utime + client_before.ru_stime)
+    return _summarize(options, stats, samples, elapsed, client_cpu)
+
+def _summarize(options, stats, samples, elapsed, client_cpu):
+    steady = [stats.timeline.get(second, 0) for second in range(int(options.ramp), int(elapsed))]
+    requests = sum(stats.requests.values())
+    errors = sum(stats.errors.values())
+    result = {
+        'players': options.players,
+        'seconds': round(elapsed, 1),
+        'bytes': stats.bytes,
+        'sustained_mb_s': round(statistics.fmean(steady) / 1e6, 2) if steady else 0.0,
+        'sustained_p10_mb_s': round(_percentile(steady, 10) / 1e6, 2) if steady else 0.0,
+        'requests': requests,
+        'errors': errors,
+        'error_rate': round(errors / requests, 4) if requests else 0.0,
+        'stalls_per_player_minute': round(stats.stalls / (stats.playing_seconds / 60), 3) if stats.playing_seconds else 0.0,
+        'client_cpu_percent': round(client_cpu / elapsed * 100, 1),
+        'by_kind': {},
+    }
+    for kind in (*MEDIA_KINDS, 'track'):
+        first_byte = stats.first_byte[kind]
+        result['by_kind'][kind] = {
+            'requests': stats.requests[kind],
+            'errors': stats.errors[kind],
+            'ttfb_p50_ms': round(_percentile(first_byte, 50) * 1000, 2) if first_byte else None,
+            'ttfb_p95_ms': round(_percentile(first_byte, 95) * 1000, 2) if first_byte else None,
+            'ttfb_p99_ms': round(_percentile(first_byte, 99) * 1000, 2) if first_byte else None,
+        }
+    if len(samples) >= 2:
+        (t0, cpu0, _), (t1, cpu1, _) = samples[0], samples[-1]
+        result['server_cpu_percent'] = round((cpu1 - cpu0) / (t1 - t0) * 100, 1)
+        result['server_peak_rss_mb'] = round(max(rss for _, _, rss in samples) / 1e6, 1)
+    return result
+
+def compare(result, baseline, tolerance, min_delta_ms):
+    """Regression messages where the run is worse than the baseline"""
+    previous = baseline.get('results', {})
+    regressions = []
+    if result['sustained_mb_s'] < previous.get('sustained_mb_s', 0) * (1 - tolerance):
+        regressions.append(f"sustained {result['sustained_mb_s']} MB/s < {previous['sustained_mb_s']} (-{tolerance:.0%})")
+    if result['error_rate'] > previous.get('error_rate', 0) + 0.001:
+        regressions.append(f"error rate {result['error_rate']} > {previous['error_rate']}")
+    for kind, current in result['by_kind'].items():
+        before = previous.get('by_kind', {}).get(kind, {})
+        for key in ('ttfb_p50_ms', 'ttfb_p95_ms'):
+            if current.get(key) is None or before.get(key) is None:
+                continue
+            if current[key] > before[key] * (1 + tolerance) and current[key] - before[key] > min_delta_ms:
+                regressions.append(f'{kind}: {key} {current[key]} > {before[key]} (+{tolerance:.0%})')
+    return regressions
+
+def _write_audio(upload_folder, rows, minutes):
+    """One silent WAV per distinct length, hard-linked (or copied) to every episode of that length"""
+    from benchmarks.seed import wav_bytes
+    audio_dir = os.path.join(upload_folder, 'audio')
+    os.makedirs(audio_dir, exist_ok=True)
+    templates = {}
+    for length in set(minutes):
+        path = os.path.join(upload_folder, f'.streaming-{length}m.wav')
+        with open(path, 'wb') as f:
+            f.write(wav_bytes(length * 60))
+        templates[length] = path
+    for (podcast_id, audio_url), length in zip(rows, minutes):
+        target = os.path.join(upload_folder, audio_url)
+        if os.path.exists(target):
+            os.remove(target)
+        try:
+            os.link(templates[length], target)
+        except OSError:
+            with open(templates[length], 'rb') as src, open(target, 'wb') as dst:
+                dst.write(src.read())
+
+def _prepare(options, root):
+    """Seed the catalog and write the audio; returns ([(podcast id, file name)], tokens)"""
+    from flask_jwt_extended import create_access_token
+    from app import create_app, db
+    from app.models.podcast import Podcast
+    from benchmarks.seed import seed
+
+    app = create_app()
+    upload_folder = os.path.join(root, 'uploads')
+    with app.app_context():
+        ids = seed(users=min(options.players, 1000), podcasts=options.episodes, likes=0, comments=0, listens=0)
+        rows = db.session.execute(db.select(Podcast.id, Podcast.audio_url).where(Podcast.id.in_(ids['podcasts']))).all()
+        minutes = [options.minutes[i % len(options.minutes)] for i in range(len(rows))]
+        for (podcast_id, _), length in zip(rows, minutes):
+            db.session.execute(db.update(Podcast).where(Podcast.id == podcast_id).values(duration=length * 60))
+        db.session.commit()
+        tokens = [create_access_token(identity=user_id) for user_id in ids['users']]
+    _write_audio(upload_folder, rows, minutes)
+    return [(podcast_id, os.path.basename(audio_url)) for podcast_id, audio_url in rows], tokens
+
+def serve(root):
+    """Server process: the app with its uploads under `root`; prints the port it listens on"""
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    from app import create_app
+
+    class QuietHandler(WSGIRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    app = create_app()
+    app.config['UPLOAD_FOLDER'] = os.path.join(root, 'uploads')
+    # The file routes serve uploads/ relative to the app package
+    app.root_path = root
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    print(server.server_port, flush=True)
+    server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate concurrent audio players against a local server')
+    parser.add_argument('--players', type=int, default=500)
+    parser.add_argument('--duration', type=float, default=30, help='seconds of full load after ramp-up')
+    parser.add_argument('--ramp', type=float, default=5, help='seconds over which players start')
+    parser.add_argument('--episodes', type=int, default=50)
+    parser.add_argument('--minutes', default='10,30,60', help='episode lengths, cycled over the catalog')
+    parser.add_argument('--zipf', type=float, default=1.1)
+    parser.add_argument('--chunk-kb', type=int, default=256)
+    parser.add_argument('--buffer', type=float, default=30, help='seconds of audio a player buffers ahead')
+    parser.add_argument('--speed', type=float, default=1.0, help='playback speed; raise it to compress time')
+    parser.add_argument('--seek-prob', type=float, default=0.05)
+    parser.add_argument('--heartbeat', type=float, default=15, help='seconds of playback between /track calls')
+    parser.add_argument('--save', help='write the result to this JSON baseline')
+    parser.add_argument('--baseline', help='compare with this JSON baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--min-delta-ms', type=float, default=1.0)
+    parser.add_argument('--serve', help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    os.environ.setdefault('MAIL_OUTBOX_SENDER', 'false')
+    os.environ['RATELIMIT_ENABLED'] = 'false'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    if options.serve:
+        serve(options.serve)
+        return
+
+    options.minutes = [int(value) for value in options.minutes.split(',')]
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or hard > soft:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard if hard != resource.RLIM_INFINITY else 65536, hard))
+
+    tmpdir = tempfile.TemporaryDirectory()
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmpdir.name, 'streaming.db')
+    print(f'Writing {options.episodes} episodes of {options.minutes} minutes...', flush=True)
+    catalog, tokens = _prepare(options, tmpdir.name)
+
+    server = subprocess.Popen([sys.executable, '-m', 'benchmarks.streaming_load', '--serve', tmpdir.name],
+                              stdout=subprocess.PIPE, text=True)
+    try:
+        options.host, options.port = '127.0.0.1', int(server.stdout.readline())
+        print(f'Running {options.players} players for {options.ramp + options.duration:.0f}s...', flush=True)
+        result = asyncio.run(_run(options, catalog, tokens, 0, server.pid))
+    finally:
+        server.terminate()
+        server.wait()
+        tmpdir.cleanup()
+
+    print(f"sustained {result['sustained_mb_s']} MB/s (p10 {result['sustained_p10_mb_s']}), "
+          f"{result['requests']} requests, error rate {result['error_rate']:.2%}, "
+          f"{result['stalls_per_player_minute']} stalls per player-minute")
+    print(f"server CPU {result.get('server_cpu_percent', '?')}%, peak RSS {result.get('server_peak_rss_mb', '?')} MB; "
+          f"client CPU {result['client_cpu_percent']}%")
+    print(f"{'kind':<8} {'requests':>9} {'errors':>7} {'ttfb p50':>9} {'p95':>8} {'p99':>8}")
+    for kind, row in result['by_kind'].items():
+        print(f"{kind:<8} {row['requests']:>9} {row['errors']:>7} {row['ttfb_p50_ms'] or '-':>9} "
+              f"{row['ttfb_p95_ms'] or '-':>8} {row['ttfb_p99_ms'] or '-':>8}")
+
+    failed = []
+    if options.save:
+        with open(options.save, 'w') as f:
+            json.dump({
+                'meta': {
+                    'created_at': datetime.now(UTC).isoformat(timespec='seconds'),
+                    'python': platform.python_version(),
+                    'machine': platform.machine(),
+                    **{key: getattr(options, key) for key in ('players', 'duration', 'ramp', 'episodes', 'minutes',
+                                                               'chunk_kb', 'buffer', 'speed', 'seek_prob', 'heartbeat')},
+                },
+                'results': result,
+            }, f, indent=2)
+        print(f'Saved baseline to {options.save}')
+    if options.baseline:
+        with open(options.baseline) as f:
+            failed += compare(result, json.load(f), options.tolerance, options.min_delta_ms)
+    if failed:
+        print(f'\n{len(failed)} regression(s):')
+        for line in failed:
+            print(f'  {line}')
+        sys.exit(1)
+    if options.baseline:
+        print(f'No regressions beyond {options.tolerance:.0%}')
+
+if __name__ == '__main__':
+    main()
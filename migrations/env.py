@@ -14,13 +14,6 @@ config = context.config
 fileConfig(config.config_file_name)
 logger = logging.getLogger('alembic.env')
 
-# Get database URL from environment or use default
-def get_database_url():
-    return os.getenv('DATABASE_URL', 'sqlite:///instance/auth.db')
-
-# Set the database URL in the config
-config.set_main_option('sqlalchemy.url', get_database_url())
-
 # Import all models to ensure they are registered with SQLAlchemy
 from app import create_app, db
 from app.models.user import User
@@ -28,11 +21,17 @@ from app.models.category import Category
 from app.models.podcast import Podcast
 from app.models.comment import Comment
 from app.models.podcast_listen import PodcastListen
+from app.models.email_outbox import EmailOutbox
 
 # Create Flask app and get metadata
 app = create_app()
 with app.app_context():
     target_metadata = db.metadata
+    # Migrate the database the app uses (relative SQLite paths resolve into the instance folder)
+    database_url = db.engine.url.render_as_string(hide_password=False)
+
+# Set the database URL in the config
+config.set_main_option('sqlalchemy.url', database_url.replace('%', '%%'))
 
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
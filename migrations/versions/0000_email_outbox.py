@@ -0,0 +1,48 @@
+"""Add the email outbox
+
+Revision ID: 0000
+Revises: 
+Create Date: 2026-10-19 08:00:00.000000
+
+Transactional emails are queued in this table and sent by the outbox sender
+(app.utils.email_outbox). Keys are 36-character strings like every other
+table at this revision; 0002 converts them to native UUIDs.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0000'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases built with create_all() before this revision existed already have the table
+    op.create_table(
+        'email_outbox',
+        sa.Column('id', sa.String(36), primary_key=True),
+        sa.Column('sender', sa.String(120), nullable=False),
+        sa.Column('recipient', sa.String(120), nullable=False),
+        sa.Column('subject', sa.String(255), nullable=False),
+        sa.Column('html', sa.Text(), nullable=True),
+        sa.Column('body', sa.Text(), nullable=True),
+        sa.Column('status', sa.String(20), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('claim_token', sa.String(36), nullable=True),
+        sa.Column('locked_until', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        if_not_exists=True,
+    )
+    op.create_index('ix_email_outbox_status_next_attempt_at', 'email_outbox', ['status', 'next_attempt_at'],
+                    if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_email_outbox_status_next_attempt_at', table_name='email_outbox', if_exists=True)
+    op.drop_table('email_outbox')
@@ -0,0 +1,43 @@
+"""Add indexes for the hot query paths
+
+Revision ID: 0001
+Revises: 0000
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = '0000'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_comments_podcast_id_created_at', 'comments', ['podcast_id', 'created_at']),
+    ('ix_comments_parent_id', 'comments', ['parent_id']),
+    ('ix_podcast_listens_user_id_tracked_at', 'podcast_listens', ['user_id', 'tracked_at']),
+    ('ix_podcast_listens_podcast_id', 'podcast_listens', ['podcast_id']),
+    ('ix_podcasts_created_at', 'podcasts', ['created_at', 'id']),
+    ('ix_podcasts_author_id', 'podcasts', ['author_id']),
+    ('ix_podcast_likes_user_id', 'podcast_likes', ['user_id', 'podcast_id']),
+    ('ix_podcast_categories_category_id', 'podcast_categories', ['category_id', 'podcast_id']),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # Build the indexes without blocking writes to the live tables
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                op.create_index(name, table, columns, if_not_exists=True, postgresql_concurrently=True)
+    else:
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,253 @@
+"""Store primary and foreign keys as native UUIDs
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 12:00:00.000000
+
+Existing keys keep their value; only their storage changes (36-character
+strings become 16-byte BLOBs on SQLite and `uuid` on PostgreSQL). New rows get
+time-ordered UUIDv7 keys from the application.
+
+SQLite: values are converted in place, table by table, then each table is
+rebuilt with the new column types. Readers keep working in WAL mode; writers
+wait on the busy timeout while a table is converted.
+
+PostgreSQL: the change runs online, in three phases:
+
+1. Expand (autocommit): add a `<column>__uuid` shadow column per key column,
+   keep it in sync with a trigger, backfill existing rows in small batches and
+   build the future indexes CONCURRENTLY next to the old ones.
+2. Swap (one short transaction): drop the old columns, rename the shadows,
+   attach the prebuilt indexes as primary keys and unique constraints and
+   re-add foreign keys as NOT VALID.
+3. Validate (autocommit): validate the foreign keys without blocking writes.
+
+Deploy the application code that uses GUID right after the swap.
+The downgrade is offline on both databases.
+"""
+import uuid
+from alembic import op
+import sqlalchemy as sa
+from app.models.types import GUID
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+# table -> key columns stored as UUIDs
+COLUMNS = {
+    'users': ['id'],
+    'categories': ['id'],
+    'podcasts': ['id', 'author_id'],
+    'comments': ['id', 'podcast_id', 'user_id', 'parent_id'],
+    'podcast_listens': ['id', 'user_id', 'podcast_id'],
+    'podcast_categories': ['podcast_id', 'category_id'],
+    'podcast_likes': ['podcast_id', 'user_id'],
+    'email_outbox': ['id'],
+}
+
+NULLABLE = {('comments', 'parent_id')}
+
+PRIMARY_KEYS = {
+    'users': ['id'],
+    'categories': ['id'],
+    'podcasts': ['id'],
+    'comments': ['id'],
+    'podcast_listens': ['id'],
+    'podcast_categories': ['podcast_id', 'category_id'],
+    'podcast_likes': ['podcast_id', 'user_id'],
+    'email_outbox': ['id'],
+}
+
+UNIQUE_CONSTRAINTS = [
+    ('_user_podcast_uc', 'podcast_listens', ['user_id', 'podcast_id']),
+]
+
+# Every index that contains a key column (see 0001)
+INDEXES = [
+    ('ix_comments_podcast_id_created_at', 'comments', ['podcast_id', 'created_at']),
+    ('ix_comments_parent_id', 'comments', ['parent_id']),
+    ('ix_podcast_listens_user_id_tracked_at', 'podcast_listens', ['user_id', 'tracked_at']),
+    ('ix_podcast_listens_podcast_id', 'podcast_listens', ['podcast_id']),
+    ('ix_podcasts_created_at', 'podcasts', ['created_at', 'id']),
+    ('ix_podcasts_author_id', 'podcasts', ['author_id']),
+    ('ix_podcast_likes_user_id', 'podcast_likes', ['user_id', 'podcast_id']),
+    ('ix_podcast_categories_category_id', 'podcast_categories', ['category_id', 'podcast_id']),
+]
+
+FOREIGN_KEYS = [
+    ('podcasts', 'author_id', 'users'),
+    ('comments', 'podcast_id', 'podcasts'),
+    ('comments', 'user_id', 'users'),
+    ('comments', 'parent_id', 'comments'),
+    ('podcast_listens', 'user_id', 'users'),
+    ('podcast_listens', 'podcast_id', 'podcasts'),
+    ('podcast_categories', 'podcast_id', 'podcasts'),
+    ('podcast_categories', 'category_id', 'categories'),
+    ('podcast_likes', 'podcast_id', 'podcasts'),
+    ('podcast_likes', 'user_id', 'users'),
+]
+
+
+def _present():
+    return set(sa.inspect(op.get_bind()).get_table_names())
+
+
+def _existing(mapping):
+    """(table, value) pairs of `mapping` for the tables this database has; older schemas may lack some"""
+    present = _present()
+    return [(table, value) for table, value in mapping.items() if table in present]
+
+
+def _existing_indexes(indexes):
+    present = _present()
+    return [(name, table, columns) for name, table, columns in indexes if table in present]
+
+
+def _existing_foreign_keys():
+    present = _present()
+    return [(table, column, referred) for table, column, referred in FOREIGN_KEYS
+            if table in present and referred in present]
+
+
+def _shadow(table, column):
+    return f'{column}__uuid' if column in COLUMNS[table] else column
+
+
+def _to_blob(value):
+    if value is None or isinstance(value, bytes):
+        return value
+    return uuid.UUID(value).bytes
+
+
+def _to_text(value):
+    if isinstance(value, bytes):
+        return str(uuid.UUID(bytes=value))
+    return value
+
+
+def _sqlite_convert(function, new_type, existing_type):
+    bind = op.get_bind()
+    bind.connection.driver_connection.create_function('convert_uuid', 1, function, deterministic=True)
+    for table, columns in _existing(COLUMNS):
+        assignments = ', '.join(f'{column} = convert_uuid({column})' for column in columns)
+        op.execute(f'UPDATE {table} SET {assignments}')
+        with op.batch_alter_table(table) as batch_op:
+            for column in columns:
+                batch_op.alter_column(column, type_=new_type, existing_type=existing_type,
+                                      existing_nullable=(table, column) in NULLABLE)
+
+
+def _postgres_expand():
+    with op.get_context().autocommit_block():
+        for table, columns in _existing(COLUMNS):
+            for column in columns:
+                op.execute(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column}__uuid uuid')
+            sync = '; '.join(f'NEW.{column}__uuid := NEW.{column}::uuid' for column in columns)
+            op.execute(
+                f'CREATE OR REPLACE FUNCTION {table}__uuid_sync() RETURNS trigger AS $$ '
+                f'BEGIN {sync}; RETURN NEW; END $$ LANGUAGE plpgsql'
+            )
+            op.execute(f'DROP TRIGGER IF EXISTS {table}__uuid_sync ON {table}')
+            op.execute(
+                f'CREATE TRIGGER {table}__uuid_sync BEFORE INSERT OR UPDATE ON {table} '
+                f'FOR EACH ROW EXECUTE FUNCTION {table}__uuid_sync()'
+            )
+
+        # Backfill in short transactions so live writes are never blocked for long
+        bind = op.get_bind()
+        for table, columns in _existing(COLUMNS):
+            pending = ' OR '.join(f'({column} IS NOT NULL AND {column}__uuid IS NULL)' for column in columns)
+            assignments = ', '.join(f'{column}__uuid = {column}::uuid' for column in columns)
+            while True:
+                result = bind.exec_driver_sql(
+                    f'UPDATE {table} SET {assignments} WHERE ctid IN '
+                    f'(SELECT ctid FROM {table} WHERE {pending} LIMIT {BATCH_SIZE})'
+                )
+                if result.rowcount == 0:
+                    break
+
+            # A validated CHECK lets SET NOT NULL skip its table scan during the swap
+            for column in columns:
+                if (table, column) not in NULLABLE:
+                    op.execute(
+                        f'ALTER TABLE {table} ADD CONSTRAINT {table}_{column}__uuid_not_null '
+                        f'CHECK ({column}__uuid IS NOT NULL) NOT VALID'
+                    )
+                    op.execute(f'ALTER TABLE {table} VALIDATE CONSTRAINT {table}_{column}__uuid_not_null')
+
+        for table, columns in _existing(PRIMARY_KEYS):
+            shadow = ', '.join(_shadow(table, column) for column in columns)
+            op.execute(f'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {table}_pkey__uuid ON {table} ({shadow})')
+        for name, table, columns in _existing_indexes(UNIQUE_CONSTRAINTS + INDEXES):
+            unique = 'UNIQUE ' if (name, table, columns) in UNIQUE_CONSTRAINTS else ''
+            shadow = ', '.join(_shadow(table, column) for column in columns)
+            op.execute(f'CREATE {unique}INDEX CONCURRENTLY IF NOT EXISTS {name}__uuid ON {table} ({shadow})')
+
+
+def _postgres_swap():
+    for table, _ in _existing(COLUMNS):
+        op.execute(f'LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE')
+    for table, columns in _existing(COLUMNS):
+        op.execute(f'DROP TRIGGER {table}__uuid_sync ON {table}')
+        op.execute(f'DROP FUNCTION {table}__uuid_sync()')
+        for column in columns:
+            # CASCADE also drops the primary key, indexes and foreign keys that use the old column
+            op.execute(f'ALTER TABLE {table} DROP COLUMN {column} CASCADE')
+            op.execute(f'ALTER TABLE {table} RENAME COLUMN {column}__uuid TO {column}')
+            if (table, column) not in NULLABLE:
+                op.execute(f'ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL')
+                op.execute(f'ALTER TABLE {table} DROP CONSTRAINT {table}_{column}__uuid_not_null')
+    for table, _ in _existing(PRIMARY_KEYS):
+        op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY USING INDEX {table}_pkey__uuid')
+    for name, table, columns in _existing_indexes(UNIQUE_CONSTRAINTS):
+        op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE USING INDEX {name}__uuid')
+    for name, table, columns in _existing_indexes(INDEXES):
+        op.execute(f'ALTER INDEX {name}__uuid RENAME TO {name}')
+    for table, column, referred in _existing_foreign_keys():
+        op.execute(
+            f'ALTER TABLE {table} ADD CONSTRAINT {table}_{column}_fkey '
+            f'FOREIGN KEY ({column}) REFERENCES {referred} (id) NOT VALID'
+        )
+
+
+def _postgres_validate():
+    with op.get_context().autocommit_block():
+        for table, column, referred in _existing_foreign_keys():
+            op.execute(f'ALTER TABLE {table} VALIDATE CONSTRAINT {table}_{column}_fkey')
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        _postgres_expand()
+        _postgres_swap()
+        _postgres_validate()
+    elif dialect == 'sqlite':
+        _sqlite_convert(_to_blob, GUID(), sa.String(36))
+    else:
+        raise NotImplementedError(f'No UUID key migration for {dialect}')
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for table, column, referred in _existing_foreign_keys():
+            op.execute(f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {table}_{column}_fkey')
+        for table, columns in _existing(COLUMNS):
+            for column in columns:
+                op.execute(f'ALTER TABLE {table} ALTER COLUMN {column} TYPE VARCHAR(36) USING {column}::text')
+        for table, column, referred in _existing_foreign_keys():
+            op.execute(
+                f'ALTER TABLE {table} ADD CONSTRAINT {table}_{column}_fkey '
+                f'FOREIGN KEY ({column}) REFERENCES {referred} (id)'
+            )
+    elif dialect == 'sqlite':
+        _sqlite_convert(_to_text, sa.String(36), GUID())
+    else:
+        raise NotImplementedError(f'No UUID key migration for {dialect}')
@@ -0,0 +1,99 @@
+"""Add ON DELETE CASCADE to every foreign key
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 13:00:00.000000
+
+Rows orphaned by earlier deletes (listens and comments of removed podcasts)
+are removed first, so the constraints can be validated.
+
+SQLite: each child table is rebuilt with named, cascading foreign keys.
+PostgreSQL: each constraint is swapped for a NOT VALID cascading one in a
+short transaction and validated afterwards without blocking writes.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+# (table, column, referred table); all reference <referred>.id
+FOREIGN_KEYS = [
+    ('podcasts', 'author_id', 'users'),
+    ('comments', 'podcast_id', 'podcasts'),
+    ('comments', 'user_id', 'users'),
+    ('comments', 'parent_id', 'comments'),
+    ('podcast_listens', 'user_id', 'users'),
+    ('podcast_listens', 'podcast_id', 'podcasts'),
+    ('podcast_categories', 'podcast_id', 'podcasts'),
+    ('podcast_categories', 'category_id', 'categories'),
+    ('podcast_likes', 'podcast_id', 'podcasts'),
+    ('podcast_likes', 'user_id', 'users'),
+]
+
+# Names SQLite batch mode gives the reflected, unnamed foreign keys
+NAMING_CONVENTION = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+
+
+def _by_table():
+    tables = {}
+    for table, column, referred in FOREIGN_KEYS:
+        tables.setdefault(table, []).append((column, referred))
+    return tables
+
+
+def _delete_orphans():
+    # Parents before children, so removing orphaned comments also catches their replies
+    for table, column, referred in FOREIGN_KEYS:
+        op.execute(
+            f'DELETE FROM {table} WHERE {column} IS NOT NULL AND NOT EXISTS '
+            f'(SELECT 1 FROM {referred} WHERE {referred}.id = {table}.{column})'
+        )
+
+
+def _sqlite_rebuild(ondelete):
+    for table, keys in _by_table().items():
+        with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch_op:
+            for column, referred in keys:
+                name = f'fk_{table}_{column}_{referred}'
+                batch_op.drop_constraint(name, type_='foreignkey')
+                batch_op.create_foreign_key(name, referred, [column], ['id'], ondelete=ondelete)
+
+
+def _postgres_swap(ondelete):
+    clause = f' ON DELETE {ondelete}' if ondelete else ''
+    for table, keys in _by_table().items():
+        changes = []
+        for column, referred in keys:
+            name = f'{table}_{column}_fkey'
+            changes.append(f'DROP CONSTRAINT IF EXISTS {name}')
+            changes.append(f'ADD CONSTRAINT {name} FOREIGN KEY ({column}) REFERENCES {referred} (id){clause} NOT VALID')
+        op.execute(f'ALTER TABLE {table} ' + ', '.join(changes))
+    with op.get_context().autocommit_block():
+        for table, column, referred in FOREIGN_KEYS:
+            op.execute(f'ALTER TABLE {table} VALIDATE CONSTRAINT {table}_{column}_fkey')
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    _delete_orphans()
+    if dialect == 'postgresql':
+        _postgres_swap('CASCADE')
+    elif dialect == 'sqlite':
+        _sqlite_rebuild('CASCADE')
+    else:
+        raise NotImplementedError(f'No cascading foreign key migration for {dialect}')
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        _postgres_swap(None)
+    elif dialect == 'sqlite':
+        _sqlite_rebuild(None)
+    else:
+        raise NotImplementedError(f'No cascading foreign key migration for {dialect}')
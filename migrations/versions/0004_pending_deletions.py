@@ -0,0 +1,37 @@
+"""Record deletions that have been requested but not finished
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 16:00:00.000000
+
+Account and podcast deletions run in the background. The request stamps
+deletion_requested_at first, so a deletion survives a restart: every worker
+queues the stamped rows again when it starts (app.utils.deletion).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+TABLES = ['users', 'podcasts']
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table in TABLES:
+        # Databases built with create_all() from newer models already have the column
+        if 'deletion_requested_at' not in {column['name'] for column in inspector.get_columns(table)}:
+            op.add_column(table, sa.Column('deletion_requested_at', sa.DateTime(), nullable=True))
+        op.create_index(f'ix_{table}_deletion_requested_at', table, ['deletion_requested_at'], if_not_exists=True)
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_index(f'ix_{table}_deletion_requested_at', table_name=table, if_exists=True)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('deletion_requested_at')
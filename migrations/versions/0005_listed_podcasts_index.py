@@ -0,0 +1,40 @@
+"""Cover the pending-deletion filter in the podcast ordering index
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 18:00:00.000000
+
+Listings and the discover ranking leave out podcasts pending deletion. With
+deletion_requested_at in ix_podcasts_created_at, the ranking still reads
+ordered ids from the index alone instead of scanning the table.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+NAME = 'ix_podcasts_created_at'
+
+
+def _replace_index(columns):
+    if op.get_bind().dialect.name == 'postgresql':
+        # Rebuild without blocking writes to the live table
+        with op.get_context().autocommit_block():
+            op.drop_index(NAME, table_name='podcasts', if_exists=True, postgresql_concurrently=True)
+            op.create_index(NAME, 'podcasts', columns, postgresql_concurrently=True)
+    else:
+        op.drop_index(NAME, table_name='podcasts', if_exists=True)
+        op.create_index(NAME, 'podcasts', columns)
+
+
+def upgrade():
+    _replace_index(['created_at', 'id', 'deletion_requested_at'])
+
+
+def downgrade():
+    _replace_index(['created_at', 'id'])
@@ -3,4 +3,11 @@ from app import create_app
 app = create_app()
 
 if __name__ == '__main__':
-    app.run(host="0.0.0.0", port=8000, debug=False) 
\ No newline at end of file
+    # Development convenience; production runs `flask init-db` once and starts serve.py
+    import os
+    if 'MAIL_OUTBOX_SENDER' not in os.environ:
+        app.config['MAIL_OUTBOX_SENDER'] = True
+    from app.commands import init_db
+    with app.app_context():
+        init_db()
+    app.run(host="0.0.0.0", port=8000, debug=False)
@@ -0,0 +1,308 @@
+"""
+Production launcher: pre-forked workers, each serving with a pool of threads.
+
+The master binds the listening socket and (with --preload, the default)
+builds the app once, then forks --workers processes that inherit both.
+Forked workers start in milliseconds and share the imported code pages.
+Every worker accepts connections from the shared socket only while one of its
+--threads request threads is free, so a busy worker leaves new connections to
+the others.
+
+Signals to the master:
+    TERM, INT   graceful stop: workers stop accepting, finish in-flight
+                requests and exit; stragglers are killed after --graceful-timeout
+    HUP         graceful reload: the new code is checked in a subprocess, the
+                master re-executes itself on the same socket, starts a new set
+                of workers and only then retires the old ones
+Workers that die are replaced, with a growing delay if they keep crashing.
+
+The launcher never creates tables: run `flask init-db` once per deploy first.
+
+Usage:
+    python serve.py --bind 0.0.0.0:8000 --workers 4 --threads 8
+    kill -HUP <master pid>
+"""
+
+import argparse
+import logging
+import os
+import selectors
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+logger = logging.getLogger('serve')
+
+LISTEN_FD = 'SERVE_LISTEN_FD'
+OLD_WORKERS = 'SERVE_OLD_WORKERS'
+
+def load_app():
+    # Workers deliver queued email unless told otherwise; each starts its sender on its first request
+    os.environ.setdefault('MAIL_OUTBOX_SENDER', 'true')
+    from app import create_app
+    return create_app()
+
+class RequestHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    access_log = False
+
+    def handle_one_request(self):
+        super().handle_one_request()
+        # Let keep-alive clients reconnect to a worker that is not shutting down
+        if self.server.stopping.is_set():
+            self.close_connection = True
+
+    def log_request(self, *args, **kwargs):
+        if self.access_log:
+            super().log_request(*args, **kwargs)
+
+class WorkerServer(BaseWSGIServer):
+    """Serves the inherited listening socket with a fixed pool of request threads"""
+
+    multithread = True
+
+    def __init__(self, sock, app, threads, handler):
+        host, port = sock.getsockname()[:2]
+        super().__init__(host, port, app, handler=handler, fd=sock.fileno())
+        self.socket.setblocking(False)
+        self.slots = threading.BoundedSemaphore(threads)
+        self.pool = ThreadPoolExecutor(threads, thread_name_prefix='request')
+        self.stopping = threading.Event()
+
+    def serve_forever(self, poll_interval=0.5):
+        with selectors.DefaultSelector() as selector:
+            selector.register(self.socket, selectors.EVENT_READ)
+            while not self.stopping.is_set():
+                # Accept only with a free thread; until then other workers take the connections
+                if not self.slots.acquire(timeout=poll_interval):
+                    continue
+                try:
+                    if not selector.select(poll_interval):
+                        self.slots.release()
+                        continue
+                    request, address = self.socket.accept()
+                except OSError:
+                    # Another worker accepted it first, or the socket was closed
+                    self.slots.release()
+                    continue
+                request.setblocking(True)
+                self.pool.submit(self._process, request, address)
+        self.pool.shutdown(wait=True)
+        self.server_close()
+
+    def _process(self, request, address):
+        try:
+            self.finish_request(request, address)
+        except Exception:
+            self.handle_error(request, address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+
+def run_worker(app, sock, options, ready):
+    """Body of a forked worker; returns the exit code"""
+    signal.set_wakeup_fd(-1)
+    # The master handles Ctrl-C and reloads for the whole group
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    if app is None:
+        app = load_app()
+    # Connections opened by the master must not be shared with the children
+    from app import db
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+    handler = type('Handler', (RequestHandler,), {'timeout': options.keepalive, 'access_log': options.access_log})
+    server = WorkerServer(sock, app, options.threads, handler)
+    signal.signal(signal.SIGTERM, lambda signum, frame: server.stopping.set())
+    os.write(ready, b'.')
+    server.serve_forever()
+    return 0
+
+class Master:
+    def __init__(self, options, sock, app):
+        self.options = options
+        self.sock = sock
+        self.app = app
+        self.workers = {}
+        self.retiring = set()
+        self.failures = 0
+        self.signals = []
+        self.ready_r, self.ready_w = os.pipe()
+        os.set_blocking(self.ready_r, False)
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                os.close(self.ready_r)
+                code = run_worker(self.app, self.sock, self.options, self.ready_w)
+            except BaseException:
+                logger.exception('Worker %s failed', os.getpid())
+            finally:
+                logging.shutdown()
+                os._exit(code)
+        self.workers[pid] = time.monotonic()
+        return pid
+
+    def wait_ready(self, count, timeout):
+        """Block until `count` new workers report they are serving"""
+        deadline = time.monotonic() + timeout
+        seen = 0
+        while seen < count and time.monotonic() < deadline:
+            try:
+                seen += len(os.read(self.ready_r, 4096))
+            except BlockingIOError:
+                self.reap()
+                time.sleep(0.01)
+        return seen >= count
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid in self.retiring:
+                self.retiring.discard(pid)
+                continue
+            started = self.workers.pop(pid, None)
+            if started is None:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            logger.warning('Worker %s exited with %s', pid, code)
+            # Back off when workers die right after starting, e.g. on a broken config
+            self.failures = self.failures + 1 if time.monotonic() - started < 5 else 0
+
+    def stop(self, timeout):
+        pids = set(self.workers) | self.retiring
+        for pid in pids:
+            self.kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + timeout
+        while pids and time.monotonic() < deadline:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid:
+                pids.discard(pid)
+            else:
+                time.sleep(0.05)
+        for pid in pids:
+            self.kill(pid, signal.SIGKILL)
+        self.workers.clear()
+        self.retiring.clear()
+
+    @staticmethod
+    def kill(pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def reload(self):
+        """Re-execute the master with the new code on the same socket; old workers keep serving meanwhile"""
+        check = subprocess.run([sys.executable] + sys.orig_argv[1:] + ['--check'])
+        if check.returncode != 0:
+            logger.error('Reload aborted: the new code failed to load')
+            return
+        os.set_inheritable(self.sock.fileno(), True)
+        env = dict(os.environ)
+        env[LISTEN_FD] = str(self.sock.fileno())
+        env[OLD_WORKERS] = ','.join(str(pid) for pid in (*self.workers, *self.retiring))
+        logger.info('Reloading')
+        os.execve(sys.executable, [sys.executable] + sys.orig_argv[1:], env)
+
+    def run(self, old_workers=()):
+        wakeup_r, wakeup_w = os.pipe()
+        os.set_blocking(wakeup_r, False)
+        os.set_blocking(wakeup_w, False)
+        signal.set_wakeup_fd(wakeup_w)
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGCHLD):
+            signal.signal(signum, lambda signum, frame: self.signals.append(signum))
+
+        for _ in range(self.options.workers):
+            self.spawn()
+        if not self.wait_ready(self.options.workers, self.options.graceful_timeout):
+            logger.warning('Not every worker reported ready')
+        # Hand over from the previous master's workers only once the new ones serve
+        for pid in old_workers:
+            self.retiring.add(pid)
+            self.kill(pid, signal.SIGTERM)
+        logger.info('Serving on %s:%s with %s workers x %s threads (pid %s)',
+                    *self.sock.getsockname()[:2], self.options.workers, self.options.threads, os.getpid())
+
+        with selectors.DefaultSelector() as selector:
+            selector.register(wakeup_r, selectors.EVENT_READ)
+            while True:
+                selector.select(1.0)
+                try:
+                    os.read(wakeup_r, 4096)
+                    os.read(self.ready_r, 4096)
+                except BlockingIOError:
+                    pass
+                self.reap()
+                while self.signals:
+                    signum = self.signals.pop(0)
+                    if signum in (signal.SIGTERM, signal.SIGINT):
+                        logger.info('Stopping')
+                        self.stop(self.options.graceful_timeout)
+                        return
+                    if signum == signal.SIGHUP:
+                        self.reload()
+                if len(self.workers) < self.options.workers and self.failures:
+                    time.sleep(min(2 ** self.failures, 30))
+                while len(self.workers) < self.options.workers:
+                    self.spawn()
+
+def bind(address, backlog):
+    host, _, port = address.rpartition(':')
+    host = host.strip('[]') or '0.0.0.0'
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, int(port)))
+    sock.listen(backlog)
+    return sock
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-forking production server for the podcast API')
+    parser.add_argument('--bind', default=os.getenv('BIND', '0.0.0.0:8000'), help='host:port')
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WEB_CONCURRENCY', os.cpu_count() or 1)))
+    parser.add_argument('--threads', type=int, default=int(os.getenv('WEB_THREADS', 8)), help='request threads per worker')
+    parser.add_argument('--preload', action=argparse.BooleanOptionalAction, default=True,
+                        help='build the app in the master before forking (default)')
+    parser.add_argument('--backlog', type=int, default=2048)
+    parser.add_argument('--keepalive', type=float, default=5, help='seconds an idle connection keeps its thread')
+    parser.add_argument('--graceful-timeout', type=float, default=30)
+    parser.add_argument('--access-log', action='store_true')
+    parser.add_argument('--check', action='store_true', help='load the app and exit; used before a reload')
+    options = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s [serve] %(message)s')
+    if options.check:
+        load_app()
+        return
+
+    inherited = os.environ.pop(LISTEN_FD, None)
+    old_workers = [int(pid) for pid in os.environ.pop(OLD_WORKERS, '').split(',') if pid]
+    if inherited is not None:
+        sock = socket.socket(fileno=int(inherited))
+        os.set_inheritable(sock.fileno(), False)
+    else:
+        sock = bind(options.bind, options.backlog)
+    app = load_app() if options.preload else None
+    Master(options, sock, app).run(old_workers)
+
+if __name__ == '__main__':
+    main()
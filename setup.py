@@ -60,8 +60,8 @@ def main():
     print("\n=== Setup Complete ===")
     print("\nNext steps:")
     print("1. Configure your .env file with proper values")
-    print("2. Run: flask db upgrade")
-    print("3. Run: python run.py")
+    print("2. Run: flask init-db")
+    print("3. Run: python run.py (development) or python serve.py (production)")
     
     if not env_ok:
         print("\n⚠ Please set up your .env file before running the application.")
@@ -0,0 +1,85 @@
+import anyio
+import pytest
+from app import create_app, db
+from app.commands import init_db
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """An app on its own SQLite file, with every runtime file under tmp_path and no background senders"""
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.setenv('MAIL_OUTBOX_SENDER', 'false')
+    monkeypatch.setenv('RATELIMIT_ENABLED', 'false')
+    # Tests see the queries themselves, not cache hits
+    monkeypatch.setenv('RESPONSE_CACHE_ENABLED', 'false')
+    monkeypatch.setenv('RATELIMIT_STORAGE_PATH', str(tmp_path / 'ratelimit.bin'))
+    monkeypatch.setenv('CATEGORY_CACHE_VERSION_PATH', str(tmp_path / 'category_version.bin'))
+    monkeypatch.setenv('RESPONSE_CACHE_PATH', str(tmp_path / 'response_cache.db'))
+    monkeypatch.setenv('RESPONSE_CACHE_VERSION_PATH', str(tmp_path / 'response_cache_version.bin'))
+    monkeypatch.setenv('LIVE_EVENTS_PATH', str(tmp_path / 'live_events.db'))
+    monkeypatch.setenv('PROFILE_DIR', str(tmp_path / 'profiles'))
+    app = create_app()
+    app.config.update(TESTING=True, UPLOAD_FOLDER=str(tmp_path / 'uploads'))
+    with app.app_context():
+        init_db()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def assert_max_queries(app):
+    """`with assert_max_queries(n): ...` fails, listing the statements, when the block runs more than n"""
+    from app.utils.query_trace import assert_max_queries
+    return lambda n: assert_max_queries(n, app)
+
+class ASGIClient:
+    """Drives an ASGI app in-process: `get()` from sync tests, `request()` from async ones"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def request(self, method, path, headers=None, body=b''):
+        """(status, headers, body) once the whole response was sent"""
+        path, _, query = path.partition('?')
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+            'root_path': '', 'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in (headers or {}).items()],
+        }
+        messages = []
+        finished = anyio.Event()
+        requested = False
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            await finished.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            messages.append(message)
+            if message['type'] == 'http.response.body' and not message.get('more_body', False):
+                finished.set()
+
+        await self.app(scope, receive, send)
+        start = messages[0]
+        response_headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in start['headers']}
+        return start['status'], response_headers, b''.join(message.get('body', b'') for message in messages[1:])
+
+    def get(self, path, headers=None):
+        return anyio.run(self.request, 'GET', path, headers)
+
+@pytest.fixture
+def asgi_client(app):
+    """The async app (app.asgi) in front of the test app"""
+    from app.asgi import create_asgi_app
+    asgi = create_asgi_app(app)
+    yield ASGIClient(asgi)
+    anyio.run(asgi.state.reads.engine.dispose)
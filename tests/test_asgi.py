@@ -0,0 +1,48 @@
+import json
+import anyio
+import pytest
+from benchmarks.seed import seed
+
+@pytest.fixture
+def world(app):
+    with app.app_context():
+        ids = seed(users=5, podcasts=15, likes=20, comments=20, listens=0, upload_folder=app.config['UPLOAD_FOLDER'])
+    return ids
+
+def _paths(ids):
+    podcast_id, category_id = ids['podcasts'][0], ids['categories'][0]
+    return [
+        '/api/podcasts',
+        '/api/podcasts?page=2&per_page=5',
+        '/api/podcasts?page=x',
+        f'/api/podcasts?category_id={category_id}',
+        '/api/podcasts?search=a',
+        '/api/podcasts/discover',
+        '/api/podcasts/discover?per_page=4&page=2',
+        f'/api/podcasts/{podcast_id}',
+        f'/api/podcasts/{podcast_id}/comments',
+        '/api/categories',
+    ]
+
+def test_async_reads_match_the_flask_views(app, client, asgi_client, world):
+    for path in _paths(world):
+        flask_response = client.get(path)
+        status, headers, body = asgi_client.get(path)
+        assert status == flask_response.status_code == 200, path
+        assert json.loads(body) == flask_response.get_json(), path
+        assert headers['cache-control'] == flask_response.headers['Cache-Control'], path
+        assert headers.get('etag') == flask_response.headers.get('ETag'), path
+
+@pytest.mark.parametrize('path', ['/api/podcasts?page=99', '/api/podcasts?per_page=0', '/api/podcasts/missing',
+                                  '/api/podcasts/missing/comments'])
+def test_async_reads_404_where_flask_does(app, client, asgi_client, world, path):
+    assert client.get(path).status_code == 404
+    assert asgi_client.get(path)[0] == 404
+
+def test_other_routes_fall_through_to_flask(app, asgi_client, world):
+    status, _, body = anyio.run(asgi_client.request, 'POST', '/api/categories',
+                                {'Content-Type': 'application/json', 'Content-Length': '17'}, b'{"name": "Async"}')
+    assert status == 201 and json.loads(body)['category']['name'] == 'Async'
+    # The category snapshot is shared, so the async listing sees the write at once
+    status, _, body = asgi_client.get('/api/categories')
+    assert 'Async' in [category['name'] for category in json.loads(body)['categories']]
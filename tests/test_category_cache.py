@@ -0,0 +1,47 @@
+from app import db
+from app.models.category import Category
+from app.utils.category_cache import CategoryCache, VersionFile
+
+def test_version_file_is_shared_by_every_opener(tmp_path):
+    first, second = VersionFile(str(tmp_path / 'version.bin')), VersionFile(str(tmp_path / 'version.bin'))
+    assert first.read() == second.read() == 0
+    assert first.bump() == 1
+    assert second.read() == 1
+    assert second.bump() == 2 and first.read() == 2
+
+def test_categories_are_served_without_queries(app, client, assert_max_queries):
+    assert client.post('/api/categories', json={'name': 'Jazz'}).status_code == 201
+    # The first read after a write rebuilds the snapshot, the rest reuse it
+    with assert_max_queries(1):
+        client.get('/api/categories')
+    with assert_max_queries(0):
+        response = client.get('/api/categories')
+    assert [category['name'] for category in response.get_json()['categories']] == ['Jazz']
+
+    response = client.get('/api/categories', headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+
+def test_a_write_in_one_worker_refreshes_the_others(app, client):
+    # Another worker on the host: its own snapshot over the same version file
+    other = CategoryCache(app, VersionFile(app.config['CATEGORY_CACHE_VERSION_PATH']))
+    with app.app_context():
+        before = other.snapshot()
+    assert before.categories == ()
+
+    assert client.post('/api/categories', json={'name': 'Jazz'}).status_code == 201
+    assert other.current() is None
+    with app.app_context():
+        after = other.snapshot()
+    assert [category['name'] for category in after.categories] == ['Jazz']
+    assert after.etag != before.etag
+
+def test_edits_made_elsewhere_show_up_after_max_age(app):
+    cache = app.extensions['category_cache']
+    with app.app_context():
+        cache.snapshot()
+        # Written without invalidate(), as another host would
+        db.session.add(Category(name='Jazz'))
+        db.session.commit()
+        assert cache.snapshot().categories == ()
+        cache.max_age = 0
+        assert [category['name'] for category in cache.snapshot().categories] == ['Jazz']
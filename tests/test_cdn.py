@@ -0,0 +1,121 @@
+import json
+import threading
+import time
+import urllib.error
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from flask_jwt_extended import create_access_token
+from app.utils.cdn import PurgeDispatcher, purge
+from benchmarks.seed import seed
+
+class PurgeStub(ThreadingHTTPServer):
+    """A purge API that records each call and fails the first `failures` of them"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _PurgeHandler)
+        self.calls = []
+        self.failures = 0
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/purge'
+
+    def keys(self):
+        return [key for _, body in self.calls for key in next(iter(body.values()))]
+
+class _PurgeHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if self.server.failures:
+            self.server.failures -= 1
+            self.send_response(503)
+        else:
+            self.server.calls.append((dict(self.headers), body))
+            self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def purge_api():
+    server = PurgeStub()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def dispatcher(app, purge_api):
+    """The app's purges go to the stand-in, with a short gathering delay"""
+    app.config.update(CDN_PURGE_URL=purge_api.url, CDN_PURGE_TOKEN='secret', CDN_PURGE_BATCH_SIZE=3, CDN_PURGE_DELAY=0.05)
+    dispatcher = PurgeDispatcher(app)
+    app.extensions['cdn'].dispatcher = dispatcher
+    return dispatcher
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('timed out')
+        time.sleep(0.02)
+
+def test_public_responses_name_what_they_were_built_from(app, client):
+    with app.app_context():
+        ids = seed(users=3, podcasts=3, likes=0, comments=3, listens=3, upload_folder=app.config['UPLOAD_FOLDER'])
+        token = create_access_token(identity=ids['users'][0])
+    podcast_id = ids['podcasts'][0]
+
+    response = client.get(f'/api/podcasts/{podcast_id}/stream', headers={'Range': 'bytes=0-99'})
+    keys = response.headers['Surrogate-Key'].split(' ')
+    assert f'podcast:{podcast_id}' in keys and any(key.startswith('author:') for key in keys)
+    assert any(key.startswith('file:audio/') for key in keys)
+    assert response.headers['Cache-Tag'].split(',') == keys
+
+    assert 'catalog' in client.get('/api/podcasts').headers['Surrogate-Key'].split(' ')
+    assert client.get('/api/categories').headers['Surrogate-Key'] == 'categories'
+    # A caller's own data never reaches the edge
+    private = client.get('/auth/profile/listen-history', headers={'Authorization': f'Bearer {token}'})
+    assert private.status_code == 200 and 'Surrogate-Key' not in private.headers
+
+def test_purges_are_deduplicated_and_batched(dispatcher, purge_api):
+    dispatcher._pending.update(dict.fromkeys(['podcast:1', 'podcast:2', 'podcast:1', 'catalog']))
+    dispatcher._pending.update(dict.fromkeys(['catalog', 'author:9', 'podcast:3']))
+    dispatcher.drain()
+
+    bodies = [body for _, body in purge_api.calls]
+    assert bodies == [{'surrogate_keys': ['podcast:1', 'podcast:2', 'catalog']},
+                      {'surrogate_keys': ['author:9', 'podcast:3']}]
+    assert all(headers['Fastly-Key'] == 'secret' for headers, _ in purge_api.calls)
+
+def test_cloudflare_format(app, purge_api, dispatcher):
+    app.config['CDN_PURGE_FORMAT'] = 'cloudflare'
+    dispatcher = PurgeDispatcher(app)
+    dispatcher.send(['podcast:1'])
+    headers, body = purge_api.calls[0]
+    assert body == {'tags': ['podcast:1']}
+    assert headers['Authorization'] == 'Bearer secret'
+
+def test_failed_purges_stay_pending(dispatcher, purge_api):
+    purge_api.failures = 1
+    dispatcher._pending.update(dict.fromkeys(['podcast:1', 'podcast:2']))
+    with pytest.raises(urllib.error.HTTPError):
+        dispatcher.drain()
+    assert list(dispatcher._pending) == ['podcast:1', 'podcast:2']
+    dispatcher.drain()
+    assert purge_api.keys() == ['podcast:1', 'podcast:2']
+
+def test_a_burst_of_writes_becomes_one_purge(app, client, dispatcher, purge_api):
+    dispatcher.delay = 0.5
+    for name in ('Jazz', 'Blues'):
+        assert client.post('/api/categories', json={'name': name}).status_code == 201
+    with app.test_request_context():
+        purge('catalog', 'categories')
+
+    _wait_for(lambda: purge_api.calls)
+    time.sleep(0.1)
+    assert [body for _, body in purge_api.calls] == [{'surrogate_keys': ['categories', 'catalog']}]
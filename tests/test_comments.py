@@ -0,0 +1,49 @@
+import uuid
+import pytest
+from app import db
+from app.models.user import User
+from app.utils.password import hash_password
+from app.utils.response_cache import init_response_cache
+from benchmarks.seed import seed
+
+PASSWORD = 'Comments-Passw0rd!'
+
+@pytest.fixture
+def podcasts(app, client):
+    """Two podcast ids and a bearer header for a user who can comment on them"""
+    with app.app_context():
+        ids = seed(users=1, podcasts=2, likes=0, comments=0, listens=0, upload_folder=app.config['UPLOAD_FOLDER'])
+        user = db.session.get(User, ids['users'][0])
+        user.password = hash_password(PASSWORD)
+        db.session.commit()
+        email = user.email
+    token = client.post('/auth/login', json={'email': email, 'password': PASSWORD}).get_json()['token']
+    return ids['podcasts'], {'Authorization': f'Bearer {token}'}
+
+def test_replies_need_a_parent_on_the_same_podcast(client, podcasts):
+    (podcast_id, other_id), auth = podcasts
+    comments = f'/api/podcasts/{podcast_id}/comments'
+    parent = client.post(comments, headers=auth, json={'content': 'First'}).get_json()['comment']
+    elsewhere = client.post(f'/api/podcasts/{other_id}/comments', headers=auth, json={'content': 'Other'}).get_json()['comment']
+
+    reply = client.post(comments, headers=auth, json={'content': 'Reply', 'parent_id': parent['id'].upper()})
+    assert reply.status_code == 201 and reply.get_json()['comment']['parent_id'] == parent['id']
+
+    # None of these may turn into a top-level comment
+    assert client.post(comments, headers=auth, json={'content': 'Reply', 'parent_id': 'not-an-id'}).status_code == 400
+    assert client.post(comments, headers=auth, json={'content': 'Reply', 'parent_id': 42}).status_code == 400
+    assert client.post(comments, headers=auth, json={'content': 'Reply', 'parent_id': str(uuid.uuid4())}).status_code == 404
+    assert client.post(comments, headers=auth, json={'content': 'Reply', 'parent_id': elsewhere['id']}).status_code == 404
+    assert sorted(comment['content'] for comment in client.get(comments).get_json()['comments']) == ['First', 'Reply']
+
+def test_new_comments_show_whatever_case_the_podcast_id_was_cached_under(app, client, podcasts):
+    (podcast_id, _), auth = podcasts
+    app.config['RESPONSE_CACHE_ENABLED'] = True
+    init_response_cache(app)
+    comments = f'/api/podcasts/{podcast_id.upper()}/comments'
+    assert client.get(comments).get_json()['comments'] == []
+    # Served from the cache until its tag is invalidated
+    assert client.get(comments).get_json()['comments'] == []
+
+    client.post(f'/api/podcasts/{podcast_id}/comments', headers=auth, json={'content': 'Hello'})
+    assert [comment['content'] for comment in client.get(comments).get_json()['comments']] == ['Hello']
@@ -0,0 +1,52 @@
+import gzip
+import pytest
+from app.utils.compression import Compressor, negotiate
+from benchmarks.seed import seed
+
+@pytest.fixture
+def world(app):
+    with app.app_context():
+        return seed(users=3, podcasts=10, likes=0, comments=0, listens=0, upload_folder=app.config['UPLOAD_FOLDER'])
+
+def test_negotiate_follows_the_clients_q_values():
+    preference = ['zstd', 'br', 'gzip']
+    assert negotiate('gzip, br', preference) == 'br'
+    assert negotiate('gzip;q=1, br;q=0.5', preference) == 'gzip'
+    assert negotiate('br;q=0, gzip;q=0', preference) is None
+    assert negotiate('*', preference) == 'zstd'
+    assert negotiate('identity', preference) is None
+    assert negotiate(None, preference) is None
+
+def test_precompressed_bodies_are_bounded_by_bytes():
+    compressor = Compressor({'gzip': lambda data: data[:100]}, ['gzip'], cache_bytes=250)
+    for index in range(5):
+        compressor.cached(bytes([index]) * 1000, 'gzip')
+    assert compressor._cached_bytes == 200 and len(compressor._cache) == 2
+
+def test_json_is_compressed_for_clients_that_accept_it(app, client, world):
+    identity = client.get('/api/podcasts')
+    response = client.get('/api/podcasts', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.get_data()) == identity.get_data()
+    assert 'Content-Encoding' not in identity.headers
+
+def test_small_bodies_and_audio_are_sent_as_is(app, client, world):
+    assert 'Content-Encoding' not in client.get('/api/test', headers={'Accept-Encoding': 'gzip'}).headers
+    response = client.get(f"/api/podcasts/{world['podcasts'][0]}/stream", headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200 and 'Content-Encoding' not in response.headers
+
+def test_compressed_responses_carry_a_weak_etag(app, client, world):
+    path = f"/api/podcasts/{world['podcasts'][0]}"
+    app.extensions['compressor'].min_size = 0
+    response = client.get(path, headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['ETag'].startswith('W/')
+    revalidated = client.get(path, headers={'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
+
+def test_async_reads_are_compressed_the_same_way(app, client, asgi_client, world):
+    status, headers, body = asgi_client.get('/api/podcasts', {'Accept-Encoding': 'gzip'})
+    assert status == 200 and headers['content-encoding'] == 'gzip'
+    assert 'Accept-Encoding' in headers['vary']
+    assert gzip.decompress(body) == asgi_client.get('/api/podcasts')[2]
@@ -0,0 +1,80 @@
+import pytest
+from app import db
+from app.models.user import User
+from app.utils.password import hash_password
+from benchmarks.seed import seed
+
+PASSWORD = 'Etag-Passw0rd!'
+
+@pytest.fixture
+def podcast(app, client):
+    """A podcast id and a bearer header for a user who can like it and comment on it"""
+    with app.app_context():
+        ids = seed(users=1, podcasts=1, likes=0, comments=0, listens=0, upload_folder=app.config['UPLOAD_FOLDER'])
+        user = db.session.get(User, ids['users'][0])
+        user.password = hash_password(PASSWORD)
+        db.session.commit()
+        email = user.email
+    token = client.post('/auth/login', json={'email': email, 'password': PASSWORD}).get_json()['token']
+    return ids['podcasts'][0], {'Authorization': f'Bearer {token}'}
+
+def _revalidate(client, path, etag, headers=None):
+    return client.get(path, headers={**(headers or {}), 'If-None-Match': etag})
+
+def test_unchanged_podcast_is_a_304_with_its_validators(client, podcast):
+    podcast_id, _ = podcast
+    path = f'/api/podcasts/{podcast_id}'
+    response = client.get(path)
+    etag = response.headers['ETag']
+    assert etag.startswith('W/')
+
+    revalidated = _revalidate(client, path, etag)
+    assert revalidated.status_code == 304 and revalidated.get_data() == b''
+    assert revalidated.headers['ETag'] == etag
+    assert revalidated.headers['Cache-Control'] == response.headers['Cache-Control'] == 'public, no-cache'
+    assert _revalidate(client, path, '*').status_code == 304
+
+def test_likes_and_category_changes_move_the_podcast_etag(client, podcast):
+    podcast_id, auth = podcast
+    path = f'/api/podcasts/{podcast_id}'
+    etag = client.get(path).headers['ETag']
+    assert client.post(f'{path}/like', headers=auth).status_code == 200
+    response = _revalidate(client, path, etag)
+    assert response.status_code == 200 and response.get_json()['likes_count'] == 1
+
+    # Category dicts come from the snapshot, whose version is part of the ETag
+    etag = response.headers['ETag']
+    assert client.post('/api/categories', json={'name': 'New'}).status_code == 201
+    assert _revalidate(client, path, etag).status_code == 200
+
+def test_comment_writes_move_the_listing_etag(client, podcast):
+    podcast_id, auth = podcast
+    path = f'/api/podcasts/{podcast_id}/comments'
+    etag = client.get(path).headers['ETag']
+    assert _revalidate(client, path, etag).status_code == 304
+
+    comment = client.post(path, headers=auth, json={'content': 'First'}).get_json()['comment']
+    response = _revalidate(client, path, etag)
+    assert response.status_code == 200 and len(response.get_json()['comments']) == 1
+
+    etag = response.headers['ETag']
+    assert client.delete(f"{path}/{comment['id']}", headers=auth).status_code == 200
+    assert _revalidate(client, path, etag).status_code == 200
+
+def test_profile_honours_if_modified_since_unless_an_etag_is_sent(client, podcast):
+    _, auth = podcast
+    response = client.get('/auth/profile', headers=auth)
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+    last_modified = response.headers['Last-Modified']
+    assert client.get('/auth/profile', headers={**auth, 'If-Modified-Since': last_modified}).status_code == 304
+    # If-None-Match takes precedence, so a stale ETag gets the full body
+    stale = {**auth, 'If-Modified-Since': last_modified, 'If-None-Match': 'W/"stale"'}
+    assert client.get('/auth/profile', headers=stale).status_code == 200
+
+def test_async_reads_revalidate_with_the_flask_etags(client, asgi_client, podcast):
+    podcast_id, _ = podcast
+    for path in (f'/api/podcasts/{podcast_id}', f'/api/podcasts/{podcast_id}/comments', '/api/categories'):
+        etag = client.get(path).headers['ETag']
+        status, headers, body = asgi_client.get(path, {'If-None-Match': etag})
+        assert (status, body) == (304, b''), path
+        assert headers['etag'] == etag, path
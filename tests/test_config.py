@@ -0,0 +1,24 @@
+import os
+import threading
+from app import create_app
+
+RUNTIME_PATHS = ('RATELIMIT_STORAGE_PATH', 'CATEGORY_CACHE_VERSION_PATH', 'RESPONSE_CACHE_PATH',
+                 'RESPONSE_CACHE_VERSION_PATH', 'LIVE_EVENTS_PATH', 'PROFILE_DIR', 'METRICS_DIR')
+
+def test_create_app_reads_the_environment_and_touches_nothing(tmp_path, monkeypatch):
+    runtime = tmp_path / 'runtime'
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.setenv('RATELIMIT_BACKEND', 'file')
+    monkeypatch.setenv('STREAM_RATE', '1000')
+    for name in RUNTIME_PATHS:
+        monkeypatch.setenv(name, str(runtime / name.lower()))
+    threads = set(threading.enumerate())
+
+    app = create_app()
+    assert app.config['RATELIMIT_BACKEND'] == 'file' and app.config['STREAM_RATE'] == 1000
+    assert not runtime.exists()
+    assert set(threading.enumerate()) <= threads
+
+    # Files appear when the features that own them are first used
+    app.extensions['category_cache'].version_file.bump()
+    assert os.path.exists(app.config['CATEGORY_CACHE_VERSION_PATH'])
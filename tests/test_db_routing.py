@@ -0,0 +1,60 @@
+import pytest
+from app import db
+from app.utils.db_routing import STICKY_COOKIE
+from benchmarks.seed import seed
+
+@pytest.fixture
+def replicated(request, tmp_path, monkeypatch):
+    """An app whose two replicas are empty SQLite files, so a 404 shows a read went to a replica"""
+    monkeypatch.setenv('DATABASE_REPLICA_URLS', f"sqlite:///{tmp_path / 'replica_0.db'},sqlite:///{tmp_path / 'replica_1.db'}")
+    app = request.getfixturevalue('app')
+    with app.app_context():
+        for key in app.config['SQLALCHEMY_REPLICA_BINDS']:
+            db.metadata.create_all(db.engines[key])
+        podcast_id = seed(users=1, podcasts=1, likes=0, comments=0, listens=0,
+                          upload_folder=app.config['UPLOAD_FOLDER'])['podcasts'][0]
+    yield app, f'/api/podcasts/{podcast_id}'
+    with app.app_context():
+        for key in app.config['SQLALCHEMY_REPLICA_BINDS']:
+            db.engines[key].dispose()
+
+def test_read_only_views_read_one_replica_per_request(replicated, monkeypatch):
+    app, podcast = replicated
+    router = app.extensions['db_router']
+    picks = []
+    pick = router.pick
+    monkeypatch.setattr(router, 'pick', lambda: picks.append(1) or pick())
+    client = app.test_client()
+
+    assert client.get(podcast).status_code == 404
+    # Listing runs several statements, all against the replica picked first
+    assert client.get('/api/podcasts').get_json()['podcasts'] == []
+    assert len(picks) == 2
+
+def test_clients_that_wrote_read_the_primary(replicated):
+    app, podcast = replicated
+    writer = app.test_client()
+    response = writer.post('/api/categories', json={'name': 'Sticky'})
+    assert response.status_code == 201
+    assert writer.get_cookie(STICKY_COOKIE) is not None
+    assert writer.get(podcast).status_code == 200
+
+    # Other clients, and forged cookies, still read replicas
+    assert app.test_client().get(podcast).status_code == 404
+    forger = app.test_client()
+    forger.set_cookie(STICKY_COOKIE, 'forged')
+    assert forger.get(podcast).status_code == 404
+
+    # The window is carried by the cookie, not by this process
+    app.extensions['db_router'].sticky_seconds = -1
+    assert writer.get(podcast).status_code == 404
+
+def test_lagging_replicas_leave_rotation(replicated):
+    app, podcast = replicated
+    router = app.extensions['db_router']
+    router.lag_query = f'SELECT {router.max_lag + 1}'
+    for state in router.states.values():
+        state.checked_at = 0
+    assert app.test_client().get(podcast).status_code == 200
+    with app.app_context():
+        assert all(replica['lag_seconds'] > router.max_lag for replica in router.health())
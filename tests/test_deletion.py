@@ -0,0 +1,114 @@
+import os
+import pytest
+from app import db
+from app.models.comment import Comment
+from app.models.podcast import Podcast
+from app.models.podcast_listen import PodcastListen
+from app.models.user import User
+from app.utils.deletion import Deletion
+from app.utils.password import hash_password
+from benchmarks.seed import seed
+
+PASSWORD = 'Deletion-Passw0rd!'
+
+@pytest.fixture
+def world(app):
+    with app.app_context():
+        ids = seed(users=5, podcasts=10, likes=20, comments=40, listens=40, upload_folder=app.config['UPLOAD_FOLDER'])
+        # Someone who has written podcasts, with a password to log in with
+        author_id = db.session.execute(db.select(Podcast.author_id).limit(1)).scalar_one()
+        user = db.session.get(User, author_id)
+        user.password = hash_password(PASSWORD)
+        db.session.commit()
+        ids['author'] = (author_id, user.email)
+    return ids
+
+def _login(client, email):
+    return client.post('/auth/login', json={'email': email, 'password': PASSWORD})
+
+def _count(model, **filters):
+    return db.session.execute(db.select(db.func.count()).select_from(model).filter_by(**filters)).scalar_one()
+
+def test_account_deletion_blocks_login_and_finishes_in_the_background(app, client, world):
+    author_id, email = world['author']
+    token = _login(client, email).get_json()['token']
+    response = client.delete('/auth/profile', headers={'Authorization': f'Bearer {token}'}, json={'password': PASSWORD})
+    assert response.status_code == 202
+
+    assert _login(client, email).status_code == 403
+    app.extensions['deletion'].join()
+    with app.app_context():
+        assert db.session.get(User, author_id) is None
+        assert _count(Podcast, author_id=author_id) == 0
+        assert _count(Comment, user_id=author_id) == 0
+        assert _count(PodcastListen, user_id=author_id) == 0
+    assert _login(client, email).status_code == 401
+
+def test_podcast_deletion_runs_in_the_background(app, client, world):
+    author_id, email = world['author']
+    token = _login(client, email).get_json()['token']
+    with app.app_context():
+        podcast = db.session.execute(db.select(Podcast).filter_by(author_id=author_id).limit(1)).scalar_one()
+        podcast_id, audio_path = podcast.id, os.path.join(app.config['UPLOAD_FOLDER'], podcast.audio_url)
+    assert os.path.exists(audio_path)
+
+    response = client.delete(f'/api/podcasts/{podcast_id}', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 202
+
+    deletion = app.extensions['deletion']
+    deletion.join()
+    deletion.reaper.join()
+    with app.app_context():
+        assert db.session.get(Podcast, podcast_id) is None
+        assert _count(Comment, podcast_id=podcast_id) == 0
+        assert _count(PodcastListen, podcast_id=podcast_id) == 0
+    assert not os.path.exists(audio_path)
+
+def test_a_new_process_resumes_requested_deletions(app, world):
+    author_id, _ = world['author']
+    with app.app_context():
+        other_podcast = db.session.execute(
+            db.select(Podcast.id).where(Podcast.author_id != author_id).limit(1)).scalar_one()
+        # Stamped, then the process died before its deleters got to them
+        before_restart = Deletion(app)
+        before_restart.accounts.request(author_id)
+        before_restart.podcasts.request(other_podcast)
+        db.session.commit()
+        assert db.session.get(User, author_id).deletion_requested_at is not None
+
+    after_restart = Deletion(app)
+    after_restart.resume()
+    after_restart.join()
+    with app.app_context():
+        assert db.session.get(User, author_id) is None
+        assert db.session.get(Podcast, other_podcast) is None
+
+def test_podcasts_pending_deletion_are_hidden_at_once(app, client, world, monkeypatch):
+    author_id, email = world['author']
+    token = _login(client, email).get_json()['token']
+    auth = {'Authorization': f'Bearer {token}'}
+    deletion = app.extensions['deletion']
+    # Leave the rows stamped, as they are until the deleters get to them
+    monkeypatch.setattr(deletion.podcasts, 'submit', lambda podcast_id: None)
+    monkeypatch.setattr(deletion.accounts, 'submit', lambda user_id: None)
+    with app.app_context():
+        podcast_ids = db.session.execute(db.select(Podcast.id).filter_by(author_id=author_id)).scalars().all()
+    podcast_id = podcast_ids[0]
+    assert client.get(f'/api/podcasts/{podcast_id}').status_code == 200
+
+    assert client.delete(f'/api/podcasts/{podcast_id}', headers=auth).status_code == 202
+    for response in (
+        client.get(f'/api/podcasts/{podcast_id}'),
+        client.get(f'/api/podcasts/{podcast_id}/stream'),
+        client.post(f'/api/podcasts/{podcast_id}/like', headers=auth),
+        client.post(f'/api/podcasts/{podcast_id}/comments', headers=auth, json={'content': 'Too late'}),
+    ):
+        assert response.status_code == 404
+    listed = {podcast['id'] for podcast in client.get('/api/podcasts?per_page=100').get_json()['podcasts']}
+    assert podcast_id not in listed
+
+    # An account pending deletion takes its podcasts with it
+    assert client.delete('/auth/profile', headers=auth, json={'password': PASSWORD}).status_code == 202
+    listed = {podcast['id'] for podcast in client.get('/api/podcasts?per_page=100').get_json()['podcasts']}
+    assert listed and not listed & set(podcast_ids)
+    assert client.get(f'/api/podcasts/{podcast_ids[-1]}').status_code == 404
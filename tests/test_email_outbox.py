@@ -0,0 +1,179 @@
+import socketserver
+import threading
+from datetime import datetime, timedelta
+import pytest
+from app import db, mail
+from app.models.email_outbox import EmailOutbox
+from app.utils.email import queue_email
+from app.utils.email_outbox import OutboxSender, retry_delay
+
+def _sender_threads():
+    return [thread for thread in threading.enumerate() if thread.name == 'email-outbox-sender' and thread.is_alive()]
+
+def test_create_app_does_not_start_the_sender(app):
+    sender = app.extensions['email_outbox']
+    assert sender._thread is None
+    assert not _sender_threads()
+
+def test_sender_stays_off_by_default(app, client):
+    client.get('/api/categories')
+    assert app.extensions['email_outbox']._thread is None
+
+def test_first_request_starts_the_sender_once(app, client):
+    app.config['MAIL_OUTBOX_SENDER'] = True
+    sender = app.extensions['email_outbox']
+    try:
+        client.get('/api/categories')
+        thread = sender._thread
+        assert thread is not None and thread.is_alive()
+        client.get('/api/categories')
+        assert sender._thread is thread
+    finally:
+        sender.stop()
+    assert not thread.is_alive()
+
+class SMTPStub(socketserver.ThreadingTCPServer):
+    """A relay that records what it receives and refuses the recipients in `refused`"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _SMTPHandler)
+        self.connections = 0
+        self.messages = []
+        self.refused = set()
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.server.connections += 1
+        self._reply('220 stub')
+        recipients, data = [], None
+        for line in self.rfile:
+            line = line.decode().rstrip('\r\n')
+            if data is not None:
+                if line == '.':
+                    self.server.messages.append((recipients, '\n'.join(data)))
+                    recipients, data = [], None
+                    self._reply('250 queued')
+                else:
+                    data.append(line)
+                continue
+            command = line.split(' ', 1)[0].upper()
+            if command == 'RCPT':
+                address = line.split(':', 1)[1].strip(' <>')
+                if address in self.server.refused:
+                    self._reply('550 no such user')
+                    continue
+                recipients.append(address)
+                self._reply('250 ok')
+            elif command == 'DATA':
+                data = []
+                self._reply('354 go ahead')
+            elif command == 'RSET':
+                recipients = []
+                self._reply('250 ok')
+            elif command == 'QUIT':
+                self._reply('221 bye')
+                return
+            else:
+                self._reply('250 ok')
+
+    def _reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+@pytest.fixture
+def smtp(app):
+    server = SMTPStub()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=server.server_address[1], MAIL_USE_TLS=False,
+                      MAIL_USERNAME=None, MAIL_PASSWORD=None, MAIL_SUPPRESS_SEND=False)
+    mail.init_app(app)
+    yield server
+    app.extensions['email_outbox'].stop()
+    server.shutdown()
+    server.server_close()
+
+def _queue(app, *recipients):
+    with app.app_context():
+        messages = [queue_email('Hello', recipient, '<p>Hi</p>', 'Hi') for recipient in recipients]
+        db.session.commit()
+        return [message.id for message in messages]
+
+def _rows(app, ids):
+    with app.app_context():
+        rows = [db.session.get(EmailOutbox, id) for id in ids]
+        db.session.expunge_all()
+        return rows
+
+def test_drain_delivers_queued_messages_over_one_connection(app, smtp):
+    ids = _queue(app, 'a@example.com', 'b@example.com', 'c@example.com')
+    sender = app.extensions['email_outbox']
+
+    assert sender.drain() == 3
+    assert sorted(recipients[0] for recipients, _ in smtp.messages) == ['a@example.com', 'b@example.com', 'c@example.com']
+    assert smtp.connections == 1
+    assert all(row.status == 'sent' and row.attempts == 1 and row.sent_at for row in _rows(app, ids))
+    # Nothing is due any more
+    assert sender.drain() == 0
+    assert len(smtp.messages) == 3
+
+def test_refused_recipient_is_retried_with_backoff_then_given_up(app, smtp):
+    app.config['MAIL_OUTBOX_MAX_ATTEMPTS'] = 2
+    sender = OutboxSender(app)
+    smtp.refused.add('gone@example.com')
+    good, bad = _queue(app, 'a@example.com', 'gone@example.com')
+
+    before = datetime.utcnow()
+    assert sender.drain() == 1
+    delivered, refused = _rows(app, [good, bad])
+    assert delivered.status == 'sent'
+    assert refused.status == 'pending' and refused.attempts == 1
+    assert '550' in refused.last_error
+    delay = retry_delay(1, sender.retry_base, sender.retry_max)
+    assert refused.next_attempt_at >= before + timedelta(seconds=delay)
+    assert refused.claim_token is None and refused.locked_until is None
+
+    # Not due yet
+    assert sender.drain() == 0
+    with app.app_context():
+        db.session.get(EmailOutbox, bad).next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+    assert sender.drain() == 0
+    refused, = _rows(app, [bad])
+    assert refused.status == 'failed' and refused.attempts == 2
+    sender.stop()
+
+def test_relay_down_keeps_the_batch_for_the_next_poll(app, smtp):
+    ids = _queue(app, 'a@example.com', 'b@example.com')
+    sender = app.extensions['email_outbox']
+    smtp.shutdown()
+    smtp.server_close()
+
+    assert sender.drain() == 0
+    first, second = sorted(_rows(app, ids), key=lambda row: -row.attempts)
+    # The first failure stops the batch instead of trying every message against a dead relay
+    assert first.status == 'pending' and first.attempts == 1 and first.next_attempt_at > datetime.utcnow()
+    assert second.status == 'pending' and second.attempts == 0
+    assert first.locked_until is None and second.locked_until is None
+
+def test_sender_survives_a_refused_first_message(app, smtp):
+    app.config.update(MAIL_OUTBOX_SENDER=True, MAIL_OUTBOX_POLL_INTERVAL=0.05, MAIL_OUTBOX_IDLE_TIMEOUT=0)
+    sender = OutboxSender(app)
+    smtp.refused.add('gone@example.com')
+    # The only message on a fresh connection is refused, so nothing has been sent over it yet
+    bad, = _queue(app, 'gone@example.com')
+    sender.start()
+    try:
+        deadline = datetime.utcnow() + timedelta(seconds=5)
+        while (_rows(app, [bad])[0].attempts == 0 or sender._connection is not None) and datetime.utcnow() < deadline:
+            threading.Event().wait(0.02)
+        assert _rows(app, [bad])[0].attempts == 1
+        # The idle connection was closed and the thread lives on to send the next message
+        assert sender._connection is None and sender._thread.is_alive()
+        good, = _queue(app, 'a@example.com')
+        while _rows(app, [good])[0].status != 'sent' and datetime.utcnow() < deadline:
+            threading.Event().wait(0.02)
+        assert _rows(app, [good])[0].status == 'sent'
+    finally:
+        sender.stop()
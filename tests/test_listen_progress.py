@@ -0,0 +1,77 @@
+import os
+import threading
+import pytest
+from app.utils.listen_progress import ProgressWriter, Timeline, _audio_start, _xing, timeline
+
+# First half of the duration in the first 100/256 of the bytes, the second half in the rest
+VBR_TOC = [i * 2 for i in range(50)] + [100 + (i - 50) * 3 for i in range(50, 100)]
+
+def _id3(size, footer=False):
+    """An ID3v2.4 header announcing `size` bytes of tag, which follow as padding"""
+    syncsafe = bytes((size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+    return b'ID3\x04\x00' + (b'\x10' if footer else b'\x00') + syncsafe + bytes(size) + (bytes(10) if footer else b'')
+
+def _xing_frame(audio_bytes, toc):
+    """A first MPEG frame carrying a Xing header with the byte count and seek table"""
+    return b'\xff\xfb\x90\x64' + bytes(32) + b'Xing' + (0x6).to_bytes(4, 'big') \
+        + audio_bytes.to_bytes(4, 'big') + bytes(toc) + bytes(200)
+
+@pytest.fixture
+def mp3(tmp_path):
+    path = tmp_path / 'vbr.mp3'
+    frame = _xing_frame(25600, VBR_TOC)
+    path.write_bytes(_id3(1000) + frame + bytes(25600 - len(frame)))
+    return path
+
+def test_constant_bitrate_timeline_is_linear():
+    line = Timeline(start=100, audio_bytes=1000, duration=50)
+    assert line.seconds(0) == line.seconds(100) == 0
+    assert line.seconds(600) == 25
+    assert line.seconds(5000) == 50
+
+def test_vbr_timeline_follows_the_seek_table():
+    line = Timeline(start=0, audio_bytes=25600, duration=100, toc=VBR_TOC)
+    # 50/256 of the bytes is 25% in, and 100/256 is halfway, though a linear map would say 19.5 and 39
+    assert line.seconds(5000) == pytest.approx(25)
+    assert line.seconds(10000) == pytest.approx(50)
+    assert line.seconds(25600) == pytest.approx(100)
+
+def test_audio_starts_after_the_id3_tag(tmp_path):
+    for footer, start in ((False, 10 + 300), (True, 10 + 300 + 10)):
+        path = tmp_path / 'tagged.mp3'
+        path.write_bytes(_id3(300, footer) + b'\xff\xfb' + bytes(100))
+        with open(path, 'rb') as f:
+            assert _audio_start(f) == start
+
+def test_audio_starts_at_the_wav_data_chunk(tmp_path):
+    path = tmp_path / 'clip.wav'
+    fmt = b'fmt ' + (16).to_bytes(4, 'little') + bytes(16)
+    path.write_bytes(b'RIFF' + bytes(4) + b'WAVE' + fmt + b'data' + (8).to_bytes(4, 'little') + bytes(8))
+    with open(path, 'rb') as f:
+        assert _audio_start(f) == 44
+
+def test_xing_header_gives_bytes_and_seek_table(mp3):
+    assert _xing(_xing_frame(25600, VBR_TOC)) == (25600, VBR_TOC)
+    assert _xing(b'\xff\xfb\x90\x64' + bytes(200)) == (None, None)
+
+    stat = os.stat(mp3)
+    line = timeline(str(mp3), stat.st_mtime_ns, stat.st_size, 100)
+    assert (line.start, line.audio_bytes, line.toc) == (1010, 25600, VBR_TOC)
+
+def _stop_thread(writer):
+    writer._thread = threading.Thread(target=lambda: None)
+    writer._thread.start()
+    writer._thread.join()
+
+def test_a_restarted_flush_thread_keeps_pending_positions(app):
+    writer = ProgressWriter(app, interval=3600)
+    writer.record('user-a', 'podcast', 30)
+    _stop_thread(writer)
+    writer.record('user-b', 'podcast', 40)
+    assert writer._pending == {('user-a', 'podcast'): 30, ('user-b', 'podcast'): 40}
+    assert writer._thread.is_alive()
+
+    # In a forked worker the parent's positions are not this process's to write
+    writer._pid = -1
+    writer.record('user-c', 'podcast', 50)
+    assert writer._pending == {('user-c', 'podcast'): 50}
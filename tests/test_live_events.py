@@ -0,0 +1,109 @@
+import asyncio
+import time
+import anyio
+import pytest
+from app import db
+from app.models.user import User
+from app.utils.live_events import EventLog, LiveEvents
+from app.utils.password import hash_password
+from benchmarks.seed import seed
+
+PASSWORD = 'Events-Passw0rd!'
+
+@pytest.fixture
+def podcast(app, client):
+    """A podcast id and a bearer header for a user who can like it"""
+    with app.app_context():
+        ids = seed(users=1, podcasts=1, likes=0, comments=0, listens=0, upload_folder=app.config['UPLOAD_FOLDER'])
+        user = db.session.get(User, ids['users'][0])
+        user.password = hash_password(PASSWORD)
+        db.session.commit()
+        email = user.email
+    token = client.post('/auth/login', json={'email': email, 'password': PASSWORD}).get_json()['token']
+    return ids['podcasts'][0], {'Authorization': f'Bearer {token}'}
+
+def test_broker_fans_out_to_the_topics_followed(tmp_path):
+    log = EventLog(str(tmp_path / 'events.db'))
+    live_events = LiveEvents(log, poll_interval=5, heartbeat=15, queue_size=10, max_topics=5)
+
+    async def main():
+        broker = live_events.broker
+        first = broker.subscribe(['podcast:a'])
+        both = broker.subscribe(['podcast:a', 'podcast:b'])
+        # Published from a request thread; notify() wakes the broker long before its next poll
+        await anyio.to_thread.run_sync(live_events.publish, 'podcast:b', [('like-count', {'likes_count': 1})])
+        seq, event, data = await asyncio.wait_for(both.queue.get(), 2)
+        assert (event, data) == ('like-count', '{"likes_count": 1}')
+        assert first.queue.empty()
+        broker.unsubscribe(first)
+        broker.unsubscribe(both)
+
+    anyio.run(main)
+
+def test_replay_gives_up_once_events_were_pruned(tmp_path):
+    log = EventLog(str(tmp_path / 'events.db'), retention=0)
+    log.prune_every = 1000
+    log.append('podcast:a', [('like-count', {'likes_count': 1})])
+    log.append('podcast:b', [('like-count', {'likes_count': 1})])
+    log.append('podcast:a', [('like-count', {'likes_count': 2})])
+    assert [seq for seq, *_ in log.replay(0, ['podcast:a'])] == [1, 3]
+
+    time.sleep(0.01)
+    log.prune_every = 1
+    log.append('podcast:a', [('like-count', {'likes_count': 3})])
+    # Events after 0 are gone, so the client has to start over
+    assert log.replay(0, ['podcast:a']) is None
+    assert [seq for seq, *_ in log.replay(3, ['podcast:a'])] == [4]
+
+def test_a_failing_publish_does_not_fail_the_write(app, client, podcast, monkeypatch):
+    podcast_id, auth = podcast
+
+    def broken(topic, events):
+        raise RuntimeError('event log unavailable')
+
+    monkeypatch.setattr(app.extensions['live_events'], 'publish', broken)
+    response = client.post(f'/api/podcasts/{podcast_id}/like', headers=auth)
+    assert response.status_code == 200 and response.get_json()['likes_count'] == 1
+
+def test_sse_stream_sends_counts_then_live_events(app, client, asgi_client, podcast):
+    podcast_id, auth = podcast
+    path = f'/api/podcasts/{podcast_id}/events'
+    body = bytearray()
+
+    async def main():
+        disconnected = anyio.Event()
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+            'root_path': '', 'client': ('127.0.0.1', 50000), 'server': ('testserver', 80), 'headers': [],
+        }
+        requested = False
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            body.extend(message.get('body', b''))
+
+        async def wait_for(text):
+            with anyio.fail_after(5):
+                while text not in body:
+                    await anyio.sleep(0.01)
+
+        async with anyio.create_task_group() as tasks:
+            tasks.start_soon(asgi_client.app, scope, receive, send)
+            await wait_for(b'event: counts')
+            # A like from a Flask request thread reaches the open stream
+            await anyio.to_thread.run_sync(lambda: client.post(f'/api/podcasts/{podcast_id}/like', headers=auth))
+            await wait_for(b'event: like-count')
+            disconnected.set()
+
+    anyio.run(main)
+    counts, live = bytes(body).split(b'\n\n')[:2]
+    assert b'"likes_count": 0' in counts
+    assert live.startswith(b'id: ') and b'"likes_count": 1' in live
@@ -0,0 +1,18 @@
+import pytest
+
+TOKEN = 'metrics-secret'
+
+@pytest.fixture
+def metrics(request, monkeypatch):
+    monkeypatch.setenv('METRICS_TOKEN', TOKEN)
+    return request.getfixturevalue('app').test_client()
+
+def test_metrics_need_the_token(metrics):
+    metrics.get('/api/test')
+    response = metrics.get('/metrics', headers={'Authorization': f'Bearer {TOKEN}'})
+    assert response.status_code == 200 and response.mimetype == 'text/plain'
+    assert metrics.get('/metrics').status_code == 401
+
+@pytest.mark.parametrize('value', ['Bearer wrong', 'Bearer métrics', 'Bearer ²'])
+def test_bad_tokens_are_unauthorised(metrics, value):
+    assert metrics.get('/metrics', headers={'Authorization': value}).status_code == 401
@@ -0,0 +1,19 @@
+import pytest
+from app.utils.profiling import HEADER, sign
+
+SECRET = 'profile-secret'
+
+@pytest.fixture
+def profiled(request, monkeypatch):
+    monkeypatch.setenv('PROFILE_TOKEN', SECRET)
+    return request.getfixturevalue('app').test_client()
+
+def test_only_authorised_requests_are_profiled(profiled):
+    assert 'X-Profile-Id' in profiled.get('/api/test', headers={HEADER: SECRET}).headers
+    assert 'X-Profile-Id' in profiled.get('/api/test', headers={HEADER: sign(SECRET, 'GET', '/api/test')}).headers
+    assert 'X-Profile-Id' not in profiled.get('/api/categories', headers={HEADER: sign(SECRET, 'GET', '/api/test')}).headers
+
+@pytest.mark.parametrize('value', ['wrong', 'sécret', '9999999999.sïgnature', '²³.abc'])
+def test_malformed_profile_headers_are_ignored(profiled, value):
+    response = profiled.get('/api/test', headers={HEADER: value})
+    assert response.status_code == 200 and 'X-Profile-Id' not in response.headers
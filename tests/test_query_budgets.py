@@ -0,0 +1,45 @@
+import pytest
+from flask_jwt_extended import create_access_token
+from app import db
+from app.utils.query_budgets import check_query_budgets
+from benchmarks.seed import THUMBNAIL, seed, wav_bytes
+
+@pytest.fixture
+def world(app):
+    with app.app_context():
+        ids = seed(users=50, podcasts=200, likes=500, comments=500, listens=1000,
+                   upload_folder=app.config['UPLOAD_FOLDER'])
+    # The category snapshot is built once per version, not per request
+    with app.test_request_context():
+        app.extensions['category_cache'].snapshot()
+    return ids
+
+@pytest.fixture
+def reader(app, world):
+    with app.app_context():
+        return {'Authorization': f"Bearer {create_access_token(identity=world['users'][0])}"}
+
+def test_every_endpoint_stays_within_its_budget(app, world):
+    results = check_query_budgets(app, world, wav_bytes(), THUMBNAIL)
+    assert [failure for *_, failures, _ in results for failure in failures] == []
+
+@pytest.mark.parametrize('url, budget', [
+    ('/api/podcasts', 3),
+    ('/api/podcasts?page=2&per_page=50', 3),
+    ('/api/podcasts/discover', 4),
+])
+def test_listings_do_not_grow_with_the_page(app, client, world, assert_max_queries, url, budget):
+    with assert_max_queries(budget):
+        assert client.get(url).status_code == 200
+
+def test_listen_history_is_batched(app, client, world, reader, assert_max_queries):
+    with assert_max_queries(5):
+        assert client.get('/auth/profile/listen-history?per_page=50', headers=reader).status_code == 200
+
+def test_assert_max_queries_reports_an_n_plus_one(app, world, assert_max_queries):
+    with app.app_context():
+        with pytest.raises(AssertionError, match=r'Expected at most 2 queries, got 10') as error:
+            with assert_max_queries(2):
+                for podcast_id in world['podcasts'][:10]:
+                    db.session.execute(db.text('SELECT title FROM podcasts WHERE id = :id'), {'id': podcast_id})
+    assert '10 x SELECT title FROM podcasts WHERE id = ?' in str(error.value)
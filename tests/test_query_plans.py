@@ -0,0 +1,25 @@
+import pytest
+from app import db
+from app.utils.query_plans import _sqlite_violations, check_query_plans
+from benchmarks.seed import seed
+
+@pytest.fixture
+def world(app):
+    with app.app_context():
+        return seed(users=50, podcasts=300, likes=1000, comments=1000, listens=2000,
+                    upload_folder=app.config['UPLOAD_FOLDER'])
+
+def test_hot_queries_use_indexes(app, world):
+    results = check_query_plans(app, world)
+    assert {endpoint for endpoint, *_ in results} == {'get_podcasts', 'discover_podcasts', 'get_comments', 'get_listen_history'}
+    failures = [f"{url}: {' '.join(statement.split())[:200]} -> {violations}"
+                for endpoint, url, statement, plan, violations in results if violations]
+    assert failures == []
+
+def test_a_table_scan_is_reported(app, world):
+    tables = set(db.metadata.tables)
+    with app.app_context(), db.engine.connect() as connection:
+        plan, violations = _sqlite_violations(connection, 'SELECT id FROM podcasts WHERE description = ?', ('x',), tables)
+        assert violations == ['SCAN podcasts']
+        plan, violations = _sqlite_violations(connection, 'SELECT id FROM podcasts WHERE slug = ?', ('x',), tables)
+        assert violations == [], plan
@@ -0,0 +1,71 @@
+from app.utils import rate_limit
+from app.utils.rate_limit import FileBackend, MemoryBackend, RateLimitPolicy
+
+LONG = RateLimitPolicy('forgot_password', 5, 900, 'ip')
+SHORT = RateLimitPolicy('track', 120, 1, 'user')
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def test_memory_backend_refuses_past_the_limit():
+    backend = MemoryBackend()
+    results = [backend.hit('login:ip:1.2.3.4', RateLimitPolicy('login', 3, 60, 'ip')) for _ in range(4)]
+    assert [result.allowed for result in results] == [True, True, True, False]
+    assert results[-1].retry_after > 0
+
+def test_file_backend_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / 'ratelimit.bin')
+    first, second = FileBackend(path, slots=64), FileBackend(path, slots=64)
+    for _ in range(LONG.limit):
+        assert first.hit('forgot_password:ip:a', LONG).allowed
+    assert not second.hit('forgot_password:ip:a', LONG).allowed
+
+def test_short_period_policy_does_not_take_over_a_live_long_period_slot(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, 'time', clock)
+    # One window of slots, so every key competes for the same four; one is left free
+    backend = FileBackend(str(tmp_path / 'ratelimit.bin'), slots=FileBackend._PROBE + 1)
+    long_keys = [f'forgot_password:ip:{i}' for i in range(FileBackend._PROBE - 1)]
+    for key in long_keys:
+        backend.hit(key, LONG)
+        backend.hit(key, LONG)
+
+    # Long past the short policy's period, well within the long one's
+    clock.now += 10
+    backend.hit('track:user:u:1', SHORT)
+
+    assert [backend.hit(key, LONG).remaining for key in long_keys] == [LONG.limit - 3] * len(long_keys)
+
+def test_slot_is_reused_once_its_own_bucket_has_refilled(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, 'time', clock)
+    backend = FileBackend(str(tmp_path / 'ratelimit.bin'), slots=FileBackend._PROBE + 1)
+    for i in range(FileBackend._PROBE):
+        backend.hit(f'track:user:u:{i}', SHORT)
+
+    clock.now += 2
+    assert backend.hit('forgot_password:ip:new', LONG).remaining == LONG.limit - 1
+    # The reused slot belonged to a short-period key; the others are untouched
+    owners = {backend._SLOT.unpack_from(backend._map, i * backend._SLOT.size)[0] for i in range(FileBackend._PROBE)}
+    assert len(owners) == FileBackend._PROBE
+
+def test_a_full_window_evicts_the_bucket_nearest_to_full(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, 'time', clock)
+    backend = FileBackend(str(tmp_path / 'ratelimit.bin'), slots=FileBackend._PROBE + 1)
+    # Every slot taken by a live bucket, with 0, 1, 2 and 3 tokens left
+    keys = [f'forgot_password:ip:{i}' for i in range(FileBackend._PROBE)]
+    for left, key in enumerate(keys):
+        for _ in range(LONG.limit - left):
+            backend.hit(key, LONG)
+
+    # The newcomer gets a bucket of its own instead of sharing another key's
+    assert backend.hit('forgot_password:ip:new', LONG).remaining == LONG.limit - 1
+    assert backend.hit('forgot_password:ip:new', LONG).remaining == LONG.limit - 2
+    # The others kept their buckets; only the one with the most tokens left was evicted
+    assert [backend.hit(key, LONG).remaining for key in keys[:-1]] == [0, 0, 1]
+    assert not backend.hit(keys[0], LONG).allowed
@@ -0,0 +1,46 @@
+from app.utils.category_cache import VersionFile
+from app.utils.response_cache import ResponseCache, SharedTier
+
+def _worker(tmp_path, **options):
+    """A ResponseCache as one worker process sees it: its own memory tier over the shared files"""
+    return ResponseCache(SharedTier(str(tmp_path / 'cache.db')), VersionFile(str(tmp_path / 'version.bin')), **options)
+
+def _store(cache, key, body, tags):
+    return cache.store(key, body, 'application/json', f'"{key}"', tags, None, cache.seq())
+
+def test_one_workers_entry_warms_the_others(tmp_path):
+    first, second = _worker(tmp_path), _worker(tmp_path)
+    _store(first, 'comments|a', b'[1]', ['podcast:a'])
+
+    entry, fresh = first.lookup('comments|a')
+    assert fresh and entry.body == b'[1]'
+    # Not in the second worker's memory, so it comes from the shared file and stays in memory
+    entry, fresh = second.lookup('comments|a')
+    assert fresh and entry.body == b'[1]'
+    assert 'comments|a' in second._memory
+
+def test_invalidating_a_tag_drops_entries_in_every_worker(tmp_path):
+    first, second = _worker(tmp_path), _worker(tmp_path)
+    _store(first, 'comments|a', b'[1]', ['podcast:a'])
+    _store(first, 'comments|b', b'[2]', ['podcast:b'])
+    second.lookup('comments|a')
+
+    second.invalidate('podcast:a')
+    assert first.lookup('comments|a') == (None, False)
+    assert second.lookup('comments|a') == (None, False)
+    assert first.lookup('comments|b')[1]
+
+def test_responses_built_across_an_invalidation_are_not_stored(tmp_path):
+    cache = _worker(tmp_path)
+    since = cache.seq()
+    cache.invalidate('podcast:a')
+    assert cache.store('comments|a', b'[1]', 'application/json', '"a"', ['podcast:a'], None, since) is None
+    assert cache.lookup('comments|a') == (None, False)
+
+def test_memory_tier_is_bounded_by_bytes(tmp_path):
+    cache = _worker(tmp_path, memory_bytes=100)
+    for key in ('a', 'b', 'c'):
+        _store(cache, key, bytes(40), [f'podcast:{key}'])
+    assert list(cache._memory) == ['b', 'c']
+    # Evicted from memory only; the shared tier still has it
+    assert cache.lookup('a')[1]
@@ -0,0 +1,63 @@
+import os
+import pytest
+from app import db
+from app.models.podcast import Podcast
+from app.utils.segment_cache import SegmentCache
+from benchmarks.seed import seed
+
+@pytest.fixture
+def audio(tmp_path):
+    path = tmp_path / 'episode.mp3'
+    path.write_bytes(os.urandom(1000))
+    return str(path)
+
+def _read(cache, path, start, end):
+    return b''.join(cache.read_range(path, os.stat(path), start, end))
+
+def test_ranges_are_assembled_from_blocks(audio):
+    cache = SegmentCache(capacity=1000, block_size=100)
+    data = open(audio, 'rb').read()
+    for start, end in ((0, 99), (50, 349), (150, 150), (900, 999)):
+        assert _read(cache, audio, start, end) == data[start:end + 1]
+    misses, hits = cache.stats['misses'], cache.stats['hits']
+    assert _read(cache, audio, 50, 349) == data[50:350]
+    assert cache.stats['misses'] == misses and cache.stats['hits'] == hits + 4
+
+def test_a_one_off_scan_does_not_displace_popular_blocks(audio):
+    cache = SegmentCache(capacity=200, block_size=100)
+    for _ in range(3):
+        _read(cache, audio, 0, 199)
+    # Blocks 2-9 are each asked for once, less often than the resident ones
+    _read(cache, audio, 200, 999)
+    assert cache.stats['rejections'] == 8 and cache.stats['evictions'] == 0
+    hits = cache.stats['hits']
+    _read(cache, audio, 0, 199)
+    assert cache.stats['hits'] == hits + 2
+
+def test_a_replaced_file_is_never_served_from_old_blocks(audio):
+    cache = SegmentCache(capacity=1000, block_size=100)
+    _read(cache, audio, 0, 99)
+    replacement = os.urandom(1200)
+    with open(audio, 'wb') as f:
+        f.write(replacement)
+    assert _read(cache, audio, 0, 99) == replacement[:100]
+
+def test_stream_ranges_match_the_uncached_response(app, client):
+    with app.app_context():
+        podcast_id = seed(users=1, podcasts=1, likes=0, comments=0, listens=0,
+                          upload_folder=app.config['UPLOAD_FOLDER'])['podcasts'][0]
+        path = os.path.join(app.config['UPLOAD_FOLDER'], db.session.get(Podcast, podcast_id).audio_url)
+    data = open(path, 'rb').read()
+    url, headers = f'/api/podcasts/{podcast_id}/stream', {'Range': 'bytes=10-299'}
+    app.extensions['segment_cache'] = SegmentCache(capacity=1000, block_size=64)
+
+    cached = client.get(url, headers=headers)
+    assert cached.status_code == 206 and cached.get_data() == data[10:300]
+    assert cached.headers['Content-Range'] == f'bytes 10-299/{len(data)}'
+    assert app.extensions['segment_cache'].stats['misses'] == 5
+
+    del app.extensions['segment_cache']
+    uncached = client.get(url, headers=headers)
+    assert uncached.status_code == 206 and uncached.get_data() == cached.get_data()
+    # The same validator either way, so a client can mix cached and uncached responses
+    assert uncached.headers['ETag'] == cached.headers['ETag']
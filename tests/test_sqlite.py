@@ -0,0 +1,125 @@
+import os
+import sqlite3
+import threading
+from concurrent.futures import Future
+import pytest
+from sqlalchemy import create_engine, event, text
+from app import db
+from app.models.user import User
+from app.utils.password import hash_password
+from app.utils.sqlite import WriteQueue, group_commit_engine
+from benchmarks.seed import seed
+
+PASSWORD = 'Queue-Passw0rd!'
+
+def _queue(tmp_path):
+    path = tmp_path / 'app.db'
+    engine = create_engine(f'sqlite:///{path}')
+    with engine.begin() as connection:
+        connection.exec_driver_sql('CREATE TABLE listens (id INTEGER PRIMARY KEY, seconds INTEGER NOT NULL)')
+    writer = group_commit_engine(engine)
+    statements = []
+
+    @event.listens_for(writer, 'connect')
+    def trace(dbapi_connection, connection_record):
+        dbapi_connection.set_trace_callback(statements.append)
+
+    return WriteQueue(writer), path, statements
+
+def _insert(connection, id, seconds):
+    connection.execute(text('INSERT INTO listens (id, seconds) VALUES (:id, :seconds)'), {'id': id, 'seconds': seconds})
+    return id
+
+def _batch(*jobs):
+    return [(Future(), fn, args, {}) for fn, *args in jobs]
+
+def test_a_batch_commits_once(tmp_path):
+    write_queue, path, statements = _queue(tmp_path)
+    seen_outside = []
+
+    def peek(connection):
+        # Another connection must not see the earlier jobs until the whole batch commits
+        with sqlite3.connect(path) as outside:
+            seen_outside.append(outside.execute('SELECT count(*) FROM listens').fetchone()[0])
+
+    batch = _batch((_insert, 1, 10), (_insert, 2, 20), (peek,), (_insert, 3, 30))
+    write_queue._run_batch(batch)
+
+    assert [future.result() for future, *_ in batch] == [1, 2, None, 3]
+    assert seen_outside == [0]
+    commits = [statement for statement in statements if statement.split()[0].upper() in ('BEGIN', 'COMMIT')]
+    assert commits == ['BEGIN IMMEDIATE', 'COMMIT']
+    assert sum(statement.startswith('SAVEPOINT') for statement in statements) == 4
+
+def test_a_failing_job_only_rolls_back_itself(tmp_path):
+    write_queue, path, statements = _queue(tmp_path)
+    batch = _batch((_insert, 1, 10), (_insert, 1, 99), (_insert, 2, 20))
+    write_queue._run_batch(batch)
+
+    assert batch[0][0].result() == 1 and batch[2][0].result() == 2
+    assert isinstance(batch[1][0].exception(), Exception)
+    with sqlite3.connect(path) as connection:
+        assert connection.execute('SELECT id, seconds FROM listens ORDER BY id').fetchall() == [(1, 10), (2, 20)]
+
+def test_submit_runs_jobs_on_the_writer_thread(tmp_path):
+    write_queue, path, statements = _queue(tmp_path)
+    assert write_queue.submit(_insert, 7, 70) == 7
+    with sqlite3.connect(path) as connection:
+        assert connection.execute('SELECT seconds FROM listens WHERE id = 7').fetchone() == (70,)
+
+def test_a_restarted_writer_keeps_the_queued_jobs(tmp_path):
+    write_queue, path, statements = _queue(tmp_path)
+    # This process's writer died with a job still queued
+    write_queue._thread = threading.Thread(target=lambda: None)
+    write_queue._thread.start()
+    write_queue._thread.join()
+    write_queue._pid = os.getpid()
+    stranded = Future()
+    write_queue._jobs.put((stranded, _insert, (2, 20), {}))
+
+    assert write_queue.submit(_insert, 3, 30) == 3
+    assert stranded.result(timeout=5) == 2
+
+def test_submit_gives_up_after_its_timeout(tmp_path):
+    write_queue, path, statements = _queue(tmp_path)
+    write_queue.timeout = 0.2
+    started, release = threading.Event(), threading.Event()
+    write_queue._ensure_started()
+    blocked = Future()
+    write_queue._jobs.put((blocked, lambda connection: started.set() or release.wait(5), (), {}))
+    # The next job has to wait for the following batch
+    started.wait(5)
+    try:
+        with pytest.raises(TimeoutError):
+            write_queue.submit(_insert, 1, 10)
+    finally:
+        release.set()
+    assert blocked.result(timeout=5)
+    # The abandoned job was dropped rather than committed behind the caller's back
+    write_queue.timeout = None
+    assert write_queue.submit(_insert, 2, 20) == 2
+    with sqlite3.connect(path) as connection:
+        assert connection.execute('SELECT id FROM listens').fetchall() == [(2,)]
+
+def test_likes_go_through_the_write_queue(request, monkeypatch):
+    monkeypatch.setenv('SQLITE_WRITE_QUEUE', 'true')
+    app = request.getfixturevalue('app')
+    client = app.test_client()
+    with app.app_context():
+        ids = seed(users=1, podcasts=1, likes=0, comments=0, listens=0, upload_folder=app.config['UPLOAD_FOLDER'])
+        user = db.session.get(User, ids['users'][0])
+        user.password = hash_password(PASSWORD)
+        db.session.commit()
+        email = user.email
+    token = client.post('/auth/login', json={'email': email, 'password': PASSWORD}).get_json()['token']
+    auth = {'Authorization': f'Bearer {token}'}
+    like, unlike = (f"/api/podcasts/{ids['podcasts'][0]}/{action}" for action in ('like', 'unlike'))
+    write_queue = app.extensions['sqlite_write_queue']
+
+    response = client.post(like, headers=auth)
+    assert response.status_code == 200 and response.get_json()['likes_count'] == 1
+    assert write_queue._thread is not None
+    assert client.post(like, headers=auth).status_code == 400
+    response = client.post(unlike, headers=auth)
+    assert response.status_code == 200 and response.get_json()['likes_count'] == 0
+    assert client.post(unlike, headers=auth).status_code == 400
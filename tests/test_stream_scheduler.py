@@ -0,0 +1,80 @@
+import time
+import anyio
+import pytest
+from werkzeug.http import parse_range_header
+from app.utils.stream_scheduler import StreamScheduler
+from benchmarks.seed import seed
+
+class _Response:
+    def __init__(self, content_length):
+        self.content_length = content_length
+
+def test_only_large_closed_ranges_are_bulk():
+    scheduler = StreamScheduler(64000, 1024 * 1024, small_range=256 * 1024)
+    episode = _Response(50 * 1024 * 1024)
+    assert scheduler.classify(_Response(65536), parse_range_header('bytes=1000000-1065535')) == 'seek'
+    # How players read an episode
+    assert scheduler.classify(episode, None) == 'listen'
+    assert scheduler.classify(episode, parse_range_header('bytes=0-')) == 'listen'
+    assert scheduler.classify(episode, parse_range_header('bytes=1048576-')) == 'listen'
+    # How download managers fetch one
+    assert scheduler.classify(_Response(8 * 1024 * 1024), parse_range_header('bytes=0-8388607')) == 'bulk'
+
+@pytest.fixture
+def stream(app):
+    app.config.update(SEGMENT_CACHE_ENABLED=False)
+    scheduler = app.extensions['stream_scheduler']
+    scheduler.max_per_user, scheduler.small_range = 1, 64 * 1024
+    scheduler.rate, scheduler.burst, scheduler.chunk_size = 256 * 1024, 32 * 1024, 16 * 1024
+    with app.app_context():
+        podcast_id = seed(users=1, podcasts=1, likes=0, comments=0, listens=0,
+                          upload_folder=app.config['UPLOAD_FOLDER'], audio_seconds=120)['podcasts'][0]
+    return f'/api/podcasts/{podcast_id}/stream'
+
+def test_listeners_are_never_refused(client, stream):
+    # Bodies are left open, so each bulk download keeps its slot
+    downloads = [client.get(stream, headers={'Range': 'bytes=0-524287'}, buffered=False)]
+    try:
+        assert downloads[0].status_code == 206
+        refused = client.get(stream, headers={'Range': 'bytes=524288-1048575'})
+        assert refused.status_code == 429 and refused.headers['Retry-After'] == '1'
+
+        for headers in ({}, {'Range': 'bytes=0-'}, {'Range': 'bytes=524288-'}, {'Range': 'bytes=0-'}):
+            downloads.append(client.get(stream, headers=headers, buffered=False))
+            assert downloads[-1].status_code in (200, 206)
+        assert client.get(stream, headers={'Range': 'bytes=1000000-1065535'}).status_code == 206
+    finally:
+        for response in downloads:
+            response.close()
+    # Closing the body frees the slot
+    assert client.get(stream, headers={'Range': 'bytes=524288-1048575'}).status_code == 206
+
+def test_paced_streams_hold_no_thread(app, asgi_client, stream):
+    size = 160 * 1024
+    paced_for = (size - 32 * 1024) / (256 * 1024)
+
+    async def download(results):
+        started = time.monotonic()
+        status, _, body = await asgi_client.request('GET', stream, {'Range': f'bytes=0-{size - 1}'})
+        results.append((status, len(body), time.monotonic() - started))
+
+    async def main():
+        # Two threads for everything: a stream that slept on one would starve the rest
+        anyio.to_thread.current_default_thread_limiter().total_tokens = 2
+        results = []
+        started = time.monotonic()
+        async with anyio.create_task_group() as tasks:
+            for user in range(6):
+                tasks.start_soon(download, results)
+            await anyio.sleep(0.05)
+            status, _, body = await asgi_client.request('GET', stream, {'Range': 'bytes=1000000-1065535'})
+            seek = time.monotonic() - started
+        return results, (status, len(body), seek), time.monotonic() - started
+
+    # Six downloads from one address would be refused past the first; these are open to the limits
+    app.extensions['stream_scheduler'].max_per_user = 10
+    results, seek, elapsed = anyio.run(main)
+    assert all(status == 206 and length == size and took >= paced_for * 0.9 for status, length, took in results)
+    assert seek[:2] == (206, 65536) and seek[2] < paced_for
+    # Paced side by side, not two at a time
+    assert elapsed < paced_for * 2